@@ -1,22 +1,27 @@
 #!/usr/bin/env python3
 """
 Telegram 告警集成模块
-支持严重告警和警告告警，支持多账号推送和重试机制。
+支持严重告警和警告告警，优先通过 Bot API 推送，失败时回退到主账号，支持多账号推送、重试和告警合并。
 """
 
 import asyncio
+import html
 import os
 import sys
 import argparse
 import logging
 from datetime import datetime
-from typing import Optional, List
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
 # 确保可以从 src 导入
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.config import config
-from src.adapters.telegram_adapter_v2 import TelegramMultiAccountAdapter
+from src.config import config, TelegramAccountConfig
+from src.adapters.telegram_adapter_v2 import TelegramClientSession
+from src.adapters.telegram_replay import make_client_factory
+from src.delivery.bot_api import BotApiSender
+from src.delivery.outbox import Outbox, content_key
+from src.metrics import metrics
 
 # 配置日志
 logging.basicConfig(
@@ -26,26 +31,181 @@ logging.basicConfig(
 )
 logger = logging.getLogger("TelegramAlerter")
 
+class AlertBatcher:
+    """
+    告警合并器
+    窗口期内发往同一组目标的告警合并为一条消息发送，避免故障时连续告警触发限流
+    """
+
+    def __init__(self, deliver: Callable[[str, List[str], bool], Awaitable[bool]],
+                 window: float = 2.0, max_batch: int = 20):
+        """
+        Args:
+            deliver: 实际发送函数 (message, targets, use_all_accounts) -> 是否成功
+            window: 合并窗口（秒），从该组第一条告警开始计时
+            max_batch: 单条合并消息最多包含的告警数，达到后立即发送
+        """
+        self.deliver = deliver
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[Tuple, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[Tuple, asyncio.Task] = {}
+        # 批次满时立即发送的任务；事件循环只持有弱引用，需保留到完成
+        self._flushes: Set[asyncio.Task] = set()
+
+    async def submit(self, message: str, targets: List[str], use_all_accounts: bool = False) -> bool:
+        """加入合并队列，等待所在批次发送完成后返回结果"""
+        key = (tuple(targets), use_all_accounts)
+        future = asyncio.get_running_loop().create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((message, future))
+
+        if len(batch) >= self.max_batch:
+            task = asyncio.create_task(self._flush(key))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.create_task(self._flush_later(key))
+        return await future
+
+    async def _flush_later(self, key: Tuple):
+        await asyncio.sleep(self.window)
+        await self._flush(key)
+
+    async def _flush(self, key: Tuple):
+        timer = self._timers.pop(key, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+        batch = self._pending.pop(key, [])
+        if not batch:
+            return
+
+        messages = [message for message, _ in batch]
+        if len(messages) == 1:
+            text = messages[0]
+        else:
+            text = f"<b>📦 {len(messages)} 条告警合并推送</b>\n\n" + "\n\n".join(messages)
+
+        try:
+            success = await self.deliver(text, list(key[0]), key[1])
+        except Exception as e:
+            logger.error(f"合并告警发送失败: {e}")
+            success = False
+        for _, future in batch:
+            if not future.done():
+                future.set_result(success)
+
+    async def flush_all(self):
+        """立即发送所有等待中的告警（退出前调用）"""
+        await asyncio.gather(*(self._flush(key) for key in list(self._pending)))
+        # 等待已在发送中的满批次，避免退出时被取消
+        if self._flushes:
+            await asyncio.gather(*list(self._flushes))
+
+
 class TelegramAlerter:
-    def __init__(self):
-        self.adapter = TelegramMultiAccountAdapter()
+    def __init__(self, bot_sender: Optional[BotApiSender] = None,
+                 session_factory: Optional[Callable[[TelegramAccountConfig], TelegramClientSession]] = None,
+                 coalesce_window: float = 0.0):
+        """
+        Args:
+            bot_sender: Bot API 发送器，默认在配置了 BOT_TOKEN 时创建
+            session_factory: 按账号创建 MTProto 会话，默认根据 TELEGRAM_CLIENT_MODE 选择真实/录制/回放客户端
+            coalesce_window: 告警合并窗口（秒），0 表示逐条立即发送
+        """
+        if bot_sender is None and config.push_config.bot_token:
+            bot_sender = BotApiSender(config.push_config.bot_token)
+        self.bot_sender = bot_sender
+
+        if session_factory is None:
+            client_factory = make_client_factory()
+            session_factory = lambda account: TelegramClientSession(account, client_factory=client_factory)
+        self.session_factory = session_factory
+
+        self.batcher = AlertBatcher(self._deliver, window=coalesce_window) if coalesce_window > 0 else None
 
     async def _send_via_session(self, session, text: str, targets: List[str]) -> bool:
-        """使用特定会话发送消息到多个目标"""
+        """使用特定会话并发发送消息到多个目标"""
         if not session:
             return False
-            
-        success_any = False
-        for target in targets:
+
+        async def send_one(target):
             try:
-                # 尝试发送
-                res = await session.send_to_channel(text, target, parse_mode="HTML")
-                if res:
+                if await session.send_to_channel(text, target, parse_mode="HTML", is_html=True):
                     logger.info(f"账号 {session.account_config.account_id} 成功发送到 {target}")
-                    success_any = True
+                    return True
             except Exception as e:
                 logger.error(f"账号 {session.account_config.account_id} 发送到 {target} 失败: {e}")
-        return success_any
+            return False
+
+        results = await asyncio.gather(*(send_one(target) for target in targets))
+        return any(results)
+
+    async def _send_via_bot(self, text: str, targets: List[str]) -> bool:
+        """Bot API 快速通道：无需登录 MTProto 会话"""
+        if self.bot_sender is None:
+            return False
+        results = await self.bot_sender.send_to_targets(text, targets)
+        for target, ok in results.items():
+            if ok:
+                logger.info(f"Bot 成功发送到 {target}")
+        return any(results.values())
+
+    async def _send_via_accounts(self, text: str, targets: List[str], use_all_accounts: bool) -> bool:
+        """通过 MTProto 账号发送，只连接实际要用的会话"""
+        accounts = [config.main_account]
+        if use_all_accounts:
+            accounts.extend(config.collector_accounts)
+        sessions = [self.session_factory(account) for account in accounts]
+
+        async def send_with_session(session) -> bool:
+            try:
+                await session.connect()
+            except Exception as e:
+                logger.error(f"账号 {session.account_config.account_id} 连接失败: {e}")
+                return False
+            # 带有重试机制的发送（复用已建立的连接）
+            for attempt in range(3):
+                if await self._send_via_session(session, text, targets):
+                    return True
+                logger.warning(f"账号 {session.account_config.account_id} 尝试 {attempt+1} 失败")
+                await asyncio.sleep(1)
+            return False
+
+        try:
+            results = await asyncio.gather(*(send_with_session(session) for session in sessions))
+            return any(results)
+        finally:
+            await asyncio.gather(*(session.disconnect() for session in sessions), return_exceptions=True)
+
+    async def _deliver(self, message: str, targets: List[str], use_all_accounts: bool = False) -> bool:
+        """
+        发送一条已构造好的告警
+
+        默认优先走 Bot API，失败时回退到主账号；use_all_accounts 时 Bot 与全部账号同时发送；
+        全部失败时写入发件箱
+        """
+        with metrics.timer("alert_seconds"):
+            if use_all_accounts:
+                results = await asyncio.gather(
+                    self._send_via_bot(message, targets),
+                    self._send_via_accounts(message, targets, use_all_accounts=True),
+                )
+                if any(results):
+                    return True
+
+            if await self._send_via_bot(message, targets):
+                return True
+            if self.bot_sender is not None:
+                logger.warning("Bot API 发送失败，回退到主账号发送")
+            if await self._send_via_accounts(message, targets, use_all_accounts=False):
+                return True
+
+        # 所有通道都失败时写入发件箱，由调度器的 outbox 任务稍后续发
+        if config.outbox_config.enabled:
+            Outbox().enqueue(content_key(message), message, targets, kind="alert", is_html=True)
+            logger.warning("告警暂时无法送达，已写入发件箱等待重试")
+        return False
 
     async def send_alert(self, 
                          level: str, 
@@ -78,13 +238,13 @@ class TelegramAlerter:
             extra_label = "建议"
             extra_value = suggestion if suggestion else "检查系统状态"
 
-        # 构造 HTML 格式的消息 (Telegram 支持 HTML)
+        # 构造 HTML 格式的消息 (Telegram 支持 HTML)；错误文本中常见的 < 和 & 需要转义，否则整条消息解析失败
         message = (
             f"<b>{emoji}{title}</b>\n"
             f"时间: {time_str}\n"
-            f"问题: {problem}\n"
-            f"状态: {status}\n"
-            f"{extra_label}: {extra_value}"
+            f"问题: {html.escape(problem, quote=False)}\n"
+            f"状态: {html.escape(status, quote=False)}\n"
+            f"{extra_label}: {html.escape(extra_value, quote=False)}"
         )
 
         # 确定推送目标
@@ -100,34 +260,16 @@ class TelegramAlerter:
             logger.error("未配置任何推送目标 (CHANNEL_ID/CHANNEL_USERNAME/USER_ID)")
             return False
 
-        async with self.adapter as adapter:
-            # 待使用的会话列表
-            sessions_to_use = []
-            if adapter.main_session:
-                sessions_to_use.append(adapter.main_session)
-            
-            if use_all_accounts:
-                sessions_to_use.extend(adapter.collector_sessions.values())
-            
-            if not sessions_to_use:
-                logger.error("没有可用的 Telegram 会话")
-                return False
+        if self.batcher is not None:
+            return await self.batcher.submit(message, targets, use_all_accounts)
+        return await self._deliver(message, targets, use_all_accounts)
 
-            overall_success = False
-            for session in sessions_to_use:
-                # 带有重试机制的发送
-                for attempt in range(3):
-                    try:
-                        if await self._send_via_session(session, message, targets):
-                            overall_success = True
-                            if not use_all_accounts:
-                                return True # 只要主账号成功且不要求全部发送，就返回
-                            break # 当前账号成功，跳出重试
-                    except Exception as e:
-                        logger.warning(f"账号 {session.account_config.account_id} 尝试 {attempt+1} 失败: {e}")
-                        await asyncio.sleep(1)
-                
-            return overall_success
+    async def close(self):
+        """发送剩余的合并告警并释放 HTTP 连接池"""
+        if self.batcher is not None:
+            await self.batcher.flush_all()
+        if self.bot_sender is not None:
+            await self.bot_sender.close()
 
 async def main():
     parser = argparse.ArgumentParser(description="Telegram 告警集成模块")
@@ -160,6 +302,8 @@ async def main():
     except Exception as e:
         logger.error(f"运行告警模块时发生未处理的错误: {e}")
         sys.exit(1)
+    finally:
+        await alerter.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
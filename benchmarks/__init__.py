@@ -0,0 +1,4 @@
+"""
+离线性能基准
+使用合成语料和本地假实现（LLM / Telegram）度量流水线各阶段耗时，不需要真实账号
+"""
@@ -0,0 +1,170 @@
+"""
+消息转换微基准：Telethon 消息 → 流水线消息
+
+用法:
+    python -m benchmarks.conversion --messages 50000
+    python -m benchmarks.conversion --recording-dir data/telegram_recordings
+
+对同一批录制消息（默认用合成语料构造，也可以读取 TELEGRAM_CLIENT_MODE=record 录下的真实流量）比较：
+- per_message_validated: 改动前的方式，每条消息检查 chat/sender 属性并经 pydantic 校验构造 UnifiedMessage
+- per_message_cached: 现在的 _convert_to_unified_message（会话内名称缓存，仍逐条构造 UnifiedMessage）
+- page_batch: 采集实际使用的路径，按 iter_messages 的页（100 条）转换为 MessageBatch，不经过 pydantic
+结果写入 data/benchmarks/conversion_*.json。
+"""
+
+import argparse
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run_collector import build_recordings
+from benchmarks.run_pipeline import DEFAULT_OUTPUT_DIR, git_commit, write_report
+from src.adapters.telegram_adapter_v2 import _ITER_PAGE_SIZE, TelegramClientSession
+from src.adapters.telegram_replay import RecordedMessage, TelegramRecording
+from src.batch import MessageBatch
+from src.config import TelegramAccountConfig
+from src.models import Platform, UnifiedMessage
+
+
+def load_messages(recording_dir: str = None, n_messages: int = 50000, n_chats: int = 78) -> List[RecordedMessage]:
+    if recording_dir:
+        recordings = [TelegramRecording.load(os.path.join(recording_dir, name))
+                      for name in sorted(os.listdir(recording_dir)) if name.endswith(".json")]
+    else:
+        recordings = build_recordings(n_chats, max(1, n_messages // n_chats), n_accounts=1).values()
+    return [message for recording in recordings for chat_id in recording.messages
+            for message in recording.messages[chat_id].values()]
+
+
+def convert_validated(message: RecordedMessage, account_id: str) -> UnifiedMessage:
+    """改动前的 _convert_to_unified_message（作为对照保留在基准中）"""
+    text = message.message or ""
+    links = []
+    if message.entities:
+        for entity in message.entities:
+            if hasattr(entity, 'url') and entity.url:
+                links.append(entity.url)
+
+    chat_name = "Unknown Chat"
+    if hasattr(message.chat, 'title'):
+        chat_name = message.chat.title
+    elif hasattr(message.chat, 'first_name'):
+        chat_name = message.chat.first_name
+
+    author_name = "Unknown"
+    if message.sender:
+        if hasattr(message.sender, 'title'):
+            author_name = message.sender.title
+        elif hasattr(message.sender, 'first_name'):
+            first = message.sender.first_name or ""
+            last = getattr(message.sender, 'last_name', "") or ""
+            author_name = f"{first} {last}".strip() or "Unknown"
+
+    return UnifiedMessage(
+        id=f"{account_id}:{message.id}",
+        platform=Platform.TELEGRAM,
+        external_id=str(message.id),
+        content=text,
+        author_id=str(message.sender_id) if message.sender_id else "unknown",
+        author_name=author_name,
+        timestamp=message.date.astimezone().replace(tzinfo=None),
+        chat_id=str(message.chat_id),
+        chat_name=chat_name,
+        urls=links,
+        raw_metadata={
+            'collector_account': account_id,
+            'views': message.views or 0,
+            'forwards': message.forwards or 0,
+            'reply_to': message.reply_to_msg_id if message.reply_to else None
+        }
+    )
+
+
+def _new_session() -> TelegramClientSession:
+    """每轮使用新会话，名称缓存从空开始（与一次采集相同）"""
+    account = TelegramAccountConfig(account_id="collector1", api_id=0, api_hash="", phone="", session_name="")
+    return TelegramClientSession(account_config=account)
+
+
+def run_validated(messages: List[RecordedMessage]) -> int:
+    return len([convert_validated(message, "collector1") for message in messages])
+
+
+def run_cached(messages: List[RecordedMessage]) -> int:
+    session = _new_session()
+    return len([session._convert_to_unified_message(message, "") for message in messages])
+
+
+def run_page_batch(messages: List[RecordedMessage]) -> int:
+    session = _new_session()
+    batch = MessageBatch()
+    page = []
+    for message in messages:
+        page.append((message, message.date.astimezone().replace(tzinfo=None)))
+        if len(page) >= _ITER_PAGE_SIZE:
+            session._add_page(batch, page)
+    session._add_page(batch, page)
+    return len(batch)
+
+
+MODES: Dict[str, Callable[[List[RecordedMessage]], int]] = {
+    "per_message_validated": run_validated,
+    "per_message_cached": run_cached,
+    "page_batch": run_page_batch,
+}
+
+
+def measure(messages: List[RecordedMessage], repeat: int) -> Dict[str, Dict]:
+    """每种方式取 repeat 轮中最快的一轮"""
+    results = {}
+    for name, run in MODES.items():
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            converted = run(messages)
+            best = min(best, time.perf_counter() - started)
+        assert converted == len(messages)
+        results[name] = {"seconds": round(best, 6), "messages_per_second": round(len(messages) / best, 1)}
+    baseline = results["per_message_validated"]["seconds"]
+    for result in results.values():
+        result["speedup"] = round(baseline / result["seconds"], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息转换微基准")
+    parser.add_argument("--messages", type=int, default=50000, help="合成消息数量")
+    parser.add_argument("--chats", type=int, default=78)
+    parser.add_argument("--recording-dir", help="使用录制目录中的真实消息代替合成语料")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    messages = load_messages(args.recording_dir, args.messages, args.chats)
+    if not messages:
+        print("❌ 没有可用的录制消息")
+        return 1
+    results = measure(messages, args.repeat)
+
+    report = {
+        "run_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {**vars(args), "loaded_messages": len(messages)},
+        "results": results,
+    }
+    print(f"📦 {len(messages)} 条录制消息")
+    for name, result in results.items():
+        print(f"  {name:<22} {result['messages_per_second']:>10.0f} 条/秒  ({result['speedup']:.2f}x)")
+    path = write_report(report, args.output_dir, prefix="conversion")
+    print(f"\n✅ 结果已写入 {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+合成消息语料
+按可配置规模生成接近真实群聊分布的 UnifiedMessage：中英混杂、代币讨论、链接、
+跨群转发造成的重复、刷屏广告和基础操作问题
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Any, List, Optional
+
+from src.models import UnifiedMessage, Platform
+
+
+TICKERS = ["BTC", "ETH", "SOL", "BNB", "DOGE", "PEPE", "WIF", "ARB", "OP", "TON", "SUI", "NVDA", "TSLA"]
+DOMAINS = ["x.com", "twitter.com", "t.me", "coindesk.com", "theblock.co", "binance.com", "dexscreener.com"]
+
+ZH_TEMPLATES = [
+    "${t} 今天突破 {p} 了，链上活跃度很高",
+    "{t} 这波回调到 {p} 附近可以考虑接吗？",
+    "美联储 议息 会议 今晚公布，{t} 注意风险",
+    "刚看到 {t} 大户转了 {n} 万枚到交易所，要砸盘？",
+    "{t} 生态 meme 币爆发，还能追吗",
+    "以太坊 gas 费又涨了，layer2 交互成本上升",
+    "这轮 {t} 空投规则出来了，交互 {n} 次以上才有资格",
+    "合约爆仓 {n} 亿，多头被清算，{t} 插针",
+    "{t} ETF 净流入 {n} 亿美元",
+    "项目方在 {t} 上发了新公告，解锁 {n}% 代币",
+]
+EN_TEMPLATES = [
+    "${t} breaking {p}, volume is insane",
+    "anyone still holding {t}? funding rate flipped negative",
+    "{t} unlock next week, {n}M tokens hitting the market",
+    "whale moved {n}k {t} to exchange, careful",
+    "gm, {t} looking strong on the 4h chart",
+]
+SHORT_CHATTER = ["gm", "哈哈哈", "👍", "牛", "冲冲冲🚀🚀🚀🚀🚀", "?", "同问", "+1", "确实", "lol"]
+BASIC_QUESTIONS = [
+    "币安下载 怎么弄？国内下不了",
+    "telegram中文 怎么设置啊",
+    "新手请问钱包怎么用",
+    "小狐狸下载 链接有吗",
+    "uniswap怎么 换币",
+]
+SPAM_TEMPLATES = [
+    "🔥🔥🔥 免费空投 {n} USDT，邀请码 ABC{n} 注册返佣 https://spam{n}.example/ref?code={n} 🔥🔥🔥",
+    "Join our VIP signal group!!! 100x guaranteed https://t.me/+spam{n}",
+]
+
+# make_message 的默认时间起点
+BASE_TIME = datetime(2026, 1, 1)
+
+
+def make_message(idx: int, content: Optional[str] = None, chat_id: str = "-1001", *, account: str = "collector1",
+                 timestamp: Optional[datetime] = None, author_id: str = "user", author_name: str = "用户",
+                 chat_name: Optional[str] = None, **fields: Any) -> UnifiedMessage:
+    """
+    构造一条测试消息：ID 为 账号:群组:序号，默认内容为“消息 N”，默认时间从 BASE_TIME 起每条间隔一分钟
+
+    其余 UnifiedMessage 字段（urls、raw_metadata 等）通过关键字参数传入
+    """
+    return UnifiedMessage(
+        id=f"{account}:{chat_id}:{idx}",
+        platform=Platform.TELEGRAM,
+        external_id=str(idx),
+        content=content if content is not None else f"消息 {idx}",
+        author_id=author_id,
+        author_name=author_name,
+        timestamp=timestamp or BASE_TIME + timedelta(minutes=idx),
+        chat_id=chat_id,
+        chat_name=chat_name or f"群{chat_id}",
+        **fields,
+    )
+
+
+def _render(rng: random.Random, template: str) -> str:
+    return template.format(
+        t=rng.choice(TICKERS),
+        p=rng.choice([0.5, 1.2, 3.3, 25, 180, 2400, 68000, 100000]),
+        n=rng.randint(1, 999),
+    )
+
+
+def _with_extras(rng: random.Random, text: str) -> str:
+    # 部分消息附带链接或引用
+    roll = rng.random()
+    if roll < 0.15:
+        domain = rng.choice(DOMAINS)
+        text += f" https://{domain}/status/{rng.randint(10**9, 10**10)}?utm_source=tg&ref={rng.randint(1, 9999)}"
+    elif roll < 0.22:
+        text = f"> {_render(rng, rng.choice(ZH_TEMPLATES))}\n{text}"
+    if rng.random() < 0.03:
+        text = "\n".join([text] * rng.randint(3, 8))  # 长消息
+    return text
+
+
+def generate_corpus(
+    n_messages: int,
+    n_chats: int = 20,
+    duplicate_ratio: float = 0.15,
+    spam_ratio: float = 0.05,
+    basic_question_ratio: float = 0.05,
+    hours: float = 24.0,
+    start_time: Optional[datetime] = None,
+    seed: int = 42,
+) -> List[UnifiedMessage]:
+    """
+    生成合成语料
+
+    Args:
+        n_messages: 消息总数
+        n_chats: 群组数量，消息量按长尾分布分配到各群
+        duplicate_ratio: 跨群转发/多账号重复采集造成的重复消息比例
+        spam_ratio: 刷屏广告比例（以连发形式出现）
+        basic_question_ratio: 基础操作问题比例
+        hours: 时间跨度
+        start_time: 起始时间，默认 2026-01-01 00:00
+        seed: 随机种子，相同参数生成相同语料
+
+    Returns:
+        按时间排序的消息列表
+    """
+    rng = random.Random(seed)
+    start_time = start_time or datetime(2026, 1, 1)
+    span_seconds = max(1, int(hours * 3600))
+
+    chats = [(f"-100{1000000 + i}", f"测试群{i:02d}") for i in range(n_chats)]
+    chat_weights = [1.0 / (i + 1) for i in range(n_chats)]
+    collectors = ["collector1", "collector2"]
+
+    messages: List[UnifiedMessage] = []
+    external_id = 0
+
+    def make(content: str, chat, timestamp: datetime, collector: str) -> UnifiedMessage:
+        nonlocal external_id
+        external_id += 1
+        chat_id, chat_name = chat
+        urls = [word for word in content.split() if word.startswith("http")]
+        # 同一作者的 ID 和昵称固定，与真实群聊一样会反复发言
+        user = rng.randint(1, 5000)
+        return UnifiedMessage(
+            id=f"{collector}:{chat_id}:{external_id}",
+            platform=Platform.TELEGRAM,
+            external_id=str(external_id),
+            content=content,
+            author_id=str(10**8 + user),
+            author_name=f"user{user}",
+            timestamp=timestamp,
+            chat_id=chat_id,
+            chat_name=chat_name,
+            urls=urls,
+            raw_metadata={"collector_account": collector},
+        )
+
+    while len(messages) < n_messages:
+        chat = rng.choices(chats, weights=chat_weights)[0]
+        timestamp = start_time + timedelta(seconds=rng.randrange(span_seconds))
+        collector = rng.choice(collectors)
+        roll = rng.random()
+
+        if messages and roll < duplicate_ratio:
+            # 重复：同一内容出现在另一个群或被另一个账号采集
+            original = rng.choice(messages)
+            messages.append(make(original.content, rng.choice(chats), timestamp, collector))
+        elif roll < duplicate_ratio + spam_ratio:
+            # 刷屏：同一群短时间内连发
+            burst = rng.randint(3, 10)
+            template = rng.choice(SPAM_TEMPLATES)
+            for k in range(min(burst, n_messages - len(messages))):
+                messages.append(make(_render(rng, template), chat, timestamp + timedelta(seconds=k), collector))
+        elif roll < duplicate_ratio + spam_ratio + basic_question_ratio:
+            messages.append(make(rng.choice(BASIC_QUESTIONS), chat, timestamp, collector))
+        elif roll < 0.55:
+            messages.append(make(_with_extras(rng, _render(rng, rng.choice(ZH_TEMPLATES))), chat, timestamp, collector))
+        elif roll < 0.75:
+            messages.append(make(_with_extras(rng, _render(rng, rng.choice(EN_TEMPLATES))), chat, timestamp, collector))
+        else:
+            messages.append(make(rng.choice(SHORT_CHATTER), chat, timestamp, collector))
+
+    messages.sort(key=lambda m: m.timestamp)
+    return messages
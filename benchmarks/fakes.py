@@ -0,0 +1,158 @@
+"""
+本地假实现
+替代 LLM 与 Telegram 网络调用，延迟可配置，用于离线基准
+"""
+
+import asyncio
+import re
+from typing import AsyncIterator, Dict, List, Optional
+
+from src.adapters.telegram_adapter_v2 import TelegramClientSession, TelegramMultiAccountAdapter
+from src.batch import MessageBatch
+from src.config import config, TelegramAccountConfig
+from src.models import UnifiedMessage
+
+
+_ID_LINE_RE = re.compile(r'^\s*\[ID:(\d+)\]\s*(.*)$', re.MULTILINE)
+_BASIC_HINT_RE = re.compile(r'下载|怎么|如何|中文|教程')
+
+
+class FakeSummarizer:
+    """
+    假 AI 总结器，接口与 AISummarizer 的提示词方法一致
+
+    Args:
+        latency: 每次调用的固定延迟（秒）
+        stream_chunks: 流式输出拆成的片段数，总延迟与一次性调用相同
+    """
+
+    def __init__(self, latency: float = 0.0, stream_chunks: int = 20):
+        self.latency = latency
+        self.stream_chunks = max(1, stream_chunks)
+        self.calls = 0
+        self.prompt_chars = 0
+
+    def _fake_report(self, prompt: str) -> str:
+        lines = [line for _, line in _ID_LINE_RE.findall(prompt)][:30]
+        body = "\n".join(f"- {line[:80]}" for line in lines) or "- 暂无重点"
+        return f"## 主要话题\n{body}\n\n## 情绪\n中性偏多\n\n## 风险提示\n注意波动"
+
+    async def generate_json_response(self, prompt: str, system_prompt: Optional[str] = None,
+                                     temperature: float = 0.3, **kwargs) -> Dict:
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        await asyncio.sleep(self.latency)
+        basic_ids = [int(idx) for idx, text in _ID_LINE_RE.findall(prompt) if _BASIC_HINT_RE.search(text)]
+        return {"summary": self._fake_report(prompt), "basic_question_ids": basic_ids}
+
+    async def generate_summary_with_prompt(self, prompt: str, system_prompt: Optional[str] = None,
+                                           temperature: float = 0.3, json_format: bool = False, **kwargs) -> str:
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        await asyncio.sleep(self.latency)
+        return self._fake_report(prompt)
+
+    async def stream_summary_with_prompt(self, prompt: str, system_prompt: Optional[str] = None,
+                                         temperature: float = 0.3, **kwargs) -> AsyncIterator[str]:
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        text = self._fake_report(prompt)
+        step = max(1, len(text) // self.stream_chunks)
+        for i in range(0, len(text), step):
+            await asyncio.sleep(self.latency / self.stream_chunks)
+            yield text[i:i + step]
+
+
+class _FakeSentMessage:
+    def __init__(self, message_id: int):
+        self.id = message_id
+
+
+class FakeTelegramClient:
+    """
+    假 Telethon 客户端，只实现流水线用到的发送/编辑/删除接口
+
+    Args:
+        latency: 每次网络调用的固定延迟（秒）
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.posts: Dict[int, str] = {}
+        self.calls = 0
+
+    async def _delay(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+    async def get_entity(self, identifier):
+        await self._delay()
+        return identifier
+
+    async def send_message(self, entity, text, parse_mode=None, **kwargs):
+        await self._delay()
+        msg = _FakeSentMessage(len(self.posts) + 1)
+        self.posts[msg.id] = text
+        return msg
+
+    async def edit_message(self, entity, message, text, parse_mode=None, **kwargs):
+        await self._delay()
+        self.posts[message.id] = text
+
+    async def delete_messages(self, entity, ids):
+        await self._delay()
+        for message_id in ids:
+            self.posts.pop(message_id, None)
+
+    async def disconnect(self):
+        pass
+
+
+class FakeMultiAccountAdapter(TelegramMultiAccountAdapter):
+    """
+    使用预生成语料的多账号适配器
+
+    采集直接返回语料中落在时间范围内的消息（经过真实的去重逻辑），推送走假客户端。
+    """
+
+    def __init__(self, corpus: List[UnifiedMessage], latency: float = 0.0):
+        self.corpus = corpus
+        self.latency = latency
+        super().__init__()
+
+    def _init_sessions(self):
+        collector_ids = sorted({m.raw_metadata.get("collector_account", "collector1") for m in self.corpus})
+        for account_id in collector_ids or ["collector1"]:
+            self.collector_sessions[account_id] = self._fake_session(account_id)
+        self.main_session = self._fake_session("main")
+
+    def _fake_session(self, account_id: str) -> TelegramClientSession:
+        account = TelegramAccountConfig(
+            account_id=account_id, api_id=0, api_hash="", phone="", session_name=f"fake_{account_id}"
+        )
+        return TelegramClientSession(account, client=FakeTelegramClient(self.latency), is_connected=True)
+
+    async def connect_all(self):
+        pass
+
+    async def disconnect_all(self):
+        pass
+
+    async def fetch_batch_concurrently(self, chat_identifiers=None, start_time=None, end_time=None,
+                                       limit_per_chat: int = 100, chat_limits=None,
+                                       watermarks=None) -> MessageBatch:
+        await asyncio.sleep(self.latency)
+        batch = MessageBatch.from_unified(
+            m for m in self.corpus
+            if (start_time is None or m.timestamp >= start_time) and (end_time is None or m.timestamp <= end_time)
+        )
+        return batch.derive(self._deduplicate_messages(batch))
+
+    @property
+    def channel_posts(self) -> Dict[int, str]:
+        return self.main_session.client.posts
+
+
+def channel_identifier() -> str:
+    """基准中使用的频道标识符"""
+    return config.push_config.channel_username or config.push_config.channel_id or "@benchmark"
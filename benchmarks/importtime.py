@@ -0,0 +1,153 @@
+"""
+启动耗时基准（python -X importtime）
+
+用法:
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --entries src.config,auto/telegram_alerter.py --repeat 5
+
+每个入口在独立子进程中执行 `python -X importtime -c "import ..."`，解析 stderr 得到导入总耗时、
+最重的依赖以及是否加载了 telethon / openai 等重型 SDK，结果写入 data/benchmarks/importtime_*.json。
+入口可以是模块名，也可以是脚本路径（如 auto/telegram_alerter.py）。
+"""
+
+import argparse
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Set
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run_pipeline import DEFAULT_OUTPUT_DIR, git_commit, write_report
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_ENTRIES = [
+    "src.config",
+    "src.processors.summarizer",
+    "src.adapters.telegram_adapter_v2",
+    "auto/telegram_alerter.py",
+    "process_24h_report.py",
+]
+
+# 这些 SDK 只应在真正使用时加载
+HEAVY_MODULES = ("telethon", "openai", "google.genai", "dotenv")
+
+
+class ImportRecord(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(stderr: str) -> List[ImportRecord]:
+    """解析 -X importtime 的输出"""
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        records.append(ImportRecord(
+            module=stripped,
+            self_us=int(parts[0]),
+            cumulative_us=int(parts[1]),
+            depth=(len(name) - len(stripped) - 1) // 2,
+        ))
+    return records
+
+
+def _import_statement(entry: str) -> str:
+    if entry.endswith(".py"):
+        directory, filename = os.path.split(os.path.join(ROOT_DIR, entry))
+        return f"import sys; sys.path.insert(0, {directory!r}); import {filename[:-3]}"
+    return f"import {entry}"
+
+
+def _run_importtime(code: str) -> List[ImportRecord]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import sys; sys.path.insert(0, {ROOT_DIR!r}); {code}"],
+        capture_output=True, text=True, cwd=ROOT_DIR, timeout=120,
+    )
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ""
+        raise RuntimeError(f"导入失败: {code}\n{last_line}")
+    return parse_importtime(result.stderr)
+
+
+def loaded_modules(entry: str) -> Set[str]:
+    """返回导入该入口时加载的全部模块名"""
+    return {record.module for record in _run_importtime(_import_statement(entry))}
+
+
+def heavy_modules_loaded(entry: str) -> Set[str]:
+    """导入该入口时加载了哪些重型 SDK"""
+    modules = loaded_modules(entry)
+    return {name for name in HEAVY_MODULES if name in modules}
+
+
+def measure(entry: str, baseline: Set[str], repeat: int = 3) -> Dict:
+    """
+    测量一个入口的导入耗时（多次取最快）
+
+    Args:
+        baseline: 解释器启动时就会加载的模块，不计入入口耗时
+    """
+    best = None
+    for _ in range(max(1, repeat)):
+        records = [r for r in _run_importtime(_import_statement(entry)) if r.module not in baseline]
+        total_us = sum(r.cumulative_us for r in records if r.depth == 0)
+        if best is None or total_us < best[0]:
+            best = (total_us, records)
+
+    total_us, records = best
+    modules = {r.module for r in records}
+    heaviest = sorted(records, key=lambda r: r.self_us, reverse=True)[:10]
+    return {
+        "entry": entry,
+        "total_ms": round(total_us / 1000, 2),
+        "modules": len(records),
+        "heavy_modules_loaded": sorted(name for name in HEAVY_MODULES if name in modules),
+        "heaviest": [{"module": r.module, "self_ms": round(r.self_us / 1000, 2)} for r in heaviest],
+    }
+
+
+def run_benchmark(entries: List[str], repeat: int = 3) -> Dict:
+    baseline = {record.module for record in _run_importtime("pass")}
+    return {
+        "run_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {"entries": entries, "repeat": repeat},
+        "results": [measure(entry, baseline, repeat) for entry in entries],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="入口导入耗时基准")
+    parser.add_argument("--entries", default=",".join(DEFAULT_ENTRIES), help="模块名或脚本路径，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=3, help="每个入口重复次数，取最快一次")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    entries = [entry.strip() for entry in args.entries.split(",") if entry.strip()]
+    report = run_benchmark(entries, args.repeat)
+    for item in report["results"]:
+        heavy = ", ".join(item["heavy_modules_loaded"]) or "无"
+        print(f"📦 {item['entry']:<36} {item['total_ms']:>8.1f} ms  {item['modules']:>4} 个模块  重型 SDK: {heavy}")
+        for heaviest in item["heaviest"][:3]:
+            print(f"      {heaviest['self_ms']:>8.1f} ms  {heaviest['module']}")
+    path = write_report(report, args.output_dir, prefix="importtime")
+    print(f"\n✅ 结果已写入 {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+消息内存基准：UnifiedMessage 列表 vs MessageBatch
+
+用法:
+    python -m benchmarks.message_memory
+    python -m benchmarks.message_memory --messages 23400,100000 --chats 78
+
+合成语料先写入临时 JSONL 文件，每种表示在独立子进程中逐行读取并构造消息（模拟采集：群组名来自
+实体缓存，作者名、链接等每条消息都是新对象），然后跑一遍简报流水线的内存密集阶段
+（基础问题过滤、提示词压缩、分块、提及统计）。记录：
+- held_bytes: 持有全部消息占用的内存（tracemalloc）
+- pipeline_peak_bytes: 流水线阶段的内存峰值（tracemalloc）
+- max_rss_mb: 子进程峰值 RSS
+结果写入 data/benchmarks/message_memory_*.json。
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run_pipeline import DEFAULT_OUTPUT_DIR, git_commit, write_report
+
+MODES = ("unified", "batch")
+
+
+def write_corpus(path: str, n_messages: int, n_chats: int, seed: int):
+    from benchmarks.corpus import generate_corpus
+
+    with open(path, "w", encoding="utf-8") as f:
+        for msg in generate_corpus(n_messages, n_chats=n_chats, hours=48, seed=seed):
+            f.write(json.dumps([
+                msg.id, msg.external_id, msg.content, msg.author_id, msg.author_name,
+                msg.timestamp.isoformat(), msg.chat_id, msg.chat_name, msg.urls,
+                msg.raw_metadata.get("collector_account"),
+            ], ensure_ascii=False) + "\n")
+
+
+def load_messages(path: str, mode: str):
+    """逐行读取语料并构造消息，与采集时的构造方式一致"""
+    from src.batch import MessageBatch
+    from src.models import Platform, UnifiedMessage
+
+    # 采集时同一群组的名称来自同一个实体对象
+    chat_titles: Dict[str, str] = {}
+    batch = MessageBatch()
+    messages: List = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            (id_, external_id, content, author_id, author_name, timestamp,
+             chat_id, chat_name, urls, collector) = json.loads(line)
+            chat_name = chat_titles.setdefault(chat_id, chat_name)
+            timestamp = datetime.fromisoformat(timestamp)
+            if mode == "unified":
+                messages.append(UnifiedMessage(
+                    id=id_, platform=Platform.TELEGRAM, external_id=external_id, content=content,
+                    author_id=author_id, author_name=author_name, timestamp=timestamp, chat_id=chat_id,
+                    chat_name=chat_name, urls=urls,
+                    raw_metadata={"collector_account": collector, "views": 0, "forwards": 0, "reply_to": None},
+                ))
+            else:
+                batch.add(id_, external_id, content, author_id, author_name, timestamp, chat_id, chat_name,
+                          urls, collector)
+    return messages if mode == "unified" else batch
+
+
+def run_child(path: str, mode: str) -> Dict:
+    """在当前进程中度量一种表示（由父进程以子进程方式调用）"""
+    from process_24h_report import chunk_messages_by_tokens, filter_basic_operation_questions
+    from src.processors.compactor import PromptCompactor
+    from src.processors.entities import EntityExtractor, mention_stats
+
+    extractor = EntityExtractor()
+    compactor = PromptCompactor()
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    messages = load_messages(path, mode)
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - baseline
+
+    tracemalloc.reset_peak()
+    filtered = filter_basic_operation_questions(messages)
+    prompt_messages, _ = compactor.compact_messages(messages)
+    chunks = chunk_messages_by_tokens(prompt_messages, 100000)
+    mention_stats(messages, extractor, top_n=20)
+    pipeline_peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    return {
+        "mode": mode,
+        "messages": len(messages),
+        "filtered": len(filtered),
+        "chunks": len(chunks),
+        "held_bytes": held,
+        "bytes_per_message": round(held / max(1, len(messages)), 1),
+        "pipeline_peak_bytes": pipeline_peak,
+        # Linux 上 ru_maxrss 单位为 KB
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def measure(n_messages: int, n_chats: int, seed: int) -> Dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.jsonl")
+        write_corpus(path, n_messages, n_chats, seed)
+        results = {}
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.message_memory", "--child", mode, "--corpus", path],
+                capture_output=True, text=True, check=True,
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    unified, batch = results["unified"], results["batch"]
+    return {
+        "messages": n_messages,
+        "chats": n_chats,
+        "unified": unified,
+        "batch": batch,
+        "held_ratio": round(batch["held_bytes"] / unified["held_bytes"], 3),
+        "pipeline_peak_ratio": round(batch["pipeline_peak_bytes"] / unified["pipeline_peak_bytes"], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息内存基准")
+    parser.add_argument("--messages", default="23400", help="消息数量，逗号分隔（默认 78 群 × 300 条）")
+    parser.add_argument("--chats", type=int, default=78)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--corpus", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.corpus, args.child)))
+        return 0
+
+    sizes = [int(size) for size in args.messages.split(",") if size.strip()]
+    report = {
+        "run_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {"messages": sizes, "chats": args.chats, "seed": args.seed},
+        "results": [measure(size, args.chats, args.seed) for size in sizes],
+    }
+    mb = 1024 * 1024
+    for item in report["results"]:
+        print(f"📦 {item['messages']} 条消息 / {item['chats']} 个群组")
+        for mode in MODES:
+            result = item[mode]
+            print(f"  {mode:<8} 持有 {result['held_bytes'] / mb:>7.1f} MB ({result['bytes_per_message']:>6.0f} B/条)  "
+                  f"流水线峰值 {result['pipeline_peak_bytes'] / mb:>7.1f} MB  峰值 RSS {result['max_rss_mb']:>7.1f} MB")
+        print(f"  MessageBatch / UnifiedMessage: 持有 {item['held_ratio']:.0%}，流水线峰值 {item['pipeline_peak_ratio']:.0%}")
+    path = write_report(report, args.output_dir, prefix="message_memory")
+    print(f"\n✅ 结果已写入 {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
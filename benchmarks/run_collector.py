@@ -0,0 +1,201 @@
+"""
+采集流程基准（录制/回放）
+
+用法:
+    python -m benchmarks.run_collector --chats 2000 --messages-per-chat 50 --accounts 2 \
+        --latency 0.05 --flood-rate 0.01 --rate-limit 20
+    python -m benchmarks.run_collector --chats 2000 --accounts 12 --processes 4
+
+用合成语料生成每个账号的回放录制，然后通过真实的 TelegramMultiAccountAdapter.fetch_messages_concurrently
+走完实体解析、分页拉取、FloodWait 重试和去重，结果写入 data/benchmarks/collector_*.json。
+也可以用 --recording-dir 回放 TELEGRAM_CLIENT_MODE=record 录下的真实流量。
+--processes 大于 1 时录制先写入临时目录，各工作进程以 replay 模式各自加载（与 COLLECTOR_PROCESSES 的实际路径相同）。
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.run_pipeline import DEFAULT_OUTPUT_DIR, git_commit, write_report
+from src.adapters.telegram_adapter_v2 import TelegramMultiAccountAdapter
+from src.adapters.telegram_replay import (
+    RecordedEntity,
+    RecordedMessage,
+    ReplayClient,
+    TelegramRecording,
+    recording_path,
+)
+from src.config import TelegramAccountConfig, TelegramClientModeConfig
+
+
+def build_recordings(n_chats: int, messages_per_chat: int, n_accounts: int = 2, hours: float = 24.0,
+                     start_time: Optional[datetime] = None, seed: int = 42) -> Dict[str, TelegramRecording]:
+    """
+    用合成语料构造每个账号的回放录制，群组按轮询方式分配给各账号
+
+    Returns:
+        {account_id: TelegramRecording}
+    """
+    start_time = start_time or datetime(2026, 1, 1)
+    corpus = generate_corpus(n_chats * messages_per_chat, n_chats=n_chats, hours=hours,
+                             start_time=start_time, seed=seed)
+    recordings = {f"collector{i + 1}": TelegramRecording() for i in range(n_accounts)}
+    account_ids = list(recordings)
+
+    chats: Dict[str, RecordedEntity] = {}
+    next_id: Dict[str, int] = defaultdict(int)
+    last_message: Dict[str, RecordedMessage] = {}
+    for msg in corpus:
+        chat_index = int(msg.chat_id[4:]) - 1000000
+        account_id = account_ids[chat_index % n_accounts]
+        entity = chats.get(msg.chat_id)
+        if entity is None:
+            entity = RecordedEntity(id=int(msg.chat_id[4:]), kind="Channel", title=msg.chat_name)
+            chats[msg.chat_id] = entity
+        next_id[msg.chat_id] += 1
+        sender = RecordedEntity(id=int(msg.author_id), kind="User", first_name=msg.author_name)
+        recorded = RecordedMessage(
+            id=next_id[msg.chat_id],
+            chat_id=entity.marked_id,
+            # 语料时间是本地时间，Telegram 返回 UTC
+            date=msg.timestamp.astimezone(timezone.utc),
+            message=msg.content,
+            sender_id=sender.id,
+            sender=sender,
+            urls=msg.urls,
+        )
+        recordings[account_id].add_message(entity, recorded)
+        last_message[msg.chat_id] = recorded
+
+    for chat_id, entity in chats.items():
+        account_id = account_ids[(int(chat_id[4:]) - 1000000) % n_accounts]
+        top = last_message[chat_id]
+        recordings[account_id].add_dialog(entity, top.date, top)
+    return recordings
+
+
+def monitored_chats(recording: TelegramRecording) -> List[str]:
+    return [str(entity.marked_id) for entity in recording.entities.values()
+            if entity.kind in ("Channel", "Chat") and recording.messages.get(str(entity.id))]
+
+
+async def run_collect(recordings: Dict[str, TelegramRecording], start_time: datetime, end_time: datetime,
+                      limit_per_chat: int, latency: float, flood_rate: float, flood_seconds: int,
+                      rate_limit: float, seed: int, processes: int = 1) -> Dict:
+    """用回放客户端跑一次 fetch_messages_concurrently"""
+    accounts = [
+        TelegramAccountConfig(account_id=account_id, api_id=0, api_hash="", phone="",
+                              session_name=f"replay_{account_id}", monitored_chats=monitored_chats(recording))
+        for account_id, recording in recordings.items()
+    ]
+    clients: Dict[str, ReplayClient] = {}
+
+    def factory(account_config: TelegramAccountConfig) -> ReplayClient:
+        client = ReplayClient(
+            recordings.get(account_config.account_id, TelegramRecording()),
+            latency=latency, flood_wait_rate=flood_rate, flood_wait_seconds=flood_seconds,
+            rate_limit=rate_limit, seed=seed + len(clients)
+        )
+        clients[account_config.account_id] = client
+        return client
+
+    async def fetch(adapter: TelegramMultiAccountAdapter):
+        started = time.perf_counter()
+        messages = await adapter.fetch_messages_concurrently(
+            start_time=start_time, end_time=end_time, limit_per_chat=limit_per_chat
+        )
+        return messages, time.perf_counter() - started
+
+    if processes != 1:
+        # 工作进程不能使用闭包工厂，录制写入临时目录后按 replay 模式加载；请求数只在各进程内统计
+        with tempfile.TemporaryDirectory() as tmp:
+            for account in accounts:
+                recordings[account.account_id].save(recording_path(account, tmp))
+            mode = TelegramClientModeConfig(
+                mode="replay", recording_dir=tmp, replay_latency=latency, replay_flood_wait_rate=flood_rate,
+                replay_flood_wait_seconds=flood_seconds, replay_rate_limit=rate_limit, replay_seed=seed
+            )
+            adapter = TelegramMultiAccountAdapter(collector_accounts=accounts, processes=processes, client_mode=mode)
+            messages, elapsed = await fetch(adapter)
+    else:
+        adapter = TelegramMultiAccountAdapter(collector_accounts=accounts, client_factory=factory)
+        messages, elapsed = await fetch(adapter)
+
+    return {
+        "seconds": round(elapsed, 6),
+        "processes": adapter.processes,
+        "chats": sum(len(a.monitored_chats) for a in accounts),
+        "messages": len(messages),
+        "messages_per_second": round(len(messages) / elapsed, 1) if elapsed > 0 else 0,
+        "requests": {account_id: c.requests for account_id, c in clients.items()},
+        "flood_waits": {account_id: c.flood_waits for account_id, c in clients.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="采集流程回放基准")
+    parser.add_argument("--chats", type=int, default=500, help="合成群组数量")
+    parser.add_argument("--messages-per-chat", type=int, default=50)
+    parser.add_argument("--accounts", type=int, default=2, help="采集账号数量")
+    parser.add_argument("--recording-dir", help="使用录制目录中的真实流量代替合成语料")
+    parser.add_argument("--hours", type=float, default=24.0, help="采集时间窗口（小时）")
+    parser.add_argument("--limit-per-chat", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05, help="每次请求延迟（秒）")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="每次请求触发 FloodWait 的概率")
+    parser.add_argument("--flood-seconds", type=int, default=1)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="每个账号每秒最多请求数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--processes", type=int, default=1, help="采集工作进程数（0 表示按 CPU 核数）")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    # 每个群组都会打一条 INFO 日志，压测时只保留警告
+    logging.getLogger("src.adapters").setLevel(logging.WARNING)
+
+    if args.recording_dir:
+        recordings = {}
+        for name in sorted(os.listdir(args.recording_dir)):
+            if name.endswith(".json") and name != "main.json":
+                account = TelegramAccountConfig(account_id=name[:-5], api_id=0, api_hash="", phone="",
+                                                session_name="")
+                recordings[account.account_id] = TelegramRecording.load(recording_path(account, args.recording_dir))
+        end_time = datetime.now()
+    else:
+        start = datetime(2026, 1, 1)
+        recordings = build_recordings(args.chats, args.messages_per_chat, args.accounts, args.hours, start, args.seed)
+        end_time = start + timedelta(hours=args.hours)
+    start_time = end_time - timedelta(hours=args.hours)
+
+    result = asyncio.run(run_collect(
+        recordings, start_time, end_time, args.limit_per_chat, args.latency,
+        args.flood_rate, args.flood_seconds, args.rate_limit, args.seed, args.processes
+    ))
+
+    report = {
+        "run_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "params": vars(args),
+        "result": result,
+    }
+    print(f"📊 {result['processes']} 个进程，{result['chats']} 个群组，{result['messages']} 条消息，耗时 {result['seconds']:.2f}s "
+          f"（{result['messages_per_second']:.0f} 条/秒）")
+    print(f"   请求数 {result['requests']}，FloodWait {result['flood_waits']}")
+    path = write_report(report, args.output_dir, prefix="collector")
+    print(f"✅ 结果已写入 {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""
+端到端流水线基准
+
+用法:
+    python -m benchmarks.run_pipeline --sizes 1000,10000 --llm-latency 0.5 --telegram-latency 0.05
+    python -m benchmarks.run_pipeline --sizes 10000 --compare data/benchmarks/pipeline_xxx.json
+
+依次度量：采集+去重、去重、基础问题过滤、提示词压缩、话题聚类、分块、提及统计、
+入库、查询、简报生成（假 LLM）和推送格式化（假 Telegram），结果写入 data/benchmarks/*.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.fakes import FakeMultiAccountAdapter, FakeSummarizer, channel_identifier
+from src.processors.compactor import PromptCompactor
+from src.processors.clustering import TopicClusterer
+from src.processors.entities import EntityExtractor, mention_stats
+from src.storage import Storage
+from process_24h_report import (
+    chunk_messages_by_clusters,
+    chunk_messages_by_tokens,
+    count_basic_operation_questions,
+    filter_basic_operation_questions,
+    generate_global_summary,
+)
+
+
+DEFAULT_OUTPUT_DIR = os.path.join("data", "benchmarks")
+
+
+class StageTimer:
+    """记录各阶段耗时（多次重复时取最快一次）"""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            current = self.stages.get(name)
+            if current is None or elapsed < current["seconds"]:
+                self.stages[name] = {
+                    "seconds": round(elapsed, 6),
+                    "items": items,
+                    "items_per_second": round(items / elapsed, 1) if items and elapsed > 0 else 0,
+                }
+
+
+async def run_once(n_messages: int, timer: StageTimer, llm_latency: float, telegram_latency: float,
+                   seed: int, max_tokens_per_chunk: int) -> Dict:
+    """在一份语料上跑一遍完整流水线"""
+    start_time = datetime(2026, 1, 1)
+    end_time = start_time + timedelta(hours=24)
+    corpus = generate_corpus(n_messages, start_time=start_time, hours=24, seed=seed)
+
+    adapter = FakeMultiAccountAdapter(corpus, latency=telegram_latency)
+    summarizer = FakeSummarizer(latency=llm_latency)
+
+    with timer.stage("collect", len(corpus)):
+        messages = await adapter.fetch_batch_concurrently(start_time=start_time, end_time=end_time)
+
+    with timer.stage("dedup", len(corpus)):
+        adapter._deduplicate_messages(corpus)
+
+    with timer.stage("basic_filter", len(messages)):
+        basic_op_count = count_basic_operation_questions(messages)
+        filtered = filter_basic_operation_questions(messages)
+
+    with timer.stage("compaction", len(messages)):
+        prompt_messages, compaction_stats = PromptCompactor().compact_messages(messages)
+
+    with timer.stage("clustering", len(prompt_messages)):
+        clusters = TopicClusterer().cluster(prompt_messages)
+
+    with timer.stage("chunking", len(prompt_messages)):
+        if clusters:
+            chunks = chunk_messages_by_clusters(prompt_messages, clusters, max_tokens_per_chunk)
+        else:
+            chunks = chunk_messages_by_tokens(prompt_messages, max_tokens_per_chunk)
+
+    with timer.stage("mention_stats", len(messages)):
+        top_mentions = mention_stats(messages, EntityExtractor(), top_n=20)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = Storage(os.path.join(tmp, "raw_messages.db"))
+        with timer.stage("storage_insert", len(messages)):
+            storage.save_messages(messages)
+        with timer.stage("storage_query", 1):
+            storage.get_top_mentions(start_time, end_time, limit=20)
+            storage.get_unprocessed()
+
+    with timer.stage("report_assembly", len(prompt_messages)):
+        summary_result = await generate_global_summary(
+            summarizer, "", prompt_messages, start_time, end_time
+        )
+
+    with timer.stage("delivery_formatting", 1):
+        await adapter.main_session.send_to_channel(summary_result["summary"], channel_identifier())
+
+    return {
+        "corpus_messages": len(corpus),
+        "deduplicated_messages": len(messages),
+        "basic_questions": basic_op_count,
+        "filtered_messages": len(filtered),
+        "prompt_tokens_before": compaction_stats.tokens_before,
+        "prompt_tokens_after": compaction_stats.tokens_after,
+        "clusters": len(clusters),
+        "chunks": len(chunks),
+        "top_mentions": [item["entity"] for item in top_mentions[:5]],
+        "llm_calls": summarizer.calls,
+        "llm_prompt_chars": summarizer.prompt_chars,
+        "channel_posts": len(adapter.channel_posts),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(sizes: List[int], llm_latency: float = 0.0, telegram_latency: float = 0.0,
+                  seed: int = 42, repeat: int = 1, max_tokens_per_chunk: int = 100000) -> Dict:
+    """
+    运行基准并返回结果字典
+
+    Args:
+        sizes: 语料规模列表
+        llm_latency: 假 LLM 每次调用的延迟（秒）
+        telegram_latency: 假 Telegram 每次调用的延迟（秒）
+        seed: 语料随机种子
+        repeat: 每个规模重复次数，各阶段取最快一次
+        max_tokens_per_chunk: 分块 token 上限
+    """
+    results = []
+    for n_messages in sizes:
+        timer = StageTimer()
+        counts = {}
+        for _ in range(max(1, repeat)):
+            counts = asyncio.run(run_once(n_messages, timer, llm_latency, telegram_latency, seed,
+                                          max_tokens_per_chunk))
+        results.append({
+            "messages": n_messages,
+            "stages": timer.stages,
+            "total_seconds": round(sum(s["seconds"] for s in timer.stages.values()), 6),
+            "counts": counts,
+        })
+
+    return {
+        "run_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "sizes": sizes,
+            "llm_latency": llm_latency,
+            "telegram_latency": telegram_latency,
+            "seed": seed,
+            "repeat": repeat,
+            "max_tokens_per_chunk": max_tokens_per_chunk,
+        },
+        "results": results,
+    }
+
+
+def write_report(report: Dict, output_dir: str = DEFAULT_OUTPUT_DIR, prefix: str = "pipeline") -> str:
+    """把结果写入 JSON 文件，返回文件路径"""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def compare_reports(current: Dict, baseline: Dict, tolerance: float = 0.25) -> List[str]:
+    """
+    与基线结果比较，返回变慢超过 tolerance 的阶段描述
+
+    只比较两边都存在的规模和阶段；耗时低于 1ms 的阶段噪声太大，不参与比较。
+    """
+    regressions = []
+    baseline_by_size = {item["messages"]: item for item in baseline.get("results", [])}
+    for item in current.get("results", []):
+        base = baseline_by_size.get(item["messages"])
+        if not base:
+            continue
+        for stage, stats in item["stages"].items():
+            base_stats = base["stages"].get(stage)
+            if not base_stats or base_stats["seconds"] < 0.001:
+                continue
+            ratio = stats["seconds"] / base_stats["seconds"]
+            if ratio > 1 + tolerance:
+                regressions.append(
+                    f"{item['messages']} 条 / {stage}: {base_stats['seconds']:.4f}s -> {stats['seconds']:.4f}s ({ratio:.2f}x)"
+                )
+    return regressions
+
+
+def _print_report(report: Dict):
+    for item in report["results"]:
+        print(f"\n📊 {item['messages']} 条消息（去重后 {item['counts']['deduplicated_messages']} 条）")
+        for stage, stats in item["stages"].items():
+            print(f"  {stage:<20} {stats['seconds'] * 1000:>10.1f} ms  {stats['items_per_second']:>12.0f} 条/秒")
+        print(f"  {'total':<20} {item['total_seconds'] * 1000:>10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线流水线性能基准")
+    parser.add_argument("--sizes", default="1000,10000", help="语料规模，逗号分隔")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="假 LLM 每次调用延迟（秒）")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="假 Telegram 每次调用延迟（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=1, help="每个规模重复次数，取最快一次")
+    parser.add_argument("--max-tokens-per-chunk", type=int, default=100000)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--compare", help="基线结果 JSON，变慢超过容差时以非零状态退出")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的变慢比例")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    report = run_benchmark(sizes, args.llm_latency, args.telegram_latency, args.seed, args.repeat,
+                           args.max_tokens_per_chunk)
+    _print_report(report)
+    path = write_report(report, args.output_dir)
+    print(f"\n✅ 结果已写入 {path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_reports(report, baseline, args.tolerance)
+        if regressions:
+            print("\n⚠️ 性能回退：")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\n✅ 与基线相比没有超过容差的回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,7 @@
 兼容现有数据库结构的采集脚本
 """
 
+import argparse
 import asyncio
 import sys
 import os
@@ -22,7 +23,8 @@ from src.config import config
 from src.storage import Storage
 from src.processors.summarizer import AISummarizer
 from src.models import UnifiedMessage, Platform
-from src.adapters.telegram_adapter_v2 import TelegramMultiAccountAdapter
+from src.adapters.telegram_adapter_v2 import TelegramClientSession, TelegramMultiAccountAdapter
+from src.profiling import profiler, add_profile_arguments
 
 # 配置日志
 logging.basicConfig(
@@ -68,11 +70,14 @@ def ensure_database():
     conn.commit()
     conn.close()
 
-async def collect_from_group(client: TelegramClient, chat_url: str, hours_back: int = 24) -> List[Dict[str, Any]]:
+async def collect_from_group(session: TelegramClientSession, chat_url: str, hours_back: int = 24) -> List[Dict[str, Any]]:
     """从单个群组采集消息"""
     messages = []
     
     try:
+        await session.connect()
+        client = session.client
+
         # 处理可能的数字 ID
         target = chat_url
         if isinstance(chat_url, str) and (chat_url.isdigit() or (chat_url.startswith('-') and chat_url[1:].isdigit())):
@@ -208,30 +213,13 @@ def get_last_three_messages() -> List[Dict[str, Any]]:
     conn.close()
     return messages
 
-async def push_to_channel(messages: List[Dict[str, Any]]) -> bool:
-    """推送消息到频道"""
+async def push_to_channel(messages: List[Dict[str, Any]], session: TelegramClientSession) -> bool:
+    """使用主账号会话推送消息到频道"""
     if not messages:
         logger.info("没有消息需要推送")
         return False
     
     try:
-        # 使用主账号连接
-        main_account = config.main_account
-        client = TelegramClient(
-            main_account.session_name,
-            main_account.api_id,
-            main_account.api_hash
-        )
-        
-        await client.connect()
-        
-        if not await client.is_user_authorized():
-            logger.error("主账号未认证")
-            return False
-        
-        # 获取频道
-        channel = await client.get_entity(config.push_config.channel_username)
-        
         # 构建消息内容
         message_text = "📊 **AI 智能信息简报**\n\n"
         
@@ -263,11 +251,10 @@ async def push_to_channel(messages: List[Dict[str, Any]]) -> bool:
         
         message_text += "📅 生成时间: " + datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # 发送消息
-        await client.send_message(channel, message_text, link_preview=False)
+        # 发送消息（Markdown 模式，超长时由会话分段发送）
+        if not await session.send_to_channel(message_text, config.push_config.channel_username, parse_mode="md"):
+            return False
         logger.info("消息已成功推送到频道")
-        
-        await client.disconnect()
         return True
         
     except Exception as e:
@@ -346,6 +333,31 @@ def create_obsidian_md(messages: List[Dict[str, Any]]) -> str:
     logger.info(f"Obsidian MD 文件已创建: {filepath}")
     return filepath
 
+async def collect_and_store(adapter: TelegramMultiAccountAdapter, storage: Storage,
+                            start_time: datetime, end_time: datetime) -> int:
+    """
+    采集窗口内的消息并写入当月分库，返回写入的条数
+
+    采集前用 authors 表预热作者资料缓存（有效期内的已知作者不再读取发送者实体），
+    写入消息后保存本次新增或刷新的作者资料，供下次运行使用。
+    """
+    adapter.sender_cache.load(storage.load_authors())
+
+    # fetch_messages_concurrently 会自动根据账号配置进行采集
+    with profiler.stage("collect"):
+        unified_messages = await adapter.fetch_messages_concurrently(
+            start_time=start_time,
+            end_time=end_time,
+            limit_per_chat=100
+        )
+    print(f"   总共采集到 {len(unified_messages)} 条去重后的消息")
+
+    # messages 表以 internal_id 为主键，INSERT OR IGNORE 保证重复运行幂等；新插入的消息同时写入提及统计
+    with profiler.stage("storage"):
+        saved_count = storage.save_messages(unified_messages)
+        storage.save_authors(adapter.sender_cache.drain_dirty())
+    return saved_count
+
 async def main():
     """主函数"""
     print("=" * 60)
@@ -359,103 +371,88 @@ async def main():
     # 确保数据库存在
     ensure_database()
     
-    # 使用多账号适配器
-    async with TelegramMultiAccountAdapter() as adapter:
-        # 1. 采集消息
-        print("\n1. 📥 并发采集消息...")
-        start_time = datetime.now() - timedelta(hours=24)
-        end_time = datetime.now()
-        
-        # fetch_messages_concurrently 会自动根据账号配置进行采集
-        unified_messages = await adapter.fetch_messages_concurrently(
-            start_time=start_time,
-            end_time=end_time,
-            limit_per_chat=100
-        )
-        
-        print(f"   总共采集到 {len(unified_messages)} 条去重后的消息")
-        
-        # 2. 保存消息
-        print("\n2. 💾 保存消息到数据库...")
-        saved_count = 0
-        for msg in unified_messages:
-            # 检查是否已存在（storage.save_message 内部使用 INSERT OR IGNORE）
-            # 注意：UnifiedMessage 的 id 在 adapter 中被设置为 "{account_id}:{msg_id}"
-            # 但在 messages 表中 UNIQUE(platform, chat_id, external_id) 才是真正的唯一键
-            storage.save_message(msg)
-            saved_count += 1 # 这里其实无法精确知道是否真的插入了，但 save_message 是幂等的
-        
-        print(f"   处理了 {saved_count} 条消息")
+    try:
+        # 使用多账号适配器
+        async with TelegramMultiAccountAdapter() as adapter:
+            # 1. 采集消息  2. 保存消息
+            print("\n1. 📥 并发采集消息...")
+            end_time = datetime.now()
+            start_time = end_time - timedelta(hours=24)
+            saved_count = await collect_and_store(adapter, storage, start_time, end_time)
+            print(f"\n2. 💾 已保存到数据库: 处理了 {saved_count} 条消息")
         
-        # 3. AI 分析
-        print("\n3. 🤖 执行 AI 深度分析...")
-        unprocessed = storage.get_unprocessed()
-        if unprocessed:
-            print(f"   发现 {len(unprocessed)} 条待分析消息，正在处理...")
-            for row in unprocessed[:10]: # 每次流程最多处理10条新消息
-                try:
-                    # 转换行数据为 UnifiedMessage 以便 summarizer 处理
-                    msg = UnifiedMessage(
-                        id=row['internal_id'],
-                        platform=Platform(row['platform']),
-                        external_id=row['external_id'],
-                        content=row['content'],
-                        author_id="unknown",
-                        author_name=row['author_name'],
-                        timestamp=datetime.fromisoformat(row['timestamp']) if isinstance(row['timestamp'], str) else row['timestamp'],
-                        chat_id=row['chat_id'],
-                        chat_name=row['chat_name'],
-                        urls=row['urls'].split(',') if row['urls'] else []
-                    )
+            # 3. AI 分析
+            print("\n3. 🤖 执行 AI 深度分析...")
+            unprocessed = storage.get_unprocessed()
+            if unprocessed:
+                print(f"   发现 {len(unprocessed)} 条待分析消息，正在处理...")
+                with profiler.stage("analysis"):
+                    for row in unprocessed[:10]: # 每次流程最多处理10条新消息
+                        try:
+                            # 转换行数据为 UnifiedMessage 以便 summarizer 处理
+                            msg = UnifiedMessage(
+                                id=row['internal_id'],
+                                platform=Platform(row['platform']),
+                                external_id=row['external_id'],
+                                content=row['content'],
+                                author_id="unknown",
+                                author_name=row['author_name'],
+                                timestamp=datetime.fromisoformat(row['timestamp']) if isinstance(row['timestamp'], str) else row['timestamp'],
+                                chat_id=row['chat_id'],
+                                chat_name=row['chat_name'],
+                                urls=row['urls'].split(',') if row['urls'] else []
+                            )
                     
-                    result = await summarizer.summarize_message(msg, [])
-                    storage.update_message_summary(msg.id, result.get("summary", ""), result.get("tags", []))
-                    print(f"   ✅ 已分析: {msg.chat_name}")
-                except Exception as e:
-                    print(f"   ❌ 分析失败: {e}")
-        else:
-            print("   没有待分析的消息")
+                            result = await summarizer.summarize_message(msg, [])
+                            storage.update_message_summary(msg.id, result.get("summary", ""), result.get("tags", []))
+                            print(f"   ✅ 已分析: {msg.chat_name}")
+                        except Exception as e:
+                            print(f"   ❌ 分析失败: {e}")
+            else:
+                print("   没有待分析的消息")
 
-        # 4. 获取已分析的消息并推送/归档
-        # ... (后续逻辑保持基本一致)
+            # 4. 获取已分析的消息并推送/归档
+            # ... (后续逻辑保持基本一致)
 
-        # 4. 获取最后三条已分析的消息
-        print("\n4. 📊 获取已分析消息...")
-        conn = sqlite3.connect(config.database_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT chat_name, content, urls, timestamp, summary, tags 
-            FROM messages 
-            WHERE processed = 1
-            ORDER BY timestamp DESC 
-            LIMIT 5
-        ''')
-        analyzed_messages = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+            # 4. 获取最后三条已分析的消息
+            print("\n4. 📊 获取已分析消息...")
+            conn = sqlite3.connect(config.database_path)
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT chat_name, content, urls, timestamp, summary, tags 
+                FROM messages 
+                WHERE processed = 1
+                ORDER BY timestamp DESC 
+                LIMIT 5
+            ''')
+            analyzed_messages = [dict(row) for row in cursor.fetchall()]
+            conn.close()
         
-        # 5. 推送到频道
-        print("\n5. 📤 推送到测试频道...")
-        if analyzed_messages:
-            success = await push_to_channel(analyzed_messages[:3])
-            if success:
-                print("   ✅ 消息已推送到频道")
+            # 5. 推送到频道
+            print("\n5. 📤 推送到测试频道...")
+            if analyzed_messages:
+                with profiler.stage("push"):
+                    success = await push_to_channel(analyzed_messages[:3], adapter.main_session)
+                    if success:
+                        print("   ✅ 消息已推送到频道")
+                    else:
+                        print("   ❌ 消息推送失败")
             else:
-                print("   ❌ 消息推送失败")
-        else:
-            print("   没有消息需要推送")
+                print("   没有消息需要推送")
         
-        # 6. 创建 Obsidian MD 文件
-        print("\n6. 📝 创建 Obsidian MD 文件...")
-        if analyzed_messages:
-            md_file = create_obsidian_md(analyzed_messages)
-            print(f"   ✅ MD 文件已创建: {md_file}")
-        else:
-            print("   没有消息，跳过创建 MD 文件")
+            # 6. 创建 Obsidian MD 文件
+            print("\n6. 📝 创建 Obsidian MD 文件...")
+            if analyzed_messages:
+                with profiler.stage("obsidian"):
+                    md_file = create_obsidian_md(analyzed_messages)
+                    print(f"   ✅ MD 文件已创建: {md_file}")
+            else:
+                print("   没有消息，跳过创建 MD 文件")
         
-        print("\n" + "=" * 60)
-        print("✅ 采集与分析流程完成！")
-        print("=" * 60)
+            print("\n" + "=" * 60)
+            print("✅ 采集与分析流程完成！")
+            print("=" * 60)
         
     except Exception as e:
         print(f"❌ 运行失败: {e}")
@@ -463,4 +460,10 @@ async def main():
         traceback.print_exc()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="采集消息、AI 分析并推送")
+    add_profile_arguments(parser)
+    profiler.configure_from_args(parser.parse_args(), "collect_compatible")
+    try:
+        asyncio.run(main())
+    finally:
+        profiler.finish()
@@ -1,30 +1,34 @@
 #!/usr/bin/env python3
+import argparse
 import asyncio
 import json
 import os
 import sqlite3
 from datetime import datetime, timedelta
+from typing import Optional
 from loguru import logger
 from src.config import config
 from src.processors.summarizer import AISummarizer
+from src.profiling import profiler, add_profile_arguments
 from openai import AsyncOpenAI
 
-async def generate_daily_newsletter():
-    """生成每日简报"""
+async def generate_daily_newsletter(summarizer: Optional[AISummarizer] = None):
+    """生成每日简报（常驻调度器可传入 summarizer 以复用其 DeepSeek 客户端）"""
     logger.info("Starting Daily Newsletter generation...")
     
     # 1. 获取最近 24 小时已分析的消息
     time_threshold = (datetime.now() - timedelta(hours=24)).strftime("%Y-%m-%dT%H:%M:%S")
-    conn = sqlite3.connect(config.database_path)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT chat_name, summary, tags, timestamp 
-        FROM messages 
-        WHERE processed = 1 AND timestamp >= ?
-    ''', (time_threshold,))
-    rows = cursor.fetchall()
-    conn.close()
+    with profiler.stage("query"):
+        conn = sqlite3.connect(config.database_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT chat_name, summary, tags, timestamp 
+            FROM messages 
+            WHERE processed = 1 AND timestamp >= ?
+        ''', (time_threshold,))
+        rows = cursor.fetchall()
+        conn.close()
     
     if not rows:
         logger.warning("No analyzed messages found for today.")
@@ -50,7 +54,8 @@ async def generate_daily_newsletter():
         context += "\n"
 
     # 3. 使用 AI 生成聚合简报
-    client = AsyncOpenAI(api_key=config.ai_config.deepseek_api_key, base_url=config.ai_config.openai_base_url)
+    client = summarizer.deepseek_client if summarizer and summarizer.deepseek_client else \
+        AsyncOpenAI(api_key=config.ai_config.deepseek_api_key, base_url=config.ai_config.openai_base_url)
     
     prompt = f"""
     你是一个专业的新闻编辑。请根据以下来自不同 Telegram 群组的消息摘要，整理出一份“今日技术与资讯每日简报”。
@@ -68,14 +73,15 @@ async def generate_daily_newsletter():
     """
 
     try:
-        response = await client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "You are a professional editor."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.5
-        )
+        with profiler.stage("summarize"):
+            response = await client.chat.completions.create(
+                model="deepseek-chat",
+                messages=[
+                    {"role": "system", "content": "You are a professional editor."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.5
+            )
         newsletter_content = response.choices[0].message.content
     except Exception as e:
         logger.error(f"Failed to generate newsletter with AI: {e}")
@@ -109,4 +115,10 @@ async def generate_daily_newsletter():
     return filepath
 
 if __name__ == "__main__":
-    asyncio.run(generate_daily_newsletter())
+    parser = argparse.ArgumentParser(description="生成每日简报")
+    add_profile_arguments(parser)
+    profiler.configure_from_args(parser.parse_args(), "generate_newsletter")
+    try:
+        asyncio.run(generate_daily_newsletter())
+    finally:
+        profiler.finish()
@@ -1,10 +1,11 @@
+import argparse
 import asyncio
 import os
 import sys
 import logging
-import re
-import json
+from contextlib import nullcontext
 from datetime import datetime, timedelta
+from typing import Optional
 
 # Ensure we can import from src
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -14,22 +15,24 @@ load_dotenv(override=True)
 
 from src.config import config
 from src.processors.summarizer import AISummarizer
+from src.processors.tokens import estimate_token_count
+from src.processors.compactor import PromptCompactor
+from src.processors.clustering import TopicClusterer
+from src.processors.entities import EntityExtractor, mention_stats, format_mention_stats
 from src.adapters.telegram_adapter_v2 import TelegramMultiAccountAdapter
+from src.delivery.obsidian import StreamingMarkdownWriter
+from src.delivery.manifest import ReportManifest
+from src.delivery.report_stats import ReportStatsLog, build_record
+from src.fetch_budget import FetchBudget
+from src.delivery.streaming import ReportStreamSink
 from src.models import UnifiedMessage, Platform
+from src.metrics import metrics
+from src.profiling import profiler, add_profile_arguments
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def estimate_token_count(text):
-    """粗略估计文本的token数量（英文单词数 + 中文字符数 * 2）"""
-    # 简单估算：英文单词数 + 中文字符数 * 2
-    english_words = len(re.findall(r'\b[a-zA-Z]+\b', text))
-    chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-    # 其他字符（标点、数字等）按0.5倍计算
-    other_chars = len(text) - english_words - chinese_chars
-    return english_words + chinese_chars * 2 + int(other_chars * 0.5)
-
 def chunk_messages_by_tokens(message_list, max_tokens_per_chunk=100000):
     """
     将消息列表按token数分块，确保每块不超过限制
@@ -77,8 +80,85 @@ def chunk_messages_by_tokens(message_list, max_tokens_per_chunk=100000):
     
     return chunks
 
-async def generate_chunk_summary(summarizer, chunk_data, chunk_index, total_chunks, start_time, end_time):
-    """生成单个分块的摘要"""
+def chunk_messages_by_clusters(message_list, clusters, max_tokens_per_chunk=100000):
+    """
+    按话题簇分块：同一话题的消息尽量放进同一个分块，分块内按话题分组
+
+    每块额外包含 clusters 字段：[(话题标签, 该话题在本块中的消息列表)]，
+    messages 字段按分组后的顺序排列，块内相对ID即为在 messages 中的位置。
+    """
+    if not message_list or not clusters:
+        return []
+
+    chunks = []
+    current_groups = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current_groups, current_tokens
+        if not current_groups:
+            return
+        messages = [item for _, group in current_groups for item in group]
+        chunks.append({
+            'start_id': min(idx for idx, _ in messages),
+            'messages': messages,
+            'estimated_tokens': current_tokens,
+            'clusters': current_groups
+        })
+        current_groups = []
+        current_tokens = 0
+
+    for cluster in clusters:
+        group = []
+        group_tokens = 0
+        for idx in cluster.indices:
+            msg = message_list[idx]
+            message_tokens = estimate_token_count(f"[ID:{idx}] {msg.content}")
+            # 单个话题超过分块上限时，只能在话题内部切开
+            if group and group_tokens + message_tokens > max_tokens_per_chunk:
+                if current_tokens + group_tokens > max_tokens_per_chunk:
+                    flush()
+                current_groups.append((cluster.label, group))
+                current_tokens += group_tokens
+                flush()
+                group, group_tokens = [], 0
+            group.append((idx, msg))
+            group_tokens += message_tokens
+
+        if not group:
+            continue
+        # 整个话题放不进当前块时另起一块，保证话题不被拆散
+        if current_groups and current_tokens + group_tokens > max_tokens_per_chunk:
+            flush()
+        current_groups.append((cluster.label, group))
+        current_tokens += group_tokens
+
+    flush()
+
+    logger.info(f"按话题分块完成：共 {len(message_list)} 条消息，{len(clusters)} 个话题，分成 {len(chunks)} 个块")
+    for i, chunk in enumerate(chunks):
+        logger.info(f"  块 {i+1}: {len(chunk['messages'])} 条消息，{len(chunk['clusters'])} 个话题，估计 {chunk['estimated_tokens']} tokens")
+
+    return chunks
+
+def format_chunk_messages(chunk_data):
+    """把分块消息格式化为带相对ID的文本；按话题分块时附带话题标签和规模"""
+    lines = []
+    if chunk_data.get('clusters'):
+        relative_id = 0
+        for label, group in chunk_data['clusters']:
+            lines.append(f"【话题：{label}｜{len(group)} 条消息】")
+            for _, msg in group:
+                lines.append(f"[ID:{relative_id}] {msg.content}")
+                relative_id += 1
+    else:
+        for relative_id, (_, msg) in enumerate(chunk_data['messages']):
+            lines.append(f"[ID:{relative_id}] {msg.content}")
+    return "\n".join(lines)
+
+async def generate_chunk_summary(summarizer, chunk_data, chunk_index, total_chunks, start_time, end_time,
+                                 mentions_text=""):
+    """生成单个分块的摘要；mentions_text 为本块预计算的代币/项目提及统计"""
     # 读取 setting_AI.md
     try:
         with open("setting_AI.md", "r", encoding="utf-8") as f:
@@ -90,14 +170,11 @@ async def generate_chunk_summary(summarizer, chunk_data, chunk_index, total_chun
     # 格式化时间范围
     time_range_str = f"{start_time.strftime('%m%d %H:%M')} - {end_time.strftime('%m%d %H:%M')}"
 
-    # 准备分块消息文本
-    messages_with_ids = []
-    for original_id, msg in chunk_data['messages']:
-        # 使用相对ID，从0开始
-        relative_id = original_id - chunk_data['start_id']
-        messages_with_ids.append(f"[ID:{relative_id}] {msg.content}")
-    
-    messages_text = "\n".join(messages_with_ids)
+    # 准备分块消息文本（使用相对ID，从0开始）
+    messages_text = format_chunk_messages(chunk_data)
+    cluster_hint = ""
+    if chunk_data.get('clusters'):
+        cluster_hint = "消息已按话题分组，每组标题给出了话题关键词和消息条数，条数越多说明讨论热度越高，请据此判断各话题的重要程度。"
     
     prompt = f"""
     你是一个专业的区块链投研助手。请根据以下从多个 Telegram 群组采集到的碎片化信息，整理出这部分信息的摘要。
@@ -109,7 +186,10 @@ async def generate_chunk_summary(summarizer, chunk_data, chunk_index, total_chun
 
     当前简报的时间范围是：{time_range_str}
 
-    采集到的原始信息如下（每条消息都有ID标记）：
+    本块预计算的代币/股票/项目提及统计（按提及次数排序，提及相关内容请以此为准）：
+    {mentions_text or "（无）"}
+
+    采集到的原始信息如下（每条消息都有ID标记）：{cluster_hint}
     {messages_text}
 
     请返回一个JSON对象，格式如下：
@@ -131,8 +211,8 @@ async def generate_chunk_summary(summarizer, chunk_data, chunk_index, total_chun
         if result.get("basic_question_ids"):
             original_ids = []
             for relative_id in result["basic_question_ids"]:
-                original_id = chunk_data['start_id'] + relative_id
-                original_ids.append(original_id)
+                if isinstance(relative_id, int) and 0 <= relative_id < len(chunk_data['messages']):
+                    original_ids.append(chunk_data['messages'][relative_id][0])
             result["basic_question_ids"] = original_ids
         
         return result
@@ -140,8 +220,14 @@ async def generate_chunk_summary(summarizer, chunk_data, chunk_index, total_chun
         logger.error(f"分块 {chunk_index + 1} AI 生成摘要失败: {e}")
         return {"summary": f"分块 {chunk_index + 1} AI 摘要生成失败: {e}", "basic_question_ids": []}
 
-async def generate_global_summary(summarizer, aggregated_text, message_list, start_time, end_time):
-    """调用 AI 生成全局摘要，使用分块处理策略"""
+async def generate_global_summary(summarizer, aggregated_text, message_list, start_time, end_time, open_stream=None):
+    """
+    调用 AI 生成全局摘要，使用分块处理策略
+
+    如果提供了 open_stream（返回 ReportStreamSink 或 None 的异步函数），多分块时才打开流式通道，
+    聚合阶段以流式方式生成并实时交付；返回结果中的 streamed 字段标记最终简报是否已经通过该通道输出，
+    stream_sink 为输出所用的通道（调用方用它定稿）。
+    """
     # 读取 setting_AI.md
     try:
         with open("setting_AI.md", "r", encoding="utf-8") as f:
@@ -159,52 +245,87 @@ async def generate_global_summary(summarizer, aggregated_text, message_list, sta
 
     logger.info(f"开始处理 {len(message_list)} 条消息的摘要生成")
     
-    # 1. 将消息分块
-    chunks = chunk_messages_by_tokens(message_list, max_tokens_per_chunk=100000)
+    # 1. 将消息分块：优先按话题聚类分块，聚类不可用时按顺序分块
+    with metrics.timer("pipeline_stage_seconds", stage="chunking"), profiler.stage("chunking"):
+        clusters = TopicClusterer().cluster(message_list)
+        if clusters:
+            chunks = chunk_messages_by_clusters(message_list, clusters, max_tokens_per_chunk=100000)
+        else:
+            chunks = chunk_messages_by_tokens(message_list, max_tokens_per_chunk=100000)
+    metrics.counter("pipeline_chunks_total").inc(len(chunks))
     
     if not chunks:
         logger.warning("消息分块失败")
         return {"summary": f"📊 {time_range_str}\n\n⚠️ 消息处理失败", "basic_question_ids": []}
     
-    # 2. 并行生成分块摘要
+    # 2. 预计算提及统计，模型不需要再从原文中逐条查找代币和合约地址
+    extractor = EntityExtractor()
+    global_mentions_text = format_mention_stats(mention_stats(message_list, extractor, top_n=20))
+
+    # 3. 并行生成分块摘要
     chunk_summaries = []
     all_basic_question_ids = []
     
-    for chunk_index, chunk_data in enumerate(chunks):
-        logger.info(f"处理分块 {chunk_index + 1}/{len(chunks)}")
-        chunk_result = await generate_chunk_summary(
-            summarizer, chunk_data, chunk_index, len(chunks), start_time, end_time
-        )
-        chunk_summaries.append(chunk_result)
+    with metrics.timer("pipeline_stage_seconds", stage="chunk_summaries"), profiler.stage("chunk_summaries"):
+        for chunk_index, chunk_data in enumerate(chunks):
+            logger.info(f"处理分块 {chunk_index + 1}/{len(chunks)}")
+            if len(chunks) == 1:
+                chunk_mentions_text = global_mentions_text
+            else:
+                chunk_mentions_text = format_mention_stats(
+                    mention_stats([msg for _, msg in chunk_data['messages']], extractor, top_n=15)
+                )
+            chunk_result = await generate_chunk_summary(
+                summarizer, chunk_data, chunk_index, len(chunks), start_time, end_time, chunk_mentions_text
+            )
+            chunk_summaries.append(chunk_result)
         
-        # 收集基础操作问题ID
-        if chunk_result.get("basic_question_ids"):
-            all_basic_question_ids.extend(chunk_result["basic_question_ids"])
-    
-    # 3. 聚合所有分块摘要
-    if len(chunks) == 1:
-        # 如果只有一个分块，直接使用其摘要
-        final_summary = chunk_summaries[0]["summary"]
-    else:
-        # 如果有多个分块，需要聚合
-        final_summary = await aggregate_chunk_summaries(
-            summarizer, chunk_summaries, start_time, end_time, setting_ai_content
-        )
+            # 收集基础操作问题ID
+            if chunk_result.get("basic_question_ids"):
+                all_basic_question_ids.extend(chunk_result["basic_question_ids"])
+    
+    # 4. 聚合所有分块摘要
+    stream_sink = None
+    with metrics.timer("pipeline_stage_seconds", stage="aggregate"), profiler.stage("aggregate"):
+        if len(chunks) > 1 and open_stream is not None:
+            # 只有多分块的聚合阶段能流式输出，此时才打开通道（需要解析频道实体）
+            stream_sink = await open_stream()
+        if len(chunks) == 1:
+            # 如果只有一个分块，直接使用其摘要（该摘要来自 JSON 输出，无法流式交付）
+            final_summary = chunk_summaries[0]["summary"]
+        elif stream_sink is not None:
+            # 多个分块：流式聚合，失败时撤回已输出的内容并回退到一次性聚合
+            try:
+                final_summary = await stream_chunk_summaries(
+                    summarizer, chunk_summaries, start_time, end_time, setting_ai_content, stream_sink,
+                    global_mentions_text
+                )
+            except Exception as e:
+                logger.warning(f"流式聚合失败，回退到一次性模式: {e}")
+                await stream_sink.abort()
+                stream_sink = None
+                final_summary = await aggregate_chunk_summaries(
+                    summarizer, chunk_summaries, start_time, end_time, setting_ai_content, global_mentions_text
+                )
+        else:
+            # 如果有多个分块，需要聚合
+            final_summary = await aggregate_chunk_summaries(
+                summarizer, chunk_summaries, start_time, end_time, setting_ai_content, global_mentions_text
+            )
     
-    # 4. 确保摘要格式正确
+    # 5. 确保摘要格式正确
     if not final_summary.startswith("📊"):
         final_summary = f"📊 {time_range_str}\n\n{final_summary}"
     
     return {
         "summary": final_summary,
-        "basic_question_ids": all_basic_question_ids
+        "basic_question_ids": all_basic_question_ids,
+        "streamed": stream_sink is not None,
+        "stream_sink": stream_sink
     }
 
-async def aggregate_chunk_summaries(summarizer, chunk_summaries, start_time, end_time, setting_ai_content):
-    """聚合多个分块摘要为全局摘要"""
-    # 格式化时间范围
-    time_range_str = f"{start_time.strftime('%m%d %H:%M')} - {end_time.strftime('%m%d %H:%M')}"
-    
+def build_aggregation_prompt(chunk_summaries, time_range_str, setting_ai_content, mentions_text=""):
+    """构建聚合分块摘要的提示词"""
     # 准备所有分块摘要
     chunk_summary_texts = []
     for i, chunk_result in enumerate(chunk_summaries):
@@ -221,6 +342,9 @@ async def aggregate_chunk_summaries(summarizer, chunk_summaries, start_time, end
     当前简报的时间范围是：{time_range_str}
     请确保简报开头严格按照设定中的格式：📊 {time_range_str}
 
+    全部消息预计算的代币/股票/项目提及统计（按提及次数排序，提及相关内容请以此为准）：
+    {mentions_text or "（无）"}
+
     以下是 {len(chunk_summaries)} 个分块的摘要：
     {all_chunk_summaries}
 
@@ -233,6 +357,14 @@ async def aggregate_chunk_summaries(summarizer, chunk_summaries, start_time, end
 
     请直接返回完整的简报内容（不需要JSON格式）。
     """
+    return prompt
+
+async def aggregate_chunk_summaries(summarizer, chunk_summaries, start_time, end_time, setting_ai_content,
+                                    mentions_text=""):
+    """聚合多个分块摘要为全局摘要"""
+    # 格式化时间范围
+    time_range_str = f"{start_time.strftime('%m%d %H:%M')} - {end_time.strftime('%m%d %H:%M')}"
+    prompt = build_aggregation_prompt(chunk_summaries, time_range_str, setting_ai_content, mentions_text)
     
     try:
         # 使用新的summarizer接口
@@ -257,29 +389,50 @@ async def aggregate_chunk_summaries(summarizer, chunk_summaries, start_time, end
             fallback_summary += f"\n=== 分块 {i+1} ===\n{chunk_result['summary']}\n"
         return fallback_summary
 
+async def stream_chunk_summaries(summarizer, chunk_summaries, start_time, end_time, setting_ai_content, stream_sink,
+                                 mentions_text=""):
+    """
+    流式聚合多个分块摘要，生成过程中把文本实时交给 stream_sink
+
+    Returns:
+        完整的全局简报文本；流式过程中出错时抛出异常，由调用方回退到一次性模式
+    """
+    time_range_str = f"{start_time.strftime('%m%d %H:%M')} - {end_time.strftime('%m%d %H:%M')}"
+    prompt = build_aggregation_prompt(chunk_summaries, time_range_str, setting_ai_content, mentions_text)
+
+    parts = []
+    header_checked = False
+    async for delta in summarizer.stream_summary_with_prompt(
+        prompt=prompt,
+        system_prompt="你是一个专业的区块链投研助手，擅长整合多个分块摘要，生成完整、连贯的全局简报。",
+        temperature=0.3
+    ):
+        # 与一次性模式保持一致：简报必须以 📊 时间范围 开头
+        if not header_checked:
+            delta = delta.lstrip()
+            if not delta:
+                continue
+            header_checked = True
+            if not delta.startswith("📊"):
+                header = f"📊 {time_range_str}\n\n"
+                parts.append(header)
+                await stream_sink.append(header)
+        parts.append(delta)
+        await stream_sink.append(delta)
+
+    final_summary = "".join(parts)
+    if not final_summary.strip():
+        raise ValueError("AI 流式输出为空")
+
+    logger.info(f"全局摘要流式聚合完成，长度：{len(final_summary)} 字符")
+    return final_summary
+
 def get_last_launch_time():
-    """从简报文件名中获取上次启动时间"""
+    """从简报清单中获取上次启动时间（最新一份简报的统计结束时间）"""
     vault_path = config.obsidian_vault_path
     if not vault_path or not os.path.exists(vault_path):
         return None
-    
-    # 查找所有简报文件
-    pattern = re.compile(r'简报_(\d{10})_-(\d{10})(?:_\d+)?\.md')
-    last_time = None
-    
-    for filename in os.listdir(vault_path):
-        match = pattern.match(filename)
-        if match:
-            end_time_str = match.group(2)  # 文件名中的结束时间
-            try:
-                # 解析时间：YYMMDDHHMM
-                end_time = datetime.strptime(end_time_str, "%y%m%d%H%M")
-                if last_time is None or end_time > last_time:
-                    last_time = end_time
-            except ValueError:
-                continue
-    
-    return last_time
+    return ReportManifest().last_window_end(vault_path)
 
 def generate_filename(start_time, end_time, index=None):
     """生成简报文件名"""
@@ -337,48 +490,8 @@ def filter_basic_operation_questions(messages):
     return filtered_messages
 
 def save_report_stats(start_time, end_time, basic_op_count, filename):
-    """保存简报统计数据"""
-    stats_dir = "data/report_stats"
-    if not os.path.exists(stats_dir):
-        os.makedirs(stats_dir)
-    
-    stats_file = os.path.join(stats_dir, "report_stats.json")
-    
-    # 计算统计小时数
-    hours = (end_time - start_time).total_seconds() / 3600
-    
-    # 创建统计记录
-    stats_record = {
-        "filename": filename,
-        "start_time": start_time.isoformat(),
-        "end_time": end_time.isoformat(),
-        "hours": round(hours, 2),
-        "basic_operation_count": basic_op_count,
-        "basic_operation_density": round(basic_op_count / hours, 4) if hours > 0 else 0,
-        "created_at": datetime.now().isoformat()
-    }
-    
-    # 读取现有统计数据
-    all_stats = []
-    if os.path.exists(stats_file):
-        try:
-            with open(stats_file, 'r', encoding='utf-8') as f:
-                all_stats = json.load(f)
-        except:
-            all_stats = []
-    
-    # 添加新记录
-    all_stats.append(stats_record)
-    
-    # 只保留最近100条记录
-    if len(all_stats) > 100:
-        all_stats = all_stats[-100:]
-    
-    # 保存到文件
-    with open(stats_file, 'w', encoding='utf-8') as f:
-        json.dump(all_stats, f, ensure_ascii=False, indent=2)
-    
-    return stats_record
+    """追加一条简报统计记录"""
+    return ReportStatsLog().append(build_record(start_time, end_time, basic_op_count, filename))
 
 def save_training_data(messages, basic_question_ids):
     """保存训练数据到CSV文件，用于机器学习模型训练"""
@@ -416,20 +529,10 @@ def save_training_data(messages, basic_question_ids):
 
 def get_previous_report_stats():
     """获取上次简报的统计数据"""
-    stats_file = "data/report_stats/report_stats.json"
-    if not os.path.exists(stats_file):
-        return None
-    
     try:
-        with open(stats_file, 'r', encoding='utf-8') as f:
-            all_stats = json.load(f)
-        
-        if not all_stats:
-            return None
-        
-        # 返回最近的一条记录（排除当前正在处理的）
-        return all_stats[-1]
-    except:
+        return ReportStatsLog().previous()
+    except Exception as e:
+        logger.warning(f"读取上次简报统计失败: {e}")
         return None
 
 def calculate_basic_op_density_change(current_stats, previous_stats):
@@ -448,20 +551,45 @@ def calculate_basic_op_density_change(current_stats, previous_stats):
     # 返回格式化后的结果（保留两位小数）
     return f"{density_change:+.2f}" if density_change >= 0 else f"{density_change:.2f}"
 
-def save_to_obsidian(content, filename):
+@metrics.timed("delivery_seconds", target="obsidian")
+def save_to_obsidian(content, filename, stats=None):
+    """原子写入简报并记录到简报清单"""
     vault_path = config.obsidian_vault_path
     if not vault_path:
         logger.warning("未配置 OBSIDIAN_VAULT_PATH，跳过保存")
         return
-    if not os.path.exists(vault_path):
-        os.makedirs(vault_path)
     
-    file_path = os.path.join(vault_path, filename)
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(content)
+    file_path = ReportManifest().save(vault_path, filename, content, stats=stats)
+    metrics.counter("delivery_messages_sent_total", target="obsidian").inc()
     logger.info(f"报告已保存到 Obsidian: {file_path}")
 
-async def main():
+async def open_report_stream(adapter, filename):
+    """
+    为一份简报打开流式交付通道（Obsidian 草稿 + 频道消息）
+
+    Returns:
+        ReportStreamSink；未启用流式推送或没有任何可用下游时返回 None
+    """
+    if not config.stream_delivery:
+        return None
+
+    markdown_writer = None
+    if config.obsidian_vault_path:
+        markdown_writer = StreamingMarkdownWriter(os.path.join(config.obsidian_vault_path, filename))
+
+    channel_writer = await adapter.open_digest_stream(min_edit_interval=config.stream_edit_interval)
+
+    sink = ReportStreamSink(markdown_writer, channel_writer)
+    return sink if sink.enabled else None
+
+async def main(adapter: Optional[TelegramMultiAccountAdapter] = None, summarizer: Optional[AISummarizer] = None):
+    """
+    生成深度简报
+
+    Args:
+        adapter: 已连接的多账号适配器（常驻调度器传入以复用会话）；为空时本次运行自行连接和断开
+        summarizer: 复用的 AI 总结器；为空时新建
+    """
     logger.info("开始生成深度简报...")
     
     # 调试：检查配置是否正确加载
@@ -505,6 +633,9 @@ async def main():
             # 情况3：间隔 > 120小时
             logger.info("时间间隔 > 120小时，生成1份简报（最近48小时）")
             start_time = current_time - timedelta(hours=48)
+            logger.warning(f"{last_launch_time:%Y-%m-%d %H:%M} 至 {start_time:%Y-%m-%d %H:%M} 的消息不会入库，"
+                           f"可用以下命令补采: python -m src.backfill --start {last_launch_time:%Y-%m-%dT%H:%M} "
+                           f"--end {start_time:%Y-%m-%dT%H:%M}")
             end_time = current_time
             time_windows = [(start_time, end_time)]
     
@@ -513,12 +644,15 @@ async def main():
         logger.info(f"时间窗口 {i+1}: {start} 至 {end}")
     
     # 初始化 AI 总结器
-    summarizer = AISummarizer(
+    summarizer = summarizer or AISummarizer(
         api_key=config.ai_config.deepseek_api_key, 
         base_url=config.ai_config.openai_base_url
     )
     
-    async with TelegramMultiAccountAdapter() as adapter:
+    compactor = PromptCompactor()
+    
+    # 外部传入的适配器由调用方负责连接和断开
+    async with (nullcontext(adapter) if adapter is not None else TelegramMultiAccountAdapter()) as adapter:
         # 处理每个时间窗口
         for i, (start_time, end_time) in enumerate(time_windows):
             logger.info(f"正在处理时间窗口 {i+1}/{len(time_windows)}: {start_time} 至 {end_time}")
@@ -528,23 +662,33 @@ async def main():
             # limit_per_chat 根据时间间隔调整
             hours_diff = (end_time - start_time).total_seconds() / 3600
             limit_per_chat = min(300, int(hours_diff * 12.5))  # 大约每小时12.5条
+            # 按各群组历史速率重新分配上限，总请求数不超过固定上限时的请求数
+            budget = FetchBudget() if config.collector_config.adaptive_budget else None
+            chat_limits = budget.plan(adapter.monitored_chats(), hours_diff, limit_per_chat) if budget else None
+            # 上次看到的各群组最新消息 ID：估计新增条数，繁忙群组先开始扫描
+            watermarks = budget.watermarks() if budget else None
             
-            unified_messages = await adapter.fetch_messages_concurrently(
-                start_time=start_time,
-                end_time=end_time,
-                limit_per_chat=limit_per_chat
-            )
+            with metrics.timer("pipeline_stage_seconds", stage="collect"), profiler.stage("collect"):
+                unified_messages = await adapter.fetch_batch_concurrently(
+                    start_time=start_time,
+                    end_time=end_time,
+                    limit_per_chat=limit_per_chat,
+                    chat_limits=chat_limits,
+                    watermarks=watermarks
+                )
+            if budget:
+                budget.observe(adapter.last_fetches, start_time, end_time)
+                budget.save_watermarks(adapter.last_activity)
             
             if not unified_messages:
                 logger.info(f"时间窗口 {i+1} 内没有抓取到新消息")
                 continue
 
-            # 统计基础操作问题数量
-            basic_op_count = count_basic_operation_questions(unified_messages)
+            # 统计并过滤基础操作问题
+            with metrics.timer("pipeline_stage_seconds", stage="basic_filter"), profiler.stage("basic_filter"):
+                basic_op_count = count_basic_operation_questions(unified_messages)
+                filtered_messages = filter_basic_operation_questions(unified_messages)
             logger.info(f"检测到基础操作问题数量: {basic_op_count}")
-            
-            # 过滤掉基础操作问题
-            filtered_messages = filter_basic_operation_questions(unified_messages)
             logger.info(f"过滤后剩余消息数量: {len(filtered_messages)}")
 
             chat_contents = {}
@@ -565,9 +709,22 @@ async def main():
             
             logger.info(f"成功抓取 {len(unified_messages)} 条去重后的消息，过滤后剩余 {len(filtered_messages)} 条，将处理所有 {total_messages_count} 条消息")
             
+            # 生成文件名（处理同一天多次启动的情况）
+            filename = generate_filename(start_time, end_time, i+1 if len(time_windows) > 1 else None)
+            
+            # 压缩提示词：与 unified_messages 一一对应，只用于构建发送给 AI 的文本
+            with metrics.timer("pipeline_stage_seconds", stage="compaction"), profiler.stage("compaction"):
+                prompt_messages, compaction_stats = compactor.compact_messages(unified_messages)
+            metrics.counter("prompt_tokens_saved_total").inc(compaction_stats.tokens_saved)
+            
             logger.info("正在调用 AI 生成深度简报...")
             # 传递完整的消息列表给AI，让AI识别基础操作问题
-            summary_result = await generate_global_summary(summarizer, aggregated_input, unified_messages, start_time, end_time)
+            with metrics.timer("pipeline_stage_seconds", stage="summarize"), profiler.stage("summarize"):
+                # 多分块聚合时打开流式交付通道，AI 边生成边推送
+                summary_result = await generate_global_summary(
+                    summarizer, aggregated_input, prompt_messages, start_time, end_time,
+                    open_stream=lambda: open_report_stream(adapter, filename)
+                )
             
             # 从JSON结果中提取简报内容和基础问题ID列表
             report_content = summary_result.get('summary', '')
@@ -583,9 +740,6 @@ async def main():
             # 保存训练数据
             save_training_data(unified_messages, basic_question_ids)
             
-            # 生成文件名（处理同一天多次启动的情况）
-            filename = generate_filename(start_time, end_time, i+1 if len(time_windows) > 1 else None)
-            
             # 获取上次简报统计数据
             previous_stats = get_previous_report_stats()
             
@@ -605,12 +759,38 @@ async def main():
 """
             enhanced_report_content = f"{report_content}\n\n{density_stats}"
             
-            # 保存到 Obsidian
-            save_to_obsidian(enhanced_report_content, filename)
-            
-            # 推送到 Telegram
-            await adapter.send_digest_to_channel(enhanced_report_content)
+            with metrics.timer("pipeline_stage_seconds", stage="deliver"), profiler.stage("deliver"):
+                delivered = {"obsidian": False, "channel": False}
+                if summary_result.get("streamed"):
+                    # 简报正文已流式输出，只需补上统计信息并定稿
+                    delivered = await summary_result["stream_sink"].finish(enhanced_report_content, channel_tail=f"\n\n{density_stats}")
+                
+                # 保存到 Obsidian
+                report_stats = {
+                    "total_messages": total_messages,
+                    "basic_operation_count": basic_op_count,
+                    "basic_operation_density": round(basic_op_density, 4),
+                }
+                if not delivered["obsidian"]:
+                    save_to_obsidian(enhanced_report_content, filename, report_stats)
+                else:
+                    # 流式写入的文件已定稿，只需登记到简报清单
+                    ReportManifest().record(config.obsidian_vault_path, filename, enhanced_report_content,
+                                            stats=report_stats)
+                
+                # 推送到 Telegram
+                if not delivered["channel"]:
+                    await adapter.send_digest_to_channel(enhanced_report_content, idempotency_key=f"daily:{filename}")
             logger.info(f"简报 {i+1} 已推送到 Telegram 频道")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="生成 24 小时深度简报")
+    add_profile_arguments(parser)
+    profiler.configure_from_args(parser.parse_args(), "process_24h_report")
+    metrics.start_http_server()
+    try:
+        asyncio.run(main())
+    finally:
+        profiler.finish()
+        if config.metrics_config.enabled:
+            metrics.write_json("process_24h_report")
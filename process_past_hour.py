@@ -6,12 +6,14 @@ Hourly Process Script:
 3. Save to Obsidian and push to Telegram channel.
 """
 
+import argparse
 import asyncio
 import os
 import sys
 import logging
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from datetime import datetime
+from contextlib import nullcontext
+from typing import List, Dict, Any, Optional
 
 # Ensure we can import from src
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -20,8 +22,14 @@ from dotenv import load_dotenv
 load_dotenv(override=True)
 
 from src.config import config
+from src.metrics import metrics
+from src.profiling import profiler, add_profile_arguments
 from src.processors.summarizer import AISummarizer
-from src.adapters.telegram_adapter_v2 import TelegramMultiAccountAdapter
+from src.processors.compactor import PromptCompactor
+from src.processors.entities import mention_stats, format_mention_stats
+from src.adapters.telegram_adapter_v2 import TelegramClientSession, TelegramMultiAccountAdapter
+from src.adapters.telegram_replay import make_client_factory
+from src.delivery.manifest import ReportManifest
 
 # Configure logging
 logging.basicConfig(
@@ -31,9 +39,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-async def generate_global_summary(summarizer: AISummarizer, aggregated_content: str) -> Dict[str, Any]:
+async def generate_global_summary(summarizer: AISummarizer, aggregated_content: str,
+                                  mention_stats_text: str = "") -> Dict[str, Any]:
     """
     使用 DeepSeek API 生成结构化的全局摘要
+
+    mention_stats_text 为入库时预计算的代币/项目提及统计，模型不需要再从原文中逐条查找。
     """
     prompt = f"""
     你是一个专业的金融和市场数据分析师。请对过去一小时内 Telegram 多个群组讨论的内容进行深度总结。
@@ -41,6 +52,9 @@ async def generate_global_summary(summarizer: AISummarizer, aggregated_content:
     输入内容（按群组排列的消息列表）：
     {aggregated_content}
 
+    预计算的代币/股票/项目提及统计（按提及次数排序，第 4 部分请以此为准）：
+    {mention_stats_text or "（无）"}
+
     你的总结必须包含以下四个明确的部分：
     1. **主要聊了哪些内容** (Main discussion topics)
     2. **情绪如何** (Sentiment analysis)
@@ -73,19 +87,15 @@ async def generate_global_summary(summarizer: AISummarizer, aggregated_content:
         logger.error(f"Global Summary generation failed: {e}")
         return {"content": "生成全局摘要失败。"}
 
-def save_to_obsidian(report_content: str) -> str:
-    """保存摘要到 Obsidian 文件夹"""
-    obsidian_dir = "obsidian-tem"
-    os.makedirs(obsidian_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-    filename = f"PastHourReport_{timestamp}.md"
-    filepath = os.path.join(obsidian_dir, filename)
+def save_to_obsidian(report_content: str, start_time: datetime, end_time: datetime,
+                     obsidian_dir: str = "obsidian-tem", manifest: Optional[ReportManifest] = None) -> str:
+    """原子写入摘要到 Obsidian 文件夹并记录到简报清单（文件名、正文和清单都使用实际采集的窗口）"""
+    filename = f"PastHourReport_{start_time:%Y%m%d_%H%M}.md"
     
     full_md = f"""# 📊 全局信息简报 (过去 1 小时)
 
-> 生成时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-> 报告周期: { (datetime.now() - timedelta(hours=1)).strftime("%H:%M") } - { datetime.now().strftime("%H:%M") }
+> 生成时间: {datetime.now():%Y-%m-%d %H:%M:%S}
+> 报告周期: {start_time:%Y-%m-%d %H:%M} - {end_time:%H:%M}
 
 {report_content}
 
@@ -93,83 +103,76 @@ def save_to_obsidian(report_content: str) -> str:
 *由 Telegram 信息自动化系统自动生成*
 """
     
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(full_md)
+    filepath = (manifest or ReportManifest()).save(obsidian_dir, filename, full_md, kind="hourly",
+                                                   window=(start_time, end_time))
     
     logger.info(f"Obsidian 报告已保存: {filepath}")
     return filepath
 
 async def push_to_telegram(report_content: str, config):
-    """推送到 Telegram 频道"""
+    """推送到 Telegram 频道（按段落切分为多条消息，不再截断）"""
+    channel_username = config.push_config.channel_username
+    if not channel_username:
+        logger.error("未配置推送频道")
+        return
+
+    session = TelegramClientSession(config.main_account, client_factory=make_client_factory())
     try:
-        main_account = config.main_account
-        client = TelegramClient(
-            main_account.session_name,
-            main_account.api_id,
-            main_account.api_hash
-        )
-        
-        await client.connect()
-        
-        if not await client.is_user_authorized():
-            logger.error("推送账号未认证")
-            return
-        
-        channel_username = config.push_config.channel_username
-        if not channel_username:
-            logger.error("未配置推送频道")
-            return
-            
-        entity = await client.get_entity(channel_username)
-        
-        header = f"📊 **全局信息简报 (过去 1 小时)**\n\n"
-        full_message = header + report_content
-        
-        # Telegram 消息长度限制为 4096 字符
-        if len(full_message) > 4000:
-            full_message = full_message[:4000] + "..."
-            
-        await client.send_message(entity, full_message)
-        logger.info("简报已推送到 Telegram")
-        
-        await client.disconnect()
+        full_message = f"📊 全局信息简报 (过去 1 小时)\n\n{report_content}"
+        if await session.send_to_channel(full_message, channel_username):
+            logger.info("简报已推送到 Telegram")
     except Exception as e:
         logger.error(f"推送 Telegram 失败: {e}")
+    finally:
+        await session.disconnect()
 
-async def main():
+async def main(adapter: Optional[TelegramMultiAccountAdapter] = None, summarizer: Optional[AISummarizer] = None,
+               start_time: Optional[datetime] = None, end_time: Optional[datetime] = None):
+    """
+    生成过去一小时的全局简报
+
+    Args:
+        adapter: 已连接的多账号适配器（常驻调度器传入以复用会话）；为空时本次运行自行连接和断开
+        summarizer: 复用的 AI 总结器；为空时新建
+        start_time / end_time: 采集窗口；为空时使用当天 12:00 - 13:00
+    """
     logger.info("开始执行过去一小时信息处理脚本 (多账号并发版)")
     
     # 初始化 AI 总结器
-    summarizer = AISummarizer(
+    summarizer = summarizer or AISummarizer(
         api_key=config.ai_config.deepseek_api_key, 
         base_url=config.ai_config.openai_base_url
     )
     
     # 2. 采集消息
-    async with TelegramMultiAccountAdapter() as adapter:
-        logger.info("正在并发采集北京时间 12:00 - 13:00 的消息...")
-        
-        # 强制设置采集窗口为 12:00 到 13:00 (北京时间)
-        now = datetime.now()
-        start_time = now.replace(hour=12, minute=0, second=0, microsecond=0)
-        end_time = now.replace(hour=13, minute=0, second=0, microsecond=0)
-        
-        # 如果当前还没到 13:00，或者已经过了很久，这里可能需要逻辑调整
-        # 但按照用户要求，我们直接锁死这个时间段进行补采
+    # 外部传入的适配器由调用方负责连接和断开
+    async with (nullcontext(adapter) if adapter is not None else TelegramMultiAccountAdapter()) as adapter:
+        if start_time is None or end_time is None:
+            # 强制设置采集窗口为 12:00 到 13:00 (北京时间)
+            now = datetime.now()
+            start_time = now.replace(hour=12, minute=0, second=0, microsecond=0)
+            end_time = now.replace(hour=13, minute=0, second=0, microsecond=0)
+            
+            # 如果当前还没到 13:00，或者已经过了很久，这里可能需要逻辑调整
+            # 但按照用户要求，我们直接锁死这个时间段进行补采
+        logger.info(f"正在并发采集 {start_time:%H:%M} - {end_time:%H:%M} 的消息...")
         
-        unified_messages = await adapter.fetch_messages_concurrently(
-            start_time=start_time,
-            end_time=end_time,
-            limit_per_chat=100 # 增加上限，防止消息太多被截断
-        )
+        with metrics.timer("pipeline_stage_seconds", stage="collect"), profiler.stage("collect"):
+            unified_messages = await adapter.fetch_batch_concurrently(
+                start_time=start_time,
+                end_time=end_time,
+                limit_per_chat=100 # 增加上限，防止消息太多被截断
+            )
         
         if not unified_messages:
             logger.info("过去一小时没有新消息，跳过处理")
             return
             
-        # 3. 按群组聚合内容以便生成全局摘要
+        # 3. 压缩提示词后按群组聚合内容以便生成全局摘要
+        with metrics.timer("pipeline_stage_seconds", stage="compaction"), profiler.stage("compaction"):
+            prompt_messages, _ = PromptCompactor().compact_messages(unified_messages)
         chat_contents = {}
-        for msg in unified_messages:
+        for msg in prompt_messages:
             chat_name = msg.chat_name
             if chat_name not in chat_contents:
                 chat_contents[chat_name] = []
@@ -181,16 +184,29 @@ async def main():
         
         # 4. 生成全局摘要
         logger.info("正在生成全局摘要...")
-        summary_result = await generate_global_summary(summarizer, aggregated_input)
+        stats_text = format_mention_stats(mention_stats(unified_messages, top_n=15))
+        with metrics.timer("pipeline_stage_seconds", stage="summarize"), profiler.stage("summarize"):
+            summary_result = await generate_global_summary(summarizer, aggregated_input, stats_text)
         report_content = summary_result['content']
         
-        # 5. 保存到 Obsidian
-        save_to_obsidian(report_content)
-        
-        # 6. 推送到 Telegram
-        await adapter.send_digest_to_channel(f"📊 全局信息简报 (过去 1 小时)\n\n{report_content}")
+        with metrics.timer("pipeline_stage_seconds", stage="deliver"), profiler.stage("deliver"):
+            # 5. 保存到 Obsidian
+            save_to_obsidian(report_content, start_time, end_time)
+            
+            # 6. 推送到 Telegram
+            await adapter.send_digest_to_channel(f"📊 全局信息简报 (过去 1 小时)\n\n{report_content}",
+                                                 idempotency_key=f"hourly:{start_time:%Y%m%d%H%M}")
         logger.info("简报已推送到 Telegram")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="生成过去一小时的全局简报")
+    add_profile_arguments(parser)
+    profiler.configure_from_args(parser.parse_args(), "process_past_hour")
+    metrics.start_http_server()
+    try:
+        asyncio.run(main())
+    finally:
+        profiler.finish()
+        if config.metrics_config.enabled:
+            metrics.write_json("process_past_hour")
 
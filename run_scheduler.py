@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+常驻调度服务
+启动时连接一次所有 Telegram 会话并创建 AI 客户端，之后按 SCHEDULE_* 配置的 cron 表达式运行
+过去一小时简报、24 小时深度简报、每日 Newsletter 和发件箱续发，省去每次 cron / launchd 唤醒时的冷启动和重连开销。
+
+用法:
+    python run_scheduler.py                  # 常驻运行，Ctrl+C / SIGTERM 优雅退出
+    python run_scheduler.py --once daily     # 立即运行一次指定任务（hourly / daily / newsletter / outbox）后退出
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+from src.config import config, SchedulerConfig
+from src.metrics import metrics
+from src.scheduler import CronSchedule, Job, Scheduler, acquire_instance_lock
+from src.processors.summarizer import AISummarizer
+from src.adapters.telegram_adapter_v2 import TelegramMultiAccountAdapter
+import process_24h_report
+import process_past_hour
+from generate_newsletter import generate_daily_newsletter
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+LOCK_PATH = os.path.join("data", "scheduler.lock")
+
+
+class WarmResources:
+    """常驻进程中复用的 Telegram 会话和 AI 客户端"""
+
+    def __init__(self):
+        self.adapter: TelegramMultiAccountAdapter = None
+        self.summarizer: AISummarizer = None
+
+    async def start(self):
+        self.summarizer = AISummarizer(
+            api_key=config.ai_config.deepseek_api_key,
+            base_url=config.ai_config.openai_base_url
+        )
+        self.adapter = TelegramMultiAccountAdapter()
+        await self.adapter.connect_all()
+
+    async def close(self):
+        if self.adapter is not None:
+            await self.adapter.disconnect_all()
+
+
+def job_functions(resources: WarmResources) -> Dict[str, Callable[[datetime], Awaitable]]:
+    """各任务的运行函数，全部复用 resources 中已连接的会话"""
+
+    async def hourly(scheduled_at: datetime):
+        # 统计触发时间之前的一个整点小时
+        end_time = scheduled_at.replace(minute=0, second=0, microsecond=0)
+        await process_past_hour.main(resources.adapter, resources.summarizer,
+                                     start_time=end_time - timedelta(hours=1), end_time=end_time)
+
+    async def daily(scheduled_at: datetime):
+        await process_24h_report.main(resources.adapter, resources.summarizer)
+
+    async def newsletter(scheduled_at: datetime):
+        await generate_daily_newsletter(resources.summarizer)
+
+    async def outbox(scheduled_at: datetime):
+        # 续发之前未送达的简报和告警
+        if config.outbox_config.enabled:
+            await resources.adapter.outbox_worker.drain()
+
+    return {"hourly": hourly, "daily": daily, "newsletter": newsletter, "outbox": outbox}
+
+
+def build_jobs(functions: Dict[str, Callable[[datetime], Awaitable]], scheduler_config: SchedulerConfig) -> List[Job]:
+    """按配置生成任务列表，cron 表达式为空的任务不启用"""
+    expressions = {
+        "hourly": scheduler_config.hourly_cron,
+        "daily": scheduler_config.daily_cron,
+        "newsletter": scheduler_config.newsletter_cron,
+        "outbox": scheduler_config.outbox_cron,
+    }
+    return [
+        Job(name, CronSchedule(expr), functions[name], catch_up=scheduler_config.catch_up)
+        for name, expr in expressions.items() if expr
+    ]
+
+
+async def run(once: str = None) -> int:
+    scheduler_config = config.scheduler_config
+    resources = WarmResources()
+    functions = job_functions(resources)
+    jobs = build_jobs(functions, scheduler_config)
+    if not once and not jobs:
+        logger.error("没有启用任何任务，请配置 SCHEDULE_HOURLY / SCHEDULE_DAILY / SCHEDULE_NEWSLETTER")
+        return 1
+
+    started = datetime.now()
+    await resources.start()
+    logger.info(f"会话与 AI 客户端已就绪，耗时 {(datetime.now() - started).total_seconds():.1f}s")
+    try:
+        if once:
+            await functions[once](datetime.now())
+        else:
+            scheduler = Scheduler(jobs, scheduler_config.state_path,
+                                  shutdown_timeout=scheduler_config.shutdown_timeout)
+            await scheduler.run()
+    finally:
+        await resources.close()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="常驻调度服务")
+    parser.add_argument("--once", choices=["hourly", "daily", "newsletter", "outbox"], help="立即运行一次指定任务后退出")
+    args = parser.parse_args()
+
+    lock = acquire_instance_lock(LOCK_PATH)
+    if lock is None:
+        logger.error(f"另一个调度进程正在运行（{LOCK_PATH}）")
+        return 1
+
+    metrics.start_http_server()
+    try:
+        return asyncio.run(run(args.once))
+    finally:
+        if config.metrics_config.enabled:
+            metrics.write_json("scheduler")
+        lock.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
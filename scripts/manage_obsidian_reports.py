@@ -4,11 +4,16 @@
 """
 
 import os
-import re
+import sys
+import argparse
 from datetime import datetime, timedelta
 import shutil
 import logging
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.delivery.manifest import ReportManifest, parse_report_filename
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -17,98 +22,59 @@ def parse_filename_date(filename):
     """
     从简报文件名中解析日期时间
     
-    文件名格式：简报_YYMMDDHHMM_-YYMMDDHHMM.md
+    文件名格式：简报_YYMMDDHHMM_-YYMMDDHHMM.md（旧格式：简报_YYMMDD_to_YYYYMMDD.md）
     返回：datetime 对象（使用结束时间作为文件时间）
     """
-    # 匹配文件名中的时间戳
-    pattern = r'简报_(\d{10})_-(\d{10})(?:_\d+)?\.md'
-    match = re.match(pattern, filename)
-    
-    if not match:
-        # 尝试匹配旧格式：简报_YYMMDD_to_YYYYMMDD.md
-        pattern_old = r'简报_(\d{6})_to_(\d{8})\.md'
-        match = re.match(pattern_old, filename)
-        if match:
-            start_str = match.group(1)  # YYMMDD
-            end_str = match.group(2)    # YYYYMMDD
-            try:
-                # 解析结束时间（旧格式只有日期，没有时间）
-                if len(end_str) == 8:  # YYYYMMDD
-                    end_time = datetime.strptime(end_str, "%Y%m%d")
-                else:  # YYMMDD
-                    end_time = datetime.strptime(end_str, "%y%m%d")
-                return end_time
-            except ValueError:
-                return None
-        return None
-    
-    try:
-        # 解析结束时间（文件名中的第二个时间戳）
-        end_time_str = match.group(2)  # YYMMDDHHMM
-        end_time = datetime.strptime(end_time_str, "%y%m%d%H%M")
-        return end_time
-    except ValueError:
-        return None
+    window = parse_report_filename(filename)
+    return window[1] if window else None
 
-def move_old_reports(obsidian_dir, days_threshold=7):
+def move_old_reports(obsidian_dir, days_threshold=7, manifest=None):
     """
     将超过指定天数的简报文件移动到 Oldsletters 文件夹
     
+    待归档的文件从简报清单中查询，不再遍历整个目录；清单首次使用该目录时会自动导入已有简报。
+    
     Args:
         obsidian_dir: Obsidian 目录路径
         days_threshold: 天数阈值，超过这个天数的文件将被移动
+        manifest: 简报清单，默认使用 config.report_manifest_path
     """
+    manifest = manifest or ReportManifest()
+    
     # 确保 Oldsletters 文件夹存在
     oldsletters_dir = os.path.join(obsidian_dir, "Oldsletters")
     if not os.path.exists(oldsletters_dir):
         os.makedirs(oldsletters_dir)
         logger.info(f"创建 Oldsletters 文件夹: {oldsletters_dir}")
     
-    # 获取当前时间
-    current_time = datetime.now()
-    
     # 计算阈值时间
-    threshold_time = current_time - timedelta(days=days_threshold)
+    threshold_time = datetime.now() - timedelta(days=days_threshold)
     
-    # 遍历 obsidian_dir 下的所有文件
     moved_count = 0
-    for filename in os.listdir(obsidian_dir):
-        # 跳过目录和非简报文件
-        if not filename.endswith('.md') or not filename.startswith('简报_'):
-            continue
-        
+    for filename in manifest.due_for_archive(obsidian_dir, threshold_time):
         file_path = os.path.join(obsidian_dir, filename)
-        
-        # 跳过目录
-        if os.path.isdir(file_path):
+        if not os.path.isfile(file_path):
+            logger.warning(f"清单中的简报已不存在: {filename}")
             continue
         
-        # 解析文件时间
-        file_time = parse_filename_date(filename)
+        # 目标路径
+        target_path = os.path.join(oldsletters_dir, filename)
         
-        if file_time is None:
-            logger.warning(f"无法解析文件名时间: {filename}")
-            continue
+        # 如果目标文件已存在，添加后缀避免冲突
+        counter = 1
+        while os.path.exists(target_path):
+            name, ext = os.path.splitext(filename)
+            target_path = os.path.join(oldsletters_dir, f"{name}_{counter}{ext}")
+            counter += 1
         
-        # 检查文件时间是否超过阈值
-        if file_time < threshold_time:
-            # 目标路径
-            target_path = os.path.join(oldsletters_dir, filename)
-            
-            # 如果目标文件已存在，添加后缀避免冲突
-            counter = 1
-            while os.path.exists(target_path):
-                name, ext = os.path.splitext(filename)
-                target_path = os.path.join(oldsletters_dir, f"{name}_{counter}{ext}")
-                counter += 1
-            
-            # 移动文件
-            try:
-                shutil.move(file_path, target_path)
-                moved_count += 1
-                logger.info(f"移动文件: {filename} -> Oldsletters/")
-            except Exception as e:
-                logger.error(f"移动文件失败 {filename}: {e}")
+        # 移动文件
+        try:
+            shutil.move(file_path, target_path)
+            manifest.mark_archived(obsidian_dir, filename, target_path)
+            moved_count += 1
+            logger.info(f"移动文件: {filename} -> Oldsletters/")
+        except Exception as e:
+            logger.error(f"移动文件失败 {filename}: {e}")
     
     return moved_count
 
@@ -119,10 +85,18 @@ def main():
     project_root = os.path.dirname(script_dir)
     obsidian_dir = os.path.join(project_root, "obsidian-tem")
     
+    parser = argparse.ArgumentParser(description="归档超过一周的 Obsidian 简报")
+    parser.add_argument("--rebuild-manifest", action="store_true", help="手动增删过简报文件后重新扫描目录更新清单")
+    args = parser.parse_args()
+    
     if not os.path.exists(obsidian_dir):
         logger.error(f"Obsidian 目录不存在: {obsidian_dir}")
         return 1
     
+    if args.rebuild_manifest:
+        count = ReportManifest().rebuild(obsidian_dir)
+        logger.info(f"简报清单已重建，共 {count} 份简报")
+    
     logger.info(f"开始管理 Obsidian 简报文件，目录: {obsidian_dir}")
     
     # 移动超过一周的简报
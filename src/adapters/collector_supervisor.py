@@ -0,0 +1,268 @@
+"""
+多进程采集
+采集账号按轮询方式分组，每组在独立的工作进程（spawn 启动）中用自己的事件循环运行 TelegramClientSession：
+连接、分页拉取和转换都在工作进程完成，每个群组拉完后把 MessageRecord 列表通过 multiprocessing 队列发回主进程。
+开启跳过空闲群组时，工作进程先为本组各账号读对话列表，只扫描窗口内有新消息的群组（预计消息多的先开始）。
+主进程是唯一的汇总方：按单进程采集时的顺序（账号、群组）合并批次并把字符串重新登记到同一张表，
+合并作者资料和计数指标，之后由适配器统一去重（结果与单进程一致，不受各进程完成先后影响）；
+入库仍由调用方在主进程完成，SQLite 分库只有一个写入者。
+
+客户端工厂是闭包，不能跨进程传递，工作进程按 TelegramClientModeConfig 重新生成（live/record/replay）。
+同一个 Telethon 会话文件不能被两个进程同时打开，多进程采集时主进程不连接采集账号。
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import traceback
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..authors import AuthorProfile, SenderCache
+from ..batch import MessageBatch
+from ..config import TelegramAccountConfig, TelegramClientModeConfig
+from ..fetch_budget import ChatActivity, ChatFetch, FetchSlots
+from ..metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 一个账号及其要采集的群组
+AccountPlan = Tuple[TelegramAccountConfig, List[str]]
+# 分到工作进程的账号：(账号在全部账号中的序号, 账号, 群组)
+WorkerPlan = Tuple[int, TelegramAccountConfig, List[str]]
+
+# 主进程等待队列的超时（秒），超时后检查是否有工作进程异常退出
+_POLL_INTERVAL = 1.0
+# 全部结果收到后等待工作进程退出的时间（秒）
+_JOIN_TIMEOUT = 5.0
+
+
+def resolve_processes(processes: int, n_accounts: int) -> int:
+    """配置的进程数 → 实际进程数（0 表示按 CPU 核数），不超过账号数"""
+    if processes <= 0:
+        processes = os.cpu_count() or 1
+    return max(1, min(processes, n_accounts))
+
+
+def group_accounts(plan: Sequence[AccountPlan], processes: int) -> List[List[WorkerPlan]]:
+    """按轮询方式把账号分到各进程，编号相邻的账号落在不同进程；每项附带账号在 plan 中的序号"""
+    groups: List[List[WorkerPlan]] = [[] for _ in range(resolve_processes(processes, len(plan)))]
+    for order, (account, chats) in enumerate(plan):
+        groups[order % len(groups)].append((order, account, chats))
+    return [group for group in groups if group]
+
+
+@dataclass
+class WorkerJob:
+    """发给一个工作进程的采集任务（通过 pickle 传递）"""
+    worker_id: int
+    plan: List[WorkerPlan]
+    start_time: datetime
+    end_time: datetime
+    limits: Dict[str, int]  # 群组标识 -> 拉取上限
+    client_mode: TelegramClientModeConfig
+    sender_ttl: float
+    known_authors: List[AuthorProfile] = field(default_factory=list)
+    skip_idle: bool = False
+    watermarks: Dict[str, Dict[str, int]] = field(default_factory=dict)  # 账号 -> {群组标识: 最新消息 ID}
+    fetch_concurrency: int = 0  # 开启预检排序时每个账号同时扫描的群组数上限，0 表示不限
+
+
+async def _run_job(job: WorkerJob, out) -> None:
+    """在工作进程的事件循环中采集本组账号的全部群组"""
+    from .telegram_adapter_v2 import TelegramClientSession
+    from .telegram_replay import make_client_factory
+
+    factory = make_client_factory(job.client_mode)
+    senders = SenderCache(job.sender_ttl)
+    senders.load(job.known_authors)
+    # 本进程内各群组共用一张字符串表，发送时同一个对象在一次 pickle 中只序列化一次
+    strings: Dict[str, str] = {}
+    sessions = [(order, TelegramClientSession(account, client_factory=factory, senders=senders), chats)
+                for order, account, chats in job.plan]
+
+    # 各账号按预计消息数排好的顺序占用名额；没有排序（未开启预检）时所有群组同时扫描
+    slots = FetchSlots(job.fetch_concurrency if job.skip_idle else 0)
+
+    async def fetch(order: int, session, chat_index: int, chat_identifier: str):
+        batch = await slots.run(session.account_config.account_id, session.fetch_records(
+            chat_identifier, job.start_time, job.end_time, job.limits[chat_identifier], strings))
+        if len(batch):
+            out.put(("batch", job.worker_id, (order, chat_index), list(batch)))
+
+    activity: List[ChatActivity] = []
+    try:
+        tasks = [(order, session, index, chat, 0) for order, session, chats in sessions
+                 for index, chat in enumerate(chats)]
+        if job.skip_idle:
+            probes = await asyncio.gather(
+                *(session.scheduled_chats(chats, job.start_time, job.limits,
+                                          job.watermarks.get(session.account_config.account_id))
+                  for _, session, chats in sessions),
+                return_exceptions=True
+            )
+            tasks = []
+            for (order, session, chats), probe in zip(sessions, probes):
+                if isinstance(probe, Exception):
+                    # 预检失败（通常是连接失败）：该账号的群组照常扫描
+                    logger.error(f"对话列表预检失败 (工作进程 {job.worker_id}): {probe}")
+                    probe = [(index, job.limits[chat]) for index, chat in enumerate(chats)], []
+                scheduled, probed = probe
+                tasks.extend((order, session, index, chats[index], expected) for index, expected in scheduled)
+                activity.extend(probed)
+            tasks.sort(key=lambda task: -task[4])
+        results = await asyncio.gather(
+            *(fetch(order, session, index, chat) for order, session, index, chat, _ in tasks),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"采集任务失败 (工作进程 {job.worker_id}): {result}")
+    finally:
+        await asyncio.gather(*(session.disconnect() for _, session, _ in sessions), return_exceptions=True)
+
+    out.put(("done", job.worker_id, senders.drain_dirty(), metrics.to_dict()["counters"], activity))
+
+
+def _worker_main(job: WorkerJob, out) -> None:
+    """工作进程入口"""
+    try:
+        asyncio.run(_run_job(job, out))
+    except BaseException:
+        out.put(("error", job.worker_id, traceback.format_exc()))
+
+
+def _merge_counters(counters: Dict[str, List[Dict]]) -> None:
+    """把工作进程的计数指标累加到主进程（直方图只在各自进程内有效）"""
+    for name, series in counters.items():
+        for item in series:
+            metrics.counter(name, **item["labels"]).inc(item["value"])
+
+
+class CollectorSupervisor:
+    """启动采集工作进程，并在主进程汇总它们发回的批次"""
+
+    def __init__(
+        self,
+        processes: int,
+        client_mode: TelegramClientModeConfig,
+        sender_cache: Optional[SenderCache] = None
+    ):
+        """
+        Args:
+            processes: 工作进程数（0 表示按 CPU 核数），不超过账号数
+            client_mode: 工作进程生成客户端使用的模式配置
+            sender_cache: 主进程的作者资料缓存，用于预热工作进程并合并它们解析到的新资料
+        """
+        self.processes = processes
+        self.client_mode = client_mode
+        self.sender_cache = sender_cache if sender_cache is not None else SenderCache()
+        # 最近一次 collect 中正常结束的工作进程的各群组拉取结果
+        self.fetches: List[ChatFetch] = []
+        # 最近一次 collect 中各工作进程的对话列表预检结果
+        self.activity: List[ChatActivity] = []
+        # fork 会复制主进程的事件循环和已打开的连接，统一使用 spawn
+        self._context = multiprocessing.get_context("spawn")
+
+    async def collect(
+        self,
+        plan: Sequence[AccountPlan],
+        start_time: datetime,
+        end_time: datetime,
+        limits: Dict[str, int],
+        strings: Optional[Dict[str, str]] = None,
+        skip_idle: bool = False,
+        watermarks: Optional[Dict[str, Dict[str, int]]] = None,
+        fetch_concurrency: int = 0
+    ) -> MessageBatch:
+        """
+        各工作进程并发采集，返回合并后的（未去重）批次
+
+        Args:
+            limits: 群组标识 -> 拉取上限
+            skip_idle: 先读对话列表，跳过窗口内没有消息的群组（跳过的群组在 fetches 中记为 0 条）
+            watermarks: 各账号各群组上次的最新消息 ID
+            fetch_concurrency: 开启预检排序时每个账号同时扫描的群组数上限，0 表示不限
+
+        某个工作进程失败时记录错误，它在失败前发回的消息照常保留（不计入 fetches）。
+        """
+        out = self._context.Queue()
+        known_authors = self.sender_cache.profiles()
+        groups = group_accounts(plan, self.processes)
+        workers: Dict[int, multiprocessing.process.BaseProcess] = {}
+        for worker_id, group in enumerate(groups):
+            job = WorkerJob(worker_id, group, start_time, end_time, limits, self.client_mode,
+                            self.sender_cache.ttl, known_authors, skip_idle,
+                            {account.account_id: (watermarks or {}).get(account.account_id, {})
+                             for _, account, _ in group}, fetch_concurrency)
+            process = self._context.Process(target=_worker_main, args=(job, out),
+                                            name=f"collector-worker-{worker_id}", daemon=True)
+            process.start()
+            workers[worker_id] = process
+            logger.info(f"采集工作进程 {worker_id} 已启动 (pid={process.pid})，"
+                        f"账号: {', '.join(account.account_id for _, account, _ in group)}")
+
+        # (账号序号, 群组序号) -> 消息，全部收到后按单进程采集的顺序合并
+        received: Dict[Tuple[int, int], list] = {}
+        self.activity = []
+        finished: List[int] = []
+        pending = set(workers)
+        loop = asyncio.get_running_loop()
+
+        def handle(item) -> None:
+            kind, worker_id = item[0], item[1]
+            if kind == "batch":
+                received[item[2]] = item[3]
+            elif kind == "done":
+                self.sender_cache.merge(item[2])
+                _merge_counters(item[3])
+                self.activity.extend(item[4])
+                finished.append(worker_id)
+                pending.discard(worker_id)
+            else:
+                logger.error(f"采集工作进程 {worker_id} 失败:\n{item[2]}")
+                metrics.counter("collector_worker_failures_total").inc()
+                pending.discard(worker_id)
+
+        try:
+            while pending:
+                try:
+                    item = await loop.run_in_executor(None, out.get, True, _POLL_INTERVAL)
+                except queue.Empty:
+                    # 先记下已退出的进程再取空队列：它们退出前发出的批次和 done 可能还在队列中
+                    exited = [worker_id for worker_id in sorted(pending) if not workers[worker_id].is_alive()]
+                    while True:
+                        try:
+                            handle(out.get_nowait())
+                        except queue.Empty:
+                            break
+                    for worker_id in exited:
+                        if worker_id in pending:
+                            logger.error(f"采集工作进程 {worker_id} 异常退出 (exitcode={workers[worker_id].exitcode})")
+                            metrics.counter("collector_worker_failures_total").inc()
+                            pending.discard(worker_id)
+                    continue
+                handle(item)
+        finally:
+            # join 会阻塞，放到线程池中等待，不占用事件循环
+            for process in workers.values():
+                await loop.run_in_executor(None, process.join, _JOIN_TIMEOUT)
+                if process.is_alive():
+                    process.terminate()
+                    await loop.run_in_executor(None, process.join)
+            out.close()
+
+        self.fetches = [
+            ChatFetch.from_records(chat, account.account_id, limits[chat], received.get((order, index), ()))
+            for worker_id in sorted(finished)
+            for order, account, chats in groups[worker_id]
+            for index, chat in enumerate(chats)
+        ]
+        merged = MessageBatch(strings=strings)
+        for key in sorted(received):
+            merged.extend(received.pop(key))
+        logger.info(f"{len(workers)} 个采集工作进程共发回 {len(merged)} 条消息")
+        return merged
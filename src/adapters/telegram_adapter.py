@@ -43,6 +43,7 @@ class TelegramAdapter:
         抓取指定时间范围内的消息 (UTC)
         """
         unified_messages = []
+        sender_names = {}
         if not self.client.is_connected():
             await self.client.start()
         
@@ -52,6 +53,8 @@ class TelegramAdapter:
                 continue
 
             logger.info(f"Fetching from: {getattr(chat_entity, 'title', chat_identifier)}")
+            # 群组名称取自已解析的实体，发送者名称按 ID 缓存，每条消息不再 await get_chat()/get_sender()
+            chat_name = getattr(chat_entity, 'title', None) or "Private"
             try:
                 # offset_date 是抓取的起点（由于 reverse=True，它是最早的时间）
                 # 但是 Telethon 的 iter_messages 在 reverse=True 时逻辑比较绕
@@ -70,16 +73,19 @@ class TelegramAdapter:
                         continue
 
                     urls = self.extract_urls(msg.text)
+                    if msg.sender_id not in sender_names:
+                        sender = await msg.get_sender()
+                        sender_names[msg.sender_id] = getattr(sender, 'username', None) if sender else "Unknown"
                     unified_msg = UnifiedMessage(
                         id=str(uuid.uuid4()),
                         platform=Platform.TELEGRAM,
                         external_id=str(msg.id),
                         content=msg.text,
                         author_id=str(msg.sender_id),
-                        author_name=(await msg.get_sender()).username if await msg.get_sender() else "Unknown",
+                        author_name=sender_names[msg.sender_id],
                         timestamp=msg_date,
                         chat_id=str(msg.chat_id),
-                        chat_name=(await msg.get_chat()).title if hasattr(await msg.get_chat(), 'title') else "Private",
+                        chat_name=chat_name,
                         urls=urls,
                         raw_metadata={}
                     )
@@ -7,27 +7,94 @@ import asyncio
 import hashlib
 import logging
 import html
-from typing import List, Dict, Optional, Set
-from datetime import datetime
-from dataclasses import dataclass
-
-from telethon import TelegramClient
-from telethon.tl.types import Message as TelethonMessage
-from telethon.errors import FloodWaitError
+import time
+from typing import TYPE_CHECKING, Any, Callable, List, Dict, Optional, Set, Tuple
+from datetime import datetime, timedelta
+from dataclasses import dataclass, field
 
+from ..lazy_imports import lazy_import
 from ..models import UnifiedMessage, Platform
-from ..config import config, TelegramAccountConfig
+from ..authors import SenderCache
+from ..batch import MessageBatch, MessageRecord
+from ..config import config, TelegramAccountConfig, TelegramClientModeConfig
+from .collector_supervisor import CollectorSupervisor, resolve_processes
+from .telegram_replay import RecordedMessage, make_client_factory
+from ..metrics import metrics
+from ..profiling import profiler
+from ..delivery.outbox import Outbox, OutboxWorker, content_key
+from ..fetch_budget import ChatActivity, ChatFetch, FetchSlots, schedule_chats
+from ..delivery.splitter import MAX_MESSAGE_LENGTH, split_message, split_point, utf16_len
+
+if TYPE_CHECKING:
+    from telethon import TelegramClient
+    from telethon.tl.types import Message as TelethonMessage
 
+# telethon 导入约需 0.3 秒，只在真正连接 Telegram 时才加载
+telethon = lazy_import("telethon")
 
 logger = logging.getLogger(__name__)
 
 
+# Telethon 的 iter_messages 每次请求最多返回 100 条，按同样的页大小批量转换
+_ITER_PAGE_SIZE = 100
+
+
+def _chat_display_name(chat) -> str:
+    if hasattr(chat, 'title'):
+        return chat.title
+    if hasattr(chat, 'first_name'):
+        return chat.first_name
+    return "Unknown Chat"
+
+
+def _chat_target(chat_identifier):
+    """配置中的群组标识 → get_entity 使用的目标（@用户名、整数 ID 或原样的字符串）"""
+    target = chat_identifier
+    if isinstance(chat_identifier, str):
+        if chat_identifier.startswith("@"):
+            target = chat_identifier
+        elif chat_identifier.replace("-", "").isdigit():
+            # 纯数字标识符，转为整数
+            target = int(chat_identifier)
+        elif "|" in chat_identifier:
+            # 如果包含了名字，只取最后一部分标识符
+            target = chat_identifier.split("|")[-1].strip()
+            if target.replace("-", "").isdigit():
+                target = int(target)
+    return target
+
+
+def _dialog_keys(dialog) -> List[str]:
+    """对话可以匹配的群组标识：实体 ID、带 -100 前缀的 ID、对话 ID 和小写的 @用户名"""
+    entity = dialog.entity
+    keys = [str(entity.id), f"-100{entity.id}", str(getattr(dialog, "id", entity.id))]
+    username = getattr(entity, "username", None)
+    if username:
+        keys.append(f"@{username}".lower())
+    return keys
+
+
+def _collector_account(message) -> str:
+    """消息来源账号（MessageRecord 直接读属性，UnifiedMessage 读 raw_metadata）"""
+    if isinstance(message, MessageRecord):
+        return message.collector_account or 'unknown'
+    return message.raw_metadata.get('collector_account', 'unknown')
+
+
 @dataclass
 class TelegramClientSession:
     """Telegram 客户端会话管理"""
     account_config: TelegramAccountConfig
-    client: Optional[TelegramClient] = None
+    client: Optional["TelegramClient"] = None
     is_connected: bool = False
+    # 客户端工厂：为 None 时使用真实 TelegramClient，录制/回放模式下由 make_client_factory 提供
+    client_factory: Optional[Callable[[TelegramAccountConfig], Any]] = None
+    # 已解析的聊天实体，常驻进程中复用，避免每次采集都重新解析
+    entity_cache: Dict[str, Any] = field(default_factory=dict)
+    # 会话内按 ID 缓存的群组显示名称，同一群组的消息不再重复检查实体属性
+    chat_names: Dict[int, str] = field(default_factory=dict)
+    # 作者资料缓存（多账号适配器中各会话共用，并持久化到 authors 表）
+    senders: SenderCache = field(default_factory=SenderCache)
     
     async def connect(self):
         """连接到 Telegram"""
@@ -35,11 +102,14 @@ class TelegramClientSession:
             return
             
         try:
-            self.client = TelegramClient(
-                self.account_config.session_name,
-                self.account_config.api_id,
-                self.account_config.api_hash
-            )
+            if self.client_factory is not None:
+                self.client = self.client_factory(self.account_config)
+            else:
+                self.client = telethon.TelegramClient(
+                    self.account_config.session_name,
+                    self.account_config.api_id,
+                    self.account_config.api_hash
+                )
             
             # 定义验证码回调函数 - 交互式输入
             async def code_callback():
@@ -72,6 +142,7 @@ class TelegramClientSession:
         if self.client and self.is_connected:
             await self.client.disconnect()
             self.is_connected = False
+            self.entity_cache.clear()
             logger.info(f"Telegram 客户端 {self.account_config.account_id} 已断开")
     
     async def fetch_messages(
@@ -93,33 +164,103 @@ class TelegramClientSession:
         Returns:
             UnifiedMessage 列表
         """
+        return (await self.fetch_records(chat_identifier, start_time, end_time, limit)).to_unified()
+
+    async def fetch_records(
+        self,
+        chat_identifier: str,
+        start_time: datetime,
+        end_time: datetime,
+        limit: int = 100,
+        strings: Optional[Dict[str, str]] = None
+    ) -> MessageBatch:
+        """
+        获取指定时间范围内的消息（紧凑格式，流水线内部使用）
+
+        Args:
+            strings: 多个群组共用的字符串表，重复的群组名/作者名只保留一份
+        """
         if not self.is_connected:
             await self.connect()
         
-        messages = []
+        account_id = self.account_config.account_id
+        fetch_started = time.perf_counter()
+        messages = MessageBatch(strings=strings)
+        page: List[Tuple["TelethonMessage", datetime]] = []
         try:
-            # 尝试解析标识符，增强容错性
-            target = chat_identifier
-            if isinstance(chat_identifier, str):
-                if chat_identifier.startswith("@"):
-                    target = chat_identifier
-                elif chat_identifier.replace("-", "").isdigit():
-                    # 纯数字标识符，转为整数
-                    target = int(chat_identifier)
-                elif "|" in chat_identifier:
-                    # 如果包含了名字，只取最后一部分标识符
-                    target = chat_identifier.split("|")[-1].strip()
-                    if target.replace("-", "").isdigit():
-                        target = int(target)
+            chat = await self.resolve_chat(chat_identifier)
             
-            # 获取聊天实体
-            targets_to_try = [target]
-            if isinstance(target, int) and target > 0:
-                targets_to_try.append(int(f"-100{target}"))
+            # 获取消息
+            # reverse=False (默认): 从 offset_date 向过去扫描
+            # offset_date: 扫描的起点
+            message_types = (telethon.tl.types.Message, RecordedMessage)
+            async for message in self.client.iter_messages(
+                chat,
+                offset_date=end_time,
+                reverse=False,
+                limit=limit
+            ):
+                if not isinstance(message, message_types):
+                    continue
+                    
+                # 【关键修复】处理时区转换
+                # Telegram 返回的是 UTC 时间，需要转换为本地时间进行比较
+                message_time_utc = message.date
+                # 转换为本地时间 (CST/北京时间)
+                message_time = message_time_utc.astimezone().replace(tzinfo=None)
+                
+                # 如果消息比开始时间还早，说明已经扫完窗口了
+                if message_time < start_time:
+                    logger.debug(f"消息时间 {message_time} 早于开始时间 {start_time}，停止扫描")
+                    break
+                
+                if message_time > end_time:
+                    continue
+                
+                # 按页转换为紧凑记录（时间使用本地时间）
+                page.append((message, message_time))
+                if len(page) >= _ITER_PAGE_SIZE:
+                    self._add_page(messages, page)
+            self._add_page(messages, page)
+                
+            logger.info(f"账号 {self.account_config.account_id} 从 {chat_identifier} 获取到 {len(messages)} 条消息")
             
-            chat = None
-            last_err = None
+            elapsed = time.perf_counter() - fetch_started
+            metrics.histogram("telegram_fetch_seconds", account=account_id, chat=chat_identifier).observe(elapsed)
+            metrics.counter("telegram_messages_fetched_total", account=account_id).inc(len(messages))
+            if elapsed > 0:
+                metrics.histogram("telegram_fetch_messages_per_second", account=account_id).observe(len(messages) / elapsed)
             
+        except telethon.errors.FloodWaitError as e:
+            logger.warning(f"触发 FloodWait ({self.account_config.account_id}): 等待 {e.seconds} 秒")
+            metrics.counter("telegram_flood_waits_total", account=account_id).inc()
+            metrics.counter("telegram_flood_wait_seconds_total", account=account_id).inc(e.seconds)
+            await asyncio.sleep(e.seconds)
+            # 重试一次
+            return await self.fetch_records(chat_identifier, start_time, end_time, limit, strings)
+        except Exception as e:
+            logger.error(f"获取消息失败 {chat_identifier} (账号 {self.account_config.account_id}): {e}")
+            metrics.counter("telegram_fetch_errors_total", account=account_id).inc()
+            # 出错前已拉到的消息照常返回
+            self._add_page(messages, page)
+        
+        return messages
+    
+    async def resolve_chat(self, chat_identifier: str):
+        """解析群组实体（常驻进程中缓存复用），找不到时抛出异常"""
+        # 尝试解析标识符，增强容错性
+        target = _chat_target(chat_identifier)
+        
+        # 获取聊天实体
+        targets_to_try = [target]
+        if isinstance(target, int) and target > 0:
+            targets_to_try.append(int(f"-100{target}"))
+        
+        # 常驻进程中已解析过的实体直接复用
+        chat = self.entity_cache.get(str(chat_identifier))
+        last_err = None
+        
+        if not chat:
             # 1. 尝试直接获取
             for t in targets_to_try:
                 try:
@@ -128,13 +269,13 @@ class TelegramClientSession:
                 except Exception as e:
                     last_err = e
                     continue
-            
+        
             # 2. 如果失败，尝试拉取对话列表刷新缓存后再试
             if not chat:
                 logger.info(f"账号 {self.account_config.account_id} 正在通过对话列表刷新实体缓存...")
                 # 获取所有对话，不仅是刷新缓存，还保留引用
                 dialogs = await self.client.get_dialogs()
-                
+            
                 # 再次尝试直接获取
                 for t in targets_to_try:
                     try:
@@ -143,12 +284,12 @@ class TelegramClientSession:
                             break
                     except Exception:
                         continue
-                
+            
                 # 3. 如果还是失败，手动遍历对话列表查找匹配的ID
                 if not chat:
                     logger.info(f"直接获取失败，正在遍历对话列表查找 ID: {target}...")
                     target_id_str = str(target).replace("-100", "")
-                    
+                
                     for dialog in dialogs:
                         entity = dialog.entity
                         # 检查 ID 是否匹配 (尝试多种格式)
@@ -159,100 +300,183 @@ class TelegramClientSession:
                             chat = entity
                             logger.info(f"通过遍历列表找到了实体: {getattr(entity, 'title', 'Unknown')} (ID: {entity.id})")
                             break
-            
-            if not chat:
-                raise last_err or ValueError(f"无法找到实体: {target}")
-            
-            # 获取消息
-            # reverse=False (默认): 从 offset_date 向过去扫描
-            # offset_date: 扫描的起点
-            async for message in self.client.iter_messages(
-                chat,
-                offset_date=end_time,
-                reverse=False,
-                limit=limit
-            ):
-                if not isinstance(message, TelethonMessage):
-                    continue
-                    
-                # 【关键修复】处理时区转换
-                # Telegram 返回的是 UTC 时间，需要转换为本地时间进行比较
-                message_time_utc = message.date
-                # 转换为本地时间 (CST/北京时间)
-                message_time = message_time_utc.astimezone().replace(tzinfo=None)
-                
-                # 如果消息比开始时间还早，说明已经扫完窗口了
-                if message_time < start_time:
-                    logger.debug(f"消息时间 {message_time} 早于开始时间 {start_time}，停止扫描")
-                    break
-                
-                if message_time > end_time:
-                    continue
-                
-                # 转换为统一消息格式
-                unified_msg = self._convert_to_unified_message(message, chat_identifier)
-                # 确保统一消息里的时间也是本地时间
-                unified_msg.timestamp = message_time
-                messages.append(unified_msg)
-                
-            logger.info(f"账号 {self.account_config.account_id} 从 {chat_identifier} 获取到 {len(messages)} 条消息")
-            
-        except FloodWaitError as e:
-            logger.warning(f"触发 FloodWait ({self.account_config.account_id}): 等待 {e.seconds} 秒")
-            await asyncio.sleep(e.seconds)
-            # 重试一次
-            return await self.fetch_messages(chat_identifier, start_time, end_time, limit)
-        except Exception as e:
-            logger.error(f"获取消息失败 {chat_identifier} (账号 {self.account_config.account_id}): {e}")
         
-        return messages
-    
+        if not chat:
+            raise last_err or ValueError(f"无法找到实体: {target}")
+        self.entity_cache[str(chat_identifier)] = chat
+        return chat
+
+    async def fetch_page(
+        self,
+        chat_identifier: str,
+        start_time: datetime,
+        end_time: datetime,
+        max_id: int = 0,
+        strings: Optional[Dict[str, str]] = None
+    ) -> Tuple[MessageBatch, Optional[int], bool]:
+        """
+        拉取 end_time 之前、ID 小于 max_id 的一页消息（一次请求，补采时逐页记录断点）
+
+        Args:
+            max_id: 上一页最小的消息 ID，0 表示从 end_time 开始
+
+        Returns:
+            (窗口内的消息, 本页最小的消息 ID, 是否已扫完窗口)；FloodWaitError 等异常直接抛出，由调用方限速重试
+        """
+        if not self.is_connected:
+            await self.connect()
+
+        chat = await self.resolve_chat(chat_identifier)
+        batch = MessageBatch(strings=strings)
+        page: List[Tuple["TelethonMessage", datetime]] = []
+        oldest_id: Optional[int] = None
+        count = 0
+        reached_start = False
+        message_types = (telethon.tl.types.Message, RecordedMessage)
+        async for message in self.client.iter_messages(
+            chat, offset_date=end_time, max_id=max_id, limit=_ITER_PAGE_SIZE
+        ):
+            count += 1
+            oldest_id = message.id if oldest_id is None else min(oldest_id, message.id)
+            if not isinstance(message, message_types):
+                continue
+            message_time = message.date.astimezone().replace(tzinfo=None)
+            if message_time < start_time:
+                reached_start = True
+                break
+            if message_time > end_time:
+                continue
+            page.append((message, message_time))
+        self._add_page(batch, page)
+        # 不满一页说明已到群组历史的开头
+        return batch, oldest_id, reached_start or count < _ITER_PAGE_SIZE
+
+    async def probe_dialogs(self, chat_identifiers: List[str]) -> Dict[str, ChatActivity]:
+        """
+        读一次对话列表，取各群组的最新消息（匹配到的实体顺带放进实体缓存，之后扫描时不再 get_entity）
+
+        Returns:
+            {群组标识: ChatActivity}；不在对话列表中的群组（或预检失败时全部群组）不返回，照常扫描
+        """
+        if not self.is_connected:
+            await self.connect()
+
+        account_id = self.account_config.account_id
+        try:
+            dialogs = await self.client.get_dialogs()
+        except Exception as e:
+            logger.warning(f"账号 {account_id} 读取对话列表失败，所有群组照常扫描: {e}")
+            return {}
+
+        by_key = {}
+        for dialog in dialogs:
+            for key in _dialog_keys(dialog):
+                by_key.setdefault(key, dialog)
+
+        activity: Dict[str, ChatActivity] = {}
+        for chat_identifier in chat_identifiers:
+            dialog = by_key.get(str(_chat_target(chat_identifier)).lower())
+            if dialog is None:
+                continue
+            self.entity_cache.setdefault(str(chat_identifier), dialog.entity)
+            top = dialog.message
+            activity[chat_identifier] = ChatActivity(
+                chat_identifier, account_id,
+                top.id if top is not None else None,
+                top.date.astimezone().replace(tzinfo=None) if top is not None else None
+            )
+        return activity
+
+    async def scheduled_chats(
+        self,
+        chat_identifiers: List[str],
+        start_time: datetime,
+        limits: Dict[str, int],
+        watermarks: Optional[Dict[str, int]] = None
+    ) -> Tuple[List[Tuple[int, int]], List[ChatActivity]]:
+        """
+        对话列表预检后要扫描的群组
+
+        Returns:
+            ([(群组序号, 预计消息数)]，预计多的在前；本次预检结果)
+        """
+        activity = await self.probe_dialogs(chat_identifiers)
+        scheduled = schedule_chats(chat_identifiers, activity, start_time, limits, watermarks)
+        skipped = len(chat_identifiers) - len(scheduled)
+        if skipped:
+            account_id = self.account_config.account_id
+            logger.info(f"账号 {account_id} 有 {skipped}/{len(chat_identifiers)} 个群组窗口内没有新消息，跳过扫描")
+            metrics.counter("collector_chats_skipped_idle_total", account=account_id).inc(skipped)
+        return scheduled, list(activity.values())
+
+    def _chat_name(self, message: "TelethonMessage") -> str:
+        """群组名称（按 ID 缓存，实体缺失时不缓存）"""
+        chat_id = message.chat_id
+        chat_name = self.chat_names.get(chat_id)
+        if chat_name is None:
+            chat_name = _chat_display_name(message.chat)
+            if message.chat is not None:
+                self.chat_names[chat_id] = chat_name
+        return chat_name
+
+    def _update_senders(self, messages: List["TelethonMessage"]) -> List[str]:
+        """用这一页消息附带的发送者实体批量更新作者缓存，返回各条消息的作者 ID"""
+        author_ids = [str(message.sender_id) if message.sender_id else "unknown" for message in messages]
+        self.senders.update_from_page(
+            (author_id, message.sender) for author_id, message in zip(author_ids, messages)
+            if message.sender_id and message.sender is not None
+        )
+        return author_ids
+
+    def _add_page(self, batch: MessageBatch, page: List[Tuple["TelethonMessage", datetime]]):
+        """把一页 Telethon 消息（及其本地时间）追加到紧凑批次，追加后清空 page"""
+        if not page:
+            return
+        account_id = self.account_config.account_id
+        id_prefix = f"{account_id}:"
+        author_ids = self._update_senders([message for message, _ in page])
+        author_name = self.senders.name
+        chat_name = self._chat_name
+        add = batch.add
+        for author_id, (message, message_time) in zip(author_ids, page):
+            external_id = str(message.id)
+            entities = message.entities
+            add(
+                id_prefix + external_id,
+                external_id,
+                message.message or "",
+                author_id,
+                author_name(author_id),
+                message_time,
+                str(message.chat_id),
+                chat_name(message),
+                [entity.url for entity in entities if getattr(entity, 'url', None)] if entities else (),
+                account_id,
+                message.views or 0,
+                message.forwards or 0,
+                message.reply_to_msg_id if message.reply_to else None,
+            )
+        page.clear()
+
     def _convert_to_unified_message(
         self,
-        message: TelethonMessage,
+        message: "TelethonMessage",
         source_chat: str
     ) -> UnifiedMessage:
-        """将 Telethon 消息转换为统一消息格式"""
-        
-        # 提取消息文本
-        text = message.message or ""
-        
-        # 提取链接
-        links = []
-        if message.entities:
-            for entity in message.entities:
-                if hasattr(entity, 'url') and entity.url:
-                    links.append(entity.url)
-        
-        # 获取群组/频道名称
-        chat_name = "Unknown Chat"
-        if hasattr(message.chat, 'title'):
-            chat_name = message.chat.title
-        elif hasattr(message.chat, 'first_name'):
-            chat_name = message.chat.first_name
-            
-        # 获取作者名称
-        author_name = "Unknown"
-        if message.sender:
-            if hasattr(message.sender, 'title'):
-                author_name = message.sender.title
-            elif hasattr(message.sender, 'first_name'):
-                first = message.sender.first_name or ""
-                last = getattr(message.sender, 'last_name', "") or ""
-                author_name = f"{first} {last}".strip() or "Unknown"
-
-        # 创建统一消息 (严格匹配 src/models.py)
+        """将 Telethon 消息转换为统一消息格式（名称走缓存）"""
+        author_id, = self._update_senders([message])
+        entities = message.entities
         return UnifiedMessage(
             id=f"{self.account_config.account_id}:{message.id}",
             platform=Platform.TELEGRAM,
             external_id=str(message.id),
-            content=text,
-            author_id=str(message.sender_id) if message.sender_id else "unknown",
-            author_name=author_name,
+            content=message.message or "",
+            author_id=author_id,
+            author_name=self.senders.name(author_id),
             timestamp=message.date.astimezone().replace(tzinfo=None),
             chat_id=str(message.chat_id),
-            chat_name=chat_name,
-            urls=links,
+            chat_name=self._chat_name(message),
+            urls=[entity.url for entity in entities if getattr(entity, 'url', None)] if entities else [],
             raw_metadata={
                 'collector_account': self.account_config.account_id,
                 'views': message.views or 0,
@@ -265,7 +489,8 @@ class TelegramClientSession:
         self,
         text: str,
         channel_identifier: str,
-        parse_mode: str = "HTML"
+        parse_mode: str = "HTML",
+        is_html: bool = False
     ) -> bool:
         """
         发送消息到 Telegram 频道
@@ -274,6 +499,7 @@ class TelegramClientSession:
             text: 消息文本
             channel_identifier: 频道标识符（用户名或ID）
             parse_mode: 解析模式（HTML/Markdown）
+            is_html: text 已经是 Telegram HTML（例如告警），HTML 模式下不再转义
             
         Returns:
             是否发送成功
@@ -282,59 +508,239 @@ class TelegramClientSession:
             await self.connect()
         
         try:
-            # 处理 HTML 转义
-            final_text = text
-            if parse_mode == "HTML":
-                final_text = html.escape(text)
-            
             # 获取频道实体
             channel = await self.client.get_entity(channel_identifier)
             
-            # 分段发送 (Telegram 限制单条消息约 4096 字符)
-            MAX_LENGTH = 4000
-            chunks = [final_text[i:i + MAX_LENGTH] for i in range(0, len(final_text), MAX_LENGTH)]
+            # 按标题/段落边界分段，HTML 模式下先切分再转义 (Telegram 限制单条消息约 4096 字符)
+            html_mode = parse_mode == "HTML"
+            chunks = split_message(text, escape=html_mode and not is_html, is_html=html_mode and is_html)
             
-            for i, chunk in enumerate(chunks):
-                logger.info(f"账号 {self.account_config.account_id} 正在发送消息分片 {i+1}/{len(chunks)} 到频道 {channel_identifier}")
-                await self.client.send_message(
-                    channel,
-                    chunk,
-                    parse_mode=parse_mode
-                )
-                logger.info(f"账号 {self.account_config.account_id} 消息分片 {i+1}/{len(chunks)} 发送成功")
+            with metrics.timer("delivery_seconds", target="telegram"):
+                for i, chunk in enumerate(chunks):
+                    logger.info(f"账号 {self.account_config.account_id} 正在发送消息分片 {i+1}/{len(chunks)} 到频道 {channel_identifier}")
+                    await self.client.send_message(
+                        channel,
+                        chunk,
+                        parse_mode=parse_mode
+                    )
+                    metrics.counter("delivery_messages_sent_total", target="telegram").inc()
+                    logger.info(f"账号 {self.account_config.account_id} 消息分片 {i+1}/{len(chunks)} 发送成功")
             
             return True
             
         except Exception as e:
             logger.error(f"发送消息到频道失败 ({self.account_config.account_id}): {e}")
+            metrics.counter("delivery_failures_total", target="telegram").inc()
             return False
 
+    async def send_part(self, channel_identifier, text: str, parse_mode: Optional[str] = "HTML"):
+        """
+        原样发送一段已转义、已切分的消息（发件箱投递用），失败时抛出异常（包括 FloodWaitError）
+        """
+        if not self.is_connected:
+            await self.connect()
+
+        key = str(channel_identifier)
+        channel = self.entity_cache.get(key)
+        if channel is None:
+            target = int(key) if key.lstrip("-").isdigit() else key
+            channel = await self.client.get_entity(target)
+            self.entity_cache[key] = channel
+        await self.client.send_message(channel, text, parse_mode=parse_mode)
+
+    async def open_channel_stream(
+        self,
+        channel_identifier: str,
+        parse_mode: str = "HTML",
+        min_edit_interval: float = 3.0
+    ) -> "ChannelStreamWriter":
+        """
+        打开一个流式推送通道：先发送一条消息，之后随文本到达不断编辑/续发
+
+        Args:
+            channel_identifier: 频道标识符（用户名或ID）
+            parse_mode: 解析模式（HTML/Markdown）
+            min_edit_interval: 同一条消息两次编辑之间的最小间隔（秒）
+
+        Returns:
+            ChannelStreamWriter 实例
+        """
+        if not self.is_connected:
+            await self.connect()
+
+        channel = await self.client.get_entity(channel_identifier)
+        return ChannelStreamWriter(self, channel, parse_mode, min_edit_interval)
+
+
+class ChannelStreamWriter:
+    """
+    频道流式写入器
+
+    随着 AI 输出不断到达，编辑当前频道消息；超过单条长度上限时结束当前消息并续发新消息。
+    编辑频率受 min_edit_interval 限制，触发 FloodWait 时推迟下一次编辑而不是阻塞生成。
+    """
+
+    MAX_LENGTH = MAX_MESSAGE_LENGTH
+
+    def __init__(self, session: TelegramClientSession, channel, parse_mode: str = "HTML",
+                 min_edit_interval: float = 3.0):
+        self.session = session
+        self.channel = channel
+        self.parse_mode = parse_mode
+        self.min_edit_interval = min_edit_interval
+        # 已经定稿（不会再编辑）的分片及其消息
+        self.sent_message_ids: List[int] = []
+        self._current_message = None
+        self._current_text = ""
+        self._rendered_text = ""
+        self._next_edit_at = 0.0
+
+    def _render(self, text: str) -> str:
+        return html.escape(text) if self.parse_mode == "HTML" else text
+
+    async def append(self, delta: str):
+        """追加一段文本，必要时发送/编辑频道消息"""
+        if not delta:
+            return
+        self._current_text += delta
+
+        # 当前分片超长：按上限切开，前半部分定稿，剩余部分续发新消息
+        while utf16_len(self._render(self._current_text)) > self.MAX_LENGTH:
+            cut = self._split_point(self._current_text)
+            head, tail = self._current_text[:cut], self._current_text[cut:]
+            self._current_text = head
+            await self._flush(force=True)
+            self._current_message = None
+            self._rendered_text = ""
+            self._current_text = tail
+
+        await self._flush(force=False)
+
+    def _split_point(self, text: str) -> int:
+        """在渲染后不超过上限的前提下，优先在标题/段落边界切分（先切原文再转义）"""
+        return split_point(text, self.MAX_LENGTH, escape=self.parse_mode == "HTML")
+
+    async def _flush(self, force: bool):
+        """根据频率限制把当前分片同步到频道"""
+        rendered = self._render(self._current_text)
+        if not rendered.strip() or rendered == self._rendered_text:
+            return
+        now = time.monotonic()
+        if not force and now < self._next_edit_at:
+            return
+
+        client = self.session.client
+        account_id = self.session.account_config.account_id
+        try:
+            if self._current_message is None:
+                self._current_message = await client.send_message(
+                    self.channel, rendered, parse_mode=self.parse_mode
+                )
+                self.sent_message_ids.append(self._current_message.id)
+                metrics.counter("delivery_messages_sent_total", target="telegram_stream").inc()
+                logger.info(f"账号 {account_id} 已开始流式推送分片 {len(self.sent_message_ids)}")
+            else:
+                await client.edit_message(
+                    self.channel, self._current_message, rendered, parse_mode=self.parse_mode
+                )
+                metrics.counter("delivery_stream_edits_total", target="telegram_stream").inc()
+            self._rendered_text = rendered
+            self._next_edit_at = now + self.min_edit_interval
+        except telethon.errors.MessageNotModifiedError:
+            self._rendered_text = rendered
+        except telethon.errors.FloodWaitError as e:
+            logger.warning(f"流式推送触发 FloodWait ({account_id}): {e.seconds} 秒后再编辑")
+            metrics.counter("telegram_flood_waits_total", account=account_id).inc()
+            self._next_edit_at = now + e.seconds
+            if force:
+                await asyncio.sleep(e.seconds)
+                await self._flush(force=True)
+
+    async def finish(self, tail: str = "") -> bool:
+        """追加收尾文本并强制同步最后一个分片"""
+        try:
+            await self.append(tail)
+            await self._flush(force=True)
+            return True
+        except Exception as e:
+            logger.error(f"流式推送收尾失败 ({self.session.account_config.account_id}): {e}")
+            return False
+
+    async def abort(self):
+        """撤回已经发出的分片，用于回退到一次性推送模式"""
+        if not self.sent_message_ids:
+            return
+        try:
+            await self.session.client.delete_messages(self.channel, self.sent_message_ids)
+        except Exception as e:
+            logger.error(f"撤回流式推送消息失败 ({self.session.account_config.account_id}): {e}")
+        self.sent_message_ids = []
+        self._current_message = None
+
 
 class TelegramMultiAccountAdapter:
     """多账号 Telegram 适配器"""
     
-    def __init__(self):
-        """初始化多账号适配器"""
+    def __init__(
+        self,
+        collector_accounts: Optional[List[TelegramAccountConfig]] = None,
+        client_factory: Optional[Callable[[TelegramAccountConfig], Any]] = None,
+        processes: Optional[int] = None,
+        client_mode: Optional[TelegramClientModeConfig] = None
+    ):
+        """
+        初始化多账号适配器
+        
+        Args:
+            collector_accounts: 采集账号列表，默认使用配置中的采集账号
+            client_factory: 客户端工厂，默认根据 TELEGRAM_CLIENT_MODE 选择真实/录制/回放客户端
+            processes: 采集工作进程数，默认使用 COLLECTOR_PROCESSES；大于 1 时各账号组在独立进程中采集
+            client_mode: 客户端模式配置，默认使用 TELEGRAM_CLIENT_MODE 等环境变量
+        """
         self.collector_sessions: Dict[str, TelegramClientSession] = {}
         self.main_session: Optional[TelegramClientSession] = None
+        self.collector_accounts = collector_accounts if collector_accounts is not None else config.collector_accounts
+        self.client_mode = client_mode or config.client_mode_config
+        self.client_factory = client_factory or make_client_factory(self.client_mode)
+        self.processes = resolve_processes(
+            config.collector_config.processes if processes is None else processes, len(self.collector_accounts)
+        )
+        if self.processes > 1 and client_factory is not None:
+            # 注入的工厂只在当前进程有效，工作进程无法使用
+            logger.warning("指定了客户端工厂，多进程采集已关闭，所有账号在当前进程采集")
+            self.processes = 1
+        self._outbox_worker: Optional[OutboxWorker] = None
+        # 最近一次采集中各账号、各群组的拉取结果（用于更新拉取预算和检查截断）
+        self.last_fetches: List[ChatFetch] = []
+        # 采集前先读对话列表，跳过窗口内没有消息的群组
+        self.skip_idle = config.collector_config.skip_idle_chats
+        # 开启预检排序时每个账号同时扫描的群组数上限（0 表示不限），排在前面（预计消息多）的群组先开始
+        self.fetch_concurrency = config.collector_config.fetch_concurrency
+        # 最近一次对话列表预检看到的各群组最新消息（调用方用 FetchBudget.save_watermarks 保存为水位）
+        self.last_activity: List[ChatActivity] = []
+        # 各采集账号共用的作者资料缓存，调用方可用 Storage.load_authors / save_authors 跨运行保存
+        self.sender_cache = SenderCache(config.collector_config.sender_cache_ttl_hours * 3600)
         self._init_sessions()
         
     def _init_sessions(self):
         """初始化所有会话"""
         # 初始化采集账号会话
-        for account_config in config.collector_accounts:
-            self.collector_sessions[account_config.account_id] = TelegramClientSession(account_config)
+        for account_config in self.collector_accounts:
+            self.collector_sessions[account_config.account_id] = TelegramClientSession(
+                account_config, client_factory=self.client_factory, senders=self.sender_cache
+            )
         
         # 初始化主账号会话（用于推送）
-        self.main_session = TelegramClientSession(config.main_account)
+        self.main_session = TelegramClientSession(config.main_account, client_factory=self.client_factory)
     
     async def connect_all(self):
         """连接所有会话"""
         connect_tasks = []
         
-        # 连接采集会话
-        for session in self.collector_sessions.values():
-            connect_tasks.append(session.connect())
+        # 连接采集会话（多进程采集时由各工作进程自己连接，同一个会话文件不能被两个进程同时打开）
+        if self.processes == 1:
+            for session in self.collector_sessions.values():
+                connect_tasks.append(session.connect())
         
         # 连接主会话
         if self.main_session:
@@ -380,14 +786,74 @@ class TelegramMultiAccountAdapter:
         Returns:
             去重后的 UnifiedMessage 列表
         """
+        batch = await self.fetch_batch_concurrently(chat_identifiers, start_time, end_time, limit_per_chat)
+        return batch.to_unified()
+
+    async def fetch_batch_concurrently(
+        self,
+        chat_identifiers: Optional[List[str]] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        limit_per_chat: int = 100,
+        chat_limits: Optional[Dict[str, int]] = None,
+        watermarks: Optional[Dict[str, Dict[str, int]]] = None
+    ) -> MessageBatch:
+        """
+        与 fetch_messages_concurrently 相同，但返回紧凑的 MessageBatch（简报流水线内部使用）
+
+        Args:
+            chat_limits: 按群组标识指定的拉取上限（见 FetchBudget.plan），未指定的群组使用 limit_per_chat
+            watermarks: 各账号各群组上次的最新消息 ID（见 FetchBudget.watermarks），用于估计新增条数、安排扫描顺序
+        """
         if not end_time:
             end_time = datetime.now()
         if not start_time:
             start_time = end_time - timedelta(hours=24)
             
-        all_messages = []
-        fetch_tasks = []
+        plan = self.collection_plan(chat_identifiers)
+        # 所有群组共用一张字符串表
+        strings: Dict[str, str] = {}
+        limits = {chat: (chat_limits or {}).get(chat, limit_per_chat) for _, chats in plan for chat in chats}
+        self.last_fetches = []
+        self.last_activity = []
+        
+        if not plan:
+            logger.info("没有采集任务需要执行")
+            return MessageBatch(strings=strings)
+
+        # 并发执行所有采集任务
+        with metrics.timer("collector_fetch_all_seconds"):
+            if self.processes > 1 and len(plan) > 1:
+                supervisor = CollectorSupervisor(self.processes, self.client_mode, self.sender_cache)
+                all_messages = await supervisor.collect(
+                    [(session.account_config, chats) for session, chats in plan],
+                    start_time, end_time, limits, strings,
+                    skip_idle=self.skip_idle, watermarks=watermarks,
+                    fetch_concurrency=self.fetch_concurrency
+                )
+                self.last_fetches = supervisor.fetches
+                self.last_activity = supervisor.activity
+            else:
+                all_messages = await self._fetch_in_process(plan, start_time, end_time, limits, strings,
+                                                            watermarks or {})
+        
+        # 去重处理
+        with profiler.stage("dedup"):
+            deduplicated_messages = self._deduplicate_messages(all_messages)
+        metrics.counter("collector_messages_raw_total").inc(len(all_messages))
+        metrics.counter("collector_messages_deduplicated_total").inc(len(deduplicated_messages))
+        
+        logger.info(f"采集完成: 原始消息 {len(all_messages)} 条，去重后 {len(deduplicated_messages)} 条")
+        return MessageBatch(deduplicated_messages, strings)
+
+    def monitored_chats(self, chat_identifiers: Optional[List[str]] = None) -> List[str]:
+        """本次采集涉及的群组标识（多个账号采集同一群组时只列一次）"""
+        return list(dict.fromkeys(chat for _, chats in self.collection_plan(chat_identifiers) for chat in chats))
 
+    def collection_plan(self, chat_identifiers: Optional[List[str]] = None
+                         ) -> List[Tuple[TelegramClientSession, List[str]]]:
+        """各采集账号要采集的群组"""
+        plan: List[Tuple[TelegramClientSession, List[str]]] = []
         for account_id, session in self.collector_sessions.items():
             # 确定该账号要采集的群组
             target_chats = []
@@ -404,32 +870,64 @@ class TelegramMultiAccountAdapter:
                 logger.warning(f"账号 {account_id} 没有配置监控群组，跳过")
                 continue
 
-            for chat_identifier in target_chats:
-                fetch_tasks.append(
-                    session.fetch_messages(chat_identifier, start_time, end_time, limit_per_chat)
-                )
-        
-        if not fetch_tasks:
-            logger.info("没有采集任务需要执行")
-            return []
+            plan.append((session, target_chats))
+        return plan
+    
+    async def _fetch_in_process(
+        self,
+        plan: List[Tuple[TelegramClientSession, List[str]]],
+        start_time: datetime,
+        end_time: datetime,
+        limits: Dict[str, int],
+        strings: Dict[str, str],
+        watermarks: Dict[str, Dict[str, int]]
+    ) -> List[MessageRecord]:
+        """在当前事件循环中并发采集全部群组（预计消息多的先开始，结果仍按账号、群组的顺序合并）"""
+        tasks: List[Tuple[int, int, int]] = []  # (账号序号, 群组序号, 预计消息数)
+        if self.skip_idle:
+            probes = await asyncio.gather(*(
+                session.scheduled_chats(target_chats, start_time, limits,
+                                        watermarks.get(session.account_config.account_id))
+                for session, target_chats in plan
+            ), return_exceptions=True)
+            for order, probe in enumerate(probes):
+                if isinstance(probe, Exception):
+                    # 预检失败（通常是连接失败）：该账号的群组照常扫描
+                    logger.error(f"对话列表预检失败: {probe}")
+                    tasks.extend((order, index, limits[chat]) for index, chat in enumerate(plan[order][1]))
+                    continue
+                scheduled, activity = probe
+                tasks.extend((order, index, expected) for index, expected in scheduled)
+                self.last_activity.extend(activity)
+            tasks.sort(key=lambda task: -task[2])
+        else:
+            tasks = [(order, index, 0) for order, (_, target_chats) in enumerate(plan)
+                     for index in range(len(target_chats))]
 
-        # 并发执行所有采集任务
-        results = await asyncio.gather(*fetch_tasks, return_exceptions=True)
+        # 各账号按排好的顺序占用名额；没有排序（未开启预检）时所有群组同时扫描
+        slots = FetchSlots(self.fetch_concurrency if self.skip_idle else 0)
+        results = await asyncio.gather(*(
+            slots.run(plan[order][0].account_config.account_id,
+                      plan[order][0].fetch_records(plan[order][1][index], start_time, end_time,
+                                                   limits[plan[order][1][index]], strings))
+            for order, index, _ in tasks
+        ), return_exceptions=True)
+        by_task = {(order, index): result for (order, index, _), result in zip(tasks, results)}
         
-        # 收集所有消息
-        for result in results:
-            if isinstance(result, Exception):
-                logger.error(f"采集任务失败: {result}")
-                continue
-            if isinstance(result, list):
+        # 收集所有消息（跳过的群组记为拉到 0 条）
+        all_messages: List[MessageRecord] = []
+        for order, (session, target_chats) in enumerate(plan):
+            for index, chat_identifier in enumerate(target_chats):
+                result = by_task.get((order, index), ())
+                if isinstance(result, Exception):
+                    logger.error(f"采集任务失败: {result}")
+                    continue
                 all_messages.extend(result)
-        
-        # 去重处理
-        deduplicated_messages = self._deduplicate_messages(all_messages)
-        
-        logger.info(f"采集完成: 原始消息 {len(all_messages)} 条，去重后 {len(deduplicated_messages)} 条")
-        return deduplicated_messages
-    
+                self.last_fetches.append(ChatFetch.from_records(
+                    chat_identifier, session.account_config.account_id, limits[chat_identifier], result
+                ))
+        return all_messages
+
     def _deduplicate_messages(self, messages: List[UnifiedMessage]) -> List[UnifiedMessage]:
         """
         消息去重
@@ -450,12 +948,12 @@ class TelegramMultiAccountAdapter:
             dedup_key = self._generate_deduplication_key(message)
             
             # 获取消息来源账号
-            collector_account = message.raw_metadata.get('collector_account', 'unknown')
+            collector_account = _collector_account(message)
             
             # 检查是否已存在
             if dedup_key in dedup_map:
                 existing_msg = dedup_map[dedup_key]
-                existing_account = existing_msg.raw_metadata.get('collector_account', 'unknown')
+                existing_account = _collector_account(existing_msg)
                 
                 # 优先保留账号1的消息
                 if collector_account == 'collector1' and existing_account != 'collector1':
@@ -497,10 +995,39 @@ class TelegramMultiAccountAdapter:
         
         return '|'.join(keys)
     
+    @property
+    def outbox_worker(self) -> OutboxWorker:
+        """主账号的发件箱投递器（首次使用时创建，常驻进程中保留各聊天的限速状态）"""
+        if self._outbox_worker is None:
+            self._outbox_worker = OutboxWorker(Outbox(), self.main_session.send_part)
+        return self._outbox_worker
+
+    async def deliver_via_outbox(
+        self,
+        text: str,
+        targets: List,
+        idempotency_key: Optional[str] = None,
+        parse_mode: str = "HTML",
+        kind: str = "report"
+    ) -> bool:
+        """
+        写入发件箱后用主账号投递（顺带续发之前未送达的消息）
+
+        Returns:
+            本条消息是否已送达全部目标；未送达的部分留在发件箱中，下次投递时从断点续发
+        """
+        key = idempotency_key or content_key(text)
+        worker = self.outbox_worker
+        worker.outbox.enqueue(key, text, targets, kind=kind, parse_mode=parse_mode)
+        await worker.drain()
+        statuses = worker.outbox.status_of(key)
+        return all(statuses.get(str(target)) == "sent" for target in targets)
+
     async def send_digest_to_channel(
         self,
         digest_text: str,
-        parse_mode: str = "HTML"
+        parse_mode: str = "HTML",
+        idempotency_key: Optional[str] = None
     ) -> bool:
         """
         发送每日简报到 Telegram 频道
@@ -508,6 +1035,7 @@ class TelegramMultiAccountAdapter:
         Args:
             digest_text: 简报文本
             parse_mode: 解析模式（HTML/Markdown）
+            idempotency_key: 发件箱幂等键，同一份简报重复提交只发送一次；为空时按内容生成
             
         Returns:
             是否发送成功
@@ -522,8 +1050,38 @@ class TelegramMultiAccountAdapter:
             logger.error("未配置频道标识符")
             return False
         
+        if config.outbox_config.enabled:
+            return await self.deliver_via_outbox(digest_text, [channel_identifier], idempotency_key, parse_mode)
         return await self.main_session.send_to_channel(digest_text, channel_identifier, parse_mode)
-    
+
+    async def open_digest_stream(
+        self,
+        parse_mode: str = "HTML",
+        min_edit_interval: float = 3.0
+    ) -> Optional[ChannelStreamWriter]:
+        """
+        打开简报频道的流式推送通道
+
+        Returns:
+            ChannelStreamWriter 实例；无法打开时返回 None，调用方应回退到一次性推送
+        """
+        if not self.main_session:
+            logger.error("主会话未初始化")
+            return None
+
+        channel_identifier = config.push_config.channel_username or config.push_config.channel_id
+        if not channel_identifier:
+            logger.error("未配置频道标识符")
+            return None
+
+        try:
+            return await self.main_session.open_channel_stream(
+                channel_identifier, parse_mode, min_edit_interval
+            )
+        except Exception as e:
+            logger.error(f"打开流式推送通道失败: {e}")
+            return None
+
     async def __aenter__(self):
         """异步上下文管理器入口"""
         await self.connect_all()
@@ -0,0 +1,477 @@
+"""
+Telegram 录制/回放客户端
+录制模式包装真实 TelegramClient，把 get_entity / get_dialogs / iter_messages 的结果写入磁盘；
+回放模式从录制文件返回同样的数据，并可配置延迟、FloodWait 注入和单账号限速，
+用于在不接触生产账号的情况下离线压测采集流程。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import zlib
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+from ..config import config, TelegramAccountConfig, TelegramClientModeConfig
+from ..lazy_imports import lazy_import
+
+telethon = lazy_import("telethon")
+
+
+logger = logging.getLogger(__name__)
+
+_ENTITY_FIELDS = ("title", "first_name", "last_name", "username")
+_UTC = timezone.utc
+
+
+def _as_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    """与 Telethon 一致：不带时区的时间按 UTC 处理"""
+    if dt is None:
+        return None
+    return dt.replace(tzinfo=_UTC) if dt.tzinfo is None else dt.astimezone(_UTC)
+
+
+def _marked_id(entity_id: int, kind: str) -> int:
+    """Telethon 的 chat_id：频道/超级群为 -100 前缀，普通群为负数，用户为正数"""
+    if kind == "Channel":
+        return int(f"-100{entity_id}")
+    if kind == "Chat":
+        return -entity_id
+    return entity_id
+
+
+class RecordedEntity:
+    """
+    录制的实体（群组/频道/用户）
+
+    只设置录制时存在的属性，与 Telethon 实体保持一致：
+    用户没有 title，频道没有 first_name，适配器中的 hasattr 判断因此仍然成立。
+    """
+
+    def __init__(self, id: int, kind: str = "Channel", **fields):
+        self.id = int(id)
+        self.kind = kind
+        for name in _ENTITY_FIELDS:
+            if fields.get(name) is not None:
+                setattr(self, name, fields[name])
+
+    @property
+    def marked_id(self) -> int:
+        return _marked_id(self.id, self.kind)
+
+    def to_dict(self) -> dict:
+        data = {"id": self.id, "kind": self.kind}
+        for name in _ENTITY_FIELDS:
+            if hasattr(self, name):
+                data[name] = getattr(self, name)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RecordedEntity":
+        return cls(**data)
+
+    @classmethod
+    def from_telethon(cls, entity) -> "RecordedEntity":
+        return cls(
+            id=entity.id,
+            kind=type(entity).__name__,
+            **{name: getattr(entity, name, None) for name in _ENTITY_FIELDS}
+        )
+
+
+class RecordedMessage:
+    """录制的消息，提供适配器 _convert_to_unified_message 用到的全部属性"""
+
+    def __init__(self, id: int, chat_id: int, date: datetime, message: str = "",
+                 sender_id: Optional[int] = None, sender: Optional[RecordedEntity] = None,
+                 chat: Optional[RecordedEntity] = None, urls: Optional[List[str]] = None,
+                 views: Optional[int] = None, forwards: Optional[int] = None,
+                 reply_to_msg_id: Optional[int] = None):
+        self.id = int(id)
+        self.chat_id = int(chat_id)
+        self.date = _as_utc(date)
+        self.message = message or ""
+        self.sender_id = sender_id
+        self.sender = sender
+        self.chat = chat
+        self.urls = list(urls or [])
+        self.entities = [SimpleNamespace(url=url) for url in self.urls] or None
+        self.views = views
+        self.forwards = forwards
+        self.reply_to_msg_id = reply_to_msg_id
+        self.reply_to = SimpleNamespace(reply_to_msg_id=reply_to_msg_id) if reply_to_msg_id else None
+
+    @property
+    def text(self) -> str:
+        return self.message
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "chat_id": self.chat_id,
+            "date": self.date.isoformat(),
+            "message": self.message,
+            "sender_id": self.sender_id,
+            "sender": self.sender.to_dict() if self.sender else None,
+            "urls": self.urls,
+            "views": self.views,
+            "forwards": self.forwards,
+            "reply_to_msg_id": self.reply_to_msg_id,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, chat: Optional[RecordedEntity] = None) -> "RecordedMessage":
+        data = dict(data)
+        sender = data.pop("sender", None)
+        return cls(
+            date=datetime.fromisoformat(data.pop("date")),
+            sender=RecordedEntity.from_dict(sender) if sender else None,
+            chat=chat,
+            **data
+        )
+
+    @classmethod
+    def from_telethon(cls, message, chat: Optional[RecordedEntity] = None) -> "RecordedMessage":
+        sender = getattr(message, "sender", None)
+        urls = [e.url for e in (message.entities or []) if getattr(e, "url", None)]
+        return cls(
+            id=message.id,
+            chat_id=message.chat_id,
+            date=message.date,
+            message=message.message or "",
+            sender_id=message.sender_id,
+            sender=RecordedEntity.from_telethon(sender) if sender else None,
+            chat=chat,
+            urls=urls,
+            views=message.views,
+            forwards=message.forwards,
+            reply_to_msg_id=message.reply_to_msg_id if message.reply_to else None,
+        )
+
+
+class RecordedDialog:
+    """录制的对话列表项"""
+
+    def __init__(self, entity: RecordedEntity, date: Optional[datetime] = None,
+                 message: Optional[RecordedMessage] = None, unread_count: int = 0):
+        self.entity = entity
+        self.date = _as_utc(date)
+        self.message = message
+        self.unread_count = unread_count
+
+    @property
+    def id(self) -> int:
+        return self.entity.marked_id
+
+    @property
+    def name(self) -> str:
+        return getattr(self.entity, "title", None) or getattr(self.entity, "first_name", "") or ""
+
+
+class TelegramRecording:
+    """
+    单个账号的录制数据
+
+    文件格式（JSON）：
+        entities: {实体ID: 实体}
+        aliases: {请求时使用的标识符: 实体ID}
+        messages: {实体ID: [消息]}
+        dialogs: [{entity_id, date, top_message_id, unread_count}]
+    """
+
+    def __init__(self):
+        self.entities: Dict[str, RecordedEntity] = {}
+        self.aliases: Dict[str, str] = {}
+        self.messages: Dict[str, Dict[int, RecordedMessage]] = {}
+        self.dialogs: List[dict] = []
+        self._sorted_cache: Dict[str, List[RecordedMessage]] = {}
+
+    def add_entity(self, entity: RecordedEntity, alias: Any = None) -> RecordedEntity:
+        key = str(entity.id)
+        self.entities.setdefault(key, entity)
+        self.aliases[str(entity.id)] = key
+        self.aliases[str(entity.marked_id)] = key
+        if getattr(entity, "username", None):
+            self.aliases[f"@{entity.username}".lower()] = key
+        if alias is not None:
+            self.aliases[str(alias).lower()] = key
+        return self.entities[key]
+
+    def add_message(self, chat: RecordedEntity, message: RecordedMessage):
+        chat = self.add_entity(chat)
+        message.chat = chat
+        self.messages.setdefault(str(chat.id), {})[message.id] = message
+        self._sorted_cache.pop(str(chat.id), None)
+
+    def add_dialog(self, entity: RecordedEntity, date: Optional[datetime] = None,
+                   top_message: Optional[RecordedMessage] = None, unread_count: int = 0):
+        entity = self.add_entity(entity)
+        if top_message is not None:
+            self.add_message(entity, top_message)
+        self.dialogs = [d for d in self.dialogs if d["entity_id"] != str(entity.id)]
+        self.dialogs.append({
+            "entity_id": str(entity.id),
+            "date": _as_utc(date).isoformat() if date else None,
+            "top_message_id": top_message.id if top_message else None,
+            "unread_count": unread_count,
+        })
+
+    def resolve(self, identifier: Any) -> Optional[RecordedEntity]:
+        """按录制时的标识符、实体ID 或带 -100 前缀的ID 查找实体"""
+        if isinstance(identifier, RecordedEntity):
+            return identifier
+        key = self.aliases.get(str(identifier).lower())
+        if key is None and str(identifier).startswith("-100"):
+            key = self.aliases.get(str(identifier)[4:])
+        return self.entities.get(key) if key else None
+
+    def messages_for(self, entity: RecordedEntity) -> List[RecordedMessage]:
+        """实体的全部消息，按ID从新到旧排列"""
+        key = str(entity.id)
+        cached = self._sorted_cache.get(key)
+        if cached is None:
+            cached = sorted(self.messages.get(key, {}).values(), key=lambda m: m.id, reverse=True)
+            self._sorted_cache[key] = cached
+        return cached
+
+    def get_dialogs(self) -> List[RecordedDialog]:
+        dialogs = []
+        for item in self.dialogs:
+            entity = self.entities.get(item["entity_id"])
+            if entity is None:
+                continue
+            top = None
+            if item.get("top_message_id") is not None:
+                top = self.messages.get(item["entity_id"], {}).get(item["top_message_id"])
+            date = datetime.fromisoformat(item["date"]) if item.get("date") else None
+            dialogs.append(RecordedDialog(entity, date, top, item.get("unread_count", 0)))
+        return dialogs
+
+    def to_dict(self) -> dict:
+        return {
+            "entities": {key: entity.to_dict() for key, entity in self.entities.items()},
+            "aliases": self.aliases,
+            "messages": {
+                key: [msg.to_dict() for msg in sorted(msgs.values(), key=lambda m: m.id)]
+                for key, msgs in self.messages.items()
+            },
+            "dialogs": self.dialogs,
+        }
+
+    def save(self, path: str):
+        """原子写入录制文件"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TelegramRecording":
+        recording = cls()
+        if not os.path.exists(path):
+            return recording
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for key, entity in data.get("entities", {}).items():
+            recording.entities[key] = RecordedEntity.from_dict(entity)
+        recording.aliases = dict(data.get("aliases", {}))
+        for key, messages in data.get("messages", {}).items():
+            chat = recording.entities.get(key)
+            recording.messages[key] = {
+                msg["id"]: RecordedMessage.from_dict(msg, chat) for msg in messages
+            }
+        recording.dialogs = list(data.get("dialogs", []))
+        return recording
+
+
+class RecordingClient:
+    """
+    录制客户端：包装真实 TelegramClient，其他方法原样透传
+
+    断开连接时把录制内容写入磁盘；同一文件多次录制会合并。
+    """
+
+    def __init__(self, client, path: str):
+        self._client = client
+        self.path = path
+        self.recording = TelegramRecording.load(path)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    async def get_entity(self, entity):
+        result = await self._client.get_entity(entity)
+        self.recording.add_entity(RecordedEntity.from_telethon(result), alias=entity)
+        return result
+
+    async def get_dialogs(self, *args, **kwargs):
+        dialogs = await self._client.get_dialogs(*args, **kwargs)
+        for dialog in dialogs:
+            entity = RecordedEntity.from_telethon(dialog.entity)
+            top = None
+            if getattr(dialog, "message", None) is not None:
+                top = RecordedMessage.from_telethon(dialog.message, entity)
+            self.recording.add_dialog(entity, dialog.date, top, getattr(dialog, "unread_count", 0))
+        return dialogs
+
+    async def iter_messages(self, entity, *args, **kwargs):
+        chat = RecordedEntity.from_telethon(entity) if hasattr(entity, "id") else None
+        async for message in self._client.iter_messages(entity, *args, **kwargs):
+            message_chat = getattr(message, "chat", None)
+            record_chat = RecordedEntity.from_telethon(message_chat) if message_chat is not None else chat
+            if record_chat is not None and hasattr(message, "date"):
+                self.recording.add_message(record_chat, RecordedMessage.from_telethon(message, record_chat))
+            yield message
+
+    def save(self):
+        self.recording.save(self.path)
+        logger.info(f"Telegram 流量已录制到 {self.path}")
+
+    async def disconnect(self):
+        self.save()
+        return await self._client.disconnect()
+
+
+class ReplayClient:
+    """
+    回放客户端：从录制数据返回结果，不发起任何网络请求
+
+    每次请求（解析实体、拉取对话列表、拉取一页消息）都会经过：
+    单账号限速 -> 固定延迟 -> 按概率注入 FloodWaitError。
+
+    Args:
+        recording: 录制数据
+        latency: 每次请求的延迟（秒）
+        flood_wait_rate: 每次请求触发 FloodWait 的概率
+        flood_wait_seconds: 注入的 FloodWait 时长
+        rate_limit: 每秒最多请求数，0 表示不限
+        seed: FloodWait 注入的随机种子
+    """
+
+    PAGE_SIZE = 100
+
+    def __init__(self, recording: TelegramRecording, latency: float = 0.0, flood_wait_rate: float = 0.0,
+                 flood_wait_seconds: int = 1, rate_limit: float = 0.0, seed: int = 0):
+        self.recording = recording
+        self.latency = latency
+        self.flood_wait_rate = flood_wait_rate
+        self.flood_wait_seconds = flood_wait_seconds
+        self.rate_limit = rate_limit
+        self._rng = random.Random(seed)
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+        self.requests = 0
+        self.flood_waits = 0
+
+    async def start(self, *args, **kwargs):
+        return self
+
+    async def connect(self):
+        return None
+
+    async def disconnect(self):
+        return None
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def _request(self):
+        if self.rate_limit > 0:
+            async with self._lock:
+                now = time.monotonic()
+                wait = self._next_slot - now
+                self._next_slot = max(now, self._next_slot) + 1.0 / self.rate_limit
+            if wait > 0:
+                await asyncio.sleep(wait)
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        self.requests += 1
+        if self.flood_wait_rate > 0 and self._rng.random() < self.flood_wait_rate:
+            self.flood_waits += 1
+            raise telethon.errors.FloodWaitError(request=None, capture=self.flood_wait_seconds)
+
+    async def get_entity(self, entity):
+        await self._request()
+        result = self.recording.resolve(entity)
+        if result is None:
+            raise ValueError(f'Cannot find any entity corresponding to "{entity}"')
+        return result
+
+    async def get_dialogs(self, limit: Optional[int] = None, **kwargs) -> List[RecordedDialog]:
+        dialogs = self.recording.get_dialogs()
+        for _ in range(max(1, (len(dialogs) + self.PAGE_SIZE - 1) // self.PAGE_SIZE)):
+            await self._request()
+        return dialogs[:limit] if limit else dialogs
+
+    async def iter_messages(self, entity, limit: Optional[int] = None, offset_date: Optional[datetime] = None,
+                            reverse: bool = False, min_id: int = 0, max_id: int = 0, **kwargs):
+        """与 Telethon 语义一致：默认从新到旧，offset_date 之前；reverse=True 时从旧到新，offset_date 之后"""
+        chat = self.recording.resolve(entity)
+        if chat is None:
+            raise ValueError(f'Cannot find any entity corresponding to "{entity}"')
+        offset = _as_utc(offset_date)
+
+        messages = self.recording.messages_for(chat)
+        if reverse:
+            messages = [m for m in reversed(messages) if offset is None or m.date > offset]
+        elif offset is not None:
+            messages = [m for m in messages if m.date < offset]
+        if min_id:
+            messages = [m for m in messages if m.id > min_id]
+        if max_id:
+            messages = [m for m in messages if m.id < max_id]
+        if limit is not None:
+            messages = messages[:limit]
+
+        for page_start in range(0, len(messages) or 1, self.PAGE_SIZE):
+            await self._request()
+            for message in messages[page_start:page_start + self.PAGE_SIZE]:
+                yield message
+
+
+def recording_path(account_config: TelegramAccountConfig, recording_dir: Optional[str] = None) -> str:
+    recording_dir = recording_dir or config.client_mode_config.recording_dir
+    return os.path.join(recording_dir, f"{account_config.account_id}.json")
+
+
+def make_client_factory(mode_config: Optional[TelegramClientModeConfig] = None
+                        ) -> Optional[Callable[[TelegramAccountConfig], Any]]:
+    """
+    根据客户端模式生成 TelegramClientSession 使用的客户端工厂
+
+    Returns:
+        live 模式返回 None（使用真实 TelegramClient）；record/replay 模式返回工厂函数
+    """
+    mode_config = mode_config or config.client_mode_config
+    mode = mode_config.mode
+
+    if mode == "record":
+        def record_factory(account_config: TelegramAccountConfig):
+            client = telethon.TelegramClient(account_config.session_name, account_config.api_id, account_config.api_hash)
+            return RecordingClient(client, recording_path(account_config, mode_config.recording_dir))
+        return record_factory
+
+    if mode == "replay":
+        def replay_factory(account_config: TelegramAccountConfig):
+            path = recording_path(account_config, mode_config.recording_dir)
+            if not os.path.exists(path):
+                logger.warning(f"账号 {account_config.account_id} 没有录制文件 {path}，回放结果将为空")
+            return ReplayClient(
+                TelegramRecording.load(path),
+                latency=mode_config.replay_latency,
+                flood_wait_rate=mode_config.replay_flood_wait_rate,
+                flood_wait_seconds=mode_config.replay_flood_wait_seconds,
+                rate_limit=mode_config.replay_rate_limit,
+                # 每个账号使用不同但稳定的随机序列
+                seed=mode_config.replay_seed + zlib.crc32(account_config.account_id.encode("utf-8")),
+            )
+        return replay_factory
+
+    if mode != "live":
+        logger.warning(f"未知的 TELEGRAM_CLIENT_MODE: {mode}，使用真实客户端")
+    return None
@@ -0,0 +1,118 @@
+"""
+发送者资料缓存
+按作者 ID 缓存显示名称、用户名和是否机器人，在每页历史消息转换前用这一页消息附带的发送者实体批量更新，
+转换时不再逐条检查 message.sender。资料超过 TTL 后遇到新的实体才刷新（过期资料在刷新前照常使用）。
+
+缓存通过 Storage.load_authors / save_authors 持久化到分库的 authors 表，消息行只保存 author_id。
+多进程采集时每个工作进程各有一份缓存，采集结束后由主进程 merge 回来统一保存。
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 没有发送者实体时的占位名称
+UNKNOWN_AUTHOR = "Unknown"
+
+
+def display_name(entity) -> str:
+    """用户取“名 姓”，频道/群组以自身身份发言时取标题"""
+    if not entity:
+        return UNKNOWN_AUTHOR
+    if hasattr(entity, 'title'):
+        return entity.title
+    if hasattr(entity, 'first_name'):
+        first = entity.first_name or ""
+        last = getattr(entity, 'last_name', "") or ""
+        return f"{first} {last}".strip() or UNKNOWN_AUTHOR
+    return UNKNOWN_AUTHOR
+
+
+@dataclass
+class AuthorProfile:
+    """作者资料（对应 authors 表的一行）"""
+    author_id: str
+    display_name: str
+    username: Optional[str] = None
+    is_bot: bool = False
+    updated_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_entity(cls, author_id: str, entity, updated_at: Optional[float] = None) -> "AuthorProfile":
+        return cls(
+            author_id=author_id,
+            display_name=display_name(entity),
+            username=getattr(entity, 'username', None),
+            is_bot=bool(getattr(entity, 'bot', False)),
+            updated_at=time.time() if updated_at is None else updated_at,
+        )
+
+
+class SenderCache:
+    """作者 ID -> 资料，多个采集会话共用"""
+
+    def __init__(self, ttl: float = 7 * 24 * 3600, clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.clock = clock
+        self._profiles: Dict[str, AuthorProfile] = {}
+        self._dirty: Dict[str, AuthorProfile] = {}
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def get(self, author_id: str) -> Optional[AuthorProfile]:
+        return self._profiles.get(author_id)
+
+    def name(self, author_id: str) -> str:
+        profile = self._profiles.get(author_id)
+        return profile.display_name if profile is not None else UNKNOWN_AUTHOR
+
+    def is_fresh(self, author_id: str) -> bool:
+        profile = self._profiles.get(author_id)
+        return profile is not None and self.clock() - profile.updated_at < self.ttl
+
+    def update_from_page(self, senders: Iterable[Tuple[str, object]]) -> int:
+        """
+        用一页消息附带的发送者实体批量更新缓存
+
+        Args:
+            senders: (作者 ID, 发送者实体) 序列，同一作者可以重复出现
+
+        Returns:
+            新增或刷新的资料数量
+        """
+        now = self.clock()
+        updated = 0
+        for author_id, entity in senders:
+            profile = self._profiles.get(author_id)
+            if entity is None or (profile is not None and now - profile.updated_at < self.ttl):
+                continue
+            profile = AuthorProfile.from_entity(author_id, entity, now)
+            self._profiles[author_id] = self._dirty[author_id] = profile
+            updated += 1
+        return updated
+
+    def load(self, profiles: Iterable[AuthorProfile]):
+        """载入上次运行持久化的资料（不标记为待保存）"""
+        for profile in profiles:
+            self._profiles[profile.author_id] = profile
+
+    def merge(self, profiles: Iterable[AuthorProfile]) -> int:
+        """合并其他采集进程解析到的资料（较新的覆盖较旧的，并标记为待保存），返回合并的数量"""
+        merged = 0
+        for profile in profiles:
+            current = self._profiles.get(profile.author_id)
+            if current is not None and current.updated_at >= profile.updated_at:
+                continue
+            self._profiles[profile.author_id] = self._dirty[profile.author_id] = profile
+            merged += 1
+        return merged
+
+    def profiles(self) -> List[AuthorProfile]:
+        """当前缓存的全部资料（用于预热工作进程的缓存）"""
+        return list(self._profiles.values())
+
+    def drain_dirty(self) -> List[AuthorProfile]:
+        """取出自上次保存以来新增或刷新的资料"""
+        dirty, self._dirty = list(self._dirty.values()), {}
+        return dirty
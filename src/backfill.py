@@ -0,0 +1,384 @@
+"""
+历史窗口补采
+process_24h_report 按上次启动时间确定窗口，停机超过 120 小时只采最近 48 小时，中间的消息不会入库。
+这里按任意时间范围逐个群组向过去翻页拉取历史，直接写入消息时间所在月份的分库（data/raw_messages_YYYY_MM.db）：
+
+- 每页（一次 iter_messages 请求，最多 100 条）写入分库后记录断点（上一页最小的消息 ID），
+  中断或崩溃后重新运行同一范围会从断点继续；写入按 internal_id 去重，断点前重复拉到的一页不会重复入库
+- 同一账号的请求串行并按 BACKFILL_REQUEST_INTERVAL 限速；触发 FloodWait 时等待服务器要求的时间并把间隔加倍，
+  之后连续成功若干页再逐步缩回；不同账号并行
+- 多个账号都能看到的群组只由排在前面的账号补采（与去重时优先账号 1 一致），断点记录补采账号，续采时沿用
+
+用法：
+    python -m src.backfill --start 2026-01-01 --end 2026-01-08            # 补采全部监控群组
+    python -m src.backfill --start 2026-01-01 --end 2026-01-08 --chat @name
+    python -m src.backfill --status                                       # 查看各群组的补采进度
+"""
+
+import asyncio
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from loguru import logger
+
+from src.config import config
+from src.lazy_imports import lazy_import
+from src.metrics import metrics
+from src.storage import Storage, shard_path
+
+telethon = lazy_import("telethon")
+
+# 触发 FloodWait 后请求间隔的放大倍数和上限（秒）
+_BACKOFF = 2.0
+_MAX_INTERVAL = 60.0
+# 连续成功多少页后把间隔缩回一半（不低于配置值）
+_RECOVER_PAGES = 20
+# 单页失败（FloodWait 之外的错误）的重试次数，超过后该群组记为失败，下次从断点继续
+_MAX_RETRIES = 3
+
+
+class RequestThrottle:
+    """单个账号的请求节流：两次请求至少间隔 interval 秒，FloodWait 后放大间隔"""
+
+    def __init__(self, interval: float, max_interval: float = _MAX_INTERVAL):
+        self.base_interval = interval
+        self.interval = interval
+        self.max_interval = max_interval
+        self._next_at = 0.0
+        self._calm_pages = 0
+
+    async def wait(self):
+        """等到允许发出下一次请求"""
+        delay = self._next_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._next_at = time.monotonic() + self.interval
+
+    def flood_wait(self, seconds: float):
+        """服务器要求等待 seconds 秒：下一次请求推迟到那之后，之后的间隔加倍"""
+        self.interval = min(self.max_interval, max(self.interval * _BACKOFF, self.base_interval))
+        self._next_at = time.monotonic() + seconds
+        self._calm_pages = 0
+
+    def success(self):
+        """一页成功：连续成功足够多页后逐步缩回间隔"""
+        self._calm_pages += 1
+        if self._calm_pages >= _RECOVER_PAGES and self.interval > self.base_interval:
+            self.interval = max(self.base_interval, self.interval / _BACKOFF)
+            self._calm_pages = 0
+
+
+class BackfillCheckpoints:
+    """补采断点（SQLite），每个群组每个时间范围一行，每拉完一页更新一次"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        db_path = db_path or config.collector_config.backfill_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS backfill_jobs (
+                    chat TEXT NOT NULL,
+                    start_time TEXT NOT NULL,
+                    end_time TEXT NOT NULL,
+                    account_id TEXT NOT NULL,
+                    max_id INTEGER NOT NULL DEFAULT 0,
+                    oldest TEXT,
+                    pages INTEGER NOT NULL DEFAULT 0,
+                    fetched INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    error TEXT,
+                    created_at REAL,
+                    updated_at REAL,
+                    PRIMARY KEY (chat, start_time, end_time)
+                )
+            """)
+            conn.commit()
+
+    @staticmethod
+    def _key(chat: str, start_time: datetime, end_time: datetime) -> tuple:
+        return chat, start_time.isoformat(), end_time.isoformat()
+
+    def get(self, chat: str, start_time: datetime, end_time: datetime) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM backfill_jobs WHERE chat = ? AND start_time = ? AND end_time = ?",
+                               self._key(chat, start_time, end_time)).fetchone()
+        return dict(row) if row else None
+
+    def begin(self, chat: str, account_id: str, start_time: datetime, end_time: datetime) -> Dict:
+        """登记一个补采任务（已有断点时原样返回）"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT OR IGNORE INTO backfill_jobs (chat, start_time, end_time, account_id, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (*self._key(chat, start_time, end_time), account_id, now, now))
+            conn.commit()
+        return self.get(chat, start_time, end_time)
+
+    def restart(self, chat: str, account_id: str, start_time: datetime, end_time: datetime) -> Dict:
+        """换账号补采：其他账号的消息 ID 不通用，从头开始"""
+        with self._connect() as conn:
+            conn.execute("""
+                UPDATE backfill_jobs SET account_id = ?, max_id = 0, oldest = NULL, status = 'running',
+                    error = NULL, updated_at = ?
+                WHERE chat = ? AND start_time = ? AND end_time = ?
+            """, (account_id, time.time(), *self._key(chat, start_time, end_time)))
+            conn.commit()
+        return self.get(chat, start_time, end_time)
+
+    def advance(self, chat: str, start_time: datetime, end_time: datetime, max_id: int,
+                oldest: Optional[datetime], fetched: int, done: bool):
+        """一页已写入分库：记录新的断点"""
+        with self._connect() as conn:
+            conn.execute("""
+                UPDATE backfill_jobs SET max_id = ?, oldest = COALESCE(?, oldest), pages = pages + 1,
+                    fetched = fetched + ?, status = ?, error = NULL, updated_at = ?
+                WHERE chat = ? AND start_time = ? AND end_time = ?
+            """, (max_id, oldest.isoformat() if oldest else None, fetched, "done" if done else "running",
+                  time.time(), *self._key(chat, start_time, end_time)))
+            conn.commit()
+
+    def fail(self, chat: str, start_time: datetime, end_time: datetime, error: str):
+        with self._connect() as conn:
+            conn.execute("""
+                UPDATE backfill_jobs SET status = 'failed', error = ?, updated_at = ?
+                WHERE chat = ? AND start_time = ? AND end_time = ?
+            """, (error, time.time(), *self._key(chat, start_time, end_time)))
+            conn.commit()
+
+    def jobs(self, status: Optional[str] = None) -> List[Dict]:
+        """全部补采任务，最近更新的在前"""
+        query = "SELECT * FROM backfill_jobs"
+        params = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        query += " ORDER BY updated_at DESC, chat"
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(query, params).fetchall()]
+
+
+@dataclass
+class BackfillResult:
+    """一个群组本次补采的结果"""
+    chat: str
+    account_id: str
+    status: str  # done / failed
+    pages: int = 0  # 本次运行拉取的页数
+    fetched: int = 0  # 本次运行写入的消息数
+    resumed: bool = False  # 是否从之前的断点继续
+    error: Optional[str] = None
+
+
+class BackfillEngine:
+    """按时间范围补采历史消息，逐页记录断点并写入对应月份的分库"""
+
+    def __init__(
+        self,
+        adapter,
+        checkpoints: Optional[BackfillCheckpoints] = None,
+        data_dir: str = "data",
+        request_interval: Optional[float] = None
+    ):
+        """
+        Args:
+            adapter: TelegramMultiAccountAdapter（使用其采集会话，会话在第一次请求时连接）
+            checkpoints: 断点存储，默认 BACKFILL_PATH
+            data_dir: 按月分库所在目录
+            request_interval: 同一账号两次请求之间的最小间隔（秒），默认 BACKFILL_REQUEST_INTERVAL
+        """
+        self.adapter = adapter
+        self.checkpoints = checkpoints or BackfillCheckpoints()
+        self.data_dir = data_dir
+        self.request_interval = (config.collector_config.backfill_request_interval
+                                 if request_interval is None else request_interval)
+        self._storages: Dict[str, Storage] = {}
+
+    async def run(
+        self,
+        start_time: datetime,
+        end_time: datetime,
+        chat_identifiers: Optional[List[str]] = None
+    ) -> List[BackfillResult]:
+        """
+        补采 [start_time, end_time]（本地时间）内的消息
+
+        Args:
+            chat_identifiers: 要补采的群组，默认各账号的监控群组
+        """
+        sessions = {}
+        owners: Dict[str, str] = {}  # 群组 -> 计划中第一个能看到它的账号
+        for session, chats in self.adapter.collection_plan(chat_identifiers):
+            account_id = session.account_config.account_id
+            sessions[account_id] = session
+            for chat in chats:
+                owners.setdefault(chat, account_id)
+
+        assigned: Dict[str, List[str]] = {}
+        for chat, owner in owners.items():
+            # 续采沿用断点记录的账号（其他账号的消息 ID 不通用）
+            checkpoint = self.checkpoints.get(chat, start_time, end_time)
+            if checkpoint and checkpoint["account_id"] in sessions:
+                owner = checkpoint["account_id"]
+            assigned.setdefault(owner, []).append(chat)
+
+        results = await asyncio.gather(*(
+            self._run_account(sessions[account_id], chats, start_time, end_time)
+            for account_id, chats in assigned.items()
+        ))
+        flat = [result for account_results in results for result in account_results]
+        failed = [result for result in flat if result.status != "done"]
+        logger.info(f"补采完成: {len(flat)} 个群组，{sum(r.pages for r in flat)} 页，"
+                    f"写入 {sum(r.fetched for r in flat)} 条，失败 {len(failed)} 个")
+        return flat
+
+    async def _run_account(self, session, chats: Sequence[str], start_time: datetime,
+                           end_time: datetime) -> List[BackfillResult]:
+        """同一账号的群组依次补采，共用一个节流器"""
+        throttle = RequestThrottle(self.request_interval)
+        return [await self._backfill_chat(session, chat, start_time, end_time, throttle) for chat in chats]
+
+    async def _backfill_chat(self, session, chat: str, start_time: datetime, end_time: datetime,
+                             throttle: RequestThrottle) -> BackfillResult:
+        account_id = session.account_config.account_id
+        checkpoint = self.checkpoints.begin(chat, account_id, start_time, end_time)
+        if checkpoint["account_id"] != account_id:
+            logger.warning(f"群组 {chat} 的断点属于账号 {checkpoint['account_id']}，改由 {account_id} 从头补采")
+            checkpoint = self.checkpoints.restart(chat, account_id, start_time, end_time)
+        result = BackfillResult(chat, account_id, checkpoint["status"], resumed=checkpoint["max_id"] > 0)
+        if checkpoint["status"] == "done":
+            logger.info(f"群组 {chat} 已补采完成，跳过")
+            return result
+
+        max_id = checkpoint["max_id"]
+        if result.resumed:
+            logger.info(f"群组 {chat} 从断点继续补采（消息 ID < {max_id}，已写入 {checkpoint['fetched']} 条）")
+        retries = 0
+        while True:
+            await throttle.wait()
+            try:
+                batch, oldest_id, done = await session.fetch_page(chat, start_time, end_time, max_id)
+                self._write(batch)
+            except telethon.errors.FloodWaitError as e:
+                throttle.flood_wait(e.seconds)
+                logger.warning(f"补采触发 FloodWait ({account_id}): 等待 {e.seconds} 秒，"
+                               f"请求间隔调整为 {throttle.interval:.1f} 秒")
+                metrics.counter("backfill_flood_waits_total", account=account_id).inc()
+                continue
+            except Exception as e:
+                retries += 1
+                if retries <= _MAX_RETRIES:
+                    logger.warning(f"补采 {chat} 失败 (账号 {account_id}，第 {retries} 次): {e}")
+                    # 按请求间隔线性退避后重试
+                    await asyncio.sleep(throttle.interval * retries)
+                    continue
+                logger.error(f"补采 {chat} 失败，下次从断点继续 (账号 {account_id}): {e}")
+                metrics.counter("backfill_failures_total", account=account_id).inc()
+                self.checkpoints.fail(chat, start_time, end_time, str(e))
+                result.status, result.error = "failed", str(e)
+                return result
+
+            retries = 0
+            throttle.success()
+            done = done or oldest_id is None
+            max_id = oldest_id if oldest_id is not None else max_id
+            oldest = min((record.timestamp for record in batch), default=None)
+            self.checkpoints.advance(chat, start_time, end_time, max_id, oldest, len(batch), done)
+            result.pages += 1
+            result.fetched += len(batch)
+            metrics.counter("backfill_pages_total", account=account_id).inc()
+            metrics.counter("backfill_messages_total", account=account_id).inc(len(batch))
+            if done:
+                break
+
+        result.status = "done"
+        logger.info(f"群组 {chat} 补采完成: 本次 {result.pages} 页，写入 {result.fetched} 条 (账号 {account_id})")
+        return result
+
+    def _write(self, batch):
+        """按消息时间写入对应月份的分库，写入失败时抛出异常（不推进断点）"""
+        by_shard: Dict[str, list] = {}
+        for message in batch.to_unified():
+            by_shard.setdefault(shard_path(message.timestamp, self.data_dir), []).append(message)
+        for path, messages in by_shard.items():
+            storage = self._storages.get(path)
+            if storage is None:
+                storage = self._storages[path] = Storage(path)
+            if storage.save_messages(messages) != len(messages):
+                raise RuntimeError(f"写入分库失败: {path}")
+
+
+def _parse_time(value: str) -> datetime:
+    """ISO 日期或日期时间（本地时间）"""
+    return datetime.fromisoformat(value)
+
+
+def main() -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="按时间范围补采历史消息（可断点续采）")
+    parser.add_argument("--start", type=_parse_time, help="开始时间（本地时间，如 2026-01-01 或 2026-01-01T08:00）")
+    parser.add_argument("--end", type=_parse_time, help="结束时间（本地时间），默认现在")
+    parser.add_argument("--chat", action="append", help="只补采指定群组，可重复；默认各账号的监控群组")
+    parser.add_argument("--interval", type=float, help="同一账号两次请求之间的最小间隔（秒），默认 BACKFILL_REQUEST_INTERVAL")
+    parser.add_argument("--db", help="断点数据库路径，默认 BACKFILL_PATH")
+    parser.add_argument("--data-dir", default="data", help="按月分库所在目录")
+    parser.add_argument("--status", action="store_true", help="查看各群组的补采进度")
+    args = parser.parse_args()
+
+    checkpoints = BackfillCheckpoints(args.db)
+    if args.status:
+        jobs = checkpoints.jobs()
+        if not jobs:
+            print("还没有补采任务")
+            return 0
+        print(f"{'群组':<32} {'账号':<12} {'范围':<33} {'页数':>5} {'条数':>7} 状态")
+        for job in jobs:
+            span = f"{job['start_time'][:16]} ~ {job['end_time'][:16]}"
+            print(f"{job['chat'][:32]:<32} {job['account_id']:<12} {span:<33} {job['pages']:>5} {job['fetched']:>7} "
+                  f"{job['status']}{' (' + job['error'] + ')' if job['error'] else ''}")
+        return 0
+
+    if args.start is None:
+        parser.error("需要 --start（或使用 --status 查看进度）")
+    end_time = args.end or datetime.now()
+    if args.start >= end_time:
+        parser.error("--start 必须早于 --end")
+
+    from src.adapters.telegram_adapter_v2 import TelegramMultiAccountAdapter
+
+    async def run() -> List[BackfillResult]:
+        # 补采在当前进程逐页进行，不使用采集工作进程
+        adapter = TelegramMultiAccountAdapter(processes=1)
+        try:
+            engine = BackfillEngine(adapter, checkpoints, args.data_dir, args.interval)
+            return await engine.run(args.start, end_time, args.chat)
+        finally:
+            await adapter.disconnect_all()
+
+    results = asyncio.run(run())
+    for result in results:
+        mark = "✅" if result.status == "done" else "❌"
+        print(f"{mark} {result.chat} ({result.account_id}): 本次 {result.pages} 页，写入 {result.fetched} 条"
+              f"{'，从断点继续' if result.resumed else ''}{'，' + result.error if result.error else ''}")
+    return 0 if all(result.status == "done" for result in results) else 1
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+紧凑的消息批次
+采集窗口内的消息在流水线内部用 MessageRecord（__slots__，无 raw_metadata 字典、链接存为元组）表示，
+群组名、群组 ID、作者等重复字符串在批次内只保留一份。只在对外接口处（fetch_messages 等）转换为 UnifiedMessage。
+
+MessageRecord 提供流水线用到的 UnifiedMessage 属性（content、chat_name、timestamp、raw_metadata、model_copy 等），
+过滤、压缩、聚类、分块、提及统计和入库都可以直接使用。
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from src.models import Platform, UnifiedMessage
+
+_METADATA_KEYS = ("collector_account", "views", "forwards", "reply_to")
+
+
+class MessageRecord:
+    """一条消息（只读约定：修改内容请用 model_copy）"""
+
+    __slots__ = ("id", "external_id", "content", "author_id", "author_name", "timestamp", "chat_id", "chat_name",
+                 "urls", "collector_account", "views", "forwards", "reply_to")
+
+    platform = Platform.TELEGRAM
+    summary = None
+    tags = ()
+
+    def __init__(self, id: str, external_id: str, content: str, author_id: str, author_name: str,
+                 timestamp: datetime, chat_id: str, chat_name: Optional[str] = None, urls: Sequence[str] = (),
+                 collector_account: Optional[str] = None, views: int = 0, forwards: int = 0,
+                 reply_to: Optional[int] = None):
+        self.id = id
+        self.external_id = external_id
+        self.content = content
+        self.author_id = author_id
+        self.author_name = author_name
+        self.timestamp = timestamp
+        self.chat_id = chat_id
+        self.chat_name = chat_name
+        self.urls = tuple(urls)
+        self.collector_account = collector_account
+        self.views = views
+        self.forwards = forwards
+        self.reply_to = reply_to
+
+    @property
+    def raw_metadata(self) -> Dict:
+        """与 UnifiedMessage.raw_metadata 相同的字典（每次访问新建，热路径请直接读属性）"""
+        metadata = {key: getattr(self, key) for key in _METADATA_KEYS}
+        if metadata["collector_account"] is None:
+            del metadata["collector_account"]
+        return metadata
+
+    def model_copy(self, update: Optional[Dict] = None) -> "MessageRecord":
+        """与 pydantic 的 model_copy 用法一致，返回修改了部分字段的副本"""
+        copy = MessageRecord.__new__(MessageRecord)
+        for name in self.__slots__:
+            setattr(copy, name, getattr(self, name))
+        for name, value in (update or {}).items():
+            setattr(copy, name, value)
+        return copy
+
+    def to_unified(self) -> UnifiedMessage:
+        # pydantic 2 的 model_construct 逐字段处理默认值，实测比校验构造还慢，这里直接构造
+        return UnifiedMessage(
+            id=self.id,
+            platform=self.platform,
+            external_id=self.external_id,
+            content=self.content,
+            author_id=self.author_id,
+            author_name=self.author_name,
+            timestamp=self.timestamp,
+            chat_id=self.chat_id,
+            chat_name=self.chat_name,
+            urls=list(self.urls),
+            raw_metadata=self.raw_metadata,
+        )
+
+    def __repr__(self) -> str:
+        return f"MessageRecord(id={self.id!r}, chat={self.chat_name!r}, timestamp={self.timestamp!r})"
+
+
+class MessageBatch(Sequence):
+    """一批消息：MessageRecord 列表 + 批次内共享的字符串表"""
+
+    def __init__(self, records: Iterable[MessageRecord] = (), strings: Optional[Dict[str, str]] = None):
+        self._records: List[MessageRecord] = list(records)
+        self._strings: Dict[str, str] = strings if strings is not None else {}
+
+    def intern(self, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        return self._strings.setdefault(value, value)
+
+    def add(self, id: str, external_id: str, content: str, author_id: str, author_name: str,
+            timestamp: datetime, chat_id: str, chat_name: Optional[str] = None, urls: Sequence[str] = (),
+            collector_account: Optional[str] = None, views: int = 0, forwards: int = 0,
+            reply_to: Optional[int] = None) -> MessageRecord:
+        """追加一条消息，重复出现的群组/作者/账号字符串共用同一个对象"""
+        record = MessageRecord(
+            id, external_id, content, self.intern(author_id), self.intern(author_name), timestamp,
+            self.intern(chat_id), self.intern(chat_name), urls, self.intern(collector_account),
+            views, forwards, reply_to,
+        )
+        self._records.append(record)
+        return record
+
+    def add_unified(self, message: UnifiedMessage) -> MessageRecord:
+        metadata = message.raw_metadata or {}
+        return self.add(
+            message.id, message.external_id, message.content, message.author_id, message.author_name,
+            message.timestamp, message.chat_id, message.chat_name, message.urls,
+            metadata.get("collector_account"), metadata.get("views", 0), metadata.get("forwards", 0),
+            metadata.get("reply_to"),
+        )
+
+    @classmethod
+    def from_unified(cls, messages: Iterable[UnifiedMessage]) -> "MessageBatch":
+        batch = cls()
+        for message in messages:
+            batch.add_unified(message)
+        return batch
+
+    def extend(self, other: Iterable[MessageRecord]):
+        """合并另一批消息（字符串重新登记到本批次的字符串表）"""
+        for record in other:
+            self._records.append(record.model_copy({
+                "author_id": self.intern(record.author_id),
+                "author_name": self.intern(record.author_name),
+                "chat_id": self.intern(record.chat_id),
+                "chat_name": self.intern(record.chat_name),
+                "collector_account": self.intern(record.collector_account),
+            }))
+
+    def derive(self, records: Iterable[MessageRecord]) -> "MessageBatch":
+        """由本批次中的部分消息组成的新批次（共用字符串表），用于去重、过滤等"""
+        return MessageBatch(records, self._strings)
+
+    def to_unified(self) -> List[UnifiedMessage]:
+        return [record.to_unified() for record in self._records]
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.derive(self._records[index])
+        return self._records[index]
+
+    def __iter__(self) -> Iterator[MessageRecord]:
+        return iter(self._records)
+
+    def __repr__(self) -> str:
+        return f"MessageBatch({len(self._records)} 条消息, {len(self._strings)} 个共享字符串)"
@@ -4,13 +4,10 @@
 """
 
 import os
+import re
 from datetime import datetime
 from typing import List, Dict, Optional
-from dataclasses import dataclass
-from dotenv import load_dotenv
-
-# 允许覆盖环境变量以确保配置最新
-load_dotenv(override=True)
+from dataclasses import dataclass, field
 
 
 @dataclass
@@ -31,6 +28,95 @@ class CollectorConfig:
     max_messages_per_chat: int = 100
     deduplicate_by_content: bool = True
     deduplicate_by_url: bool = True
+    sender_cache_ttl_hours: float = 168.0  # 作者资料缓存有效期，过期后遇到新的发送者实体时刷新
+    processes: int = 1  # 采集工作进程数：1 表示所有账号在当前进程采集，0 表示按 CPU 核数（不超过账号数）
+    adaptive_budget: bool = True  # 按各群组历史消息速率分配每个群组的拉取上限（总请求数不超过固定上限时）
+    budget_path: str = "data/chat_rates.db"  # 各群组消息速率和上次是否触顶
+    budget_headroom: float = 1.5  # 预计消息数的放大倍数
+    budget_max_limit: int = 2000  # 单个群组的拉取上限
+    skip_idle_chats: bool = True  # 先读一次对话列表，最新消息早于窗口开始的群组不再扫描历史
+    fetch_concurrency: int = 0  # 开启预检排序时每个账号同时扫描的群组数上限（预计消息多的先占用名额），0 表示不限
+    backfill_path: str = "data/backfill.db"  # 补采断点（各账号各群组已拉到的位置）
+    backfill_request_interval: float = 1.0  # 补采时同一账号两次请求之间的最小间隔（秒），触发 FloodWait 后自动放大
+
+
+@dataclass
+class CompactionConfig:
+    """提示词压缩配置（采集之后、分块之前对消息文本做归一化）"""
+    enabled: bool = True
+    shorten_urls: bool = True  # 长链接替换为 [link:域名]
+    collapse_emoji: bool = True  # 折叠重复的表情/标点
+    max_symbol_run: int = 3  # 连续表情/标点最多保留的个数
+    drop_quoted_duplicates: bool = True  # 删除引用了其他消息原文的重复行
+    strip_boilerplate: bool = True  # 删除签名、邀请码等模板化内容
+    boilerplate_patterns: List[str] = field(default_factory=list)  # 额外的模板行正则
+    max_message_chars: int = 1500  # 单条消息最大长度，超出部分截断
+
+
+@dataclass
+class ClusteringConfig:
+    """话题聚类配置（分块前把同一话题的消息聚到一起）"""
+    enabled: bool = True
+    similarity_threshold: float = 0.25  # 余弦相似度阈值
+    max_clusters: int = 256  # 话题数量上限，超出后剩余消息归入零散消息
+    min_cluster_size: int = 2  # 小于该规模的簇视为零散消息
+    n_features: int = 2048  # 哈希特征维度
+    batch_size: int = 1024  # 增量聚类的批大小
+
+
+@dataclass
+class MetricsConfig:
+    """运行指标配置"""
+    enabled: bool = True  # 每次运行结束时导出 JSON
+    output_dir: str = "data/metrics"
+    prometheus_port: Optional[int] = None  # 配置后在该端口提供 /metrics 文本端点
+
+
+@dataclass
+class SchedulerConfig:
+    """常驻调度器配置（cron 表达式：分 时 日 月 周；为空表示不启用该任务）"""
+    hourly_cron: str = ""  # 过去一小时简报
+    daily_cron: str = "0 8 * * *"  # 24 小时深度简报
+    newsletter_cron: str = ""  # 每日 Newsletter
+    state_path: str = "data/scheduler_state.json"  # 各任务上次运行时间，用于错过补跑
+    catch_up: bool = True  # 启动时补跑停机期间错过的任务（多次错过只补一次）
+    shutdown_timeout: float = 300.0  # 退出时等待运行中任务的最长时间（秒）
+    outbox_cron: str = "*/5 * * * *"  # 重试发件箱中未送达的消息
+
+
+@dataclass
+class OutboxConfig:
+    """发件箱配置：简报和告警先持久化再投递，失败后可从断点续发"""
+    enabled: bool = True
+    db_path: str = "data/outbox.db"
+    chat_interval: float = 3.0  # 同一聊天两条消息之间的最小间隔（秒），群组/频道约 20 条/分钟
+    max_attempts: int = 8  # 超过后标记为 failed，需要手动重试
+    max_flood_wait: float = 60.0  # 不超过该值的 FloodWait 原地等待，否则推迟该聊天的全部消息
+    retry_base: float = 30.0  # 普通错误的首次重试间隔（秒），之后指数退避
+
+
+@dataclass
+class ApiConfig:
+    """只读 HTTP API 配置（web/api.py）"""
+    host: str = "127.0.0.1"
+    port: int = 8000
+    data_dir: str = "data"  # 按月分库的 raw_messages_YYYY_MM.db 所在目录
+    pool_size: int = 4  # 每个分库保留的空闲只读连接数
+    max_page_size: int = 500
+    feed_poll_interval: float = 1.0  # /feed 增量读取新消息的间隔（秒）
+    feed_buffer_size: int = 256  # 每个 /feed 订阅者最多缓存的事件数，超出丢弃最旧的
+
+
+@dataclass
+class TelegramClientModeConfig:
+    """Telegram 客户端模式配置（录制/回放用于离线压测采集流程）"""
+    mode: str = "live"  # live: 真实客户端；record: 真实客户端并录制流量；replay: 回放录制的流量
+    recording_dir: str = "data/telegram_recordings"  # 录制文件目录，每个账号一个 JSON 文件
+    replay_latency: float = 0.05  # 回放时每次请求的延迟（秒）
+    replay_flood_wait_rate: float = 0.0  # 回放时每次请求触发 FloodWait 的概率
+    replay_flood_wait_seconds: int = 1  # 注入的 FloodWait 时长
+    replay_rate_limit: float = 0.0  # 每个账号每秒最多请求数，0 表示不限
+    replay_seed: int = 0  # FloodWait 注入的随机种子
 
 
 @dataclass
@@ -67,8 +153,24 @@ class AppConfig:
     ai_config: AIConfig
     collector_config: CollectorConfig
     push_config: PushConfig
+    compaction_config: CompactionConfig = field(default_factory=CompactionConfig)
+    clustering_config: ClusteringConfig = field(default_factory=ClusteringConfig)
+    client_mode_config: TelegramClientModeConfig = field(default_factory=TelegramClientModeConfig)
+    metrics_config: MetricsConfig = field(default_factory=MetricsConfig)
+    scheduler_config: SchedulerConfig = field(default_factory=SchedulerConfig)
+    outbox_config: OutboxConfig = field(default_factory=OutboxConfig)
+    api_config: ApiConfig = field(default_factory=ApiConfig)
     obsidian_vault_path: str = ""
+    # 简报清单：记录每份简报的统计窗口和哈希，避免每次启动遍历 Obsidian 目录
+    report_manifest_path: str = "data/report_manifest.db"
+    # 简报统计日志：每次简报追加一条基础问题密度记录，保留全部历史
+    report_stats_path: str = "data/report_stats.db"
     jina_reader_base_url: str = "https://r.jina.ai/"
+    # 流式推送：AI 边生成边写入 Obsidian 并编辑频道消息，失败时回退到一次性模式
+    stream_delivery: bool = True
+    stream_edit_interval: float = 3.0
+    # 实体提取追加的已知项目名（格式：别名:规范名,别名:规范名）
+    known_projects: str = ""
     
     @property
     def database_path(self) -> str:
@@ -82,6 +184,10 @@ class AppConfig:
 def load_config() -> AppConfig:
 
     """从环境变量加载配置"""
+    from dotenv import load_dotenv
+    
+    # 允许覆盖环境变量以确保配置最新
+    load_dotenv(override=True)
     
     # 解析全局监控的群组 (作为所有账号的默认或公共列表)
     global_monitored_chats_str = os.getenv("MONITORED_CHATS", "")
@@ -107,28 +213,21 @@ def load_config() -> AppConfig:
             return [chat.strip() for chat in chats_str.split(",") if chat.strip()]
         return []
 
-    # 采集账号1
-    collector1_api_id = os.getenv("TELEGRAM_COLLECTOR1_API_ID")
-    if collector1_api_id:
-        collector_accounts.append(TelegramAccountConfig(
-            account_id="collector1",
-            api_id=int(collector1_api_id),
-            api_hash=os.getenv("TELEGRAM_COLLECTOR1_API_HASH", ""),
-            phone=os.getenv("TELEGRAM_COLLECTOR1_PHONE", ""),
-            session_name="collector1_session",
-            monitored_chats=_get_account_chats("collector1")
-        ))
-    
-    # 采集账号2
-    collector2_api_id = os.getenv("TELEGRAM_COLLECTOR2_API_ID")
-    if collector2_api_id:
+    # 采集账号：按编号发现 TELEGRAM_COLLECTOR<N>_API_ID（collector1、collector2、…、collector12），按编号排序
+    collector_numbers = sorted(
+        (match.group(1) for match in (re.fullmatch(r"TELEGRAM_COLLECTOR(\d+)_API_ID", key) for key in os.environ)
+         if match and os.environ[match.group(0)].strip()),
+        key=int
+    )
+    for number in collector_numbers:
+        account_id = f"collector{number}"
         collector_accounts.append(TelegramAccountConfig(
-            account_id="collector2",
-            api_id=int(collector2_api_id),
-            api_hash=os.getenv("TELEGRAM_COLLECTOR2_API_HASH", ""),
-            phone=os.getenv("TELEGRAM_COLLECTOR2_PHONE", ""),
-            session_name="collector2_session",
-            monitored_chats=_get_account_chats("collector2")
+            account_id=account_id,
+            api_id=int(os.environ[f"TELEGRAM_COLLECTOR{number}_API_ID"]),
+            api_hash=os.getenv(f"TELEGRAM_COLLECTOR{number}_API_HASH", ""),
+            phone=os.getenv(f"TELEGRAM_COLLECTOR{number}_PHONE", ""),
+            session_name=f"{account_id}_session",
+            monitored_chats=_get_account_chats(account_id)
         ))
     
     # 采集配置
@@ -136,7 +235,17 @@ def load_config() -> AppConfig:
         monitored_chats=global_monitored_chats,
         max_messages_per_chat=100,
         deduplicate_by_content=True,
-        deduplicate_by_url=True
+        deduplicate_by_url=True,
+        sender_cache_ttl_hours=float(os.getenv("SENDER_CACHE_TTL_HOURS", "168")),
+        processes=int(os.getenv("COLLECTOR_PROCESSES", "1")),
+        adaptive_budget=_env_bool("ADAPTIVE_FETCH_BUDGET", True),
+        budget_path=os.getenv("FETCH_BUDGET_PATH", "data/chat_rates.db"),
+        budget_headroom=float(os.getenv("FETCH_BUDGET_HEADROOM", "1.5")),
+        budget_max_limit=int(os.getenv("FETCH_BUDGET_MAX_LIMIT", "2000")),
+        skip_idle_chats=_env_bool("SKIP_IDLE_CHATS", True),
+        fetch_concurrency=int(os.getenv("COLLECTOR_FETCH_CONCURRENCY", "0")),
+        backfill_path=os.getenv("BACKFILL_PATH", "data/backfill.db"),
+        backfill_request_interval=float(os.getenv("BACKFILL_REQUEST_INTERVAL", "1.0"))
     )
     
     # 推送配置
@@ -147,6 +256,75 @@ def load_config() -> AppConfig:
         user_id=_safe_int(os.getenv("TELEGRAM_USER_ID"))
     )
     
+    # 提示词压缩配置
+    compaction_config = CompactionConfig(
+        enabled=_env_bool("PROMPT_COMPACTION", True),
+        shorten_urls=_env_bool("COMPACT_SHORTEN_URLS", True),
+        collapse_emoji=_env_bool("COMPACT_COLLAPSE_EMOJI", True),
+        max_symbol_run=int(os.getenv("COMPACT_MAX_SYMBOL_RUN", "3")),
+        drop_quoted_duplicates=_env_bool("COMPACT_DROP_QUOTES", True),
+        strip_boilerplate=_env_bool("COMPACT_STRIP_BOILERPLATE", True),
+        boilerplate_patterns=[p.strip() for p in os.getenv("COMPACT_BOILERPLATE_PATTERNS", "").split(",") if p.strip()],
+        max_message_chars=int(os.getenv("COMPACT_MAX_MESSAGE_CHARS", "1500"))
+    )
+    
+    # 话题聚类配置
+    clustering_config = ClusteringConfig(
+        enabled=_env_bool("TOPIC_CLUSTERING", True),
+        similarity_threshold=float(os.getenv("CLUSTER_SIMILARITY_THRESHOLD", "0.25")),
+        max_clusters=int(os.getenv("CLUSTER_MAX_CLUSTERS", "256")),
+        min_cluster_size=int(os.getenv("CLUSTER_MIN_SIZE", "2"))
+    )
+    
+    # Telegram 客户端模式（录制/回放）
+    client_mode_config = TelegramClientModeConfig(
+        mode=os.getenv("TELEGRAM_CLIENT_MODE", "live").strip().lower() or "live",
+        recording_dir=os.getenv("TELEGRAM_RECORDING_DIR", "data/telegram_recordings"),
+        replay_latency=float(os.getenv("TELEGRAM_REPLAY_LATENCY", "0.05")),
+        replay_flood_wait_rate=float(os.getenv("TELEGRAM_REPLAY_FLOOD_RATE", "0")),
+        replay_flood_wait_seconds=int(os.getenv("TELEGRAM_REPLAY_FLOOD_SECONDS", "1")),
+        replay_rate_limit=float(os.getenv("TELEGRAM_REPLAY_RATE_LIMIT", "0")),
+        replay_seed=int(os.getenv("TELEGRAM_REPLAY_SEED", "0"))
+    )
+    
+    # 运行指标
+    metrics_config = MetricsConfig(
+        enabled=_env_bool("METRICS_ENABLED", True),
+        output_dir=os.getenv("METRICS_DIR", "data/metrics"),
+        prometheus_port=_safe_int(os.getenv("METRICS_PORT"))
+    )
+    
+    # 常驻调度器
+    scheduler_config = SchedulerConfig(
+        hourly_cron=os.getenv("SCHEDULE_HOURLY", "").strip(),
+        daily_cron=os.getenv("SCHEDULE_DAILY", "0 8 * * *").strip(),
+        newsletter_cron=os.getenv("SCHEDULE_NEWSLETTER", "").strip(),
+        state_path=os.getenv("SCHEDULER_STATE_PATH", "data/scheduler_state.json"),
+        catch_up=_env_bool("SCHEDULER_CATCH_UP", True),
+        shutdown_timeout=float(os.getenv("SCHEDULER_SHUTDOWN_TIMEOUT", "300")),
+        outbox_cron=os.getenv("SCHEDULE_OUTBOX", "*/5 * * * *").strip()
+    )
+    
+    # 发件箱
+    outbox_config = OutboxConfig(
+        enabled=_env_bool("OUTBOX_ENABLED", True),
+        db_path=os.getenv("OUTBOX_DB_PATH", "data/outbox.db"),
+        chat_interval=float(os.getenv("OUTBOX_CHAT_INTERVAL", "3.0")),
+        max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8")),
+        max_flood_wait=float(os.getenv("OUTBOX_MAX_FLOOD_WAIT", "60")),
+        retry_base=float(os.getenv("OUTBOX_RETRY_BASE", "30"))
+    )
+    
+    api_config = ApiConfig(
+        host=os.getenv("API_HOST", "127.0.0.1"),
+        port=int(os.getenv("API_PORT", "8000")),
+        data_dir=os.getenv("API_DATA_DIR", "data"),
+        pool_size=int(os.getenv("API_POOL_SIZE", "4")),
+        max_page_size=int(os.getenv("API_MAX_PAGE_SIZE", "500")),
+        feed_poll_interval=float(os.getenv("API_FEED_POLL_INTERVAL", "1.0")),
+        feed_buffer_size=int(os.getenv("API_FEED_BUFFER_SIZE", "256"))
+    )
+    
     # AI 配置
     ai_config = AIConfig(
         deepseek_api_key=os.getenv("DEEPSEEK_API_KEY", ""),
@@ -161,9 +339,21 @@ def load_config() -> AppConfig:
         collector_accounts=collector_accounts,
         collector_config=collector_config,
         push_config=push_config,
+        compaction_config=compaction_config,
+        clustering_config=clustering_config,
+        client_mode_config=client_mode_config,
+        metrics_config=metrics_config,
+        scheduler_config=scheduler_config,
+        outbox_config=outbox_config,
+        api_config=api_config,
         ai_config=ai_config,
         obsidian_vault_path=os.getenv("OBSIDIAN_VAULT_PATH"),
-        jina_reader_base_url=os.getenv("JINA_READER_BASE_URL", "https://r.jina.ai/")
+        report_manifest_path=os.getenv("REPORT_MANIFEST_PATH", "data/report_manifest.db"),
+        report_stats_path=os.getenv("REPORT_STATS_PATH", "data/report_stats.db"),
+        jina_reader_base_url=os.getenv("JINA_READER_BASE_URL", "https://r.jina.ai/"),
+        stream_delivery=_env_bool("STREAM_DELIVERY", True),
+        stream_edit_interval=float(os.getenv("STREAM_EDIT_INTERVAL", "3.0")),
+        known_projects=os.getenv("KNOWN_PROJECTS", "")
     )
     
     return config
@@ -179,5 +369,45 @@ def _safe_int(val: Optional[str]) -> Optional[int]:
         return None
 
 
-# 全局配置实例
-config = load_config()
\ No newline at end of file
+def _env_bool(name: str, default: bool) -> bool:
+    """读取布尔型环境变量"""
+    val = os.getenv(name)
+    if val is None or not val.strip():
+        return default
+    return val.strip().lower() in ("1", "true", "yes", "on")
+
+
+class _LazyConfig:
+    """
+    全局配置代理：第一次访问属性时才读取 .env 和群组设置文件
+
+    导入 src.config 不再有副作用，只用到部分模块的命令（如告警脚本）可以更快启动。
+    """
+
+    def __init__(self):
+        object.__setattr__(self, "_config", None)
+
+    def _load(self) -> AppConfig:
+        loaded = object.__getattribute__(self, "_config")
+        if loaded is None:
+            loaded = load_config()
+            object.__setattr__(self, "_config", loaded)
+        return loaded
+
+    def reload(self) -> AppConfig:
+        """重新读取环境变量和设置文件"""
+        object.__setattr__(self, "_config", None)
+        return self._load()
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __repr__(self) -> str:
+        return repr(self._load())
+
+
+# 全局配置实例（延迟加载）
+config = _LazyConfig()
@@ -0,0 +1,121 @@
+"""
+Telegram Bot API 推送
+告警等短消息走 Bot API：一次 HTTPS 请求即可送达，不需要 MTProto 登录和多次握手。
+HTTP 连接池在发送器的生命周期内复用，多个目标并发发送。
+"""
+
+import asyncio
+from typing import Dict, Iterable, Optional, Union
+
+from loguru import logger
+
+from src.lazy_imports import lazy_import
+from src.metrics import metrics
+from src.delivery.splitter import MAX_MESSAGE_LENGTH, split_message
+
+httpx = lazy_import("httpx")
+
+BOT_API_BASE_URL = "https://api.telegram.org"
+
+ChatId = Union[str, int]
+
+
+class BotApiSender:
+    """基于 httpx 连接池的 Bot API 发送器"""
+
+    def __init__(self, token: str, base_url: str = BOT_API_BASE_URL, timeout: float = 10.0,
+                 max_retries: int = 3, retry_delay: float = 1.0, transport=None):
+        """
+        Args:
+            token: Bot Token（PushConfig.bot_token）
+            timeout: 单次请求超时（秒）
+            max_retries: 网络错误、5xx 和 429 限流时的最多尝试次数
+            retry_delay: 网络错误和 5xx 的首次重试等待（秒），之后指数退避；429 按服务端 retry_after 等待
+            transport: 自定义 httpx 传输层（测试时注入 httpx.MockTransport）
+        """
+        self.token = token
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._transport = transport
+        self._client = None
+
+    @property
+    def client(self):
+        """懒创建的共享 AsyncClient，连接在多次发送间复用"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=f"{self.base_url}/bot{self.token}",
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def send_message(self, chat_id: ChatId, text: str, parse_mode: Optional[str] = "HTML") -> bool:
+        """发送一条消息（超长时按结构切分后依次发送），返回是否全部成功"""
+        for part in split_message(text, MAX_MESSAGE_LENGTH, escape=False, is_html=parse_mode == "HTML"):
+            if not await self._send_part(chat_id, part, parse_mode):
+                return False
+        return True
+
+    async def _send_part(self, chat_id: ChatId, text: str, parse_mode: Optional[str]) -> bool:
+        payload = {
+            "chat_id": chat_id,
+            "text": text,
+            "disable_web_page_preview": True,
+        }
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+
+        for attempt in range(self.max_retries):
+            backoff = self.retry_delay * (2 ** attempt)
+            try:
+                with metrics.timer("delivery_seconds", target="bot_api"):
+                    response = await self.client.post("/sendMessage", json=payload)
+                data = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning(f"Bot API 请求失败 ({chat_id})，第 {attempt + 1} 次: {e}")
+                await asyncio.sleep(backoff)
+                continue
+
+            if data.get("ok"):
+                metrics.counter("delivery_messages_sent_total", target="bot_api").inc()
+                return True
+
+            retry_after = (data.get("parameters") or {}).get("retry_after")
+            if response.status_code == 429 and retry_after is not None:
+                logger.warning(f"Bot API 限流 ({chat_id})：{retry_after} 秒后重试")
+                metrics.counter("telegram_flood_waits_total", account="bot").inc()
+                await asyncio.sleep(retry_after)
+                continue
+            if response.status_code >= 500:
+                logger.warning(f"Bot API 服务端错误 ({chat_id}) {response.status_code}，第 {attempt + 1} 次")
+                await asyncio.sleep(backoff)
+                continue
+
+            # 4xx（chat 不存在、Bot 不是频道管理员等）重试也不会成功
+            logger.error(f"Bot API 拒绝发送到 {chat_id}: {data.get('description')}")
+            break
+
+        metrics.counter("delivery_failures_total", target="bot_api").inc()
+        return False
+
+    async def send_to_targets(self, text: str, targets: Iterable[ChatId],
+                              parse_mode: Optional[str] = "HTML") -> Dict[ChatId, bool]:
+        """并发发送到多个目标，返回 {目标: 是否成功}"""
+        targets = list(targets)
+        results = await asyncio.gather(*(self.send_message(target, text, parse_mode) for target in targets))
+        return dict(zip(targets, results))
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
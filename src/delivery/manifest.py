@@ -0,0 +1,214 @@
+"""
+简报清单（report manifest）
+每次保存简报时记录 文件名 / 统计窗口 / 内容哈希 / 统计数据，查询上次统计窗口和待归档简报时直接查清单，
+不再遍历整个 Obsidian 目录并逐个解析文件名。目录第一次使用时扫描一遍已有简报导入清单。
+简报文件通过 临时文件 + rename 原子写入，进程中途退出不会留下半截报告。
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from src.config import config
+
+# 简报_YYMMDDHHMM_-YYMMDDHHMM[_N].md
+_REPORT_RE = re.compile(r'简报_(\d{10})_-(\d{10})(?:_\d+)?\.md$')
+# 旧格式：简报_YYMMDD_to_YYYYMMDD.md（只有日期）
+_REPORT_OLD_RE = re.compile(r'简报_(\d{6})_to_(\d{8})\.md$')
+
+
+def parse_report_filename(filename: str) -> Optional[Tuple[Optional[datetime], datetime]]:
+    """
+    从简报文件名解析统计窗口
+
+    Returns:
+        (开始时间, 结束时间)；旧格式只有结束日期，开始时间为 None；不是简报文件时返回 None
+    """
+    match = _REPORT_RE.match(filename)
+    try:
+        if match:
+            return (datetime.strptime(match.group(1), "%y%m%d%H%M"),
+                    datetime.strptime(match.group(2), "%y%m%d%H%M"))
+        match = _REPORT_OLD_RE.match(filename)
+        if match:
+            return None, datetime.strptime(match.group(2), "%Y%m%d")
+    except ValueError:
+        return None
+    return None
+
+
+def atomic_write(path: str, content: str):
+    """写入同目录下的临时文件后 rename 覆盖目标文件"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ReportManifest:
+    """简报清单（SQLite）"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        db_path = db_path or config.report_manifest_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reports (
+                    directory TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    kind TEXT NOT NULL DEFAULT 'daily',
+                    window_start TEXT,
+                    window_end TEXT,
+                    sha256 TEXT,
+                    size INTEGER,
+                    stats TEXT,
+                    saved_at TEXT NOT NULL,
+                    archived_path TEXT,
+                    PRIMARY KEY (directory, filename)
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_reports_window
+                ON reports(directory, kind, window_end)
+            """)
+            # 已导入过的目录，只在第一次使用时扫描
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scanned_directories (
+                    directory TEXT PRIMARY KEY,
+                    scanned_at TEXT NOT NULL
+                )
+            """)
+            conn.commit()
+
+    @staticmethod
+    def _key(directory: str) -> str:
+        return os.path.abspath(directory)
+
+    def record(self, directory: str, filename: str, content: Optional[str] = None, kind: str = "daily",
+               window: Optional[Tuple[Optional[datetime], datetime]] = None, stats: Optional[Dict] = None):
+        """
+        记录一份已保存的简报（同名文件覆盖旧记录）
+
+        Args:
+            content: 文件内容，用于计算哈希和大小；为空时不记录
+            window: (开始, 结束)；为空时从文件名解析
+        """
+        window = window or parse_report_filename(filename) or (None, None)
+        start, end = window
+        encoded = content.encode("utf-8") if content is not None else None
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO reports
+                (directory, filename, kind, window_start, window_end, sha256, size, stats, saved_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                self._key(directory), filename, kind,
+                start.isoformat() if start else None,
+                end.isoformat() if end else None,
+                hashlib.sha256(encoded).hexdigest() if encoded is not None else None,
+                len(encoded) if encoded is not None else None,
+                json.dumps(stats, ensure_ascii=False) if stats else None,
+                datetime.now().isoformat(timespec="seconds"),
+            ))
+            conn.commit()
+
+    def save(self, directory: str, filename: str, content: str, kind: str = "daily",
+             window: Optional[Tuple[Optional[datetime], datetime]] = None, stats: Optional[Dict] = None) -> str:
+        """原子写入简报文件并记录到清单，返回文件路径"""
+        path = os.path.join(directory, filename)
+        atomic_write(path, content)
+        self.ensure_scanned(directory)
+        self.record(directory, filename, content, kind, window, stats)
+        return path
+
+    def ensure_scanned(self, directory: str) -> int:
+        """目录第一次使用时把已有的简报文件导入清单，返回导入数量"""
+        key = self._key(directory)
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM scanned_directories WHERE directory = ?", (key,)).fetchone():
+                return 0
+        return self.rebuild(directory)
+
+    def rebuild(self, directory: str) -> int:
+        """扫描目录重新导入简报文件（手动增删过文件后使用），已有记录的统计数据保留"""
+        key = self._key(directory)
+        rows = []
+        if os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                window = parse_report_filename(filename)
+                if window is None or not os.path.isfile(os.path.join(directory, filename)):
+                    continue
+                start, end = window
+                rows.append((key, filename, start.isoformat() if start else None, end.isoformat(),
+                             datetime.now().isoformat(timespec="seconds")))
+
+        with self._connect() as conn:
+            missing = [row["filename"] for row in conn.execute(
+                "SELECT filename FROM reports WHERE directory = ? AND archived_path IS NULL", (key,))
+                if not os.path.exists(os.path.join(directory, row["filename"]))]
+            conn.executemany("""
+                INSERT OR IGNORE INTO reports (directory, filename, window_start, window_end, saved_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+            # 已经不在目录中的记录删除（归档过的保留）
+            conn.executemany("DELETE FROM reports WHERE directory = ? AND filename = ? AND archived_path IS NULL",
+                             [(key, filename) for filename in missing])
+            conn.execute("INSERT OR REPLACE INTO scanned_directories (directory, scanned_at) VALUES (?, ?)",
+                         (key, datetime.now().isoformat(timespec="seconds")))
+            conn.commit()
+        if rows:
+            logger.info(f"简报清单已导入 {len(rows)} 份简报: {directory}")
+        return len(rows)
+
+    def last_window_end(self, directory: str, kind: str = "daily") -> Optional[datetime]:
+        """目录中最新一份简报的统计结束时间（含已归档的）"""
+        self.ensure_scanned(directory)
+        with self._connect() as conn:
+            row = conn.execute("""
+                SELECT MAX(window_end) FROM reports WHERE directory = ? AND kind = ?
+            """, (self._key(directory), kind)).fetchone()
+        return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+    def due_for_archive(self, directory: str, before: datetime, kind: str = "daily") -> List[str]:
+        """统计结束时间早于 before 且尚未归档的简报文件名（只看 kind 类型的简报）"""
+        self.ensure_scanned(directory)
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT filename FROM reports
+                WHERE directory = ? AND kind = ? AND archived_path IS NULL AND window_end < ?
+                ORDER BY window_end
+            """, (self._key(directory), kind, before.isoformat())).fetchall()
+        return [row["filename"] for row in rows]
+
+    def mark_archived(self, directory: str, filename: str, archived_path: str):
+        with self._connect() as conn:
+            conn.execute("UPDATE reports SET archived_path = ? WHERE directory = ? AND filename = ?",
+                         (archived_path, self._key(directory), filename))
+            conn.commit()
@@ -1,7 +1,10 @@
 import os
+import time
+import asyncio
 import aiofiles
 from datetime import datetime
 from src.models import UnifiedMessage
+from src.delivery.manifest import atomic_write
 from loguru import logger
 
 class ObsidianDelivery:
@@ -13,13 +16,14 @@ class ObsidianDelivery:
     async def deliver(self, message: UnifiedMessage, summary: str):
         date_str = message.timestamp.strftime("%Y-%m-%d")
         file_path = os.path.join(self.base_path, f"{date_str}.md")
+        original = message.content[:200].replace('\n', ' ')
         
         # 构造 Markdown 格式
         content = f"""
 ## [{message.platform.upper()}] From {message.chat_name or 'Private'}
 - **Author**: {message.author_name}
 - **Time**: {message.timestamp.strftime("%H:%M:%S")}
-- **Original**: {message.content[:200].replace('\n', ' ')}...
+- **Original**: {original}...
 - **AI Summary**:
 {summary}
 
@@ -29,3 +33,56 @@ class ObsidianDelivery:
             await f.write(content)
         
         logger.info(f"Delivered to Obsidian: {file_path}")
+
+
+class StreamingMarkdownWriter:
+    """
+    流式写入 Obsidian 报告
+
+    AI 输出到达时追加写入同目录的草稿（简报_xxx.draft.md）并按间隔刷盘，Obsidian 中可以实时看到报告成形；
+    结束时用完整内容覆盖草稿再 rename 为正式文件名，保证最终文件与一次性模式完全一致。
+    中途崩溃或失败只会留下草稿，清单、归档和缺口检测都不会把它当作已完成的简报。
+    """
+
+    def __init__(self, file_path: str, flush_interval: float = 1.0):
+        self.file_path = file_path
+        root, ext = os.path.splitext(file_path)
+        self.draft_path = f"{root}.draft{ext}"
+        self.flush_interval = flush_interval
+        self._file = None
+        self._opened = False
+        self._last_flush = 0.0
+
+    async def open(self):
+        os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+        self._file = await aiofiles.open(self.draft_path, mode='w', encoding='utf-8')
+        self._opened = True
+        logger.info(f"开始流式写入 Obsidian: {self.draft_path}")
+
+    async def append(self, delta: str):
+        if not delta or self._file is None:
+            return
+        await self._file.write(delta)
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            await self._file.flush()
+            self._last_flush = now
+
+    async def finish(self, content: str):
+        """用完整内容原子覆盖流式写入的草稿，再把草稿改名为正式文件"""
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+        await asyncio.to_thread(atomic_write, self.draft_path, content)
+        await asyncio.to_thread(os.replace, self.draft_path, self.file_path)
+        self._opened = False
+        logger.info(f"报告已保存到 Obsidian: {self.file_path}")
+
+    async def abort(self):
+        """删除草稿文件（正式文件不受影响），交由一次性模式重新写入"""
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+        if self._opened and os.path.exists(self.draft_path):
+            os.remove(self.draft_path)
+        self._opened = False
@@ -0,0 +1,367 @@
+"""
+发件箱（SQLite 持久化的投递队列）
+简报和告警生成后先按幂等键写入发件箱，再由投递器发送：
+- 每个目标一行，多段消息逐段记录进度，中途失败时从未发送的分段续发
+- 同一聊天按最小间隔限速；短 FloodWait 原地等待，长 FloodWait 推迟该聊天的后续消息
+- 不同目标并发投递；失败后指数退避，超过最大次数标记为 failed
+投递失败只需重放发件箱，不需要重新调用 AI 生成简报。
+
+用法:
+    python -m src.delivery.outbox --status        # 查看各状态数量
+    python -m src.delivery.outbox --drain         # 用主账号投递所有到期消息
+    python -m src.delivery.outbox --retry-failed  # 把 failed 重新放回队列
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from loguru import logger
+
+from src.config import config
+from src.metrics import metrics
+from src.delivery.splitter import MAX_MESSAGE_LENGTH, split_message
+
+MAX_PART_LENGTH = MAX_MESSAGE_LENGTH
+# 投递中（sending）的消息超过该时间未更新视为进程已崩溃，可被重新领取
+CLAIM_LEASE_SECONDS = 600
+
+# 发送一段消息：(目标, 文本, parse_mode) -> None，失败时抛出异常
+SendPart = Callable[[str, str, Optional[str]], Awaitable[None]]
+
+
+def split_parts(text: str, parse_mode: Optional[str] = "HTML", is_html: bool = False) -> List[str]:
+    """
+    把消息切成可直接发送的分段（与 send_to_channel 的转义和切分方式一致）
+
+    is_html: 原文已经是 Telegram HTML（例如告警），HTML 模式下不再转义，切分时保留标签
+    """
+    html_mode = parse_mode == "HTML"
+    return split_message(text, MAX_PART_LENGTH, escape=html_mode and not is_html, is_html=html_mode and is_html)
+
+
+def content_key(text: str) -> str:
+    """未指定幂等键时按内容生成"""
+    return "sha1:" + hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class OutboxItem:
+    """发件箱中发往一个目标的一条消息"""
+    id: int
+    idempotency_key: str
+    target: str
+    kind: str
+    parse_mode: Optional[str]
+    parts: List[str]
+    sent_parts: int
+    attempts: int
+
+
+class Outbox:
+    """发件箱存储"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        db_path = db_path or config.outbox_config.db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            # WAL 允许常驻调度器和一次性脚本同时读写
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    idempotency_key TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    kind TEXT NOT NULL DEFAULT 'report',
+                    parse_mode TEXT,
+                    parts TEXT NOT NULL,
+                    sent_parts INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    claimed_at REAL,
+                    last_error TEXT,
+                    created_at TEXT NOT NULL,
+                    sent_at TEXT,
+                    UNIQUE(idempotency_key, target)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+            conn.commit()
+
+    def enqueue(self, idempotency_key: str, text: str, targets: Iterable, kind: str = "report",
+                parse_mode: Optional[str] = "HTML", is_html: bool = False) -> int:
+        """
+        写入发件箱；同一幂等键和目标只会写入一次
+
+        is_html 表示 text 已经是 Telegram HTML，不再转义
+
+        Returns:
+            新写入的条数（已存在的不计）
+        """
+        parts = json.dumps(split_parts(text, parse_mode, is_html), ensure_ascii=False)
+        created_at = datetime.now().isoformat(timespec="seconds")
+        with self._connect() as conn:
+            inserted = 0
+            for target in targets:
+                cursor = conn.execute("""
+                    INSERT OR IGNORE INTO outbox (idempotency_key, target, kind, parse_mode, parts, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (idempotency_key, str(target), kind, parse_mode, parts, created_at))
+                inserted += cursor.rowcount
+            conn.commit()
+        if inserted:
+            metrics.counter("outbox_enqueued_total", kind=kind).inc(inserted)
+        return inserted
+
+    def claim_due(self, now: Optional[float] = None, limit: int = 100) -> List[OutboxItem]:
+        """领取到期的消息并标记为 sending，多个进程同时投递时每条只会被领取一次"""
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT * FROM outbox
+                WHERE (status = 'pending' AND next_attempt_at <= ?)
+                   OR (status = 'sending' AND claimed_at < ?)
+                ORDER BY id LIMIT ?
+            """, (now, now - CLAIM_LEASE_SECONDS, limit)).fetchall()
+            items = []
+            for row in rows:
+                cursor = conn.execute("""
+                    UPDATE outbox SET status = 'sending', claimed_at = ?
+                    WHERE id = ? AND status = ? AND claimed_at IS ?
+                """, (now, row["id"], row["status"], row["claimed_at"]))
+                if cursor.rowcount == 1:
+                    items.append(OutboxItem(
+                        id=row["id"], idempotency_key=row["idempotency_key"], target=row["target"],
+                        kind=row["kind"], parse_mode=row["parse_mode"], parts=json.loads(row["parts"]),
+                        sent_parts=row["sent_parts"], attempts=row["attempts"],
+                    ))
+            conn.commit()
+        return items
+
+    def mark_part_sent(self, item_id: int, sent_parts: int):
+        """记录已发送的分段数，续发时从这里开始"""
+        with self._connect() as conn:
+            conn.execute("UPDATE outbox SET sent_parts = ?, claimed_at = ? WHERE id = ?",
+                         (sent_parts, time.time(), item_id))
+            conn.commit()
+
+    def mark_sent(self, item_id: int):
+        with self._connect() as conn:
+            conn.execute("""
+                UPDATE outbox SET status = 'sent', claimed_at = NULL, last_error = NULL, sent_at = ?
+                WHERE id = ?
+            """, (datetime.now().isoformat(timespec="seconds"), item_id))
+            conn.commit()
+
+    def reschedule(self, item_id: int, next_attempt_at: float, error: str = None,
+                   count_attempt: bool = True, max_attempts: Optional[int] = None) -> str:
+        """
+        放回队列等待下次投递
+
+        Returns:
+            新状态（pending，或超过最大次数后的 failed）
+        """
+        with self._connect() as conn:
+            if count_attempt:
+                conn.execute("UPDATE outbox SET attempts = attempts + 1 WHERE id = ?", (item_id,))
+            attempts = conn.execute("SELECT attempts FROM outbox WHERE id = ?", (item_id,)).fetchone()[0]
+            status = "failed" if max_attempts is not None and attempts >= max_attempts else "pending"
+            conn.execute("""
+                UPDATE outbox SET status = ?, next_attempt_at = ?, claimed_at = NULL, last_error = ?
+                WHERE id = ?
+            """, (status, next_attempt_at, error, item_id))
+            conn.commit()
+        return status
+
+    def retry_failed(self) -> int:
+        """把 failed 的消息重新放回队列（保留已发送分段的进度）"""
+        with self._connect() as conn:
+            cursor = conn.execute("""
+                UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = 0
+                WHERE status = 'failed'
+            """)
+            conn.commit()
+            return cursor.rowcount
+
+    def status_of(self, idempotency_key: str) -> Dict[str, str]:
+        """某个幂等键下各目标的投递状态"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT target, status FROM outbox WHERE idempotency_key = ?",
+                                (idempotency_key,)).fetchall()
+        return {row["target"]: row["status"] for row in rows}
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+class OutboxWorker:
+    """发件箱投递器：按目标分组并发投递，同一目标内按入队顺序逐段发送"""
+
+    def __init__(self, outbox: Outbox, send_part: SendPart, chat_interval: Optional[float] = None,
+                 max_attempts: Optional[int] = None, max_flood_wait: Optional[float] = None,
+                 retry_base: Optional[float] = None, clock: Callable[[], float] = time.time):
+        """
+        Args:
+            send_part: 发送一段消息的函数，失败时抛出异常（FloodWaitError 通过 seconds 属性给出等待时间）
+            其余参数为空时取 config.outbox_config
+        """
+        outbox_config = config.outbox_config
+        self.outbox = outbox
+        self.send_part = send_part
+        self.chat_interval = outbox_config.chat_interval if chat_interval is None else chat_interval
+        self.max_attempts = outbox_config.max_attempts if max_attempts is None else max_attempts
+        self.max_flood_wait = outbox_config.max_flood_wait if max_flood_wait is None else max_flood_wait
+        self.retry_base = outbox_config.retry_base if retry_base is None else retry_base
+        self.clock = clock
+        # 各聊天上一次发送的时间，常驻进程中跨多次投递保持
+        self._last_sent: Dict[str, float] = {}
+
+    async def _throttle(self, target: str):
+        last = self._last_sent.get(target)
+        if last is not None:
+            wait = last + self.chat_interval - self.clock()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        self._last_sent[target] = self.clock()
+
+    async def _deliver_item(self, item: OutboxItem) -> Optional[float]:
+        """
+        投递一条消息
+
+        Returns:
+            0 表示已送达；遇到长 FloodWait 时返回该聊天可以恢复发送的时间；其他失败返回 None
+        """
+        sent = item.sent_parts
+        while sent < len(item.parts):
+            await self._throttle(item.target)
+            try:
+                await self.send_part(item.target, item.parts[sent], item.parse_mode)
+            except Exception as e:
+                flood_seconds = getattr(e, "seconds", None)
+                if flood_seconds is not None:
+                    metrics.counter("telegram_flood_waits_total", account="outbox").inc()
+                    if flood_seconds <= self.max_flood_wait:
+                        logger.warning(f"发件箱投递 {item.target} 触发 FloodWait，等待 {flood_seconds} 秒")
+                        await asyncio.sleep(flood_seconds)
+                        continue
+                    resume_at = self.clock() + flood_seconds
+                    self.outbox.reschedule(item.id, resume_at, f"FloodWait {flood_seconds}s", count_attempt=False)
+                    logger.warning(f"发件箱投递 {item.target} 需等待 {flood_seconds} 秒，推迟该聊天的消息")
+                    return resume_at
+
+                delay = self.retry_base * (2 ** item.attempts)
+                status = self.outbox.reschedule(item.id, self.clock() + delay, str(e),
+                                                max_attempts=self.max_attempts)
+                metrics.counter("delivery_failures_total", target="outbox").inc()
+                if status == "failed":
+                    logger.error(f"发件箱消息 {item.idempotency_key} -> {item.target} 多次发送失败，已放弃: {e}")
+                else:
+                    logger.warning(f"发件箱消息 {item.idempotency_key} -> {item.target} "
+                                   f"第 {sent + 1}/{len(item.parts)} 段发送失败，{delay:.0f} 秒后重试: {e}")
+                return None
+
+            sent += 1
+            self.outbox.mark_part_sent(item.id, sent)
+            metrics.counter("delivery_messages_sent_total", target="outbox").inc()
+
+        self.outbox.mark_sent(item.id)
+        logger.info(f"发件箱消息 {item.idempotency_key} 已送达 {item.target}（{len(item.parts)} 段）")
+        return 0
+
+    async def _deliver_target(self, items: List[OutboxItem]) -> int:
+        delivered = 0
+        for index, item in enumerate(items):
+            result = await self._deliver_item(item)
+            if result == 0:
+                delivered += 1
+            elif result is not None:
+                # 同一聊天的后续消息一起推迟，保持顺序
+                for rest in items[index + 1:]:
+                    self.outbox.reschedule(rest.id, result, "等待同一聊天的 FloodWait", count_attempt=False)
+                break
+        return delivered
+
+    async def run_once(self) -> Optional[int]:
+        """
+        投递当前所有到期消息
+
+        Returns:
+            成功送达的条数；没有到期消息时返回 None
+        """
+        items = self.outbox.claim_due(self.clock())
+        if not items:
+            return None
+        by_target: Dict[str, List[OutboxItem]] = defaultdict(list)
+        for item in items:
+            by_target[item.target].append(item)
+        results = await asyncio.gather(*(self._deliver_target(target_items) for target_items in by_target.values()))
+        return sum(results)
+
+    async def drain(self) -> int:
+        """反复投递直到没有到期消息（失败和长 FloodWait 推迟到未来的消息留给下一次），返回送达条数"""
+        delivered = 0
+        with metrics.timer("delivery_seconds", target="outbox"):
+            while True:
+                count = await self.run_once()
+                if count is None:
+                    return delivered
+                delivered += count
+
+
+async def drain_with_main_account() -> int:
+    """连接主账号投递发件箱中所有到期消息"""
+    from src.adapters.telegram_adapter_v2 import TelegramClientSession
+    from src.adapters.telegram_replay import make_client_factory
+
+    session = TelegramClientSession(config.main_account, client_factory=make_client_factory())
+    try:
+        await session.connect()
+        return await OutboxWorker(Outbox(), session.send_part).drain()
+    finally:
+        await session.disconnect()
+
+
+def main() -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="发件箱管理")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--status", action="store_true", help="查看各状态消息数量（默认）")
+    group.add_argument("--drain", action="store_true", help="用主账号投递所有到期消息")
+    group.add_argument("--retry-failed", action="store_true", help="把 failed 的消息重新放回队列")
+    args = parser.parse_args()
+
+    outbox = Outbox()
+    if args.retry_failed:
+        print(f"✅ 已重新排队 {outbox.retry_failed()} 条消息")
+    elif args.drain:
+        print(f"✅ 已送达 {asyncio.run(drain_with_main_account())} 条消息")
+    stats = outbox.stats()
+    print("📮 发件箱: " + ("，".join(f"{status} {count}" for status, count in sorted(stats.items())) or "空"))
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
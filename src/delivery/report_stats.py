@@ -0,0 +1,183 @@
+"""
+简报统计日志
+每次生成简报追加一条统计记录（基础操作问题数量与密度），按统计结束时间建索引：
+- 追加只插入一行，不再读出整个 report_stats.json、截断到 100 条后重写
+- 上次简报的统计通过索引直接取最新一条
+- 历史不再丢弃，可以按周汇总密度变化趋势
+旧的 data/report_stats/report_stats.json 在第一次打开时导入，导入后改名为 .imported。
+"""
+
+import json
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from src.config import config
+
+LEGACY_STATS_FILE = "data/report_stats/report_stats.json"
+
+_COLUMNS = ("filename", "start_time", "end_time", "hours",
+            "basic_operation_count", "basic_operation_density", "created_at")
+
+
+def build_record(start_time: datetime, end_time: datetime, basic_op_count: int, filename: str) -> Dict:
+    """生成一条统计记录（字段与旧 report_stats.json 一致）"""
+    hours = (end_time - start_time).total_seconds() / 3600
+    return {
+        "filename": filename,
+        "start_time": start_time.isoformat(),
+        "end_time": end_time.isoformat(),
+        "hours": round(hours, 2),
+        "basic_operation_count": basic_op_count,
+        "basic_operation_density": round(basic_op_count / hours, 4) if hours > 0 else 0,
+        "created_at": datetime.now().isoformat(),
+    }
+
+
+class ReportStatsLog:
+    """简报统计日志（SQLite，只追加）"""
+
+    def __init__(self, db_path: Optional[str] = None, legacy_path: Optional[str] = LEGACY_STATS_FILE):
+        db_path = db_path or config.report_stats_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self._init_db()
+        if legacy_path:
+            self.import_legacy(legacy_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS report_stats (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    filename TEXT,
+                    start_time TEXT NOT NULL,
+                    end_time TEXT NOT NULL,
+                    hours REAL NOT NULL,
+                    basic_operation_count INTEGER NOT NULL,
+                    basic_operation_density REAL NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_report_stats_end
+                ON report_stats(end_time, id)
+            """)
+            conn.commit()
+
+    def append(self, record: Dict) -> Dict:
+        """追加一条统计记录"""
+        with self._connect() as conn:
+            conn.execute(f"""
+                INSERT INTO report_stats ({", ".join(_COLUMNS)})
+                VALUES ({", ".join("?" for _ in _COLUMNS)})
+            """, tuple(record.get(column) for column in _COLUMNS))
+            conn.commit()
+        return record
+
+    def previous(self, before: Optional[datetime] = None) -> Optional[Dict]:
+        """最近一次简报的统计（统计结束时间最新的一条）；before 不为空时只看结束时间早于它的记录"""
+        query = f"SELECT {', '.join(_COLUMNS)} FROM report_stats"
+        params = ()
+        if before is not None:
+            query += " WHERE end_time < ?"
+            params = (before.isoformat(),)
+        query += " ORDER BY end_time DESC, id DESC LIMIT 1"
+        with self._connect() as conn:
+            row = conn.execute(query, params).fetchone()
+        return dict(row) if row else None
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM report_stats").fetchone()[0]
+
+    def weekly_density(self, weeks: int = 12, until: Optional[datetime] = None) -> List[Dict]:
+        """
+        按周（ISO 周一开始）汇总基础操作问题密度，按时间正序返回最近 weeks 周
+
+        Returns:
+            [{"week": "2026-W03", "reports": 次数, "basic_operation_count": 总数,
+              "hours": 总小时数, "density": 每小时数量（按小时加权）}]
+        """
+        until = until or datetime.now()
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT date(end_time, 'weekday 0', '-6 days') AS week_start,
+                       COUNT(*) AS reports,
+                       SUM(basic_operation_count) AS basic_operation_count,
+                       SUM(hours) AS hours
+                FROM report_stats
+                WHERE end_time <= ?
+                GROUP BY week_start
+                ORDER BY week_start DESC
+                LIMIT ?
+            """, (until.isoformat(), weeks)).fetchall()
+
+        trend = []
+        for row in reversed(rows):
+            year, week, _ = datetime.fromisoformat(row["week_start"]).isocalendar()
+            hours = row["hours"] or 0
+            trend.append({
+                "week": f"{year}-W{week:02d}",
+                "reports": row["reports"],
+                "basic_operation_count": row["basic_operation_count"],
+                "hours": round(hours, 2),
+                "density": round(row["basic_operation_count"] / hours, 4) if hours > 0 else 0,
+            })
+        return trend
+
+    def import_legacy(self, path: str) -> int:
+        """导入旧的 report_stats.json，导入后改名避免重复导入，返回导入条数"""
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取旧统计文件失败 {path}: {e}")
+            return 0
+
+        rows = [tuple(record.get(column) for column in _COLUMNS)
+                for record in records if record.get("start_time") and record.get("end_time")]
+        with self._connect() as conn:
+            conn.executemany(f"""
+                INSERT INTO report_stats ({", ".join(_COLUMNS)})
+                VALUES ({", ".join("?" for _ in _COLUMNS)})
+            """, rows)
+            conn.commit()
+        os.replace(path, path + ".imported")
+        logger.info(f"已导入 {len(rows)} 条历史简报统计: {path}")
+        return len(rows)
+
+
+def main() -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="简报统计趋势")
+    parser.add_argument("--weeks", type=int, default=12, help="显示最近几周（默认 12）")
+    args = parser.parse_args()
+
+    log = ReportStatsLog()
+    print(f"📊 共 {log.count()} 条简报统计，最近 {args.weeks} 周基础操作问题密度（每小时）:")
+    previous = None
+    for week in log.weekly_density(args.weeks):
+        change = "" if previous is None else f" ({week['density'] - previous:+.2f})"
+        print(f"  {week['week']}: {week['density']:.2f}{change}  "
+              f"[{week['reports']} 份简报, {week['basic_operation_count']} 条问题]")
+        previous = week["density"]
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
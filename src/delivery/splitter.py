@@ -0,0 +1,278 @@
+"""
+Telegram 消息切分
+报告只解析一次，按 标题 > 段落 > 列表项 > 普通换行 > 句子 > 空白 的优先级选择切分点：
+- 在满足单条长度上限（按 Telegram 计数的 UTF-16 长度，含 HTML 转义后的实体）的前提下，先保证消息条数最少，
+  再让切分点尽量落在结构边界上（动态规划）
+- 原文先切分再转义，不会把 &amp; 等实体切成两半
+- 跨分段的 ``` 代码块会在前一段末尾闭合、下一段开头重新打开；HTML 输入时同样闭合并重开未结束的标签
+"""
+
+import html
+import re
+from itertools import accumulate
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# 单条消息上限（Telegram 限制 4096，留出余量）
+MAX_MESSAGE_LENGTH = 4000
+
+# 切分点代价：越小越优先
+COST_HEADING = 0  # 标题或分隔线之前
+COST_PARAGRAPH = 1  # 空行（段落之间）
+COST_LIST_ITEM = 2  # 列表项之间
+COST_LINE = 4  # 普通换行
+COST_CODE_LINE = 6  # 代码块内部的换行
+COST_SENTENCE = 8  # 句末
+COST_SPACE = 10  # 空白
+COST_AFTER_HEADING = 12  # 标题和正文之间
+COST_HARD = 20  # 任意位置
+
+_HEADING_RE = re.compile(r"^(#{1,6}\s|-{3,}\s*$|={3,}\s*$|\*{3,}\s*$)")
+_LIST_ITEM_RE = re.compile(r"^\s*([-*+•]\s|\d+[.)]\s)")
+_FENCE_RE = re.compile(r"^\s*```")
+_SENTENCE_END_RE = re.compile(r"[。！？；!?;](?=\S)|[.!?;:](?=\s)|[。！？；]")
+_SPACE_RE = re.compile(r"\s+")
+_TAG_RE = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9-]*)\b[^>]*>")
+_ENTITY_RE = re.compile(r"&#?\w+;")
+
+
+# html.escape 后各字符多出的长度（&amp; &lt; &gt; &quot; &#x27;）
+_ESCAPE_EXTRA = {"&": 4, "<": 3, ">": 3, '"': 5, "'": 5}
+
+
+def utf16_len(text: str) -> int:
+    """Telegram 按 UTF-16 码元计算消息长度（emoji 等占 2）"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+@dataclass
+class _Document:
+    """解析后的报告：各位置的渲染长度前缀和、候选切分点及其代价、代码块/标签状态"""
+    text: str
+    escape: bool
+    prefix: List[int] = field(default_factory=list)
+    cuts: Dict[int, int] = field(default_factory=dict)
+    # 切分点位于代码块内部时的开始行（如 ```python）
+    fences: Dict[int, str] = field(default_factory=dict)
+    # 切分点处尚未闭合的 HTML 标签（开始标签原文，按嵌套顺序）
+    open_tags: Dict[int, Tuple[Tuple[str, str], ...]] = field(default_factory=dict)
+
+    def span(self, start: int, end: int) -> int:
+        return self.prefix[end] - self.prefix[start]
+
+    def overhead(self, start: int, end: int) -> int:
+        """跨段补齐格式（重开/闭合代码块和标签）带来的额外长度"""
+        extra = 0
+        if start in self.fences:
+            extra += utf16_len(self.fences[start]) + 1
+        if end in self.fences:
+            extra += 4
+        for name, raw in self.open_tags.get(start, ()):
+            extra += utf16_len(raw)
+        for name, raw in self.open_tags.get(end, ()):
+            extra += len(name) + 3
+        return extra
+
+    def render(self, start: int, end: int) -> str:
+        part = self.text[start:end].strip("\n")
+        if self.escape:
+            part = html.escape(part)
+        if start in self.fences:
+            part = f"{self.fences[start]}\n{part}"
+        if end in self.fences:
+            part = f"{part}\n```"
+        tags = self.open_tags.get(start, ())
+        if tags:
+            part = "".join(raw for _, raw in tags) + part
+        tags = self.open_tags.get(end, ())
+        if tags:
+            part += "".join(f"</{name}>" for name, _ in reversed(tags))
+        return part
+
+
+def _parse(text: str, limit: int, escape: bool, is_html: bool) -> _Document:
+    doc = _Document(text=text, escape=escape)
+
+    extra = _ESCAPE_EXTRA if escape else {}
+    doc.prefix = list(accumulate(
+        (1 + (ch > "\uffff") + extra.get(ch, 0) for ch in text), initial=0
+    ))
+
+    # HTML 输入：标签和实体内部不能切分
+    forbidden = set()
+    tags = []
+    if is_html:
+        for match in _TAG_RE.finditer(text):
+            forbidden.update(range(match.start() + 1, match.end()))
+            tags.append(match)
+        for match in _ENTITY_RE.finditer(text):
+            forbidden.update(range(match.start() + 1, match.end()))
+
+    # 行边界
+    in_fence: Optional[str] = None
+    fenced_lines = []
+    previous = None
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        end = offset + len(line)
+        if in_fence is not None:
+            fenced_lines.append((offset, end, in_fence))
+        if offset > 0:
+            if in_fence is not None:
+                cost = COST_CODE_LINE
+            elif _HEADING_RE.match(stripped):
+                cost = COST_HEADING
+            elif not stripped or not previous.strip():
+                cost = COST_PARAGRAPH
+            elif _HEADING_RE.match(previous.strip()):
+                cost = COST_AFTER_HEADING
+            elif _LIST_ITEM_RE.match(line):
+                cost = COST_LIST_ITEM
+            else:
+                cost = COST_LINE
+            if offset not in forbidden:
+                doc.cuts[offset] = cost
+        if not is_html and _FENCE_RE.match(line):
+            in_fence = None if in_fence is not None else stripped
+
+        # 单行超长时才在行内找句末和空白
+        if doc.span(offset, end) > limit:
+            for regex, cost in ((_SENTENCE_END_RE, COST_SENTENCE), (_SPACE_RE, COST_SPACE)):
+                for match in regex.finditer(line):
+                    pos = offset + match.end()
+                    if offset < pos < end and pos not in forbidden:
+                        doc.cuts.setdefault(pos, cost)
+        previous = line
+        offset = end
+
+    _add_hard_cuts(doc, limit, forbidden, bool(fenced_lines))
+
+    # 落在代码块内部的切分点需要在两侧补齐 ```
+    for line_start, line_end, opener in fenced_lines:
+        for pos in range(line_start, line_end):
+            if pos in doc.cuts:
+                doc.fences[pos] = opener
+
+    if tags:
+        _track_open_tags(doc, tags)
+    return doc
+
+
+def _add_hard_cuts(doc: _Document, limit: int, forbidden: set, has_fences: bool):
+    """两个候选点之间放不进一条消息时，在其中按上限补充任意位置的切分点"""
+    positions = sorted(set(doc.cuts) | {0, len(doc.text)})
+    # 给跨段补齐格式留出余量
+    budget = max(1, limit - 64) if (has_fences or forbidden) else limit
+    for start, end in zip(positions, positions[1:]):
+        if doc.span(start, end) <= budget:
+            continue
+        last = start
+        pos = start + 1
+        while pos < end:
+            if doc.span(last, pos + 1) > budget and pos not in forbidden and pos > last:
+                doc.cuts[pos] = COST_HARD
+                last = pos
+            pos += 1
+
+
+def _track_open_tags(doc: _Document, tags) -> None:
+    stack: List[Tuple[str, str]] = []
+    positions = sorted(doc.cuts)
+    index = 0
+    for pos in positions:
+        while index < len(tags) and tags[index].end() <= pos:
+            match = tags[index]
+            name = match.group(2).lower()
+            if match.group(1):
+                for i in range(len(stack) - 1, -1, -1):
+                    if stack[i][0] == name:
+                        del stack[i:]
+                        break
+            else:
+                stack.append((name, match.group(0)))
+            index += 1
+        if stack:
+            doc.open_tags[pos] = tuple(stack)
+
+
+def _plan(doc: _Document, limit: int) -> List[int]:
+    """动态规划：先最少分段，再最小切分点代价；返回切分位置列表（含结尾）"""
+    n = len(doc.text)
+    positions = sorted(set(doc.cuts) | {0, n})
+    prefix = doc.prefix
+    has_format = bool(doc.fences or doc.open_tags)
+    best: List[Optional[Tuple[int, int]]] = [None] * len(positions)
+    back = [0] * len(positions)
+    best[0] = (0, 0)
+    for i in range(1, len(positions)):
+        end = positions[i]
+        end_prefix = prefix[end]
+        cut_cost = 0 if end == n else doc.cuts[end]
+        for j in range(i - 1, -1, -1):
+            start = positions[j]
+            length = end_prefix - prefix[start]
+            if length > limit:
+                break
+            if best[j] is None or (has_format and length + doc.overhead(start, end) > limit):
+                continue
+            candidate = (best[j][0] + 1, best[j][1] + cut_cost)
+            if best[i] is None or candidate < best[i]:
+                best[i] = candidate
+                back[i] = j
+    if best[-1] is None:
+        raise ValueError(f"无法在 {limit} 字符内切分消息")
+
+    cuts = []
+    i = len(positions) - 1
+    while i > 0:
+        cuts.append(positions[i])
+        i = back[i]
+    return cuts[::-1]
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH, escape: bool = True,
+                  is_html: bool = False) -> List[str]:
+    """
+    把一条消息切成若干段
+
+    Args:
+        limit: 每段最大长度（UTF-16 码元，按最终发送的文本计算）
+        escape: 原文是纯文本/Markdown，以 HTML parse_mode 发送前需要转义（与 send_to_channel 一致）
+        is_html: 原文已经是 Telegram HTML，切分时不切开标签和实体，并在分段间闭合/重开标签
+
+    Returns:
+        可直接发送的分段列表（空文本返回 [""]）
+    """
+    if escape and is_html:
+        raise ValueError("escape 和 is_html 不能同时使用")
+    if not text.strip():
+        return [""]
+
+    doc = _parse(text, limit, escape, is_html)
+    parts = []
+    start = 0
+    for end in _plan(doc, limit):
+        part = doc.render(start, end)
+        if part.strip():
+            parts.append(part)
+        start = end
+    return parts or [""]
+
+
+def split_point(text: str, limit: int = MAX_MESSAGE_LENGTH, escape: bool = True) -> int:
+    """
+    流式推送用：在渲染后不超过上限的前提下找一个切分点（结构边界优先，且前一段至少占上限的一半）
+
+    Returns:
+        切分位置；整段都放得下时返回 len(text)
+    """
+    doc = _parse(text, limit, escape, is_html=False)
+    if doc.span(0, len(text)) <= limit:
+        return len(text)
+    fitting = [pos for pos in doc.cuts if 0 < pos and doc.span(0, pos) <= limit]
+    if not fitting:
+        return 1
+    furthest = max(fitting)
+    preferred = [pos for pos in fitting if pos >= furthest // 2]
+    return min(preferred, key=lambda pos: (doc.cuts[pos], -pos))
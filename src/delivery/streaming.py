@@ -0,0 +1,85 @@
+"""
+流式报告交付
+把 AI 的流式输出同时扇出到 Obsidian 草稿文件和 Telegram 频道消息
+"""
+
+from typing import Optional
+from loguru import logger
+
+from src.delivery.obsidian import StreamingMarkdownWriter
+
+
+class ReportStreamSink:
+    """
+    报告流式交付汇聚点
+
+    两个下游都是可选的；任一下游出错时只停用该下游，不影响 AI 继续生成。
+    调用方在结束时必须二选一：finish()（流式成功）或 abort()（回退到一次性模式）。
+    """
+
+    def __init__(self, markdown_writer: Optional[StreamingMarkdownWriter] = None, channel_writer=None):
+        self.markdown_writer = markdown_writer
+        self.channel_writer = channel_writer
+        self.started = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.markdown_writer is not None or self.channel_writer is not None
+
+    async def append(self, delta: str):
+        if not delta:
+            return
+        if not self.started:
+            self.started = True
+            if self.markdown_writer is not None:
+                try:
+                    await self.markdown_writer.open()
+                except Exception as e:
+                    logger.error(f"打开 Obsidian 流式草稿失败: {e}")
+                    self.markdown_writer = None
+
+        if self.markdown_writer is not None:
+            try:
+                await self.markdown_writer.append(delta)
+            except Exception as e:
+                logger.error(f"流式写入 Obsidian 失败，后续改为一次性写入: {e}")
+                await self.markdown_writer.abort()
+                self.markdown_writer = None
+
+        if self.channel_writer is not None:
+            try:
+                await self.channel_writer.append(delta)
+            except Exception as e:
+                logger.error(f"流式推送频道失败: {e}")
+                await self.channel_writer.abort()
+                self.channel_writer = None
+
+    async def finish(self, full_content: str, channel_tail: str = "") -> dict:
+        """
+        收尾：Obsidian 写入完整内容，频道追加尾部文本
+
+        Returns:
+            {"obsidian": bool, "channel": bool}，标记哪些下游已完成交付，
+            未完成的下游由调用方使用一次性模式补发
+        """
+        delivered = {"obsidian": False, "channel": False}
+        if self.markdown_writer is not None:
+            try:
+                await self.markdown_writer.finish(full_content)
+                delivered["obsidian"] = True
+            except Exception as e:
+                logger.error(f"Obsidian 流式收尾失败: {e}")
+        if self.channel_writer is not None:
+            delivered["channel"] = await self.channel_writer.finish(channel_tail)
+            if not delivered["channel"]:
+                # 撤回残缺的分片，避免一次性补发后频道里出现重复内容
+                await self.channel_writer.abort()
+        return delivered
+
+    async def abort(self):
+        """撤销所有已产生的流式输出"""
+        if self.markdown_writer is not None:
+            await self.markdown_writer.abort()
+        if self.channel_writer is not None:
+            await self.channel_writer.abort()
+        self.started = False
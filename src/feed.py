@@ -0,0 +1,115 @@
+"""
+实时消息推送
+新入库的消息（type=message）和 AI 分析结果（type=analysis）发布到 FeedHub，按订阅者的筛选条件分发：
+- 订阅者按群组建立索引，只对可能匹配的订阅者检查标签和关键词（关键词合并为一个正则）
+- 每个订阅者的缓冲区有上限，满了丢弃最旧的事件并记录丢弃数量，慢消费者不会阻塞发布方
+"""
+
+import asyncio
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+from src.metrics import metrics
+
+EVENT_TYPES = ("message", "analysis")
+
+
+@dataclass
+class FeedFilter:
+    """订阅筛选条件：各条件之间为“且”，同一条件的多个取值为“或”；为空表示不限"""
+    chat_ids: Set[str] = field(default_factory=set)
+    tags: Set[str] = field(default_factory=set)
+    keywords: List[str] = field(default_factory=list)
+    types: Set[str] = field(default_factory=lambda: set(EVENT_TYPES))
+
+    def __post_init__(self):
+        self._pattern = (re.compile("|".join(re.escape(keyword) for keyword in self.keywords), re.IGNORECASE)
+                         if self.keywords else None)
+
+    def matches(self, event: Dict) -> bool:
+        """群组已由 FeedHub 的索引过滤，这里只检查类型、标签和关键词"""
+        if event["type"] not in self.types:
+            return False
+        data = event["data"]
+        if self.tags and not self.tags.intersection(data.get("tags") or ()):
+            return False
+        if self._pattern is not None:
+            text = f"{data.get('content') or ''}\n{data.get('summary') or ''}"
+            if not self._pattern.search(text):
+                return False
+        return True
+
+
+class Subscription:
+    """一个订阅者：有上限的事件缓冲区"""
+
+    def __init__(self, feed_filter: FeedFilter, buffer_size: int = 256):
+        self.filter = feed_filter
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def offer(self, event: Dict):
+        """放入事件，缓冲区满时丢弃最旧的一条"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            metrics.counter("feed_events_dropped_total").inc()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """取下一条事件；超时返回 None"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def take_dropped(self) -> int:
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class FeedHub:
+    """发布/订阅中心（单个事件循环内使用）"""
+
+    def __init__(self, buffer_size: int = 256):
+        self.buffer_size = buffer_size
+        self._by_chat: Dict[str, Set[Subscription]] = {}
+        self._any_chat: Set[Subscription] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._any_chat) + len({sub for subs in self._by_chat.values() for sub in subs})
+
+    def subscribe(self, feed_filter: Optional[FeedFilter] = None) -> Subscription:
+        feed_filter = feed_filter or FeedFilter()
+        subscription = Subscription(feed_filter, self.buffer_size)
+        if feed_filter.chat_ids:
+            for chat_id in feed_filter.chat_ids:
+                self._by_chat.setdefault(chat_id, set()).add(subscription)
+        else:
+            self._any_chat.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._any_chat.discard(subscription)
+        for chat_id in subscription.filter.chat_ids:
+            subs = self._by_chat.get(chat_id)
+            if subs is not None:
+                subs.discard(subscription)
+                if not subs:
+                    del self._by_chat[chat_id]
+
+    def publish(self, event: Dict) -> int:
+        """分发一条事件（不阻塞），返回投递到的订阅者数量"""
+        chat_id = str(event["data"].get("chat_id"))
+        delivered = 0
+        for subscription in self._any_chat.union(self._by_chat.get(chat_id, ())):
+            if subscription.filter.matches(event):
+                subscription.offer(event)
+                delivered += 1
+        metrics.counter("feed_events_published_total", type=event["type"]).inc()
+        return delivered
+
+    def publish_many(self, events: Iterable[Dict]) -> int:
+        return sum(self.publish(event) for event in events)
@@ -0,0 +1,440 @@
+"""
+按群组自适应的拉取预算
+固定的 limit_per_chat 让安静的频道白白多拉一整页、繁忙的群组被截断（窗口开头的消息悄悄丢失）。这里按各群组的
+历史消息速率（条/小时）估算本次窗口的消息数，在总页数不超过固定上限的前提下分配每个群组的上限：
+
+- iter_messages 每次请求最多返回 100 条，一个群组最多请求 ceil(上限 / 100) 页，预算按页分配：
+  群组数 × ceil(固定上限 / 100)，与固定上限时最坏情况的请求数相同
+- 只要 1 页的群组上限取预计条数（请求更小，不再每次多拉一整页窗口外的旧消息），需要多页的群组上限取整页
+  （同样的请求数多拉满最后一页）
+- 需要的总页数超过预算时按最大最小公平分配（先满足小群组，安静群组用不到的页分给繁忙群组）
+- 没有历史的群组沿用固定上限
+
+每次采集后用各群组的拉取结果更新速率（指数滑动平均）：没有触顶时 速率 = 条数 / 窗口时长；触顶时只覆盖了
+[最早一条, 窗口结束]，速率 = 条数 / 覆盖时长，并记录为截断。速率保存在 data/chat_rates.db，
+以配置中的群组标识为键；还没有记录的数字 ID 群组用分库中近 7 天入库的消息数估算。
+
+采集前各账号先读一次对话列表（get_dialogs，每 100 个对话一次请求）拿到每个群组的最新消息：最新消息早于窗口
+开始的群组窗口内没有消息，不再解析实体、扫描历史（大多数频道没有新帖时，一次采集只剩对话列表请求）。
+其余群组按预计消息数从多到少开始扫描：频道的消息 ID 连续递增，最新消息 ID 减去上次记录的水位即为新增条数；
+没有水位的按拉取上限估计。水位（各账号各群组上次看到的最新消息 ID）保存在同一个数据库的 chat_watermarks 表。
+默认所有扫描同时发出；设置 COLLECTOR_FETCH_CONCURRENCY 后每个账号最多同时扫描这么多个群组，排在前面的先占用名额。
+
+查看最近一次触顶的群组：python -m src.fetch_budget --truncated
+"""
+
+import asyncio
+import math
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Coroutine, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+from loguru import logger
+
+from src.config import config
+from src.metrics import metrics
+
+# Telethon iter_messages 单次请求最多返回的条数
+PAGE_SIZE = 100
+# 速率的指数滑动平均系数（越大越看重最近一次）
+_ALPHA = 0.5
+# 没有预计消息数时，单页请求的最小上限
+_MIN_LIMIT = 10
+# 用分库估算速率时回看的天数
+_HISTORY_DAYS = 7
+
+
+def _pages(limit: int) -> int:
+    return max(1, math.ceil(limit / PAGE_SIZE))
+
+
+def chat_id_candidates(chat: str) -> List[str]:
+    """配置中的群组标识可能对应的 chat_id（@用户名无法直接对应，返回空列表）"""
+    target = chat.split("|")[-1].strip()
+    if not target.lstrip("-").isdigit():
+        return []
+    if target.startswith("-"):
+        return [target]
+    return [target, f"-100{target}"]
+
+
+@dataclass
+class ChatFetch:
+    """一次采集中一个账号拉取一个群组的结果"""
+    chat: str  # 配置中的群组标识
+    account_id: str
+    limit: int
+    fetched: int
+    chat_id: Optional[str] = None
+    chat_name: Optional[str] = None
+    oldest: Optional[datetime] = None  # 拉到的最早一条消息的时间
+
+    @property
+    def truncated(self) -> bool:
+        """拉满上限：窗口开头可能还有没拉到的消息"""
+        return self.fetched >= self.limit > 0
+
+    @classmethod
+    def from_records(cls, chat: str, account_id: str, limit: int, records: Sequence) -> "ChatFetch":
+        if not records:
+            return cls(chat, account_id, limit, 0)
+        first = records[0]
+        return cls(chat, account_id, limit, len(records), first.chat_id, first.chat_name,
+                   min(record.timestamp for record in records))
+
+
+@dataclass
+class ChatActivity:
+    """对话列表中一个群组的最新消息"""
+    chat: str  # 配置中的群组标识
+    account_id: str
+    top_message_id: Optional[int]
+    top_date: Optional[datetime]  # 本地时间
+
+    def idle_since(self, start_time: datetime) -> bool:
+        """最新消息早于 start_time：窗口内没有消息（没有最新消息时无法判断，照常扫描）"""
+        return self.top_date is not None and self.top_date < start_time
+
+
+def schedule_chats(
+    chats: Sequence[str],
+    activity: Dict[str, ChatActivity],
+    start_time: datetime,
+    limits: Dict[str, int],
+    watermarks: Optional[Dict[str, int]] = None
+) -> List[Tuple[int, int]]:
+    """
+    跳过窗口内没有消息的群组，其余按预计消息数从多到少排列
+
+    Args:
+        chats: 一个账号要采集的群组
+        activity: 对话列表预检结果，不在其中的群组照常扫描
+        limits: 群组标识 -> 拉取上限
+        watermarks: 该账号各群组上次记录的最新消息 ID
+
+    Returns:
+        [(群组在 chats 中的序号, 预计消息数)]
+    """
+    watermarks = watermarks or {}
+    scheduled = []
+    for index, chat in enumerate(chats):
+        item = activity.get(chat)
+        if item is not None and item.idle_since(start_time):
+            continue
+        expected = limits[chat]
+        previous = watermarks.get(chat)
+        if item is not None and item.top_message_id is not None and previous is not None:
+            expected = min(expected, max(0, item.top_message_id - previous))
+        scheduled.append((index, expected))
+    scheduled.sort(key=lambda entry: -entry[1])
+    return scheduled
+
+
+_T = TypeVar("_T")
+
+
+class FetchSlots:
+    """按账号限制同时扫描的群组数：每个账号各有 concurrency 个名额，0 表示不限"""
+
+    def __init__(self, concurrency: int = 0):
+        self.concurrency = concurrency
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    async def run(self, account_id: str, fetch: Coroutine[Any, Any, _T]) -> _T:
+        if self.concurrency <= 0:
+            return await fetch
+        semaphore = self._semaphores.setdefault(account_id, asyncio.Semaphore(self.concurrency))
+        try:
+            async with semaphore:
+                return await fetch
+        finally:
+            # 排队时被取消的扫描还没有开始执行，关闭协程以免告警
+            fetch.close()
+
+
+@dataclass
+class ChatCoverage:
+    """一个群组本次的覆盖情况（多个账号拉同一群组时取覆盖最完整的一次）"""
+    chat: str
+    chat_name: Optional[str]
+    limit: int
+    fetched: int
+    truncated: bool
+    covered_hours: float  # 实际覆盖的时长
+    missing_hours: float  # 窗口开头没有覆盖到的时长
+    rate: float  # 更新后的速率（条/小时）
+
+    @property
+    def estimated_missing(self) -> int:
+        return int(round(self.rate * self.missing_hours))
+
+
+class FetchBudget:
+    """各群组消息速率（SQLite）与拉取上限分配"""
+
+    def __init__(self, db_path: Optional[str] = None, headroom: Optional[float] = None,
+                 max_limit: Optional[int] = None, data_dir: Optional[str] = "data"):
+        """
+        Args:
+            db_path: 速率数据库，默认 FETCH_BUDGET_PATH
+            headroom: 预计消息数的放大倍数，默认 FETCH_BUDGET_HEADROOM
+            max_limit: 单个群组的上限，默认 FETCH_BUDGET_MAX_LIMIT
+            data_dir: 按月分库所在目录，用于估算还没有记录的群组；None 表示不使用分库
+        """
+        collector_config = config.collector_config
+        self.db_path = db_path or collector_config.budget_path
+        self.headroom = collector_config.budget_headroom if headroom is None else headroom
+        self.max_limit = collector_config.budget_max_limit if max_limit is None else max_limit
+        self.data_dir = data_dir
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_rates (
+                    chat TEXT PRIMARY KEY,
+                    chat_id TEXT,
+                    chat_name TEXT,
+                    rate REAL NOT NULL,
+                    observations INTEGER NOT NULL DEFAULT 0,
+                    last_limit INTEGER,
+                    last_fetched INTEGER,
+                    truncated INTEGER NOT NULL DEFAULT 0,
+                    missing_hours REAL NOT NULL DEFAULT 0,
+                    updated_at REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_watermarks (
+                    account_id TEXT NOT NULL,
+                    chat TEXT NOT NULL,
+                    top_message_id INTEGER NOT NULL,
+                    top_date TEXT,
+                    updated_at REAL,
+                    PRIMARY KEY (account_id, chat)
+                )
+            """)
+            conn.commit()
+
+    def rates(self, chats: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """已记录的速率（条/小时）"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT chat, rate FROM chat_rates").fetchall()
+        rates = {row["chat"]: row["rate"] for row in rows}
+        if chats is None:
+            return rates
+        return {chat: rates[chat] for chat in chats if chat in rates}
+
+    def history_rates(self, chats: Iterable[str], now: Optional[datetime] = None) -> Dict[str, float]:
+        """用分库中近 _HISTORY_DAYS 天入库的消息数估算速率（只适用于数字 ID 的群组标识）"""
+        if not self.data_dir:
+            return {}
+        from src.storage import Storage, shard_path
+
+        now = now or datetime.now()
+        start = now - timedelta(days=_HISTORY_DAYS)
+        counts: Dict[str, int] = {}
+        month = start.replace(day=1)
+        while month <= now:
+            path = shard_path(month, self.data_dir)
+            if os.path.exists(path):
+                for chat_id, count in Storage(path).get_chat_message_counts(start, now).items():
+                    counts[chat_id] = counts.get(chat_id, 0) + count
+            month = (month + timedelta(days=32)).replace(day=1)
+
+        hours = _HISTORY_DAYS * 24
+        rates = {}
+        for chat in chats:
+            total = sum(counts.get(chat_id, 0) for chat_id in chat_id_candidates(chat))
+            if total:
+                rates[chat] = total / hours
+        return rates
+
+    def plan(self, chats: Sequence[str], hours: float, default_limit: int) -> Dict[str, int]:
+        """
+        分配各群组的拉取上限
+
+        Args:
+            chats: 本次要采集的群组标识（去重后）
+            hours: 采集窗口时长
+            default_limit: 原来的固定上限；总请求数不超过 len(chats) * ceil(default_limit / 100)
+
+        Returns:
+            {群组标识: 上限}
+        """
+        chats = list(dict.fromkeys(chats))
+        rates = self.rates(chats)
+        missing = [chat for chat in chats if chat not in rates]
+        if missing:
+            rates.update(self.history_rates(missing))
+
+        wanted: Dict[str, int] = {}
+        for chat in chats:
+            rate = rates.get(chat)
+            if rate is None:
+                wanted[chat] = default_limit
+            else:
+                wanted[chat] = min(self.max_limit, max(_MIN_LIMIT, math.ceil(rate * hours * self.headroom)))
+
+        pages = {chat: _pages(limit) for chat, limit in wanted.items()}
+        budget = len(chats) * _pages(default_limit)
+        if sum(pages.values()) > budget:
+            pages = _max_min_fair(pages, budget)
+
+        limits = {}
+        for chat in chats:
+            if pages[chat] == 1:
+                limits[chat] = min(wanted[chat], PAGE_SIZE)
+            else:
+                limits[chat] = pages[chat] * PAGE_SIZE
+        logger.info(f"拉取预算: {len(chats)} 个群组 {sum(_pages(limit) for limit in limits.values())}/{budget} 页，"
+                    f"{len(chats) - len(rates)} 个没有历史速率")
+        return limits
+
+    def observe(self, fetches: Iterable[ChatFetch], start_time: datetime, end_time: datetime) -> List[ChatCoverage]:
+        """
+        用本次拉取结果更新各群组速率
+
+        Returns:
+            各群组的覆盖情况，触顶的在前
+        """
+        window_hours = max((end_time - start_time).total_seconds() / 3600, 1e-6)
+        best: Dict[str, ChatFetch] = {}
+        for fetch in fetches:
+            current = best.get(fetch.chat)
+            # 优先没有触顶的一次，其次拉到更多的一次
+            if current is None or (not fetch.truncated, fetch.fetched) > (not current.truncated, current.fetched):
+                best[fetch.chat] = fetch
+
+        previous = self.rates(best)
+        coverage = []
+        now = time.time()
+        with self._connect() as conn:
+            for chat, fetch in best.items():
+                covered = window_hours
+                if fetch.truncated and fetch.oldest is not None:
+                    covered = min(window_hours, max((end_time - fetch.oldest).total_seconds() / 3600, 1e-6))
+                observed = fetch.fetched / covered
+                rate = observed if chat not in previous else _ALPHA * observed + (1 - _ALPHA) * previous[chat]
+                if fetch.truncated:
+                    # 触顶时的观测只是下限，速率至少取到它，下次尽快放大上限
+                    rate = max(rate, observed)
+                missing_hours = window_hours - covered if fetch.truncated else 0.0
+                conn.execute("""
+                    INSERT INTO chat_rates (chat, chat_id, chat_name, rate, observations, last_limit, last_fetched,
+                                            truncated, missing_hours, updated_at)
+                    VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?)
+                    ON CONFLICT(chat) DO UPDATE SET
+                        chat_id = COALESCE(excluded.chat_id, chat_rates.chat_id),
+                        chat_name = COALESCE(excluded.chat_name, chat_rates.chat_name),
+                        rate = excluded.rate,
+                        observations = chat_rates.observations + 1,
+                        last_limit = excluded.last_limit,
+                        last_fetched = excluded.last_fetched,
+                        truncated = excluded.truncated,
+                        missing_hours = excluded.missing_hours,
+                        updated_at = excluded.updated_at
+                """, (chat, fetch.chat_id, fetch.chat_name, rate, fetch.limit, fetch.fetched,
+                      int(fetch.truncated), missing_hours, now))
+                coverage.append(ChatCoverage(chat, fetch.chat_name, fetch.limit, fetch.fetched, fetch.truncated,
+                                             round(covered, 3), round(missing_hours, 3), rate))
+            conn.commit()
+
+        metrics.counter("collector_chats_truncated_total").inc(sum(item.truncated for item in coverage))
+        coverage.sort(key=lambda item: (not item.truncated, -item.missing_hours, item.chat))
+        truncated = [item for item in coverage if item.truncated]
+        if truncated:
+            details = ", ".join(f"{item.chat_name or item.chat}（{item.fetched} 条，缺 {item.missing_hours:.1f} 小时）"
+                                for item in truncated[:10])
+            logger.warning(f"{len(truncated)} 个群组拉满上限，窗口开头的消息可能缺失: {details}")
+        return coverage
+
+    def watermarks(self) -> Dict[str, Dict[str, int]]:
+        """各账号各群组上次记录的最新消息 ID：{账号: {群组标识: 消息 ID}}"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT account_id, chat, top_message_id FROM chat_watermarks").fetchall()
+        watermarks: Dict[str, Dict[str, int]] = {}
+        for row in rows:
+            watermarks.setdefault(row["account_id"], {})[row["chat"]] = row["top_message_id"]
+        return watermarks
+
+    def save_watermarks(self, activity: Iterable[ChatActivity]) -> int:
+        """记录本次对话列表预检看到的最新消息 ID，返回写入的条数"""
+        now = time.time()
+        rows = [(item.account_id, item.chat, item.top_message_id,
+                 item.top_date.isoformat() if item.top_date else None, now)
+                for item in activity if item.top_message_id is not None]
+        with self._connect() as conn:
+            conn.executemany("""
+                INSERT INTO chat_watermarks (account_id, chat, top_message_id, top_date, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(account_id, chat) DO UPDATE SET
+                    top_message_id = excluded.top_message_id,
+                    top_date = excluded.top_date,
+                    updated_at = excluded.updated_at
+            """, rows)
+            conn.commit()
+        return len(rows)
+
+    def truncated(self) -> List[Dict]:
+        """最近一次采集中触顶的群组，缺失时长长的在前"""
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT chat, chat_id, chat_name, rate, last_limit, last_fetched, missing_hours, updated_at
+                FROM chat_rates WHERE truncated = 1
+                ORDER BY missing_hours DESC, chat
+            """).fetchall()
+        return [dict(row) for row in rows]
+
+
+def _max_min_fair(pages: Dict[str, int], budget: int) -> Dict[str, int]:
+    """把 budget 页按最大最小公平分配：每个群组最多拿到自己需要的页数，先满足需要少的"""
+    allocation: Dict[str, int] = {}
+    remaining = budget
+    ordered = sorted(pages, key=lambda chat: pages[chat])
+    for index, chat in enumerate(ordered):
+        share = max(1, remaining // (len(ordered) - index))
+        allocation[chat] = min(pages[chat], share)
+        remaining -= allocation[chat]
+    return allocation
+
+
+def main() -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="查看各群组的拉取预算")
+    parser.add_argument("--truncated", action="store_true", help="只列出最近一次拉满上限的群组")
+    parser.add_argument("--db", help="速率数据库路径，默认 FETCH_BUDGET_PATH")
+    args = parser.parse_args()
+
+    budget = FetchBudget(args.db)
+    if args.truncated:
+        rows = budget.truncated()
+        if not rows:
+            print("✅ 最近一次采集没有群组拉满上限")
+            return 0
+        print(f"{'群组':<32} {'上限':>6} {'拉到':>6} {'速率/时':>8} {'缺失小时':>8}")
+        for row in rows:
+            print(f"{(row['chat_name'] or row['chat'])[:32]:<32} {row['last_limit']:>6} {row['last_fetched']:>6} "
+                  f"{row['rate']:>8.1f} {row['missing_hours']:>8.1f}")
+        return 0
+
+    for chat, rate in sorted(budget.rates().items(), key=lambda item: -item[1]):
+        print(f"{chat:<40} {rate:>8.1f} 条/小时")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
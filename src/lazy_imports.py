@@ -0,0 +1,33 @@
+"""
+延迟导入
+telethon、openai、google-genai 等 SDK 导入耗时数百毫秒，而很多命令只用到其中一个甚至一个都不用。
+lazy_import 返回的模块对象在第一次访问属性时才真正执行导入。
+"""
+
+import importlib.util
+import sys
+from types import ModuleType
+from typing import Optional
+
+
+def lazy_import(name: str) -> Optional[ModuleType]:
+    """
+    延迟导入模块
+
+    Returns:
+        模块对象（首次访问属性时加载）；模块未安装时返回 None
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or spec.loader is None:
+        return None
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,289 @@
+"""
+运行指标
+轻量级的计数器 / 直方图 / 计时器，用于定位一次简报运行的耗时分布。
+每次运行结束时导出 JSON，可选开启 Prometheus 文本格式的 HTTP 端点。
+
+用法:
+    from src.metrics import metrics
+
+    metrics.counter("telegram_messages_fetched_total", account="collector1").inc(120)
+    with metrics.timer("pipeline_stage_seconds", stage="collect"):
+        ...
+
+    @metrics.timed("storage_query_seconds", query="top_mentions")
+    def get_top_mentions(...): ...
+"""
+
+import asyncio
+import functools
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from src.config import config
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# 单个直方图最多保留的样本数（超出后使用蓄水池抽样），保证长时间运行内存有界
+MAX_SAMPLES = 10000
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in items) + "}"
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, lock: threading.Lock):
+        self._lock = lock
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """记录样本分布，导出 count / sum / min / max 和分位数"""
+
+    def __init__(self, lock: threading.Lock):
+        self._lock = lock
+        self._rng = random.Random(0)
+        self.samples: List[float] = []
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float):
+        with self._lock:
+            self.count += 1
+            self.total += value
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+            if len(self.samples) < MAX_SAMPLES:
+                self.samples.append(value)
+            else:
+                slot = self._rng.randrange(self.count)
+                if slot < MAX_SAMPLES:
+                    self.samples[slot] = value
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        rank = q * (len(ordered) - 1)
+        low = int(rank)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+        }
+
+
+class _Timer:
+    """计时上下文管理器，退出时把耗时（秒）记入直方图"""
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.elapsed = 0.0
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self._start
+        self.histogram.observe(self.elapsed)
+        return False
+
+
+class MetricsRegistry:
+    """指标注册表：按 名称 + 标签 区分指标实例"""
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, Counter]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self.started_at = datetime.now()
+        self._server: Optional["ThreadingHTTPServer"] = None
+
+    def counter(self, name: str, **labels) -> Counter:
+        key = _label_key(labels)
+        with self._lock:
+            family = self._counters.setdefault(name, {})
+            if key not in family:
+                family[key] = Counter(threading.Lock())
+            return family[key]
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = _label_key(labels)
+        with self._lock:
+            family = self._histograms.setdefault(name, {})
+            if key not in family:
+                family[key] = Histogram(threading.Lock())
+            return family[key]
+
+    def timer(self, name: str, **labels) -> _Timer:
+        """计时上下文管理器：with metrics.timer("xxx_seconds", stage="collect"): ..."""
+        return _Timer(self.histogram(name, **labels))
+
+    def timed(self, name: str, **labels):
+        """计时装饰器，同时支持同步函数和协程函数"""
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.timer(name, **labels):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started_at = datetime.now()
+
+    def to_dict(self) -> dict:
+        """导出为可 JSON 序列化的字典"""
+        with self._lock:
+            counters = {name: dict(family) for name, family in self._counters.items()}
+            histograms = {name: dict(family) for name, family in self._histograms.items()}
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "exported_at": datetime.now().isoformat(timespec="seconds"),
+            "counters": {
+                name: [{"labels": dict(key), "value": c.value} for key, c in family.items()]
+                for name, family in counters.items()
+            },
+            "histograms": {
+                name: [{"labels": dict(key), **h.summary()} for key, h in family.items()]
+                for name, family in histograms.items()
+            },
+        }
+
+    def write_json(self, run_name: str, output_dir: Optional[str] = None) -> Optional[str]:
+        """把本次运行的指标写入 <output_dir>/<run_name>_<时间>.json，返回文件路径"""
+        output_dir = output_dir or config.metrics_config.output_dir
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            path = os.path.join(output_dir, f"{run_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+            logger.info(f"运行指标已写入 {path}")
+            return path
+        except Exception as e:
+            logger.error(f"写入运行指标失败: {e}")
+            return None
+
+    def render_prometheus(self) -> str:
+        """渲染为 Prometheus 文本格式；直方图以 summary 类型导出分位数"""
+        lines = []
+        with self._lock:
+            counters = {name: dict(family) for name, family in self._counters.items()}
+            histograms = {name: dict(family) for name, family in self._histograms.items()}
+        for name, family in sorted(counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for key, c in family.items():
+                lines.append(f"{name}{_format_labels(key)} {c.value}")
+        for name, family in sorted(histograms.items()):
+            lines.append(f"# TYPE {name} summary")
+            for key, h in family.items():
+                for q in self.QUANTILES:
+                    value = h.percentile(q)
+                    if value is not None:
+                        lines.append(f"{name}{_format_labels(key, {'quantile': str(q)})} {value}")
+                lines.append(f"{name}_sum{_format_labels(key)} {h.total}")
+                lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port: Optional[int] = None, host: str = "127.0.0.1") -> Optional[int]:
+        """
+        在后台线程启动 Prometheus 文本端点（GET /metrics）
+
+        Returns:
+            实际监听的端口；未配置端口或启动失败时返回 None
+        """
+        port = config.metrics_config.prometheus_port if port is None else port
+        if port is None or port < 0 or self._server is not None:
+            return None
+
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            logger.error(f"启动指标端点失败 ({host}:{port}): {e}")
+            return None
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        actual_port = self._server.server_address[1]
+        logger.info(f"Prometheus 指标端点已启动: http://{host}:{actual_port}/metrics")
+        return actual_port
+
+    def stop_http_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# 进程级默认注册表
+metrics = MetricsRegistry()
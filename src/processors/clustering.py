@@ -0,0 +1,224 @@
+"""
+话题聚类
+在分块之前把讨论同一话题/代币的消息聚到一起，使每个话题只在一个分块中被总结一次。
+纯 CPU 离线实现：哈希 TF-IDF 向量 + 增量式 leader 聚类（向量化余弦相似度）。
+"""
+
+import math
+import re
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence
+
+from loguru import logger
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.warning("numpy 包未安装，话题聚类功能将不可用")
+
+from src.config import config, ClusteringConfig
+from src.processors.entities import EntityExtractor
+
+
+_WORD_RE = re.compile(r'[A-Za-z][A-Za-z0-9]{2,}')
+_CJK_RUN_RE = re.compile(r'[\u4e00-\u9fff]{2,}')
+_LINK_RE = re.compile(r'\[link:([^\]]+)\]')
+
+_STOPWORDS = frozenset("""
+the and for you are with this that have from not but was all can will just what your they our out
+get has how its any who one now new see more http https www com
+""".split())
+# 常见但不构成话题的中文二元组
+_CJK_STOP_BIGRAMS = frozenset(["我们", "你们", "他们", "这个", "那个", "什么", "没有", "就是", "可以", "现在", "今天", "一个", "不是", "还是"])
+
+# 代币/项目/合约地址权重更高：同一代币的讨论应优先聚在一起。
+# 实体只取 EntityExtractor 的结果（显式 $TICKER 和已知项目名），不把 OK、AI、USD 这类大写词当作代币
+_TICKER_WEIGHT = 3.0
+_LINK_WEIGHT = 1.5
+
+
+@dataclass
+class TopicCluster:
+    """一个话题簇"""
+    cluster_id: int  # -1 表示未归入任何话题的零散消息
+    indices: List[int] = field(default_factory=list)  # 在原始消息列表中的下标，保持原始顺序
+    label: str = ""  # 话题关键词，用于提示词
+
+    @property
+    def size(self) -> int:
+        return len(self.indices)
+
+
+def _hash_feature(token: str, n_features: int) -> int:
+    # 使用 crc32 而不是 hash()，保证跨进程结果稳定
+    return zlib.crc32(token.encode("utf-8")) % n_features
+
+
+class TopicClusterer:
+    """
+    话题聚类器
+
+    用法:
+        clusters = TopicClusterer().cluster(messages)
+    """
+
+    def __init__(self, clustering_config: Optional[ClusteringConfig] = None,
+                 extractor: Optional[EntityExtractor] = None):
+        self.config = clustering_config or config.clustering_config
+        self.extractor = extractor or EntityExtractor()
+
+    @property
+    def available(self) -> bool:
+        return NUMPY_AVAILABLE and self.config.enabled
+
+    def _tokens(self, text: str) -> Counter:
+        """提取话题特征：代币/项目实体、链接域名、英文词、中文二元组"""
+        tokens: Counter = Counter()
+        for mention in self.extractor.extract(text):
+            tokens[mention.entity] += _TICKER_WEIGHT
+        for domain in _LINK_RE.findall(text):
+            tokens[f"link:{domain}"] += _LINK_WEIGHT
+        for word in _WORD_RE.findall(text):
+            word = word.lower()
+            if word not in _STOPWORDS:
+                tokens[word] += 1.0
+        for run in _CJK_RUN_RE.findall(text):
+            for i in range(len(run) - 1):
+                bigram = run[i:i + 2]
+                if bigram not in _CJK_STOP_BIGRAMS:
+                    tokens[bigram] += 1.0
+        return tokens
+
+    def _hash_rows(self, token_counts: Sequence[Counter]):
+        """把每条消息的特征哈希成 (列下标, 权重) 数组，并统计文档频率"""
+        n_features = self.config.n_features
+        hashed = []
+        df = np.zeros(n_features, dtype=np.float32)
+        for tokens in token_counts:
+            if not tokens:
+                hashed.append(None)
+                continue
+            cols = np.fromiter((_hash_feature(t, n_features) for t in tokens), dtype=np.int64, count=len(tokens))
+            # 次线性 TF：出现多次的特征不会压过其他特征
+            vals = np.fromiter((1.0 + math.log(w) if w >= 1 else w for w in tokens.values()),
+                               dtype=np.float32, count=len(tokens))
+            hashed.append((cols, vals))
+            df[np.unique(cols)] += 1.0
+        idf = np.log((1.0 + len(token_counts)) / (1.0 + df)) + 1.0
+        return hashed, idf.astype(np.float32)
+
+    def _batch_matrix(self, hashed_rows, idf: "np.ndarray") -> "np.ndarray":
+        """按批构建稠密 TF-IDF 矩阵（行向量 L2 归一化），避免一次性占用 n×d 内存"""
+        matrix = np.zeros((len(hashed_rows), self.config.n_features), dtype=np.float32)
+        for row, item in enumerate(hashed_rows):
+            if item is not None:
+                np.add.at(matrix[row], item[0], item[1])
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def cluster(self, messages: Sequence) -> List[TopicCluster]:
+        """
+        对消息聚类
+
+        Args:
+            messages: 任何带 content 属性的消息序列
+
+        Returns:
+            话题簇列表，按规模从大到小排列；零散消息归入最后一个 cluster_id=-1 的簇。
+            未启用或 numpy 不可用时返回空列表，调用方应回退到顺序分块。
+        """
+        if not self.available or not messages:
+            return []
+
+        cfg = self.config
+        token_counts = [self._tokens(getattr(msg, "content", "") or "") for msg in messages]
+        hashed_rows, idf = self._hash_rows(token_counts)
+
+        threshold = cfg.similarity_threshold
+        centroids = np.zeros((cfg.max_clusters, cfg.n_features), dtype=np.float32)
+        centroid_sums = np.zeros_like(centroids)
+        labels = np.full(len(messages), -1, dtype=np.int64)
+        n_clusters = 0
+
+        # 小批量增量聚类：批内先与已有质心做一次矩阵乘法，未命中的再逐条处理
+        for batch_start in range(0, len(messages), cfg.batch_size):
+            batch = self._batch_matrix(hashed_rows[batch_start:batch_start + cfg.batch_size], idf)
+            has_features = np.any(batch != 0, axis=1)
+            if n_clusters:
+                sims = batch @ centroids[:n_clusters].T
+                best = sims.argmax(axis=1)
+                best_sim = sims[np.arange(len(batch)), best]
+            else:
+                best = np.zeros(len(batch), dtype=np.int64)
+                best_sim = np.full(len(batch), -1.0, dtype=np.float32)
+
+            for offset in range(len(batch)):
+                if not has_features[offset]:
+                    continue
+                vec = batch[offset]
+                target = int(best[offset]) if best_sim[offset] >= threshold else -1
+
+                # 本批新建的质心不在 sims 中，需要单独比较
+                if target < 0 and n_clusters:
+                    local_sims = centroids[:n_clusters] @ vec
+                    candidate = int(local_sims.argmax())
+                    if local_sims[candidate] >= threshold:
+                        target = candidate
+
+                if target < 0:
+                    if n_clusters >= cfg.max_clusters:
+                        continue
+                    target = n_clusters
+                    n_clusters += 1
+
+                labels[batch_start + offset] = target
+                centroid_sums[target] += vec
+                norm = np.linalg.norm(centroid_sums[target])
+                if norm > 0:
+                    centroids[target] = centroid_sums[target] / norm
+
+        clusters = []
+        noise = TopicCluster(cluster_id=-1, label="其他")
+        members: List[List[int]] = [[] for _ in range(n_clusters)]
+        for idx, label in enumerate(labels.tolist()):
+            if label >= 0:
+                members[label].append(idx)
+            else:
+                noise.indices.append(idx)
+
+        for cluster_id, indices in enumerate(members):
+            if len(indices) < cfg.min_cluster_size:
+                noise.indices.extend(indices)
+                continue
+            clusters.append(TopicCluster(
+                cluster_id=cluster_id,
+                indices=indices,
+                label=self._label(token_counts, indices)
+            ))
+
+        clusters.sort(key=lambda c: (-c.size, c.indices[0]))
+        if noise.indices:
+            noise.indices.sort()
+            clusters.append(noise)
+
+        logger.info(
+            f"话题聚类完成：{len(messages)} 条消息，{len(clusters) - (1 if noise.indices else 0)} 个话题，"
+            f"零散消息 {len(noise.indices)} 条"
+        )
+        return clusters
+
+    @staticmethod
+    def _label(token_counts: Sequence[Counter], indices: Sequence[int], top_n: int = 3) -> str:
+        """用簇内出现最多的特征作为话题标签，代币代码优先"""
+        total: Counter = Counter()
+        for idx in indices:
+            for token in token_counts[idx]:
+                total[token] += 1
+        ranked = sorted(total.items(), key=lambda kv: (-kv[1], not kv[0].startswith("$"), kv[0]))
+        return " / ".join(token for token, _ in ranked[:top_n])
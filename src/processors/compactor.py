@@ -0,0 +1,207 @@
+"""
+提示词压缩
+在采集之后、分块之前对消息文本做归一化，减少送入模型的 token 数量，同时不改变消息的顺序和数量
+"""
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+from src.config import config, CompactionConfig
+from src.models import UnifiedMessage
+from src.processors.tokens import estimate_token_count
+
+
+_URL_RE = re.compile(r'https?://[^\s<>()\[\]{}"\'，。！？]+', re.IGNORECASE)
+# 表情、装饰符号以及零宽连接符 / 变体选择符
+_SYMBOL_CLASS = r'[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\u2190-\u21FF\u25A0-\u25FF\uFE0F\u200D]'
+_INVISIBLE_JOINERS = ('\uFE0F', '\u200D')
+_SYMBOL_RUN_RE = re.compile(f'{_SYMBOL_CLASS}{{2,}}')
+_PUNCT_RUN_RE = re.compile(r'([!！?？.。~～\-=_*#])\1{3,}')
+_INLINE_SPACE_RE = re.compile(r'[ \t\u00A0\u3000]+')
+_BLANK_LINES_RE = re.compile(r'\n{2,}')
+_QUOTE_PREFIX_RE = re.compile(r'^\s*(?:>|»|›)+\s?')
+
+# 签名、邀请、推广类模板行：命中即删除
+DEFAULT_BOILERPLATE_PATTERNS = [
+    r'\buse my (?:code|link)\b',
+    r'^\s*(?:加入|关注)(?:我们|频道|群组)',
+    r'^\s*(?:join|follow) (?:us|our)\b',
+    r'^\s*(?:—|--|——)\s*(?:来自|sent from|via)\b',
+    r'^\s*powered by\b',
+]
+# 推广关键词：正常讨论中也会出现（如“返佣比例下调”），只有短行且同时带有邀请码或链接时才删除
+PROMO_KEYWORD_PATTERNS = [
+    r'邀请码',
+    r'注册链接',
+    r'返佣',
+    r'推荐码',
+    r'\bref(?:erral)?\s*(?:code|link)\b',
+]
+PROMO_MAX_LINE_CHARS = 80
+# 链接（压缩后为 [link:域名]）、冒号后的代码，或字母数字混合的邀请码
+_PROMO_CODE_RE = re.compile(
+    r'\[link:|https?://|[:：]\s*[A-Za-z0-9]{4,}'
+    r'|(?<![A-Za-z0-9])(?=[A-Za-z]*\d)(?=\d*[A-Za-z])[A-Za-z0-9]{4,}(?![A-Za-z0-9])',
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class CompactionStats:
+    """单次压缩的统计信息"""
+    messages: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+    urls_shortened: int = 0
+    symbol_runs_collapsed: int = 0
+    quoted_lines_dropped: int = 0
+    boilerplate_lines_dropped: int = 0
+    messages_truncated: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    @property
+    def saved_ratio(self) -> float:
+        return self.tokens_saved / self.tokens_before if self.tokens_before else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "messages": self.messages,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": self.tokens_saved,
+            "saved_ratio": round(self.saved_ratio, 4),
+            "urls_shortened": self.urls_shortened,
+            "symbol_runs_collapsed": self.symbol_runs_collapsed,
+            "quoted_lines_dropped": self.quoted_lines_dropped,
+            "boilerplate_lines_dropped": self.boilerplate_lines_dropped,
+            "messages_truncated": self.messages_truncated,
+        }
+
+
+def _normalize_line(line: str) -> str:
+    """用于比较引用行的指纹：去掉引用符号、空白与大小写差异"""
+    return _INLINE_SPACE_RE.sub(' ', _QUOTE_PREFIX_RE.sub('', line)).strip().lower()
+
+
+class PromptCompactor:
+    """
+    消息文本压缩器
+
+    所有正则在初始化时编译一次；compact_messages 返回与输入一一对应的新消息列表，
+    原始消息对象不会被修改，因此基于下标的 ID（basic_question_ids 等）保持不变。
+    """
+
+    def __init__(self, compaction_config: Optional[CompactionConfig] = None):
+        self.config = compaction_config or config.compaction_config
+        patterns = list(DEFAULT_BOILERPLATE_PATTERNS) + list(self.config.boilerplate_patterns or [])
+        self._boilerplate_re = re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE)
+        self._promo_re = re.compile('|'.join(f'(?:{p})' for p in PROMO_KEYWORD_PATTERNS), re.IGNORECASE)
+        self._max_run = max(1, self.config.max_symbol_run)
+
+    def _shorten_url(self, match: re.Match, stats: CompactionStats) -> str:
+        stats.urls_shortened += 1
+        host = urlsplit(match.group(0)).hostname or "url"
+        if host.startswith("www."):
+            host = host[4:]
+        return f"[link:{host}]"
+
+    def _collapse_symbols(self, match: re.Match, stats: CompactionStats) -> str:
+        run = match.group(0)
+        # 统计真实的表情个数（不含零宽连接符/变体选择符）
+        visible = [ch for ch in run if ch not in _INVISIBLE_JOINERS]
+        if len(visible) <= self._max_run:
+            return run
+        stats.symbol_runs_collapsed += 1
+        return ''.join(visible[:self._max_run])
+
+    def _is_boilerplate(self, line: str) -> bool:
+        if self._boilerplate_re.search(line):
+            return True
+        return (len(line) <= PROMO_MAX_LINE_CHARS and self._promo_re.search(line) is not None
+                and _PROMO_CODE_RE.search(line) is not None)
+
+    def compact_text(self, text: str, seen_lines: Optional[Set[str]] = None,
+                     stats: Optional[CompactionStats] = None) -> str:
+        """
+        压缩单条消息文本
+
+        Args:
+            text: 原始文本
+            seen_lines: 已出现过的行指纹，用于识别引用/转发造成的重复；会被原地更新
+            stats: 累计统计信息
+
+        Returns:
+            压缩后的文本
+        """
+        if stats is None:
+            stats = CompactionStats()
+        if not text:
+            return ""
+        cfg = self.config
+
+        if cfg.shorten_urls:
+            text = _URL_RE.sub(lambda m: self._shorten_url(m, stats), text)
+        if cfg.collapse_emoji:
+            text = _SYMBOL_RUN_RE.sub(lambda m: self._collapse_symbols(m, stats), text)
+            text = _PUNCT_RUN_RE.sub(lambda m: m.group(1) * self._max_run, text)
+
+        kept_lines = []
+        for line in text.split('\n'):
+            line = _INLINE_SPACE_RE.sub(' ', line).strip()
+            if not line:
+                kept_lines.append("")
+                continue
+            if cfg.strip_boilerplate and self._is_boilerplate(line):
+                stats.boilerplate_lines_dropped += 1
+                continue
+            if cfg.drop_quoted_duplicates and seen_lines is not None:
+                fingerprint = _normalize_line(line)
+                if _QUOTE_PREFIX_RE.match(line) and fingerprint in seen_lines:
+                    stats.quoted_lines_dropped += 1
+                    continue
+                if fingerprint:
+                    seen_lines.add(fingerprint)
+            kept_lines.append(line)
+
+        text = _BLANK_LINES_RE.sub('\n', '\n'.join(kept_lines)).strip()
+
+        limit = cfg.max_message_chars
+        if limit and len(text) > limit:
+            stats.messages_truncated += 1
+            text = f"{text[:limit]}…[截断{len(text) - limit}字]"
+        return text
+
+    def compact_messages(self, messages: List[UnifiedMessage]) -> Tuple[List[UnifiedMessage], CompactionStats]:
+        """
+        压缩一批消息用于构建提示词
+
+        Returns:
+            (压缩后的消息列表, 统计信息)；未启用压缩时原样返回
+        """
+        stats = CompactionStats(messages=len(messages))
+        if not self.config.enabled:
+            return list(messages), stats
+
+        seen_lines: Set[str] = set()
+        compacted = []
+        for idx, msg in enumerate(messages):
+            original = msg.content or ""
+            text = self.compact_text(original, seen_lines, stats)
+            stats.tokens_before += estimate_token_count(f"[ID:{idx}] {original}")
+            stats.tokens_after += estimate_token_count(f"[ID:{idx}] {text}")
+            compacted.append(msg if text == original else msg.model_copy(update={"content": text}))
+
+        logger.info(
+            f"提示词压缩完成：{stats.messages} 条消息，token {stats.tokens_before} -> {stats.tokens_after}"
+            f"（节省 {stats.tokens_saved}，{stats.saved_ratio:.1%}），"
+            f"缩短链接 {stats.urls_shortened}，删除引用行 {stats.quoted_lines_dropped}，"
+            f"删除模板行 {stats.boilerplate_lines_dropped}，截断 {stats.messages_truncated}"
+        )
+        return compacted, stats
@@ -0,0 +1,144 @@
+"""
+代币/实体提取
+在入库时从消息文本中提取 $TICKER、EVM/Solana 合约地址和已知项目名，
+供 mentions 表、看板和提示词中的预计算提及统计使用。
+mentions 表只由 Storage 写入（collect_compatible.py 和 src.backfill）；简报脚本不入库，用 mention_stats 在内存中统计
+"""
+
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from src.config import config
+
+
+# 已知项目：别名 -> 规范名称。可以通过 KNOWN_PROJECTS 环境变量追加（格式：别名:规范名,别名:规范名）
+DEFAULT_KNOWN_PROJECTS: Dict[str, str] = {
+    "bitcoin": "BTC", "比特币": "BTC", "大饼": "BTC",
+    "ethereum": "ETH", "以太坊": "ETH", "以太": "ETH", "二饼": "ETH",
+    "solana": "SOL", "索拉纳": "SOL",
+    "binance": "Binance", "币安": "Binance",
+    "okx": "OKX", "欧易": "OKX",
+    "bybit": "Bybit",
+    "coinbase": "Coinbase",
+    "uniswap": "Uniswap",
+    "pump.fun": "Pump.fun",
+    "hyperliquid": "Hyperliquid",
+    "tether": "USDT",
+    "ripple": "XRP", "瑞波": "XRP",
+    "dogecoin": "DOGE", "狗狗币": "DOGE",
+    "英伟达": "NVDA", "nvidia": "NVDA",
+    "特斯拉": "TSLA", "tesla": "TSLA",
+    "微策略": "MSTR", "microstrategy": "MSTR",
+}
+
+_CASHTAG_RE = re.compile(r'(?<![\w$])\$([A-Za-z][A-Za-z0-9]{1,9})\b')
+_EVM_ADDRESS_RE = re.compile(r'\b0x[a-fA-F0-9]{40}\b')
+# Base58 字符集（不含 0 O I l），长度 32-44；要求同时包含数字和字母，避免误伤长单词
+_SOLANA_ADDRESS_RE = re.compile(r'(?<![A-Za-z0-9])[1-9A-HJ-NP-Za-km-z]{32,44}(?![A-Za-z0-9])')
+_HAS_DIGIT_RE = re.compile(r'\d')
+
+
+@dataclass(frozen=True)
+class EntityMention:
+    """一次实体提及"""
+    entity: str  # 规范化后的实体名，如 $BTC、0xabc...、Binance
+    entity_type: str  # ticker / evm_address / sol_address / project
+
+
+def _parse_known_projects(raw: str) -> Dict[str, str]:
+    projects = {}
+    for item in raw.split(","):
+        if ":" in item:
+            alias, canonical = item.split(":", 1)
+            if alias.strip() and canonical.strip():
+                projects[alias.strip().lower()] = canonical.strip()
+    return projects
+
+
+class EntityExtractor:
+    """
+    实体提取器
+
+    所有模式在初始化时编译；已知项目名合并成一个按长度降序的交替正则，
+    一次扫描即可匹配全部别名。
+    """
+
+    def __init__(self, known_projects: Optional[Dict[str, str]] = None):
+        if known_projects is None:
+            known_projects = dict(DEFAULT_KNOWN_PROJECTS)
+            known_projects.update(_parse_known_projects(config.known_projects))
+        self.known_projects = {alias.lower(): canonical for alias, canonical in known_projects.items()}
+
+        ascii_aliases = sorted((a for a in self.known_projects if a.isascii()), key=len, reverse=True)
+        cjk_aliases = sorted((a for a in self.known_projects if not a.isascii()), key=len, reverse=True)
+        parts = []
+        if ascii_aliases:
+            parts.append(r'(?<![\w.])(?:' + '|'.join(re.escape(a) for a in ascii_aliases) + r')(?![\w])')
+        if cjk_aliases:
+            parts.append('(?:' + '|'.join(re.escape(a) for a in cjk_aliases) + ')')
+        self._project_re = re.compile('|'.join(parts), re.IGNORECASE) if parts else None
+
+    def extract(self, text: str) -> List[EntityMention]:
+        """提取一条消息中的实体，同一实体在同一条消息中只计一次"""
+        if not text:
+            return []
+
+        found: Dict[str, EntityMention] = {}
+
+        for symbol in _CASHTAG_RE.findall(text):
+            entity = f"${symbol.upper()}"
+            found.setdefault(entity, EntityMention(entity, "ticker"))
+
+        for address in _EVM_ADDRESS_RE.findall(text):
+            entity = address.lower()
+            found.setdefault(entity, EntityMention(entity, "evm_address"))
+
+        for address in _SOLANA_ADDRESS_RE.findall(text):
+            if _HAS_DIGIT_RE.search(address) and not address.isdigit():
+                found.setdefault(address, EntityMention(address, "sol_address"))
+
+        if self._project_re is not None:
+            for match in self._project_re.finditer(text):
+                canonical = self.known_projects.get(match.group(0).lower())
+                if canonical:
+                    # 别名指向代币代码时与 $TICKER 合并统计
+                    if canonical.isupper() and canonical.isalnum():
+                        found.setdefault(f"${canonical}", EntityMention(f"${canonical}", "ticker"))
+                    else:
+                        found.setdefault(canonical, EntityMention(canonical, "project"))
+
+        return list(found.values())
+
+
+def mention_stats(messages: Iterable, extractor: Optional[EntityExtractor] = None, top_n: int = 20) -> List[dict]:
+    """
+    在内存中统计一批消息的实体提及（格式与 Storage.get_top_mentions 一致）
+
+    Returns:
+        [{"entity", "entity_type", "mentions", "chats"}]，按提及次数降序
+    """
+    extractor = extractor or EntityExtractor()
+    counts: Counter = Counter()
+    types: Dict[str, str] = {}
+    chats = defaultdict(set)
+    for msg in messages:
+        for mention in extractor.extract(getattr(msg, "content", "") or ""):
+            counts[mention.entity] += 1
+            types[mention.entity] = mention.entity_type
+            chats[mention.entity].add(getattr(msg, "chat_id", None))
+    return [
+        {"entity": entity, "entity_type": types[entity], "mentions": count, "chats": len(chats[entity])}
+        for entity, count in counts.most_common(top_n)
+    ]
+
+
+def format_mention_stats(stats: List[dict]) -> str:
+    """把提及统计格式化为提示词中的一段文本"""
+    if not stats:
+        return "（本时段没有检测到代币/项目提及）"
+    return "\n".join(
+        f"- {item['entity']}：{item['mentions']} 次提及，涉及 {item['chats']} 个群组"
+        for item in stats
+    )
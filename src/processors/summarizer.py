@@ -1,25 +1,26 @@
 import json
+import time
 import asyncio
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, List, Optional, Dict, Any
 from loguru import logger
 
-try:
-    import google.genai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
+from src.models import UnifiedMessage, ScrapedContent
+from src.config import config
+from src.lazy_imports import lazy_import
+from src.metrics import metrics
+from src.processors.tokens import estimate_token_count
+
+# 服务商 SDK 导入较慢，只检查是否安装，第一次创建客户端时才真正加载
+genai = lazy_import("google.genai")
+GEMINI_AVAILABLE = genai is not None
+if not GEMINI_AVAILABLE:
     logger.warning("google-genai 包未安装，Gemini功能将不可用")
 
-try:
-    from openai import AsyncOpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+openai = lazy_import("openai")
+OPENAI_AVAILABLE = openai is not None
+if not OPENAI_AVAILABLE:
     logger.warning("openai 包未安装，DeepSeek功能将不可用")
 
-from src.models import UnifiedMessage, ScrapedContent
-from src.config import config
-
 
 def _extract_text_from_response(response) -> str:
     """
@@ -78,6 +79,17 @@ def _extract_text_from_response(response) -> str:
     return ""
 
 
+def _usage_tokens(response):
+    """从响应中读取服务端统计的 token 数，返回 (输入, 输出)，没有时返回 (None, None)"""
+    usage = getattr(response, "usage", None)
+    if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+        return usage.prompt_tokens, getattr(usage, "completion_tokens", None)
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None and getattr(usage, "prompt_token_count", None) is not None:
+        return usage.prompt_token_count, getattr(usage, "candidates_token_count", None)
+    return None, None
+
+
 class AISummarizer:
     def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
         """
@@ -107,7 +119,7 @@ class AISummarizer:
         if OPENAI_AVAILABLE and not self.use_gemini:
             deepseek_api_key = api_key or self.ai_config.deepseek_api_key
             deepseek_base_url = base_url or self.ai_config.openai_base_url
-            self.deepseek_client = AsyncOpenAI(
+            self.deepseek_client = openai.AsyncOpenAI(
                 api_key=deepseek_api_key, 
                 base_url=deepseek_base_url
             )
@@ -116,6 +128,23 @@ class AISummarizer:
             self.deepseek_client = None
             if not self.use_gemini and not OPENAI_AVAILABLE:
                 logger.error("没有可用的AI服务，请安装google-generativeai或openai包")
+
+    @property
+    def provider(self) -> str:
+        return "gemini" if self.use_gemini and self.gemini_client else "deepseek"
+
+    def _record_llm_call(self, mode: str, started: float, prompt: str, response_text: str, response=None):
+        """记录一次成功的 AI 调用：延迟、输入/输出 token"""
+        provider = self.provider
+        metrics.histogram("llm_request_seconds", provider=provider, mode=mode).observe(time.perf_counter() - started)
+        metrics.counter("llm_requests_total", provider=provider, mode=mode).inc()
+        tokens_in, tokens_out = _usage_tokens(response) if response is not None else (None, None)
+        if tokens_in is None:
+            tokens_in = estimate_token_count(prompt)
+        if tokens_out is None:
+            tokens_out = estimate_token_count(response_text or "")
+        metrics.counter("llm_tokens_in_total", provider=provider).inc(tokens_in)
+        metrics.counter("llm_tokens_out_total", provider=provider).inc(tokens_out)
     
     async def summarize_message(self, message: UnifiedMessage, scraped_contents: List[ScrapedContent] = []) -> dict:
         """
@@ -196,7 +225,11 @@ class AISummarizer:
             AI生成的文本
         """
         last_error = None
+        mode = "json" if json_format else "text"
         for attempt in range(max_retries):
+            if attempt:
+                metrics.counter("llm_retries_total", provider=self.provider, mode=mode).inc()
+            started = time.perf_counter()
             try:
                 if self.use_gemini and self.gemini_client:
                     # 构建完整的提示词（Gemini不支持独立的system消息）
@@ -221,6 +254,7 @@ class AISummarizer:
                     response_text = _extract_text_from_response(response)
                     if not isinstance(response_text, str):
                         raise ValueError(f"Gemini返回了非文本格式: {type(response_text)}")
+                    self._record_llm_call(mode, started, full_prompt, response_text, response)
                     return response_text
                 elif self.deepseek_client:
                     # 使用DeepSeek API
@@ -238,11 +272,14 @@ class AISummarizer:
                         request_params["response_format"] = {'type': 'json_object'}
 
                     response = await self.deepseek_client.chat.completions.create(**request_params)
-                    return response.choices[0].message.content
+                    response_text = response.choices[0].message.content
+                    self._record_llm_call(mode, started, f"{system_prompt or ''}\n{prompt}", response_text, response)
+                    return response_text
                 else:
                     raise RuntimeError("没有可用的AI服务")
             except Exception as e:
                 last_error = e
+                metrics.counter("llm_failures_total", provider=self.provider, mode=mode).inc()
                 if attempt < max_retries - 1:
                     logger.warning(f"AI调用失败，{retry_delay}秒后重试 ({attempt + 1}/{max_retries}): {e}")
                     await asyncio.sleep(retry_delay)
@@ -250,7 +287,102 @@ class AISummarizer:
 
         logger.error(f"AI调用失败，已重试 {max_retries} 次: {last_error}")
         raise last_error
-    
+
+    async def stream_summary_with_prompt(self, prompt: str, system_prompt: Optional[str] = None,
+                                         temperature: float = 0.3, max_retries: int = 3,
+                                         retry_delay: float = 2.0) -> AsyncIterator[str]:
+        """
+        流式AI调用方法，逐段产出生成的文本，支持Gemini和DeepSeek
+
+        只有在尚未产出任何文本时才会重试；一旦开始输出，中途的异常会直接抛给调用方，
+        由调用方决定是否回退到一次性生成模式。
+
+        Args:
+            prompt: 用户提示词
+            system_prompt: 系统提示词（可选）
+            temperature: 温度参数
+            max_retries: 最大重试次数
+            retry_delay: 重试间隔（秒）
+
+        Yields:
+            AI生成的文本增量
+        """
+        last_error = None
+        full_prompt = f"{system_prompt or ''}\n{prompt}"
+        for attempt in range(max_retries):
+            if attempt:
+                metrics.counter("llm_retries_total", provider=self.provider, mode="stream").inc()
+            started = False
+            request_started = time.perf_counter()
+            deltas: List[str] = []
+            try:
+                if self.use_gemini and self.gemini_client:
+                    full_prompt = ""
+                    if system_prompt:
+                        full_prompt += f"System: {system_prompt}\n\n"
+                    full_prompt += prompt
+
+                    stream = await self.gemini_client.aio.models.generate_content_stream(
+                        model=self.gemini_model_name,
+                        contents=full_prompt,
+                        config={"temperature": temperature}
+                    )
+                    async for chunk in stream:
+                        # 流式分片可能只包含元数据，不能使用会告警的 _extract_text_from_response
+                        try:
+                            delta = chunk.text
+                        except (AttributeError, TypeError, ValueError):
+                            delta = None
+                        if delta:
+                            if not started:
+                                metrics.histogram("llm_first_token_seconds", provider=self.provider).observe(
+                                    time.perf_counter() - request_started)
+                            started = True
+                            deltas.append(delta)
+                            yield delta
+                    self._record_llm_call("stream", request_started, full_prompt, "".join(deltas))
+                    return
+                elif self.deepseek_client:
+                    messages = []
+                    if system_prompt:
+                        messages.append({"role": "system", "content": system_prompt})
+                    messages.append({"role": "user", "content": prompt})
+
+                    stream = await self.deepseek_client.chat.completions.create(
+                        model="deepseek-chat",
+                        messages=messages,
+                        temperature=temperature,
+                        stream=True
+                    )
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if not started:
+                                metrics.histogram("llm_first_token_seconds", provider=self.provider).observe(
+                                    time.perf_counter() - request_started)
+                            started = True
+                            deltas.append(delta)
+                            yield delta
+                    self._record_llm_call("stream", request_started, full_prompt, "".join(deltas))
+                    return
+                else:
+                    raise RuntimeError("没有可用的AI服务")
+            except Exception as e:
+                metrics.counter("llm_failures_total", provider=self.provider, mode="stream").inc()
+                if started:
+                    logger.error(f"AI流式输出中断: {e}")
+                    raise
+                last_error = e
+                if attempt < max_retries - 1:
+                    logger.warning(f"AI流式调用失败，{retry_delay}秒后重试 ({attempt + 1}/{max_retries}): {e}")
+                    await asyncio.sleep(retry_delay)
+                continue
+
+        logger.error(f"AI流式调用失败，已重试 {max_retries} 次: {last_error}")
+        raise last_error
+
     async def generate_json_response(self, prompt: str, system_prompt: Optional[str] = None,
                                     temperature: float = 0.3, max_retries: int = 3) -> Dict[str, Any]:
         """
@@ -346,6 +478,3 @@ class AISummarizer:
         # 兜底：返回原始文本，让后面的错误处理捕获
         logger.warning(f"无法清理JSON格式，返回原始文本")
         return text
-        except Exception as e:
-            logger.error(f"生成JSON响应失败: {e}")
-            raise
\ No newline at end of file
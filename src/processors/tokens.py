@@ -0,0 +1,18 @@
+"""
+Token 估算工具
+"""
+
+import re
+
+_ENGLISH_WORD_RE = re.compile(r'\b[a-zA-Z]+\b')
+_CHINESE_CHAR_RE = re.compile(r'[\u4e00-\u9fff]')
+
+
+def estimate_token_count(text):
+    """粗略估计文本的token数量（英文单词数 + 中文字符数 * 2）"""
+    # 简单估算：英文单词数 + 中文字符数 * 2
+    english_words = len(_ENGLISH_WORD_RE.findall(text))
+    chinese_chars = len(_CHINESE_CHAR_RE.findall(text))
+    # 其他字符（标点、数字等）按0.5倍计算
+    other_chars = len(text) - english_words - chinese_chars
+    return english_words + chinese_chars * 2 + int(other_chars * 0.5)
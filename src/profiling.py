@@ -0,0 +1,310 @@
+"""
+性能剖析
+脚本带 --profile 运行时，按流水线阶段运行 cProfile 或采样剖析器，并用 tracemalloc 记录各阶段的内存峰值。
+产物写入 data/profiles/<脚本>_<时间>/，运行结束时打印汇总；未开启时 stage() 是空操作。
+
+用法:
+    from src.profiling import profiler, add_profile_arguments
+
+    parser = argparse.ArgumentParser()
+    add_profile_arguments(parser)
+    profiler.configure_from_args(parser.parse_args(), "process_24h_report")
+
+    with profiler.stage("collect"):
+        ...
+
+    profiler.finish()
+
+说明:
+    - 阶段可以嵌套，cProfile 和采样按最内层阶段归属（外层阶段不重复计入内层的热点），
+      汇总中的耗时是包含内层阶段的墙钟时间；
+    - 阶段内的 await 期间运行的其他协程也会计入该阶段；
+    - *.prof 可用 `python -m pstats` 或 snakeviz 查看，*.folded 可直接喂给 flamegraph.pl / speedscope。
+"""
+
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+
+DEFAULT_PROFILE_DIR = os.path.join("data", "profiles")
+PROFILE_MODES = ("cprofile", "sample")
+
+# 汇总中每个阶段展示的热点数量
+TOP_HOTSPOTS = 5
+# 每个阶段记录的内存增长最多的代码行数量
+TOP_ALLOCATIONS = 15
+
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def add_profile_arguments(parser):
+    """给脚本的 argparse 解析器加上剖析相关参数"""
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=PROFILE_MODES, default=None,
+                        help="按阶段剖析：cprofile（默认，精确）或 sample（采样，开销更低）")
+    parser.add_argument("--profile-dir", default=DEFAULT_PROFILE_DIR, help="剖析产物目录")
+    parser.add_argument("--profile-interval", type=float, default=0.005, help="采样间隔（秒），仅 sample 模式")
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _StageStats:
+    """单个阶段（可能多次进入）的累计数据"""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.peak_bytes = 0
+        self.allocated_bytes = 0
+        self.profile: Optional[cProfile.Profile] = None
+        self.samples: Counter = Counter()
+        self.memory_top: List[str] = []
+
+
+class _ActiveStage:
+    def __init__(self, name: str):
+        self.name = name
+        self.peak_bytes = 0
+
+
+class _Sampler(threading.Thread):
+    """定时抓取目标线程的调用栈，按当前阶段累计折叠栈"""
+
+    def __init__(self, profiler: "Profiler", thread_id: int, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.profiler = profiler
+        self.thread_id = thread_id
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            stats = self.profiler._current_stats()
+            frame = sys._current_frames().get(self.thread_id)
+            if stats is None or frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stats.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Profiler:
+    """按阶段收集 CPU 和内存剖析数据"""
+
+    def __init__(self):
+        self.mode: Optional[str] = None
+        self.run_name = ""
+        self.output_dir: Optional[str] = None
+        self._stats: Dict[str, _StageStats] = {}
+        self._stack: List[_ActiveStage] = []
+        self._sampler: Optional[_Sampler] = None
+        self._owns_tracemalloc = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode is not None
+
+    def configure(self, mode: Optional[str], run_name: str, output_dir: Optional[str] = None,
+                  interval: float = 0.005):
+        """开启剖析；mode 为空时保持关闭"""
+        if not mode:
+            return
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"不支持的剖析模式: {mode}")
+        self.mode = mode
+        self.run_name = run_name
+        self.output_dir = os.path.join(output_dir or DEFAULT_PROFILE_DIR,
+                                       f"{run_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        self._stats = {}
+        self._stack = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        if mode == "sample":
+            self._sampler = _Sampler(self, threading.get_ident(), interval)
+            self._sampler.start()
+        logger.info(f"性能剖析已开启（{mode}），产物目录: {self.output_dir}")
+
+    def configure_from_args(self, args, run_name: str):
+        """根据 add_profile_arguments 解析出的参数开启剖析"""
+        self.configure(args.profile, run_name, args.profile_dir, args.profile_interval)
+
+    def _current_stats(self) -> Optional[_StageStats]:
+        stack = self._stack
+        return self._stats.get(stack[-1].name) if stack else None
+
+    def stage(self, name: str):
+        """阶段上下文管理器；未开启剖析时直接返回空上下文"""
+        if self.mode is None:
+            return contextlib.nullcontext()
+        return self._profile_stage(name)
+
+    @contextlib.contextmanager
+    def _profile_stage(self, name: str):
+        stats = self._stats.setdefault(name, _StageStats())
+        parent = self._stack[-1] if self._stack else None
+        if parent is not None:
+            # 暂停外层阶段：记下到目前为止的峰值，CPU 时间改由内层阶段承担
+            parent.peak_bytes = max(parent.peak_bytes, tracemalloc.get_traced_memory()[1])
+            parent_stats = self._stats[parent.name]
+            if parent_stats.profile is not None:
+                parent_stats.profile.disable()
+
+        active = _ActiveStage(name)
+        tracemalloc.reset_peak()
+        memory_start = tracemalloc.get_traced_memory()[0]
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        self._stack.append(active)
+        if self.mode == "cprofile":
+            stats.profile = stats.profile or cProfile.Profile()
+            stats.profile.enable()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            if stats.profile is not None:
+                stats.profile.disable()
+            self._stack.pop()
+
+            current, peak = tracemalloc.get_traced_memory()
+            active.peak_bytes = max(active.peak_bytes, peak)
+            stats.calls += 1
+            stats.seconds += elapsed
+            stats.peak_bytes = max(stats.peak_bytes, active.peak_bytes)
+            stats.allocated_bytes += current - memory_start
+            growth = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS).compare_to(snapshot, "lineno")
+            stats.memory_top = [str(stat) for stat in growth[:TOP_ALLOCATIONS]]
+
+            if parent is not None:
+                parent.peak_bytes = max(parent.peak_bytes, active.peak_bytes)
+                parent_stats = self._stats[parent.name]
+                if parent_stats.profile is not None:
+                    parent_stats.profile.enable()
+
+    @staticmethod
+    def _cprofile_hotspots(profile: cProfile.Profile) -> List[dict]:
+        raw = pstats.Stats(profile).stats
+        ordered = sorted(raw.items(), key=lambda item: item[1][2], reverse=True)[:TOP_HOTSPOTS]
+        return [
+            {
+                "function": f"{func} ({os.path.basename(filename)}:{line})",
+                "calls": nc,
+                "self_seconds": round(tt, 6),
+                "cumulative_seconds": round(ct, 6),
+            }
+            for (filename, line, func), (cc, nc, tt, ct, callers) in ordered
+        ]
+
+    @staticmethod
+    def _sample_hotspots(samples: Counter) -> List[dict]:
+        total = sum(samples.values())
+        leaves: Counter = Counter()
+        for stack, count in samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return [
+            {"function": leaf, "samples": count, "share": round(count / total, 4)}
+            for leaf, count in leaves.most_common(TOP_HOTSPOTS)
+        ]
+
+    def summary(self) -> dict:
+        stages = {}
+        for name, stats in self._stats.items():
+            entry = {
+                "calls": stats.calls,
+                "seconds": round(stats.seconds, 6),
+                "peak_memory_bytes": stats.peak_bytes,
+                "allocated_bytes": stats.allocated_bytes,
+                "hotspots": [],
+            }
+            if stats.profile is not None:
+                entry["hotspots"] = self._cprofile_hotspots(stats.profile)
+            elif stats.samples:
+                entry["samples"] = sum(stats.samples.values())
+                entry["hotspots"] = self._sample_hotspots(stats.samples)
+            stages[name] = entry
+        return {"run_name": self.run_name, "mode": self.mode, "stages": stages}
+
+    def finish(self) -> Optional[str]:
+        """停止剖析、写出产物并打印汇总，返回产物目录"""
+        if self.mode is None:
+            return None
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler = None
+
+        output_dir = self.output_dir
+        summary = self.summary()
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            for name, stats in self._stats.items():
+                if stats.profile is not None:
+                    stats.profile.dump_stats(os.path.join(output_dir, f"{name}.prof"))
+                if stats.samples:
+                    with open(os.path.join(output_dir, f"{name}.folded"), "w", encoding="utf-8") as f:
+                        for stack, count in stats.samples.most_common():
+                            f.write(f"{stack} {count}\n")
+                if stats.memory_top:
+                    with open(os.path.join(output_dir, f"{name}_memory.txt"), "w", encoding="utf-8") as f:
+                        f.write("\n".join(stats.memory_top) + "\n")
+            with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.error(f"写入剖析产物失败: {e}")
+        finally:
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+                self._owns_tracemalloc = False
+            self.mode = None
+
+        print(format_summary(summary, output_dir))
+        return output_dir
+
+
+def format_summary(summary: dict, output_dir: str) -> str:
+    """把剖析汇总格式化为终端表格"""
+    mb = 1024 * 1024
+    lines = [
+        f"\n📈 性能剖析汇总（{summary['mode']}）→ {output_dir}",
+        # 中文表头按显示宽度对齐（每个汉字占两列）
+        f"  {'阶段':<18}{'次数':>4}{'耗时(s)':>10}{'峰值内存(MB)':>12}{'净分配(MB)':>11}",
+    ]
+    for name, entry in sorted(summary["stages"].items(), key=lambda item: item[1]["seconds"], reverse=True):
+        lines.append(
+            f"  {name:<20}{entry['calls']:>6}{entry['seconds']:>12.3f}"
+            f"{entry['peak_memory_bytes'] / mb:>16.1f}{entry['allocated_bytes'] / mb:>14.1f}"
+        )
+        for hotspot in entry["hotspots"][:3]:
+            if "self_seconds" in hotspot:
+                lines.append(f"      {hotspot['self_seconds']:>8.3f}s  {hotspot['function']}")
+            else:
+                lines.append(f"      {hotspot['share']:>8.1%}   {hotspot['function']}")
+    return "\n".join(lines)
+
+
+# 进程级默认剖析器（默认关闭）
+profiler = Profiler()
@@ -0,0 +1,282 @@
+"""
+常驻调度器
+替代 cron / launchd 每次唤醒都冷启动 Python 的方式：进程常驻，Telegram 会话和 AI 客户端保持连接，
+按 cron 表达式运行各项任务，并提供防重叠、错过补跑和优雅退出。
+
+任务函数签名为 async def job(scheduled_at: datetime)，scheduled_at 是本次触发对应的计划时间。
+"""
+
+import asyncio
+import json
+import os
+import signal
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, FrozenSet, List, Optional
+
+from loguru import logger
+
+from src.metrics import metrics
+
+
+def _parse_field(field: str, low: int, high: int) -> FrozenSet[int]:
+    """解析 cron 的单个字段，支持 *、*/n、a、a-b、a-b/n、a/n 和逗号列表"""
+    values = set()
+    for part in field.split(","):
+        step = 1
+        has_step = "/" in part
+        if has_step:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"cron 步长必须为正数: {field}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            end = high if has_step else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"cron 字段超出范围 [{low}, {high}]: {field}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule:
+    """五段式 cron 表达式（分 时 日 月 周），按本地时间计算"""
+
+    def __init__(self, expr: str):
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron 表达式需要 5 段（分 时 日 月 周）: {expr!r}")
+        self.expr = expr
+        self.minutes = _parse_field(parts[0], 0, 59)
+        self.hours = _parse_field(parts[1], 0, 23)
+        self.days = _parse_field(parts[2], 1, 31)
+        self.months = _parse_field(parts[3], 1, 12)
+        # 周日既可以写 0 也可以写 7
+        self.weekdays = frozenset(d % 7 for d in _parse_field(parts[4], 0, 7))
+        self._any_day = parts[2] == "*"
+        self._any_weekday = parts[4] == "*"
+
+    def _day_matches(self, dt: datetime) -> bool:
+        # 与标准 cron 一致：日和周都有限制时，满足任一即可
+        day_ok = dt.day in self.days
+        weekday_ok = dt.isoweekday() % 7 in self.weekdays
+        if self._any_day and self._any_weekday:
+            return True
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, dt: datetime) -> datetime:
+        """返回严格晚于 dt 的下一次触发时间"""
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # 2 月 29 日这类表达式最多要找 4 年
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"cron 表达式不会触发: {self.expr}")
+
+    def __repr__(self) -> str:
+        return f"CronSchedule({self.expr!r})"
+
+
+@dataclass
+class Job:
+    """调度任务"""
+    name: str
+    schedule: CronSchedule
+    func: Callable[[datetime], Awaitable]
+    catch_up: bool = True  # 停机期间错过时，启动后立即补跑一次
+    timeout: Optional[float] = None  # 单次运行超时（秒）
+
+
+def acquire_instance_lock(path: str):
+    """
+    获取单实例文件锁，防止同时运行多个调度进程（或与 cron 任务重叠）
+
+    Returns:
+        持有锁的文件对象（进程退出时自动释放）；已被占用时返回 None
+    """
+    import fcntl
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    handle = open(path, "a+")
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    handle.seek(0)
+    handle.truncate()
+    handle.write(str(os.getpid()))
+    handle.flush()
+    return handle
+
+
+class Scheduler:
+    """按 cron 表达式在同一事件循环中运行任务"""
+
+    def __init__(self, jobs: List[Job], state_path: str, tick_seconds: float = 30.0,
+                 shutdown_timeout: float = 300.0, clock: Callable[[], datetime] = datetime.now):
+        """
+        Args:
+            jobs: 任务列表
+            state_path: 任务状态文件（记录上次运行时间，用于错过补跑）
+            tick_seconds: 最长检查间隔；按墙钟时间判断到期，系统休眠唤醒后也能及时触发
+            shutdown_timeout: 退出时等待运行中任务的最长时间（秒），超时后取消
+            clock: 当前时间函数（测试时可替换）
+        """
+        self.jobs: Dict[str, Job] = {job.name: job for job in jobs}
+        self.state_path = state_path
+        self.tick_seconds = tick_seconds
+        self.shutdown_timeout = shutdown_timeout
+        self.clock = clock
+        self.state: Dict[str, dict] = self._load_state()
+        self.next_runs: Dict[str, datetime] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._stopping: Optional[asyncio.Event] = None
+
+    def _load_state(self) -> Dict[str, dict]:
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"读取调度状态失败，将按首次启动处理: {e}")
+            return {}
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def last_run_at(self, name: str) -> Optional[datetime]:
+        value = self.state.get(name, {}).get("last_run_at")
+        return datetime.fromisoformat(value) if value else None
+
+    def plan(self, now: Optional[datetime] = None):
+        """计算各任务的下一次运行时间；停机期间错过的任务安排立即补跑"""
+        now = now or self.clock()
+        for name, job in self.jobs.items():
+            last = self.last_run_at(name)
+            if job.catch_up and last is not None and job.schedule.next_after(last) <= now:
+                logger.info(f"任务 {name} 上次运行于 {last}，错过了计划时间，立即补跑")
+                self.next_runs[name] = now
+            else:
+                self.next_runs[name] = job.schedule.next_after(now)
+            logger.info(f"任务 {name} ({job.schedule.expr}) 下次运行: {self.next_runs[name]}")
+
+    def is_running(self, name: str) -> bool:
+        task = self._running.get(name)
+        return task is not None and not task.done()
+
+    def launch(self, name: str, scheduled_at: Optional[datetime] = None) -> Optional[asyncio.Task]:
+        """启动一次任务；上一次运行尚未结束时跳过，返回 None"""
+        job = self.jobs[name]
+        if self.is_running(name):
+            logger.warning(f"任务 {name} 上一次运行尚未结束，跳过本次触发")
+            metrics.counter("scheduler_runs_skipped_total", job=name).inc()
+            return None
+        task = asyncio.create_task(self._run_job(job, scheduled_at or self.clock()))
+        self._running[name] = task
+        return task
+
+    async def _run_job(self, job: Job, scheduled_at: datetime):
+        logger.info(f"开始运行任务 {job.name}（计划时间 {scheduled_at}）")
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            with metrics.timer("scheduler_job_seconds", job=job.name):
+                if job.timeout:
+                    await asyncio.wait_for(job.func(scheduled_at), job.timeout)
+                else:
+                    await job.func(scheduled_at)
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except Exception as e:
+            status = "failed"
+            logger.exception(f"任务 {job.name} 运行失败: {e}")
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.counter("scheduler_runs_total", job=job.name, status=status).inc()
+            if status != "cancelled":
+                # 失败也记录运行时间，避免重启后反复补跑同一个失败任务
+                self.state[job.name] = {
+                    "last_run_at": scheduled_at.isoformat(timespec="seconds"),
+                    "last_status": status,
+                    "last_duration": round(elapsed, 3),
+                }
+                try:
+                    self._save_state()
+                except Exception as e:
+                    logger.error(f"保存调度状态失败: {e}")
+            logger.info(f"任务 {job.name} 结束: {status}，耗时 {elapsed:.1f}s")
+
+    def stop(self):
+        """请求退出：不再触发新任务，等待运行中的任务结束"""
+        if self._stopping is not None and not self._stopping.is_set():
+            logger.info("收到退出信号，等待运行中的任务结束...")
+            self._stopping.set()
+
+    def _install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                # 非主线程或不支持信号处理的平台
+                pass
+
+    async def run(self):
+        """主循环，直到 stop() 被调用"""
+        self._stopping = asyncio.Event()
+        self._install_signal_handlers()
+        self.plan()
+
+        while not self._stopping.is_set():
+            now = self.clock()
+            for name, due in list(self.next_runs.items()):
+                if due <= now:
+                    self.next_runs[name] = self.jobs[name].schedule.next_after(now)
+                    self.launch(name, due)
+
+            seconds_to_next = min((due - now).total_seconds() for due in self.next_runs.values()) \
+                if self.next_runs else self.tick_seconds
+            wait = max(0.0, min(self.tick_seconds, seconds_to_next))
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+        await self._drain()
+
+    async def _drain(self):
+        running = [task for task in self._running.values() if not task.done()]
+        if not running:
+            return
+        done, pending = await asyncio.wait(running, timeout=self.shutdown_timeout)
+        if pending:
+            logger.warning(f"{len(pending)} 个任务在 {self.shutdown_timeout}s 内未结束，取消运行")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
@@ -1,11 +1,97 @@
 import sqlite3
+import time
 from datetime import datetime
 from src.models import UnifiedMessage, Platform
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 import json
 from loguru import logger
 
+from src.authors import UNKNOWN_AUTHOR, AuthorProfile
 from src.config import config
+from src.metrics import metrics
+from src.processors.entities import EntityExtractor
+
+# 旧数据中的 tags 可能不是合法 JSON，json_each 遇到会报错
+_VALID_TAGS = "CASE WHEN json_valid(messages.tags) THEN messages.tags END"
+# 走 idx_messages_analyzed_seq 取当前最大值，O(log n)
+_NEXT_ANALYZED_SEQ = "(SELECT COALESCE(MAX(analyzed_seq), 0) + 1 FROM messages WHERE analyzed_seq IS NOT NULL)"
+
+
+MESSAGE_COLUMNS = "internal_id, chat_id, chat_name, author_name, content, summary, tags, timestamp, processed"
+# 作者名称保存在 authors 表，消息行按 author_id 引用；旧数据的作者名称仍在 messages.author_name
+AUTHOR_MESSAGE_COLUMNS = ("messages.internal_id, chat_id, chat_name, "
+                          "COALESCE(authors.display_name, messages.author_name) AS author_name, "
+                          "content, summary, tags, timestamp, processed")
+MESSAGES_WITH_AUTHORS = "messages LEFT JOIN authors ON authors.author_id = messages.author_id"
+
+
+def shard_path(timestamp: datetime, data_dir: str = "data") -> str:
+    """消息时间所在月份的分库路径（data/raw_messages_YYYY_MM.db）"""
+    import os
+    return os.path.join(data_dir, f"raw_messages_{timestamp:%Y_%m}.db")
+
+
+def message_source(with_authors: bool = True) -> Tuple[str, str]:
+    """
+    查询消息用的 (列, FROM 子句)
+
+    Args:
+        with_authors: 分库是否已有 authors 表；还没有被新版本打开过的旧分库传 False
+    """
+    if with_authors:
+        return AUTHOR_MESSAGE_COLUMNS, MESSAGES_WITH_AUTHORS
+    return MESSAGE_COLUMNS, "messages"
+
+
+def build_message_query(chat_ids: Optional[List[str]] = None, start_time: Optional[datetime] = None,
+                        end_time: Optional[datetime] = None, tags: Optional[List[str]] = None,
+                        processed: Optional[bool] = None, cursor: Optional[tuple] = None,
+                        limit: Optional[int] = None, search: Optional[str] = None,
+                        with_authors: bool = True) -> Tuple[str, list]:
+    """
+    生成按时间倒序查询消息的 SQL（看板和只读 API 共用）
+
+    Args:
+        tags: 包含任一标签即匹配
+        cursor: (时间戳, internal_id)，只返回排在它之后的消息
+        search: 在原文和摘要中按子串匹配
+        with_authors: 见 message_source
+    """
+    where, params = [], []
+    if chat_ids:
+        where.append(f"chat_id IN ({', '.join('?' for _ in chat_ids)})")
+        params.extend(chat_ids)
+    if start_time is not None:
+        where.append("timestamp >= ?")
+        params.append(start_time)
+    if end_time is not None:
+        where.append("timestamp < ?")
+        params.append(end_time)
+    if processed is not None:
+        where.append("processed = ?")
+        params.append(1 if processed else 0)
+    if tags:
+        where.append(f"EXISTS (SELECT 1 FROM json_each({_VALID_TAGS}) "
+                     f"WHERE value IN ({', '.join('?' for _ in tags)}))")
+        params.extend(tags)
+    if search:
+        pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        where.append("(content LIKE ? ESCAPE '\\' OR summary LIKE ? ESCAPE '\\')")
+        params.extend([pattern, pattern])
+    if cursor is not None:
+        where.append("(timestamp, internal_id) < (?, ?)")
+        params.extend(cursor)
+
+    columns, source = message_source(with_authors)
+    sql = f"SELECT {columns} FROM {source}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY timestamp DESC, internal_id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
 
 class Storage:
     def __init__(self, db_path: Optional[str] = None):
@@ -15,6 +101,7 @@ class Storage:
             
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         self.db_path = db_path
+        self.extractor = EntityExtractor()
         self._init_db()
 
     def _init_db(self):
@@ -44,51 +131,364 @@ class Storage:
                 conn.execute("ALTER TABLE messages ADD COLUMN summary TEXT")
             if 'tags' not in columns:
                 conn.execute("ALTER TABLE messages ADD COLUMN tags TEXT")
+            # 作者按 ID 引用 authors 表，新消息行不再重复保存作者名称
+            if 'author_id' not in columns:
+                conn.execute("ALTER TABLE messages ADD COLUMN author_id TEXT")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS authors (
+                    author_id TEXT PRIMARY KEY,
+                    display_name TEXT,
+                    username TEXT,
+                    is_bot INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL
+                ) WITHOUT ROWID
+            """)
+            # 分析完成顺序号：实时推送按它增量读取新的 AI 结果
+            if 'analyzed_seq' not in columns:
+                conn.execute("ALTER TABLE messages ADD COLUMN analyzed_seq INTEGER")
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_messages_analyzed_seq
+                ON messages(analyzed_seq) WHERE analyzed_seq IS NOT NULL
+            """)
+            # 看板分页/筛选：按时间倒序翻页，按群组、处理状态过滤
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_time ON messages(timestamp, internal_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_chat_time ON messages(chat_id, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_processed_time ON messages(processed, timestamp)")
+
+            # 按群组预计算的消息数/已分析数，看板侧边栏和缓存失效都只读这张小表
+            has_counts = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'message_counts'").fetchone()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS message_counts (
+                    chat_id TEXT PRIMARY KEY,
+                    chat_name TEXT,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    processed INTEGER NOT NULL DEFAULT 0,
+                    revision INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            if not has_counts:
+                conn.execute("""
+                    INSERT INTO message_counts (chat_id, chat_name, total, processed, revision)
+                    SELECT COALESCE(chat_id, ''), MAX(chat_name), COUNT(*), SUM(processed = 1), COUNT(*)
+                    FROM messages GROUP BY COALESCE(chat_id, '')
+                """)
+
+            # 实体提及：入库时提取，按实体+时间索引
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS mentions (
+                    entity TEXT NOT NULL,
+                    entity_type TEXT NOT NULL,
+                    internal_id TEXT NOT NULL,
+                    chat_id TEXT,
+                    chat_name TEXT,
+                    timestamp DATETIME,
+                    PRIMARY KEY (entity, internal_id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_mentions_entity_time ON mentions(entity, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_mentions_time ON mentions(timestamp)")
+            # 按 实体/群组/小时 预聚合的计数，热门提及查询不需要扫描明细
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS mention_hourly (
+                    entity TEXT NOT NULL,
+                    entity_type TEXT NOT NULL,
+                    chat_id TEXT NOT NULL,
+                    chat_name TEXT,
+                    hour TEXT NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (entity, chat_id, hour)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_mention_hourly_hour ON mention_hourly(hour, entity)")
             conn.commit()
 
+    @staticmethod
+    def _hour_bucket(timestamp) -> str:
+        if isinstance(timestamp, datetime):
+            return timestamp.strftime("%Y-%m-%d %H:00")
+        return str(timestamp)[:13] + ":00"
+
+    @staticmethod
+    def _known_author(msg: UnifiedMessage) -> Optional[str]:
+        return msg.author_id if msg.author_id and msg.author_id != "unknown" else None
+
+    def _upsert_authors(self, conn: sqlite3.Connection, messages: Iterable[UnifiedMessage]):
+        """把消息中出现的作者写入 authors 表（每个作者一次）；占位名称不覆盖已有名称"""
+        names = {}
+        for msg in messages:
+            author_id = self._known_author(msg)
+            if author_id is not None and (author_id not in names or msg.author_name != UNKNOWN_AUTHOR):
+                names[author_id] = msg.author_name
+        if not names:
+            return
+        now = time.time()
+        conn.executemany("""
+            INSERT INTO authors (author_id, display_name, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(author_id) DO UPDATE SET display_name = excluded.display_name, updated_at = excluded.updated_at
+            WHERE excluded.display_name != ? AND authors.display_name IS NOT excluded.display_name
+        """, [(author_id, name, now, UNKNOWN_AUTHOR) for author_id, name in names.items()])
+
+    def _insert_message(self, conn: sqlite3.Connection, msg: UnifiedMessage):
+        """写入一条消息（作者需已由 _upsert_authors 写入）；仅当消息是新插入时才写入提及，避免重复计数"""
+        author_id = self._known_author(msg)
+        cursor = conn.execute("""
+            INSERT OR IGNORE INTO messages 
+            (internal_id, platform, external_id, chat_id, chat_name, author_id, author_name, content, urls, timestamp,
+             summary, tags)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            msg.id,
+            msg.platform.value,
+            msg.external_id,
+            msg.chat_id,
+            msg.chat_name,
+            author_id,
+            # 有作者 ID 时名称只存在 authors 表
+            None if author_id is not None else msg.author_name,
+            msg.content,
+            json.dumps(msg.urls),
+            msg.timestamp,
+            msg.summary,
+            json.dumps(msg.tags)
+        ))
+        if cursor.rowcount != 1:
+            return
+        conn.execute("""
+            INSERT INTO message_counts (chat_id, chat_name, total, processed, revision)
+            VALUES (?, ?, 1, 0, 1)
+            ON CONFLICT(chat_id) DO UPDATE SET
+                total = total + 1, revision = revision + 1, chat_name = excluded.chat_name
+        """, (msg.chat_id or "", msg.chat_name))
+
+        mentions = self.extractor.extract(msg.content)
+        if not mentions:
+            return
+        hour = self._hour_bucket(msg.timestamp)
+        conn.executemany("""
+            INSERT OR IGNORE INTO mentions (entity, entity_type, internal_id, chat_id, chat_name, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(m.entity, m.entity_type, msg.id, msg.chat_id, msg.chat_name, msg.timestamp) for m in mentions])
+        conn.executemany("""
+            INSERT INTO mention_hourly (entity, entity_type, chat_id, chat_name, hour, count)
+            VALUES (?, ?, ?, ?, ?, 1)
+            ON CONFLICT(entity, chat_id, hour) DO UPDATE SET count = count + 1
+        """, [(m.entity, m.entity_type, msg.chat_id, msg.chat_name, hour) for m in mentions])
+
+    @metrics.timed("storage_seconds", op="save_message")
     def save_message(self, msg: UnifiedMessage):
         try:
             with sqlite3.connect(self.db_path) as conn:
-                conn.execute("""
-                    INSERT OR IGNORE INTO messages 
-                    (internal_id, platform, external_id, chat_id, chat_name, author_name, content, urls, timestamp, summary, tags)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    msg.id,
-                    msg.platform.value,
-                    msg.external_id,
-                    msg.chat_id,
-                    msg.chat_name,
-                    msg.author_name,
-                    msg.content,
-                    json.dumps(msg.urls),
-                    msg.timestamp,
-                    msg.summary,
-                    json.dumps(msg.tags)
-                ))
+                self._upsert_authors(conn, [msg])
+                self._insert_message(conn, msg)
                 conn.commit()
+            metrics.counter("storage_messages_written_total").inc()
         except Exception as e:
             logger.error(f"Failed to save message to DB: {e}")
+            metrics.counter("storage_errors_total", op="save_message").inc()
+
+    @metrics.timed("storage_seconds", op="save_messages")
+    def save_messages(self, messages: List[UnifiedMessage]) -> int:
+        """在一个事务中批量写入消息，返回尝试写入的条数"""
+        if not messages:
+            return 0
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                self._upsert_authors(conn, messages)
+                for msg in messages:
+                    self._insert_message(conn, msg)
+                conn.commit()
+            metrics.counter("storage_messages_written_total").inc(len(messages))
+            return len(messages)
+        except Exception as e:
+            logger.error(f"Failed to save messages to DB: {e}")
+            metrics.counter("storage_errors_total", op="save_messages").inc()
+            return 0
 
+    @metrics.timed("storage_seconds", op="update_message_summary")
     def update_message_summary(self, internal_id: str, summary: str, tags: List[str]):
         try:
             with sqlite3.connect(self.db_path) as conn:
-                conn.execute("""
+                self._touch_counts(conn, internal_id)
+                conn.execute(f"""
                     UPDATE messages 
-                    SET summary = ?, tags = ?, processed = 1 
+                    SET summary = ?, tags = ?, processed = 1, analyzed_seq = {_NEXT_ANALYZED_SEQ}
                     WHERE internal_id = ?
                 """, (summary, json.dumps(tags), internal_id))
                 conn.commit()
         except Exception as e:
             logger.error(f"Failed to update message summary: {e}")
 
+    @metrics.timed("storage_seconds", op="get_unprocessed")
     def get_unprocessed(self):
         with sqlite3.connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
-            cursor = conn.execute("SELECT * FROM messages WHERE processed = 0")
+            cursor = conn.execute(f"""
+                SELECT messages.internal_id, platform, external_id, chat_id, chat_name, messages.author_id,
+                       COALESCE(authors.display_name, messages.author_name) AS author_name,
+                       content, urls, timestamp, summary, tags, processed
+                FROM {MESSAGES_WITH_AUTHORS} WHERE processed = 0
+            """)
             return cursor.fetchall()
 
+    @metrics.timed("storage_seconds", op="save_authors")
+    def save_authors(self, profiles: Iterable[AuthorProfile]) -> int:
+        """保存发送者缓存中新增或刷新的作者资料，返回写入条数"""
+        rows = [(p.author_id, p.display_name, p.username, int(p.is_bot), p.updated_at) for p in profiles]
+        if not rows:
+            return 0
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany("""
+                INSERT INTO authors (author_id, display_name, username, is_bot, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(author_id) DO UPDATE SET
+                    display_name = excluded.display_name, username = excluded.username,
+                    is_bot = excluded.is_bot, updated_at = excluded.updated_at
+            """, rows)
+            conn.commit()
+        return len(rows)
+
+    @metrics.timed("storage_seconds", op="load_authors")
+    def load_authors(self, updated_since: Optional[float] = None) -> List[AuthorProfile]:
+        """读取作者资料（用于预热发送者缓存），updated_since 为 Unix 时间戳"""
+        sql = "SELECT author_id, display_name, username, is_bot, updated_at FROM authors"
+        params: list = []
+        if updated_since is not None:
+            sql += " WHERE updated_at >= ?"
+            params.append(updated_since)
+        with sqlite3.connect(self.db_path) as conn:
+            return [AuthorProfile(author_id, display_name, username, bool(is_bot), updated_at or 0.0)
+                    for author_id, display_name, username, is_bot, updated_at in conn.execute(sql, params)]
+
+    @metrics.timed("storage_seconds", op="mark_as_processed")
     def mark_as_processed(self, internal_id: str):
         with sqlite3.connect(self.db_path) as conn:
-            conn.execute("UPDATE messages SET processed = 1 WHERE internal_id = ?", (internal_id,))
+            self._touch_counts(conn, internal_id)
+            conn.execute(f"""
+                UPDATE messages SET processed = 1, analyzed_seq = {_NEXT_ANALYZED_SEQ}
+                WHERE internal_id = ? AND processed = 0
+            """, (internal_id,))
             conn.commit()
+
+    @staticmethod
+    def _touch_counts(conn: sqlite3.Connection, internal_id: str):
+        """更新群组计数：消息第一次标记为已处理时计入已分析数，并递增版本号（需在 UPDATE messages 之前调用）"""
+        conn.execute("""
+            UPDATE message_counts
+            SET processed = processed + (SELECT processed = 0 FROM messages WHERE internal_id = ?),
+                revision = revision + 1
+            WHERE chat_id = (SELECT COALESCE(chat_id, '') FROM messages WHERE internal_id = ?)
+        """, (internal_id, internal_id))
+
+    @metrics.timed("storage_seconds", op="get_top_mentions")
+    def get_top_mentions(self, start_time: datetime, end_time: datetime,
+                         limit: int = 20, entity_type: Optional[str] = None) -> List[dict]:
+        """
+        时间范围内提及最多的实体（按小时粒度）
+
+        Returns:
+            [{"entity", "entity_type", "mentions", "chats"}]，按提及次数降序
+        """
+        sql = """
+            SELECT entity, entity_type, SUM(count) AS mentions, COUNT(DISTINCT chat_id) AS chats
+            FROM mention_hourly
+            WHERE hour >= ? AND hour <= ?
+        """
+        params: list = [self._hour_bucket(start_time), self._hour_bucket(end_time)]
+        if entity_type:
+            sql += " AND entity_type = ?"
+            params.append(entity_type)
+        sql += " GROUP BY entity, entity_type ORDER BY mentions DESC, entity LIMIT ?"
+        params.append(limit)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+    @metrics.timed("storage_seconds", op="get_mention_counts_by_chat")
+    def get_mention_counts_by_chat(self, entity: str, start_time: datetime, end_time: datetime) -> List[dict]:
+        """某个实体在各群组中的提及次数"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute("""
+                SELECT chat_id, MAX(chat_name) AS chat_name, SUM(count) AS mentions
+                FROM mention_hourly
+                WHERE entity = ? AND hour >= ? AND hour <= ?
+                GROUP BY chat_id ORDER BY mentions DESC
+            """, (entity, self._hour_bucket(start_time), self._hour_bucket(end_time))).fetchall()
+            return [dict(row) for row in rows]
+
+    @metrics.timed("storage_seconds", op="get_mention_counts_by_hour")
+    def get_mention_counts_by_hour(self, entity: str, start_time: datetime, end_time: datetime) -> List[dict]:
+        """某个实体按小时的提及次数"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute("""
+                SELECT hour, SUM(count) AS mentions
+                FROM mention_hourly
+                WHERE entity = ? AND hour >= ? AND hour <= ?
+                GROUP BY hour ORDER BY hour
+            """, (entity, self._hour_bucket(start_time), self._hour_bucket(end_time))).fetchall()
+            return [dict(row) for row in rows]
+
+    @metrics.timed("storage_seconds", op="get_message_counts")
+    def get_message_counts(self) -> List[dict]:
+        """各群组的消息数和已分析数（预计算，不扫描 messages 表）"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute("""
+                SELECT chat_id, chat_name, total, processed FROM message_counts
+                ORDER BY total DESC, chat_id
+            """).fetchall()
+            return [dict(row) for row in rows]
+
+    @metrics.timed("storage_seconds", op="get_chat_message_counts")
+    def get_chat_message_counts(self, start_time: datetime, end_time: datetime) -> Dict[str, int]:
+        """时间范围内各群组入库的消息数（按 timestamp 索引范围扫描）"""
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("""
+                SELECT chat_id, COUNT(*) FROM messages
+                WHERE timestamp >= ? AND timestamp < ?
+                GROUP BY chat_id
+            """, (start_time, end_time)).fetchall()
+            return dict(rows)
+
+    def data_version(self) -> int:
+        """消息写入版本号：每次入库或更新摘要都会变化，用作查询缓存的失效键"""
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("SELECT COALESCE(SUM(revision), 0) FROM message_counts").fetchone()[0]
+
+    @metrics.timed("storage_seconds", op="query_messages")
+    def query_messages(self, chat_ids: Optional[List[str]] = None, start_time: Optional[datetime] = None,
+                       end_time: Optional[datetime] = None, tags: Optional[List[str]] = None,
+                       processed: Optional[bool] = None, cursor: Optional[tuple] = None,
+                       limit: int = 50) -> Tuple[List[dict], Optional[tuple]]:
+        """
+        按时间倒序分页查询消息，筛选条件都在 SQL 中完成
+
+        Args:
+            tags: 包含任一标签即匹配
+            cursor: 上一页返回的游标（时间戳, internal_id），为空时从最新一条开始
+
+        Returns:
+            (本页消息, 下一页游标)；没有更多数据时游标为 None
+        """
+        sql, params = build_message_query(chat_ids, start_time, end_time, tags, processed, cursor, limit + 1)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = [dict(row) for row in conn.execute(sql, params).fetchall()]
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, (rows[-1]["timestamp"], rows[-1]["internal_id"])
+
+    @metrics.timed("storage_seconds", op="get_tag_counts")
+    def get_tag_counts(self, limit: int = 200) -> List[dict]:
+        """已分析消息中出现最多的标签"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(f"""
+                SELECT tag.value AS tag, COUNT(*) AS messages
+                FROM messages, json_each({_VALID_TAGS}) AS tag
+                WHERE messages.processed = 1
+                GROUP BY tag.value ORDER BY messages DESC, tag LIMIT ?
+            """, (limit,)).fetchall()
+            return [dict(row) for row in rows]
@@ -0,0 +1,240 @@
+"""
+告警快速通道测试
+验证 Bot API 并发发送、限流重试、失败回退到主账号以及告警合并
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "auto"))
+
+from src.config import config, PushConfig
+from src.delivery.bot_api import BotApiSender
+from telegram_alerter import AlertBatcher, TelegramAlerter
+
+
+def _bot_sender(handler):
+    return BotApiSender("TOKEN", transport=httpx.MockTransport(handler), retry_delay=0)
+
+
+class FakeSession:
+    """记录连接和发送次数的 MTProto 会话替身"""
+
+    def __init__(self, account_config, ok=True):
+        self.account_config = account_config
+        self.ok = ok
+        self.connects = 0
+        self.disconnects = 0
+        self.sent = []
+
+    async def connect(self):
+        self.connects += 1
+
+    async def disconnect(self):
+        self.disconnects += 1
+
+    async def send_to_channel(self, text, channel_identifier, parse_mode="HTML", is_html=False):
+        self.sent.append(channel_identifier)
+        return self.ok
+
+
+def test_bot_api_concurrent_targets():
+    """多个目标并发发送，共用同一个连接池"""
+    print("🧪 测试 Bot API 并发发送...")
+    requests = []
+
+    async def handler(request):
+        requests.append(json.loads(request.content))
+        await asyncio.sleep(0.1)
+        return httpx.Response(200, json={"ok": True, "result": {}})
+
+    async def scenario():
+        async with _bot_sender(handler) as sender:
+            started = time.perf_counter()
+            results = await sender.send_to_targets("<b>hi</b>", ["@channel", "-100123", "42"])
+            return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(scenario())
+    assert results == {"@channel": True, "-100123": True, "42": True}
+    assert sorted(r["chat_id"] for r in requests) == ["-100123", "42", "@channel"]
+    assert all(r["parse_mode"] == "HTML" for r in requests)
+    assert elapsed < 0.25, f"目标应并发发送，实际耗时 {elapsed:.2f}s"
+    print(f"✅ 3 个目标并发发送，耗时 {elapsed:.2f}s")
+
+
+def test_bot_api_retry_after():
+    """429 按 retry_after 等待后重试；4xx 不重试"""
+    print("🧪 测试 Bot API 限流重试...")
+    calls = {"flood": 0, "bad": 0}
+
+    async def handler(request):
+        chat_id = json.loads(request.content)["chat_id"]
+        calls[chat_id] += 1
+        if chat_id == "bad":
+            return httpx.Response(400, json={"ok": False, "description": "Bad Request: chat not found"})
+        if calls[chat_id] == 1:
+            return httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 0}})
+        return httpx.Response(200, json={"ok": True, "result": {}})
+
+    async def scenario():
+        async with _bot_sender(handler) as sender:
+            return await sender.send_to_targets("text", ["flood", "bad"])
+
+    results = asyncio.run(scenario())
+    assert results == {"flood": True, "bad": False}
+    assert calls == {"flood": 2, "bad": 1}
+    print("✅ 限流后重试成功，永久错误不重试")
+
+
+def test_fallback_connects_only_main_session():
+    """Bot API 失败时只连接主账号回退发送"""
+    print("🧪 测试回退到主账号...")
+    sessions = []
+
+    def session_factory(account):
+        session = FakeSession(account)
+        sessions.append(session)
+        return session
+
+    async def handler(request):
+        return httpx.Response(403, json={"ok": False, "description": "Forbidden"})
+
+    async def scenario():
+        alerter = TelegramAlerter(bot_sender=_bot_sender(handler), session_factory=session_factory)
+        try:
+            return await alerter._deliver("msg", ["@channel", "42"])
+        finally:
+            await alerter.close()
+
+    assert asyncio.run(scenario()) is True
+    assert [s.account_config.account_id for s in sessions] == ["main"]
+    assert sessions[0].connects == 1 and sessions[0].disconnects == 1
+    assert sorted(sessions[0].sent) == ["42", "@channel"]
+    print("✅ 只连接了主账号")
+
+
+def test_bot_success_skips_mtproto():
+    """Bot API 成功时不创建任何 MTProto 会话"""
+    print("🧪 测试 Bot API 成功路径...")
+    sessions = []
+
+    async def handler(request):
+        return httpx.Response(200, json={"ok": True, "result": {}})
+
+    async def scenario():
+        alerter = TelegramAlerter(bot_sender=_bot_sender(handler),
+                                  session_factory=lambda account: sessions.append(account))
+        try:
+            return await alerter._deliver("msg", ["@channel"])
+        finally:
+            await alerter.close()
+
+    assert asyncio.run(scenario()) is True
+    assert sessions == []
+    print("✅ 未连接任何账号")
+
+
+def test_coalesce_burst():
+    """窗口期内的突发告警合并为一条消息"""
+    print("🧪 测试告警合并...")
+    delivered = []
+
+    async def deliver(message, targets, use_all_accounts):
+        delivered.append((message, targets))
+        return True
+
+    async def scenario():
+        batcher = AlertBatcher(deliver, window=0.05, max_batch=10)
+        first = await asyncio.gather(*(batcher.submit(f"alert {i}", ["@channel"]) for i in range(3)))
+        other = await batcher.submit("solo", ["42"])
+        full = await asyncio.gather(*(batcher.submit(f"x{i}", ["@channel"]) for i in range(10)))
+        return first, other, full
+
+    first, other, full = asyncio.run(scenario())
+    assert first == [True] * 3 and other is True and full == [True] * 10
+    assert len(delivered) == 3
+    assert "3 条告警合并推送" in delivered[0][0] and "alert 2" in delivered[0][0]
+    assert delivered[1] == ("solo", ["42"])
+    assert "10 条告警合并推送" in delivered[2][0]
+    print("✅ 突发告警已合并")
+
+
+def test_flush_all_awaits_full_batches():
+    """满批次立即发送的任务保留引用，flush_all 等待其发送完成"""
+    print("🧪 测试退出前等待满批次...")
+    delivered = []
+
+    async def deliver(message, targets, use_all_accounts):
+        await asyncio.sleep(0.05)
+        delivered.append(message)
+        return True
+
+    async def scenario():
+        batcher = AlertBatcher(deliver, window=10, max_batch=2)
+        for i in range(2):
+            asyncio.ensure_future(batcher.submit(f"x{i}", ["@channel"]))
+        await asyncio.sleep(0)
+        assert len(batcher._flushes) == 1
+        await batcher.flush_all()
+        return batcher
+
+    batcher = asyncio.run(scenario())
+    assert len(delivered) == 1 and not batcher._flushes
+    print("✅ 满批次在退出前发送完成")
+
+
+def test_send_alert_via_bot():
+    """send_alert 构造消息并通过 Bot API 发送到配置的全部目标"""
+    print("🧪 测试 send_alert...")
+    chat_ids = []
+    texts = []
+
+    async def handler(request):
+        payload = json.loads(request.content)
+        chat_ids.append(payload["chat_id"])
+        texts.append(payload["text"])
+        return httpx.Response(200, json={"ok": True, "result": {}})
+
+    original = config.push_config
+    config.push_config = PushConfig(bot_token="TOKEN", channel_username="@alerts", user_id=42)
+    try:
+        async def scenario():
+            alerter = TelegramAlerter(bot_sender=_bot_sender(handler), coalesce_window=0.01)
+            try:
+                return await alerter.send_alert("critical", "采集失败: <Response [502]>", "重试 3 & 5 次后停止",
+                                                log_path="logs/x.log")
+            finally:
+                await alerter.close()
+
+        assert asyncio.run(scenario()) is True
+    finally:
+        config.push_config = original
+    assert sorted(chat_ids) == ["42", "@alerts"]
+    # 字段中的 < 和 & 已转义，标题标签保留
+    assert texts[0].startswith("<b>🔴") and "采集失败: &lt;Response [502]&gt;" in texts[0]
+    assert "重试 3 &amp; 5 次后停止" in texts[0]
+    print("✅ 告警已发送到全部目标")
+
+
+def main():
+    """主测试函数"""
+    test_bot_api_concurrent_targets()
+    test_bot_api_retry_after()
+    test_fallback_connects_only_main_session()
+    test_bot_success_skips_mtproto()
+    test_coalesce_burst()
+    test_flush_all_awaits_full_batches()
+    test_send_alert_via_bot()
+    print("\n🎉 告警快速通道测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
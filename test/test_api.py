@@ -0,0 +1,168 @@
+"""
+只读 API 测试
+验证跨分库游标分页、摘要/搜索/提及统计接口、ETag 条件请求、NDJSON 流式导出和简报接口
+"""
+
+import os
+import sys
+import json
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+from benchmarks.corpus import make_message
+from src.storage import Storage
+from src.delivery.manifest import ReportManifest
+from web.api import ShardPool, create_app
+
+
+
+def _setup(tmp):
+    """两个月的分库，各 30 条消息；1 月分库中有一条带摘要"""
+    january = Storage(os.path.join(tmp, "raw_messages_2026_01.db"))
+    february = Storage(os.path.join(tmp, "raw_messages_2026_02.db"))
+    january.save_messages([make_message(i, chat_id="-1001", timestamp=datetime(2026, 1, 31, 0, 0) + timedelta(minutes=i))
+                           for i in range(30)])
+    # 2 月初采集到的消息时间戳可能还在 1 月，分库之间需要合并排序
+    february.save_messages([make_message(100 + i, "$SOL 空投" if i == 29 else None, "-1002",
+                                         timestamp=datetime(2026, 1, 31, 0, 0) + timedelta(minutes=i, seconds=30))
+                            for i in range(30)])
+    january.update_message_summary("collector1:-1001:5", "空投活动汇总", ["空投"])
+
+    manifest = ReportManifest(os.path.join(tmp, "manifest.db"))
+    vault = os.path.join(tmp, "vault")
+    manifest.save(vault, "简报_2601300800_-2601310800.md", "# 第一份", stats={"total_messages": 10})
+    manifest.save(vault, "简报_2601310800_-2602010800.md", "# 第二份")
+
+    pool = ShardPool(tmp, pool_size=2, manifest_path=manifest.db_path)
+    return TestClient(create_app(pool)), pool, january
+
+
+def test_paginate_across_shards():
+    """游标翻页跨两个分库按时间倒序合并，不重复不遗漏"""
+    print("🧪 测试跨分库分页...")
+    with tempfile.TemporaryDirectory() as tmp:
+        client, pool, _ = _setup(tmp)
+        with client:
+            seen, cursor = [], None
+            while True:
+                params = {"limit": 7}
+                if cursor:
+                    params["cursor"] = cursor
+                page = client.get("/messages", params=params).json()
+                seen.extend(page["items"])
+                cursor = page["next_cursor"]
+                if not cursor:
+                    break
+            assert len({item["internal_id"] for item in seen}) == len(seen) == 60
+            timestamps = [item["timestamp"] for item in seen]
+            assert timestamps == sorted(timestamps, reverse=True)
+            # 两个分库交替出现
+            assert {item["chat_id"] for item in seen[:2]} == {"-1001", "-1002"}
+
+            page = client.get("/messages", params={"chat_id": "-1002", "limit": 100}).json()
+            assert len(page["items"]) == 30 and page["next_cursor"] is None
+            assert client.get("/messages", params={"cursor": "不是游标"}).status_code == 400
+    print("✅ 60 条消息跨分库翻页正确")
+
+
+def test_summaries_search_and_mentions():
+    """摘要、搜索和提及统计接口"""
+    print("🧪 测试摘要/搜索/提及接口...")
+    with tempfile.TemporaryDirectory() as tmp:
+        client, _, _ = _setup(tmp)
+        with client:
+            items = client.get("/summaries").json()["items"]
+            assert items == [{"internal_id": "collector1:-1001:5", "chat_id": "-1001", "chat_name": "群-1001",
+                              "timestamp": "2026-01-31 00:05:00", "summary": "空投活动汇总", "tags": ["空投"]}]
+            assert client.get("/summaries", params={"tag": "NFT"}).json()["items"] == []
+
+            found = [item["internal_id"] for item in client.get("/search", params={"q": "空投"}).json()["items"]]
+            assert found == ["collector1:-1002:129", "collector1:-1001:5"]
+            assert client.get("/search", params={"q": "100%"}).json()["items"] == []
+
+            # 提及统计按当前时间过滤，时间窗口需要覆盖测试数据
+            hours = int((datetime.now() - datetime(2026, 1, 30)).total_seconds() // 3600) + 1
+            top = client.get("/mentions/top", params={"hours": hours}).json()["items"]
+            assert top == [{"entity": "$SOL", "entity_type": "ticker", "mentions": 1, "chats": 1}]
+            detail = client.get("/mentions/$SOL", params={"hours": hours}).json()
+            assert detail["by_chat"] == [{"chat_id": "-1002", "chat_name": "群-1002", "mentions": 1}]
+            assert detail["by_hour"] == [{"hour": "2026-01-31 00:00", "mentions": 1}]
+    print("✅ 各接口返回正确")
+
+
+def test_etag_conditional_requests():
+    """数据未变化时返回 304，写入后 ETag 变化"""
+    print("🧪 测试 ETag 条件请求...")
+    with tempfile.TemporaryDirectory() as tmp:
+        client, _, january = _setup(tmp)
+        with client:
+            response = client.get("/messages", params={"limit": 5})
+            etag = response.headers["etag"]
+            assert client.get("/messages", params={"limit": 5}, headers={"If-None-Match": etag}).status_code == 304
+            # 不同查询参数的 ETag 不同
+            assert client.get("/messages", params={"limit": 6}, headers={"If-None-Match": etag}).status_code == 200
+
+            january.save_messages([make_message(999, chat_id="-1001", timestamp=datetime(2026, 2, 1, 0, 0))])
+            response = client.get("/messages", params={"limit": 5}, headers={"If-None-Match": etag})
+            assert response.status_code == 200 and response.headers["etag"] != etag
+            assert response.json()["items"][0]["internal_id"] == "collector1:-1001:999"
+    print("✅ ETag 随数据变化")
+
+
+def test_ndjson_export():
+    """NDJSON 逐行导出，按时间倒序并支持筛选"""
+    print("🧪 测试 NDJSON 导出...")
+    with tempfile.TemporaryDirectory() as tmp:
+        client, pool, _ = _setup(tmp)
+        with client:
+            with client.stream("GET", "/export/messages.ndjson") as response:
+                assert response.headers["content-type"].startswith("application/x-ndjson")
+                rows = [json.loads(line) for line in response.iter_lines() if line]
+            assert len(rows) == 60
+            assert [row["timestamp"] for row in rows] == sorted((row["timestamp"] for row in rows), reverse=True)
+
+            response = client.get("/export/messages.ndjson", params={"since": "2026-01-31T00:25:00"})
+            assert len(response.text.splitlines()) == 10
+            # 导出结束后连接放回池中
+            assert all(idle.qsize() >= 1 for idle in pool._idle.values())
+    print("✅ 导出 60 行")
+
+
+def test_reports():
+    """简报列表和内容（ETag 为内容哈希）"""
+    print("🧪 测试简报接口...")
+    with tempfile.TemporaryDirectory() as tmp:
+        client, _, _ = _setup(tmp)
+        with client:
+            page = client.get("/reports", params={"limit": 1}).json()
+            assert [item["filename"] for item in page["items"]] == ["简报_2601310800_-2602010800.md"]
+            older = client.get("/reports", params={"limit": 1, "cursor": page["next_cursor"]}).json()
+            assert older["items"][0]["stats"] == {"total_messages": 10} and older["next_cursor"] is None
+
+            response = client.get("/reports/简报_2601300800_-2601310800.md")
+            assert response.text == "# 第一份"
+            etag = response.headers["etag"]
+            assert client.get("/reports/简报_2601300800_-2601310800.md",
+                              headers={"If-None-Match": etag}).status_code == 304
+            assert client.get("/reports/不存在.md").status_code == 404
+    print("✅ 简报接口正确")
+
+
+def main():
+    """主测试函数"""
+    test_paginate_across_shards()
+    test_summaries_search_and_mentions()
+    test_etag_conditional_requests()
+    test_ndjson_export()
+    test_reports()
+    print("\n🎉 只读 API 测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
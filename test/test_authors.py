@@ -0,0 +1,188 @@
+"""
+作者资料缓存测试
+验证发送者缓存的批量更新与 TTL、authors 表的读写、消息行只保存 author_id，以及旧分库的兼容查询
+"""
+
+import os
+import sys
+import sqlite3
+import asyncio
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import make_message
+from src.adapters.telegram_adapter_v2 import TelegramClientSession, TelegramMultiAccountAdapter
+from src.adapters.telegram_replay import RecordedEntity, RecordedMessage, ReplayClient, TelegramRecording
+from src.authors import AuthorProfile, SenderCache
+from src.config import TelegramAccountConfig
+from src.storage import Storage
+from web.api import ShardPool
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+
+def test_sender_cache_ttl():
+    """同一页重复出现的作者只解析一次；有效期内不刷新，过期后遇到新实体才刷新"""
+    print("🧪 测试发送者缓存...")
+    clock = _Clock()
+    cache = SenderCache(ttl=3600, clock=clock)
+    alice = RecordedEntity(42, "User", first_name="Alice", last_name="Lee", username="alice")
+    assert cache.update_from_page([("42", alice), ("42", alice), ("7", None)]) == 1
+    assert cache.name("42") == "Alice Lee" and cache.get("42").username == "alice"
+    assert cache.name("7") == "Unknown"
+    assert [p.author_id for p in cache.drain_dirty()] == ["42"] and cache.drain_dirty() == []
+
+    renamed = RecordedEntity(42, "User", first_name="Alicia")
+    clock.now += 60
+    assert cache.update_from_page([("42", renamed)]) == 0 and cache.name("42") == "Alice Lee"
+    clock.now += 3600
+    # 过期但这一页没有实体：继续使用旧名称
+    assert cache.update_from_page([("42", None)]) == 0 and cache.name("42") == "Alice Lee"
+    assert cache.update_from_page([("42", renamed)]) == 1 and cache.name("42") == "Alicia"
+    assert cache.is_fresh("42")
+    print("✅ 缓存按 TTL 刷新")
+
+
+def test_storage_references_authors():
+    """消息行只保存 author_id，查询时从 authors 表取名称；作者资料可跨运行持久化"""
+    print("🧪 测试 authors 表...")
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = Storage(os.path.join(tmp, "raw_messages_2026_01.db"))
+        storage.save_messages([make_message(i, author_id="42", author_name="Alice") for i in range(3)] +
+                              [make_message(3, author_id="unknown", author_name="Unknown"),
+                               make_message(4, author_id="42", author_name="Unknown")])
+        with sqlite3.connect(storage.db_path) as conn:
+            rows = conn.execute("SELECT author_id, author_name FROM messages ORDER BY rowid").fetchall()
+            assert rows == [("42", None)] * 3 + [(None, "Unknown"), ("42", None)]
+            assert conn.execute("SELECT author_id, display_name FROM authors").fetchall() == [("42", "Alice")]
+
+        storage.save_authors([AuthorProfile("42", "Alice Lee", username="alice", updated_at=123.0)])
+        page, _ = storage.query_messages(limit=10)
+        assert [row["author_name"] for row in page] == ["Alice Lee", "Unknown"] + ["Alice Lee"] * 3
+        assert {row["author_name"] for row in storage.get_unprocessed()} == {"Alice Lee", "Unknown"}
+
+        cache = SenderCache()
+        cache.load(storage.load_authors())
+        assert cache.get("42") == AuthorProfile("42", "Alice Lee", "alice", False, 123.0)
+        assert not cache.is_fresh("42") and cache.drain_dirty() == []
+        assert storage.load_authors(updated_since=124.0) == []
+    print("✅ 作者名称不再逐行重复保存")
+
+
+def test_legacy_shard_without_authors():
+    """还没有 authors 表的旧分库，只读 API 直接使用 messages.author_name"""
+    print("🧪 测试旧分库兼容...")
+    with tempfile.TemporaryDirectory() as tmp:
+        with sqlite3.connect(os.path.join(tmp, "raw_messages_2025_12.db")) as conn:
+            conn.execute("""
+                CREATE TABLE messages (internal_id TEXT PRIMARY KEY, platform TEXT, external_id TEXT, chat_id TEXT,
+                    chat_name TEXT, author_name TEXT, content TEXT, urls TEXT, timestamp DATETIME, summary TEXT,
+                    tags TEXT, processed INTEGER DEFAULT 0)
+            """)
+            conn.execute("INSERT INTO messages VALUES ('old', 'telegram', '1', '-1001', '群', 'Bob', '旧消息', '[]', "
+                         "'2025-12-31 23:00:00', NULL, NULL, 0)")
+        Storage(os.path.join(tmp, "raw_messages_2026_01.db")).save_messages(
+            [make_message(1, author_id="42", author_name="Alice")])
+
+        pool = ShardPool(tmp)
+        page = pool.page(10)
+        assert [(item["internal_id"], item["author_name"]) for item in page["items"]] == [
+            ("collector1:-1001:1", "Alice"), ("old", "Bob")]
+        assert [item["author_name"] for item in pool.stream()] == ["Alice", "Bob"]
+        pool.close()
+    print("✅ 新旧分库都能查询作者名称")
+
+
+def test_sessions_share_cache():
+    """多个采集会话共用缓存：每页批量解析发送者，缺少实体的消息使用已缓存的名称"""
+    print("🧪 测试采集会话共用缓存...")
+    recording = TelegramRecording()
+    chat = RecordedEntity(1234567, "Channel", title="测试频道")
+    alice = RecordedEntity(42, "User", first_name="Alice")
+    for i in range(1, 11):
+        recording.add_message(chat, RecordedMessage(
+            i, chat.marked_id, datetime(2026, 1, 1, 10, tzinfo=timezone.utc) + timedelta(seconds=i),
+            f"消息 {i}", sender_id=42, sender=alice if i == 5 else None))
+    cache = SenderCache()
+
+    def session(account_id):
+        account = TelegramAccountConfig(account_id=account_id, api_id=0, api_hash="", phone="", session_name="")
+        return TelegramClientSession(account, client_factory=lambda cfg: ReplayClient(recording), senders=cache)
+
+    first = asyncio.run(session("collector1").fetch_records(
+        str(chat.marked_id), datetime(2025, 12, 31), datetime(2026, 1, 2)))
+    assert {record.author_name for record in first} == {"Alice"} and len(first) == 10
+
+    # 另一个账号拉到的消息都没有发送者实体，名称来自共用缓存
+    for message in recording.messages_for(chat):
+        message.sender = None
+    second = asyncio.run(session("collector2").fetch_records(
+        str(chat.marked_id), datetime(2025, 12, 31), datetime(2026, 1, 2)))
+    assert {record.author_name for record in second} == {"Alice"}
+    assert len(cache) == 1 and len(cache.drain_dirty()) == 1
+    print("✅ 两个会话共用一份作者资料")
+
+
+def test_collect_script_persists_authors():
+    """collect_compatible 的采集入库步骤：作者资料写入 authors 表、提取实体提及，下次运行从表中预热缓存"""
+    print("🧪 测试采集脚本保存作者资料...")
+    from collect_compatible import collect_and_store
+
+    recording = TelegramRecording()
+    chat = RecordedEntity(7654321, "Channel", title="测试频道")
+    alice = RecordedEntity(42, "User", first_name="Alice", username="alice")
+    for i in range(1, 6):
+        recording.add_message(chat, RecordedMessage(
+            i, chat.marked_id, datetime(2026, 1, 1, 10, tzinfo=timezone.utc) + timedelta(seconds=i),
+            f"消息 {i} $SOL", sender_id=42, sender=alice if i == 1 else None))
+    account = TelegramAccountConfig(account_id="collector1", api_id=0, api_hash="", phone="", session_name="",
+                                    monitored_chats=[str(chat.marked_id)])
+
+    def run(storage):
+        adapter = TelegramMultiAccountAdapter(collector_accounts=[account],
+                                              client_factory=lambda cfg: ReplayClient(recording))
+        saved = asyncio.run(collect_and_store(adapter, storage, datetime(2025, 12, 31), datetime(2026, 1, 2)))
+        return adapter, saved
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = Storage(os.path.join(tmp, "raw_messages_2026_01.db"))
+        _, saved = run(storage)
+        assert saved == 5
+        assert [(p.author_id, p.display_name, p.username) for p in storage.load_authors()] == [("42", "Alice", "alice")]
+        # 入库时同时提取实体提及，看板和 API 的提及统计来自这里
+        top = storage.get_top_mentions(datetime(2026, 1, 1), datetime(2026, 1, 2))
+        assert [(item["entity"], item["mentions"]) for item in top] == [("$SOL", 5)]
+
+        # 下次运行拉到的消息都没有发送者实体：名称来自 authors 表预热的缓存，不产生新的待保存资料
+        for message in recording.messages_for(chat):
+            message.sender = None
+        adapter, _ = run(Storage(storage.db_path))
+        assert adapter.sender_cache.get("42").username == "alice" and adapter.sender_cache.drain_dirty() == []
+        page, _ = storage.query_messages(limit=10)
+        assert len(page) == 5 and {row["author_name"] for row in page} == {"Alice"}
+    print("✅ 作者资料跨运行保存")
+
+
+def main():
+    """主测试函数"""
+    test_sender_cache_ttl()
+    test_storage_references_authors()
+    test_legacy_shard_without_authors()
+    test_sessions_share_cache()
+    test_collect_script_persists_authors()
+    print("\n🎉 作者资料缓存测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
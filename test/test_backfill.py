@@ -0,0 +1,187 @@
+"""
+历史补采测试
+验证按时间范围逐页补采并写入对应月份的分库、中断后从断点继续且不重复入库、
+FloodWait 时等待并放大请求间隔，以及多个账号看到的群组只补采一次
+"""
+
+import os
+import sys
+import asyncio
+import sqlite3
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.adapters.telegram_adapter_v2 import TelegramMultiAccountAdapter
+from src.adapters.telegram_replay import RecordedEntity, RecordedMessage, ReplayClient, TelegramRecording
+from src.backfill import BackfillCheckpoints, BackfillEngine, RequestThrottle
+from src.config import TelegramAccountConfig
+from src.storage import shard_path
+
+# 跨月的补采范围：1 月 30 日 12:00 到 2 月 1 日 12:00（UTC）
+START_UTC = datetime(2026, 1, 30, 12, tzinfo=timezone.utc)
+END_UTC = datetime(2026, 2, 1, 12, tzinfo=timezone.utc)
+
+BUSY = RecordedEntity(3000001, "Channel", title="繁忙频道")
+QUIET = RecordedEntity(3000002, "Channel", title="安静频道")
+CHATS = [str(BUSY.marked_id), str(QUIET.marked_id)]
+
+
+def _local(value: datetime) -> datetime:
+    return value.astimezone().replace(tzinfo=None)
+
+
+START, END = _local(START_UTC), _local(END_UTC)
+
+
+def _recording() -> TelegramRecording:
+    """繁忙频道每 10 分钟一条（共 75 小时），安静频道窗口内每小时一条"""
+    recording = TelegramRecording()
+    base = datetime(2026, 1, 30, tzinfo=timezone.utc)
+    for i in range(450):
+        recording.add_message(BUSY, RecordedMessage(i + 1, BUSY.marked_id, base + timedelta(minutes=10 * i),
+                                                    f"繁忙频道 {i}", sender_id=42))
+    for i in range(30):
+        recording.add_message(QUIET, RecordedMessage(i + 1, QUIET.marked_id, base + timedelta(hours=24 + i),
+                                                     f"安静频道 {i}", sender_id=43))
+    return recording
+
+
+def _expected_shards(recording: TelegramRecording, data_dir: str) -> Counter:
+    """窗口内的消息按本地时间所在月份应写入的分库"""
+    expected = Counter()
+    for chat in (BUSY, QUIET):
+        for message in recording.messages_for(chat):
+            timestamp = _local(message.date)
+            if START <= timestamp < END:
+                expected[shard_path(timestamp, data_dir)] += 1
+    return expected
+
+
+def _shard_counts(data_dir: str) -> Counter:
+    counts = Counter()
+    for name in os.listdir(data_dir):
+        if name.startswith("raw_messages_"):
+            path = os.path.join(data_dir, name)
+            with sqlite3.connect(path) as conn:
+                counts[path] = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    return counts
+
+
+class CrashingClient(ReplayClient):
+    """拉完 pages 页后每次请求都失败（模拟网络中断或进程崩溃）"""
+
+    def __init__(self, recording, pages: int):
+        super().__init__(recording)
+        self.pages_left = pages
+
+    async def iter_messages(self, *args, **kwargs):
+        if self.pages_left <= 0:
+            raise RuntimeError("连接中断")
+        self.pages_left -= 1
+        async for message in super().iter_messages(*args, **kwargs):
+            yield message
+
+
+def _adapter(make_client, accounts=("collector1",)):
+    clients = {}
+
+    def factory(account_config):
+        clients[account_config.account_id] = make_client()
+        return clients[account_config.account_id]
+
+    collector_accounts = [TelegramAccountConfig(account_id=account_id, api_id=0, api_hash="", phone="",
+                                                session_name="", monitored_chats=CHATS)
+                          for account_id in accounts]
+    return TelegramMultiAccountAdapter(collector_accounts=collector_accounts, client_factory=factory), clients
+
+
+def _backfill(tmp: str, make_client, accounts=("collector1",)):
+    adapter, clients = _adapter(make_client, accounts)
+    engine = BackfillEngine(adapter, BackfillCheckpoints(os.path.join(tmp, "backfill.db")),
+                            data_dir=tmp, request_interval=0)
+    return asyncio.run(engine.run(START, END)), clients
+
+
+def test_backfill_writes_monthly_shards():
+    """跨月的范围逐页补采，消息写入各自月份的分库；多个账号都能看到的群组只由账号 1 补采"""
+    print("🧪 测试跨月补采...")
+    recording = _recording()
+    with tempfile.TemporaryDirectory() as tmp:
+        results, clients = _backfill(tmp, lambda: ReplayClient(recording), ("collector1", "collector2"))
+        assert _shard_counts(tmp) == _expected_shards(recording, tmp)
+        assert len(_shard_counts(tmp)) == 2
+
+        busy, quiet = results
+        # 窗口内 288 条：3 页（第 3 页翻到窗口开头）；安静频道不满一页即到历史开头
+        assert (busy.status, busy.pages, busy.fetched) == ("done", 3, 288)
+        assert (quiet.pages, quiet.fetched) == (1, 30)
+        assert {result.account_id for result in results} == {"collector1"} and "collector2" not in clients
+
+        jobs = BackfillCheckpoints(os.path.join(tmp, "backfill.db")).jobs()
+        assert {job["status"] for job in jobs} == {"done"} and sum(job["fetched"] for job in jobs) == 318
+
+        # 已完成的范围再次运行不再连接
+        again, clients = _backfill(tmp, lambda: ReplayClient(recording))
+        assert [result.pages for result in again] == [0, 0] and not clients
+    print("✅ 消息写入了对应月份的分库")
+
+
+def test_resume_after_crash():
+    """中断时断点停在最后写入的一页，重新运行从断点继续，分库中没有重复"""
+    print("🧪 测试断点续采...")
+    recording = _recording()
+    with tempfile.TemporaryDirectory() as tmp:
+        crashed, _ = _backfill(tmp, lambda: CrashingClient(recording, pages=2))
+        assert [result.status for result in crashed] == ["failed", "failed"]
+        assert crashed[0].fetched == 200 and sum(_shard_counts(tmp).values()) == 200
+
+        checkpoints = BackfillCheckpoints(os.path.join(tmp, "backfill.db"))
+        busy = checkpoints.get(CHATS[0], START, END)
+        assert busy["status"] == "failed" and busy["pages"] == 2 and busy["error"] == "连接中断"
+
+        resumed, clients = _backfill(tmp, lambda: ReplayClient(recording))
+        assert [result.status for result in resumed] == ["done", "done"] and resumed[0].resumed
+        # 繁忙频道只需再拉 1 页，安静频道从头拉 1 页（另加每个群组一次实体解析）
+        assert resumed[0].pages == 1 and clients["collector1"].requests == 2 + 1 + 1
+        assert _shard_counts(tmp) == _expected_shards(recording, tmp)
+    print("✅ 从断点继续，没有重复入库")
+
+
+def test_flood_wait_backs_off():
+    """FloodWait 后等待服务器要求的时间并放大请求间隔，全部消息照常写入"""
+    print("🧪 测试 FloodWait 限速...")
+    throttle = RequestThrottle(0.5, max_interval=4)
+    throttle.flood_wait(0)
+    throttle.flood_wait(0)
+    throttle.flood_wait(0)
+    throttle.flood_wait(0)
+    assert throttle.interval == 4
+    for _ in range(20):
+        throttle.success()
+    assert throttle.interval == 2
+
+    recording = _recording()
+    with tempfile.TemporaryDirectory() as tmp:
+        results, clients = _backfill(
+            tmp, lambda: ReplayClient(recording, flood_wait_rate=0.3, flood_wait_seconds=0, seed=7))
+        assert clients["collector1"].flood_waits > 0
+        assert [result.status for result in results] == ["done", "done"]
+        assert _shard_counts(tmp) == _expected_shards(recording, tmp)
+    print(f"✅ {clients['collector1'].flood_waits} 次 FloodWait 后全部补采完成")
+
+
+def main():
+    """主测试函数"""
+    test_backfill_writes_monthly_shards()
+    test_resume_after_crash()
+    test_flood_wait_backs_off()
+    print("\n🎉 历史补采测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
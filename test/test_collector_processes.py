@@ -0,0 +1,219 @@
+"""
+多进程采集测试
+验证按编号发现采集账号、账号分组，以及工作进程采集的结果与单进程一致（去重优先级、作者资料合并）
+"""
+
+import os
+import sys
+import asyncio
+import queue
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.adapters.collector_supervisor import CollectorSupervisor, group_accounts, resolve_processes
+from src.adapters.telegram_adapter_v2 import TelegramMultiAccountAdapter
+from src.adapters.telegram_replay import RecordedEntity, RecordedMessage, TelegramRecording, recording_path
+from src.authors import AuthorProfile, SenderCache
+from src.batch import MessageBatch
+from src.config import TelegramAccountConfig, TelegramClientModeConfig, load_config
+
+
+def _account(account_id: str, chats=None) -> TelegramAccountConfig:
+    return TelegramAccountConfig(account_id=account_id, api_id=0, api_hash="", phone="",
+                                 session_name=f"{account_id}_session", monitored_chats=chats)
+
+
+def test_discover_accounts():
+    """TELEGRAM_COLLECTOR<N>_API_ID 按编号发现，不再限于两个账号"""
+    print("🧪 测试采集账号发现...")
+    saved = dict(os.environ)
+    try:
+        for key in [key for key in os.environ if key.startswith("TELEGRAM_COLLECTOR")]:
+            del os.environ[key]
+        for number in (10, 2, 1):
+            os.environ[f"TELEGRAM_COLLECTOR{number}_API_ID"] = str(1000 + number)
+            os.environ[f"TELEGRAM_COLLECTOR{number}_API_HASH"] = f"hash{number}"
+        os.environ["TELEGRAM_COLLECTOR3_API_ID"] = ""
+        os.environ["MONITORED_CHATS_COLLECTOR10"] = "@a, @b"
+        os.environ["COLLECTOR_PROCESSES"] = "4"
+
+        loaded = load_config()
+        assert [a.account_id for a in loaded.collector_accounts] == ["collector1", "collector2", "collector10"]
+        collector10 = loaded.collector_accounts[2]
+        assert (collector10.api_id, collector10.api_hash, collector10.session_name) == (1010, "hash10",
+                                                                                         "collector10_session")
+        assert collector10.monitored_chats == ["@a", "@b"] and loaded.collector_accounts[0].monitored_chats == []
+        assert loaded.collector_config.processes == 4
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+    print("✅ 发现 3 个采集账号")
+
+
+def test_group_accounts():
+    """账号按轮询分到各进程，进程数不超过账号数"""
+    print("🧪 测试账号分组...")
+    plan = [(_account(f"collector{i}"), ["@chat"]) for i in range(1, 11)]
+    groups = group_accounts(plan, 4)
+    assert [[account.account_id for _, account, _ in group] for group in groups] == [
+        ["collector1", "collector5", "collector9"], ["collector2", "collector6", "collector10"],
+        ["collector3", "collector7"], ["collector4", "collector8"]]
+    assert [order for order, _, _ in groups[1]] == [1, 5, 9] and len(group_accounts(plan[:2], 4)) == 2
+    assert resolve_processes(4, 2) == 2 and resolve_processes(1, 10) == 1 and resolve_processes(0, 0) == 1
+    assert 1 <= resolve_processes(0, 10) <= 10
+    print("✅ 分组正确")
+
+
+def test_sender_cache_merge():
+    """工作进程解析到的资料合并回主进程，较新的覆盖较旧的"""
+    print("🧪 测试作者资料合并...")
+    cache = SenderCache()
+    cache.load([AuthorProfile("1", "Old", updated_at=100.0), AuthorProfile("2", "Keep", updated_at=300.0)])
+    merged = cache.merge([AuthorProfile("1", "New", updated_at=200.0), AuthorProfile("2", "Stale", updated_at=200.0),
+                          AuthorProfile("3", "Third", updated_at=200.0)])
+    assert merged == 2 and cache.name("1") == "New" and cache.name("2") == "Keep"
+    assert sorted(p.author_id for p in cache.drain_dirty()) == ["1", "3"] and len(cache.profiles()) == 3
+    print("✅ 资料合并正确")
+
+
+def _write_recordings(recording_dir: str, n_accounts: int):
+    """每个账号 3 个群组；群组 0 所有账号都能看到（用于验证去重保留账号 1 的消息）"""
+    base = datetime(2026, 1, 1, 10, tzinfo=timezone.utc)
+    shared = RecordedEntity(1000000, "Channel", title="公共群")
+    accounts = []
+    for number in range(1, n_accounts + 1):
+        recording = TelegramRecording()
+        chats = [shared] + [RecordedEntity(1000000 + number * 10 + i, "Channel", title=f"群{number}-{i}")
+                            for i in range(2)]
+        for chat in chats:
+            for i in range(1, 21):
+                sender = RecordedEntity(500 + i % 4, "User", first_name=f"用户{i % 4}")
+                recording.add_message(chat, RecordedMessage(
+                    i, chat.marked_id, base + timedelta(minutes=i), f"{chat.title} 第 {i} 条",
+                    sender_id=sender.id, sender=sender))
+        account = _account(f"collector{number}", [str(chat.marked_id) for chat in chats])
+        recording.save(recording_path(account, recording_dir))
+        accounts.append(account)
+    return accounts
+
+
+def test_worker_processes_match_in_process():
+    """两个工作进程采集 4 个账号，结果与单进程一致"""
+    print("🧪 测试多进程采集...")
+    start, end = datetime(2026, 1, 1), datetime(2026, 1, 2)
+    with tempfile.TemporaryDirectory() as tmp:
+        accounts = _write_recordings(tmp, 4)
+        mode = TelegramClientModeConfig(mode="replay", recording_dir=tmp, replay_latency=0)
+
+        async def collect(processes):
+            adapter = TelegramMultiAccountAdapter(collector_accounts=accounts, processes=processes, client_mode=mode)
+            batch = await adapter.fetch_batch_concurrently(start_time=start, end_time=end)
+            return adapter, batch
+
+        single_adapter, single = asyncio.run(collect(1))
+        multi_adapter, multi = asyncio.run(collect(2))
+
+    assert multi_adapter.processes == 2 and len(single) == 20 + 4 * 2 * 20
+    # 合并顺序与单进程相同，去重结果完全一致
+    assert [record.id for record in multi] == [record.id for record in single]
+    shared = [record for record in multi if record.chat_name == "公共群"]
+    assert len(shared) == 20 and {record.collector_account for record in shared} == {"collector1"}
+    # 批次由主进程重新登记字符串
+    assert multi[0].chat_name is multi._strings[multi[0].chat_name]
+    assert {record.author_name for record in multi} == {"用户0", "用户1", "用户2", "用户3"}
+    assert len(multi_adapter.sender_cache) == 4 and len(multi_adapter.sender_cache.drain_dirty()) == 4
+    print(f"✅ 多进程采集 {len(multi)} 条，与单进程一致")
+
+
+class _LateQueue:
+    """第一次阻塞读取超时，之后才能取到进程退出前放入的结果（模拟超时与退出之间的竞争）"""
+
+    def __init__(self):
+        self.items = []
+        self.timed_out = False
+
+    def put(self, item):
+        self.items.append(item)
+
+    def get(self, block=True, timeout=None):
+        if not self.timed_out or not self.items:
+            self.timed_out = True
+            raise queue.Empty
+        return self.items.pop(0)
+
+    def get_nowait(self):
+        if not self.items:
+            raise queue.Empty
+        return self.items.pop(0)
+
+    def close(self):
+        pass
+
+
+class _ExitedProcess:
+    """start 时同步发回一批消息和 done，随即退出"""
+
+    def __init__(self, target, args, name, daemon):
+        self.job, self.out = args
+        self.exitcode = None
+
+    def start(self):
+        self.pid = 0
+        batch = MessageBatch()
+        batch.add("m1", "1", "消息", "7", "用户", datetime(2026, 1, 1, 12), "@chat", "群", collector_account="collector1")
+        self.out.put(("batch", self.job.worker_id, (0, 0), list(batch)))
+        self.out.put(("done", self.job.worker_id, [], {}, []))
+        self.exitcode = 0
+
+    def is_alive(self):
+        return False
+
+    def join(self, timeout=None):
+        pass
+
+
+class _LateContext:
+    def Queue(self):
+        return _LateQueue()
+
+    Process = _ExitedProcess
+
+
+def test_exited_worker_results_drained():
+    """队列读取超时时工作进程已退出：先取完它退出前发回的结果，不判为异常退出"""
+    print("🧪 测试工作进程退出后取空队列...")
+    supervisor = CollectorSupervisor(1, TelegramClientModeConfig(mode="replay"))
+    supervisor._context = _LateContext()
+    start, end = datetime(2026, 1, 1), datetime(2026, 1, 2)
+    records = asyncio.run(supervisor.collect([(_account("collector1"), ["@chat"])], start, end, {"@chat": 10}))
+    assert [record.content for record in records] == ["消息"]
+    assert [(fetch.chat, fetch.fetched) for fetch in supervisor.fetches] == [("@chat", 1)]
+    print("✅ 退出前发回的结果全部保留")
+
+
+def test_injected_factory_stays_in_process():
+    """注入的客户端工厂无法传给工作进程，自动回退为单进程"""
+    print("🧪 测试注入工厂回退...")
+    adapter = TelegramMultiAccountAdapter(collector_accounts=[_account("collector1"), _account("collector2")],
+                                          client_factory=lambda account: None, processes=2)
+    assert adapter.processes == 1
+    print("✅ 回退为单进程")
+
+
+def main():
+    """主测试函数"""
+    test_discover_accounts()
+    test_group_accounts()
+    test_sender_cache_merge()
+    test_worker_processes_match_in_process()
+    test_exited_worker_results_drained()
+    test_injected_factory_stays_in_process()
+    print("\n🎉 多进程采集测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
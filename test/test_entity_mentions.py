@@ -0,0 +1,95 @@
+"""
+实体提取测试
+验证 $TICKER、合约地址、已知项目名的提取，以及入库后的提及统计查询
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import make_message
+from src.processors.entities import EntityExtractor, mention_stats, format_mention_stats
+from src.storage import Storage
+
+
+EVM_ADDRESS = "0x" + "aB" * 20
+SOL_ADDRESS = "7xKXtg2CW87d97TXJSDpbD5jBkheTqA83TZRuJosgAsU"
+
+
+
+def test_extract_entities():
+    """提取代币代码、地址和已知项目，同一消息内去重"""
+    print("🧪 测试实体提取...")
+    extractor = EntityExtractor(known_projects={"币安": "Binance", "以太坊": "ETH"})
+
+    mentions = extractor.extract(f"$btc 和 $BTC 都在涨，以太坊也动了，币安上新 CA: {EVM_ADDRESS} sol: {SOL_ADDRESS}")
+    found = {(m.entity, m.entity_type) for m in mentions}
+    assert found == {
+        ("$BTC", "ticker"),
+        ("$ETH", "ticker"),
+        ("Binance", "project"),
+        (EVM_ADDRESS.lower(), "evm_address"),
+        (SOL_ADDRESS, "sol_address"),
+    }
+    # 价格和普通单词不应被识别
+    assert extractor.extract("价格 $100，understanding") == []
+    print("✅ 实体提取正确")
+
+
+def test_mention_stats_in_memory():
+    """内存统计按提及次数排序并统计群组数"""
+    extractor = EntityExtractor(known_projects={})
+    messages = [
+        make_message(0, "$SOL 冲", "-1001", timestamp=datetime(2026, 1, 1, 12, 30)),
+        make_message(1, "$SOL $BTC", "-1002", timestamp=datetime(2026, 1, 1, 12, 30)),
+        make_message(2, "$SOL", "-1002", timestamp=datetime(2026, 1, 1, 12, 30)),
+    ]
+    stats = mention_stats(messages, extractor)
+    assert stats[0] == {"entity": "$SOL", "entity_type": "ticker", "mentions": 3, "chats": 2}
+    assert "$BTC：1 次提及" in format_mention_stats(stats)
+
+
+def test_storage_mentions_index():
+    """入库时写入提及表，重复入库不重复计数"""
+    print("🧪 测试提及表查询...")
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = Storage(os.path.join(tmp, "raw_messages.db"))
+        messages = [
+            make_message(0, "$SOL 突破", "-1001", timestamp=datetime(2026, 1, 1, 10, 30)),
+            make_message(1, "$SOL 还能追吗 $BTC", "-1002", timestamp=datetime(2026, 1, 1, 11, 30)),
+            make_message(2, "$SOL 链上数据", "-1001", timestamp=datetime(2026, 1, 1, 11, 30)),
+        ]
+        storage.save_messages(messages)
+        storage.save_message(messages[0])  # 重复消息
+
+        start, end = datetime(2026, 1, 1, 0, 0), datetime(2026, 1, 1, 23, 59)
+        top = storage.get_top_mentions(start, end)
+        assert top[0] == {"entity": "$SOL", "entity_type": "ticker", "mentions": 3, "chats": 2}
+        assert top[1]["entity"] == "$BTC"
+
+        by_hour = storage.get_mention_counts_by_hour("$SOL", start, end)
+        assert [(r["hour"], r["mentions"]) for r in by_hour] == [("2026-01-01 10:00", 1), ("2026-01-01 11:00", 2)]
+
+        by_chat = storage.get_mention_counts_by_chat("$SOL", start, end)
+        assert by_chat[0]["chat_id"] == "-1001" and by_chat[0]["mentions"] == 2
+
+        # 时间范围之外不计入
+        assert storage.get_top_mentions(end + timedelta(hours=1), end + timedelta(hours=2)) == []
+    print("✅ 提及表查询正确")
+
+
+def main():
+    """主测试函数"""
+    test_extract_entities()
+    test_mention_stats_in_memory()
+    test_storage_mentions_index()
+    print("\n🎉 实体提取测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
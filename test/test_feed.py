@@ -0,0 +1,185 @@
+"""
+实时推送测试
+验证订阅筛选（群组/标签/关键词/类型）、有上限的缓冲区、分库增量读取以及 SSE 编码
+"""
+
+import os
+import sys
+import json
+import asyncio
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import make_message
+from src.feed import FeedFilter, FeedHub
+from src.storage import Storage
+from web.api import ShardPool, ShardTailer, sse_events
+
+
+def _event(chat_id="-1001", content="", tags=(), event_type="message", summary=None):
+    return {"type": event_type, "id": "x",
+            "data": {"chat_id": chat_id, "content": content, "summary": summary, "tags": list(tags)}}
+
+
+
+def test_filters():
+    """各订阅者只收到匹配的事件"""
+    print("🧪 测试订阅筛选...")
+
+    async def run():
+        hub = FeedHub()
+        everything = hub.subscribe()
+        by_chat = hub.subscribe(FeedFilter(chat_ids={"-1002", "-1003"}))
+        by_tag = hub.subscribe(FeedFilter(tags={"空投"}, types={"analysis"}))
+        by_keyword = hub.subscribe(FeedFilter(keywords=["$sol", "a.b"]))
+
+        hub.publish(_event("-1001", "今天 $SOL 大涨"))
+        hub.publish(_event("-1002", "a.b 上线"))
+        hub.publish(_event("-1003", "axb 不应匹配关键词"))
+        hub.publish(_event("-1001", summary="空投汇总", tags=["空投"], event_type="analysis"))
+
+        sizes = [sub.queue.qsize() for sub in (everything, by_chat, by_tag, by_keyword)]
+        assert sizes == [4, 2, 1, 2], sizes
+
+        hub.unsubscribe(by_chat)
+        assert hub.subscriber_count == 3
+        assert hub.publish(_event("-1002")) == 1
+
+    asyncio.run(run())
+    print("✅ 筛选正确")
+
+
+def test_bounded_buffer():
+    """慢消费者的缓冲区满后丢弃最旧事件，发布方不阻塞"""
+    print("🧪 测试缓冲区上限...")
+
+    async def run():
+        hub = FeedHub(buffer_size=3)
+        slow = hub.subscribe()
+        for i in range(10):
+            hub.publish(_event(content=str(i)))
+        assert slow.queue.qsize() == 3 and slow.take_dropped() == 7
+        assert [(await slow.get())["data"]["content"] for _ in range(3)] == ["7", "8", "9"]
+        assert await slow.get(timeout=0.01) is None
+
+    asyncio.run(run())
+    print("✅ 只保留最新 3 条")
+
+
+def test_sse_encoding():
+    """SSE 编码：事件、丢弃通知和心跳"""
+    print("🧪 测试 SSE 编码...")
+
+    async def run():
+        hub = FeedHub(buffer_size=1)
+        subscription = hub.subscribe()
+        hub.publish(_event(content="旧"))
+        hub.publish(_event(content="新"))
+
+        checks = iter([False, False, True])
+
+        async def is_disconnected():
+            return next(checks)
+
+        return [chunk async for chunk in sse_events(subscription, is_disconnected, heartbeat=0.01)]
+
+    chunks = asyncio.run(run())
+    assert chunks[0] == "retry: 3000\n\n"
+    assert chunks[1] == 'event: dropped\ndata: {"count": 1}\n\n'
+    assert chunks[2].startswith("event: message\nid: x\ndata: ")
+    assert json.loads(chunks[2].split("data: ", 1)[1])["content"] == "新"
+    assert chunks[3] == ": ping\n\n"
+    print("✅ SSE 编码正确")
+
+
+def test_tailer_reads_new_rows_only():
+    """增量读取：不回放历史，新消息和分析结果各发一次，跨月新分库从头读取"""
+    print("🧪 测试分库增量读取...")
+    with tempfile.TemporaryDirectory() as tmp:
+        january = Storage(os.path.join(tmp, "raw_messages_2026_01.db"))
+        january.save_messages([make_message(i) for i in range(5)])
+
+        hub = FeedHub()
+        subscription = hub.subscribe()
+        tailer = ShardTailer(ShardPool(tmp), hub)
+        assert tailer.poll_once() == []
+
+        january.save_messages([make_message(5, content="新消息")])
+        january.update_message_summary("collector1:-1001:1", "摘要", ["空投"])
+        events = tailer.poll_once()
+        assert [(event["type"], event["data"]["internal_id"]) for event in events] == [
+            ("message", "collector1:-1001:5"), ("analysis", "collector1:-1001:1")]
+        assert events[1]["data"]["tags"] == ["空投"] and "analyzed_seq" not in events[1]["data"]
+        assert tailer.poll_once() == []
+
+        february = Storage(os.path.join(tmp, "raw_messages_2026_02.db"))
+        february.save_messages([make_message(100, chat_id="-1002")])
+        assert [event["data"]["internal_id"] for event in tailer.poll_once()] == ["collector1:-1002:100"]
+
+        async def run_loop():
+            tailer.interval = 0.01
+            task = asyncio.create_task(tailer.run())
+            await asyncio.sleep(0.05)
+            february.save_messages([make_message(101, chat_id="-1002")])
+            event = await subscription.get(timeout=1)
+            task.cancel()
+            return event
+
+        event = asyncio.run(run_loop())
+        assert event["data"]["internal_id"] == "collector1:-1002:101"
+    print("✅ 增量读取正确")
+
+
+def test_tailer_survives_failed_poll():
+    """一次读取失败（database is locked）后推送任务继续运行，且不丢事件"""
+    print("🧪 测试增量读取失败后恢复...")
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = Storage(os.path.join(tmp, "raw_messages_2026_01.db"))
+        storage.save_messages([make_message(0)])
+
+        hub = FeedHub()
+        subscription = hub.subscribe()
+        tailer = ShardTailer(ShardPool(tmp), hub, interval=0.01)
+        tailer.poll_once()
+        storage.save_messages([make_message(1, content="锁住期间写入")])
+
+        poll_once = tailer.poll_once
+        failures = []
+
+        def flaky_poll():
+            if not failures:
+                failures.append(True)
+                raise sqlite3.OperationalError("database is locked")
+            return poll_once()
+
+        tailer.poll_once = flaky_poll
+
+        async def run_loop():
+            task = asyncio.create_task(tailer.run())
+            event = await subscription.get(timeout=2)
+            alive = not task.done()
+            task.cancel()
+            return event, alive
+
+        event, alive = asyncio.run(run_loop())
+        assert failures and alive
+        assert event["data"]["internal_id"] == "collector1:-1001:1"
+    print("✅ 读取失败后继续推送")
+
+
+def main():
+    """主测试函数"""
+    test_filters()
+    test_bounded_buffer()
+    test_sse_encoding()
+    test_tailer_reads_new_rows_only()
+    test_tailer_survives_failed_poll()
+    print("\n🎉 实时推送测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,163 @@
+"""
+拉取预算测试
+验证按历史速率分配各群组上限（总页数不超过固定上限）、触顶时的速率估计与截断报告、分库历史估算，
+以及用回放客户端采集时繁忙群组在同样请求数下覆盖更完整
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.adapters.telegram_adapter_v2 import TelegramMultiAccountAdapter
+from src.adapters.telegram_replay import RecordedEntity, RecordedMessage, ReplayClient, TelegramRecording
+from src.config import TelegramAccountConfig
+from src.fetch_budget import ChatFetch, FetchBudget, chat_id_candidates
+from src.models import UnifiedMessage, Platform
+from src.storage import Storage
+
+END = datetime(2026, 1, 2)
+START = END - timedelta(hours=24)
+
+
+def _budget(tmp: str, data_dir=None) -> FetchBudget:
+    return FetchBudget(os.path.join(tmp, "chat_rates.db"), headroom=1.5, max_limit=2000, data_dir=data_dir)
+
+
+def test_plan_respects_request_budget():
+    """安静群组只拉 1 小页，繁忙群组分到省下来的页，没有历史的群组沿用固定上限"""
+    print("🧪 测试上限分配...")
+    with tempfile.TemporaryDirectory() as tmp:
+        budget = _budget(tmp)
+        assert budget.plan(["@quiet", "@busy", "@new"], 24, 300) == {"@quiet": 300, "@busy": 300, "@new": 300}
+
+        budget.observe([ChatFetch("@quiet", "collector1", 300, 2), ChatFetch("@busy", "collector1", 300, 300,
+                                                                             oldest=END - timedelta(hours=6))],
+                       START, END)
+        limits = budget.plan(["@quiet", "@busy", "@new"], 24, 300)
+        # 9 页预算：安静群组 1 页（只要 10 条），新群组 3 页，繁忙群组拿剩下的 5 页
+        assert limits == {"@quiet": 10, "@new": 300, "@busy": 500}
+
+        # 1 小时窗口预计 50 × 1.5 条：仍是 1 次请求，但不再只拉固定的 12 条
+        assert budget.plan(["@busy"], 1, 12) == {"@busy": 75}
+    print("✅ 总页数不超过固定上限")
+
+
+def test_observe_reports_truncation():
+    """触顶时按实际覆盖时长估算速率，记录缺失的时长；多个账号拉同一群组时取覆盖完整的一次"""
+    print("🧪 测试截断报告...")
+    with tempfile.TemporaryDirectory() as tmp:
+        budget = _budget(tmp)
+        coverage = budget.observe([
+            ChatFetch("@busy", "collector1", 300, 300, "-1001", "繁忙群", END - timedelta(hours=6)),
+            ChatFetch("@calm", "collector1", 100, 100, "-1002", "平静群", END - timedelta(hours=20)),
+            ChatFetch("@calm", "collector2", 300, 120, "-1002", "平静群", START + timedelta(hours=1)),
+        ], START, END)
+        busy, calm = coverage
+        assert busy.truncated and busy.rate == 50 and busy.missing_hours == 18 and busy.estimated_missing == 900
+        assert not calm.truncated and calm.fetched == 120 and calm.rate == 5
+
+        report = budget.truncated()
+        assert [(row["chat_name"], row["last_fetched"]) for row in report] == [("繁忙群", 300)]
+
+        # 下一次没有触顶：速率按滑动平均回落，截断标记清除
+        budget.observe([ChatFetch("@busy", "collector1", 2000, 240, "-1001", "繁忙群", START)], START, END)
+        assert budget.rates(["@busy"]) == {"@busy": 30} and budget.truncated() == []
+    print("✅ 截断的群组和缺失时长已记录")
+
+
+def test_history_rates_from_shards():
+    """还没有速率记录的数字 ID 群组，用分库中近 7 天入库的消息估算"""
+    print("🧪 测试分库历史估算...")
+    assert chat_id_candidates("@name") == [] and chat_id_candidates("name|1234") == ["1234", "-1001234"]
+    now = datetime.now()
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = Storage(os.path.join(tmp, f"raw_messages_{now:%Y_%m}.db"))
+        storage.save_messages([
+            UnifiedMessage(id=f"collector1:-1001234:{i}", platform=Platform.TELEGRAM, external_id=str(i),
+                           content=f"消息 {i}", author_id="1", author_name="A", chat_id="-1001234",
+                           chat_name="群", timestamp=now - timedelta(hours=i + 1))
+            for i in range(168)
+        ])
+        budget = _budget(tmp, data_dir=tmp)
+        assert budget.history_rates(["1234", "@name"], now) == {"1234": 1.0}
+        # 1 条/小时 × 24 小时 × 1.5
+        assert budget.plan(["1234"], 24, 300) == {"1234": 36}
+    print("✅ 分库历史速率可用")
+
+
+def _recording() -> TelegramRecording:
+    """繁忙群 24 小时 600 条，安静群 5 条"""
+    recording = TelegramRecording()
+    busy = RecordedEntity(1000001, "Channel", title="繁忙群")
+    quiet = RecordedEntity(1000002, "Channel", title="安静群")
+    base = START.replace(tzinfo=timezone.utc)
+    for i in range(600):
+        recording.add_message(busy, RecordedMessage(i + 1, busy.marked_id, base + timedelta(minutes=2.4 * i + 1),
+                                                    f"繁忙群 {i}", sender_id=42))
+    for i in range(5):
+        recording.add_message(quiet, RecordedMessage(i + 1, quiet.marked_id, base + timedelta(hours=4 * i + 1),
+                                                     f"安静群 {i}", sender_id=42))
+    return recording
+
+
+def test_adaptive_budget_improves_coverage():
+    """总页数上限不变，第二次采集把安静群组用不到的页分给繁忙群组"""
+    print("🧪 测试回放采集...")
+    recording = _recording()
+    chats = ["-1001000001", "-1001000002"]
+    clients = []
+
+    def factory(account_config):
+        clients.append(ReplayClient(recording))
+        return clients[-1]
+
+    account = TelegramAccountConfig(account_id="collector1", api_id=0, api_hash="", phone="", session_name="",
+                                    monitored_chats=chats)
+
+    async def collect(chat_limits=None):
+        adapter = TelegramMultiAccountAdapter(collector_accounts=[account], client_factory=factory)
+        messages = await adapter.fetch_batch_concurrently(
+            start_time=_local(START), end_time=_local(END), limit_per_chat=300, chat_limits=chat_limits)
+        return adapter, messages, clients[-1].requests
+
+    with tempfile.TemporaryDirectory() as tmp:
+        budget = _budget(tmp)
+        fixed_adapter, fixed, fixed_requests = asyncio.run(collect())
+        coverage = budget.observe(fixed_adapter.last_fetches, _local(START), _local(END))
+        assert [item.chat for item in coverage if item.truncated] == ["-1001000001"]
+
+        limits = budget.plan(fixed_adapter.monitored_chats(), 24, 300)
+        adaptive_adapter, adaptive, adaptive_requests = asyncio.run(collect(limits))
+        assert limits == {"-1001000001": 500, "-1001000002": 10}
+
+    # 繁忙群组 600 条：固定上限只拉到最近 12 小时，自适应多覆盖 200 条；
+    # 拉消息的页数（请求数减去一次对话列表预检和每个群组一次实体解析）不超过固定上限时的 2 × 3 页
+    assert len(fixed) == 300 + 5 and len(adaptive) == 500 + 5
+    assert adaptive_requests - 1 - len(chats) <= len(chats) * 3, (adaptive_requests, fixed_requests)
+    busy = next(fetch for fetch in adaptive_adapter.last_fetches if fetch.chat == "-1001000001")
+    assert busy.truncated and busy.oldest < min(f.oldest for f in fixed_adapter.last_fetches if f.truncated)
+    print(f"✅ 固定上限 {len(fixed)} 条/{fixed_requests} 次请求，自适应 {len(adaptive)} 条/{adaptive_requests} 次请求")
+
+
+def _local(value: datetime) -> datetime:
+    """采集窗口使用本地时间，与 fetch_records 的比较方式一致"""
+    return value.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+def main():
+    """主测试函数"""
+    test_plan_respects_request_budget()
+    test_observe_reports_truncation()
+    test_history_rates_from_shards()
+    test_adaptive_budget_improves_coverage()
+    print("\n🎉 拉取预算测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
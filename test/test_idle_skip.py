@@ -0,0 +1,222 @@
+"""
+空闲群组跳过测试
+验证对话列表预检：最新消息早于窗口的群组不再扫描（大多空闲时只剩一次对话列表请求），
+其余群组按预计消息数排序，水位的保存与读取，以及预检关闭时的原有行为
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.adapters.telegram_adapter_v2 import TelegramClientSession, TelegramMultiAccountAdapter
+from src.adapters.telegram_replay import RecordedEntity, RecordedMessage, ReplayClient, TelegramRecording
+from src.config import TelegramAccountConfig
+from src.fetch_budget import ChatActivity, FetchBudget, schedule_chats
+
+# 回放消息使用 UTC，采集窗口使用本地时间
+END_UTC = datetime(2026, 1, 2, tzinfo=timezone.utc)
+START_UTC = END_UTC - timedelta(hours=24)
+
+
+def _local(value: datetime) -> datetime:
+    return value.astimezone().replace(tzinfo=None)
+
+
+START, END = _local(START_UTC), _local(END_UTC)
+
+
+def _recording(n_chats: int, active: dict) -> TelegramRecording:
+    """n_chats 个频道，最新一条都在对话列表里；active 中的频道窗口内有若干条消息，其余最后一条在三天前"""
+    recording = TelegramRecording()
+    for number in range(n_chats):
+        chat = RecordedEntity(2000000 + number, "Channel", title=f"频道{number}")
+        old = RecordedMessage(100, chat.marked_id, START_UTC - timedelta(days=3), f"频道{number} 旧消息", sender_id=7)
+        recording.add_message(chat, old)
+        top = old
+        for i in range(active.get(number, 0)):
+            top = RecordedMessage(101 + i, chat.marked_id, START_UTC + timedelta(minutes=10 * i + 1),
+                                  f"频道{number} 第 {i} 条", sender_id=7)
+            recording.add_message(chat, top)
+        recording.add_dialog(chat, top.date, top)
+    return recording
+
+
+def _chats(n_chats: int):
+    return [str(RecordedEntity(2000000 + number, "Channel").marked_id) for number in range(n_chats)]
+
+
+def _collect(recording: TelegramRecording, chats, skip_idle=True, watermarks=None, concurrency=None, started=None,
+             latency=0.0):
+    clients = []
+
+    def factory(account_config):
+        clients.append(ReplayClient(recording, latency=latency))
+        return clients[-1]
+
+    account = TelegramAccountConfig(account_id="collector1", api_id=0, api_hash="", phone="", session_name="",
+                                    monitored_chats=chats)
+    adapter = TelegramMultiAccountAdapter(collector_accounts=[account], client_factory=factory)
+    adapter.skip_idle = skip_idle
+    if concurrency is not None:
+        adapter.fetch_concurrency = concurrency
+    if started is not None:
+        session = adapter.collector_sessions["collector1"]
+        fetch_records = session.fetch_records
+        finished = []
+
+        async def tracked(chat_identifier, *args):
+            # 记下开始扫描时仍在进行的其他扫描数
+            started.append((chat_identifier, len(started) - len(finished)))
+            try:
+                return await fetch_records(chat_identifier, *args)
+            finally:
+                finished.append(chat_identifier)
+
+        session.fetch_records = tracked
+    batch = asyncio.run(adapter.fetch_batch_concurrently(start_time=START, end_time=END, limit_per_chat=100,
+                                                         watermarks=watermarks))
+    return adapter, batch, clients[-1].requests
+
+
+def test_idle_chats_collapse_to_dialogs_call():
+    """50 个频道只有 2 个有新消息：1 次对话列表请求 + 2 页，不再逐个解析实体和扫描"""
+    print("🧪 测试空闲群组跳过...")
+    chats = _chats(50)
+    recording = _recording(50, {3: 5, 40: 12})
+
+    full_adapter, full, full_requests = _collect(recording, chats, skip_idle=False)
+    adapter, batch, requests = _collect(recording, chats)
+
+    assert len(batch) == len(full) == 17
+    assert sorted(record.id for record in batch) == sorted(record.id for record in full)
+    # 原来每个群组一次 get_entity 加一页消息；预检后实体来自对话列表
+    assert full_requests == 100 and requests == 1 + 2, (full_requests, requests)
+    # 跳过的群组记为拉到 0 条，拉取预算照常更新速率
+    assert len(adapter.last_fetches) == 50
+    assert sum(fetch.fetched for fetch in adapter.last_fetches) == 17
+    assert {item.top_message_id for item in adapter.last_activity} == {100, 105, 112}
+
+    _, idle, idle_requests = _collect(_recording(50, {}), chats)
+    assert len(idle) == 0 and idle_requests == 1
+    print(f"✅ 预检后 {requests} 次请求（原来 {full_requests} 次），全部空闲时只需 {idle_requests} 次")
+
+
+def test_unknown_chats_still_scanned():
+    """不在对话列表中的群组（例如账号还没有加入）照常扫描"""
+    print("🧪 测试不在对话列表中的群组...")
+    recording = _recording(3, {0: 2, 2: 3})
+    recording.dialogs = [item for item in recording.dialogs if item["entity_id"] != "2000002"]
+    adapter, batch, requests = _collect(recording, _chats(3))
+    assert len(batch) == 5 and requests == 1 + 1 + (1 + 1)
+    assert [item.chat for item in adapter.last_activity] == _chats(2)
+    print("✅ 未匹配的群组照常扫描")
+
+
+def test_fetch_concurrency_follows_schedule():
+    """并发受限时按预计消息数从多到少依次开始扫描，结果与不限并发时一致"""
+    print("🧪 测试并发上限...")
+    chats = _chats(6)
+    recording = _recording(6, {1: 2, 3: 9, 4: 5, 5: 1})
+    # 旧消息 ID 都是 100：预计 9、5、2、1 条
+    watermarks = {"collector1": dict.fromkeys(chats, 100)}
+    started = []
+    _, batch, _ = _collect(recording, chats, watermarks=watermarks, concurrency=1, started=started,
+                           latency=0.01)
+    _, full, _ = _collect(recording, chats, concurrency=100)
+    # 每个群组开始时前一个已经拉完
+    assert started == [(chats[3], 0), (chats[4], 0), (chats[1], 0), (chats[5], 0)]
+    assert [record.id for record in batch] == [record.id for record in full] and len(batch) == 17
+    print("✅ 按预计消息数依次扫描")
+
+
+def test_fetch_concurrency_per_account():
+    """名额按账号计算，默认不限，未开启预检时不限流：2 个账号各 4 个群组，每次请求 0.2 秒"""
+    print("🧪 测试并发上限的耗时...")
+    chats = _chats(8)
+    recording = _recording(8, dict.fromkeys(range(8), 3))
+    accounts = [TelegramAccountConfig(account_id=f"collector{n + 1}", api_id=0, api_hash="", phone="",
+                                      session_name="", monitored_chats=chats[4 * n:4 * n + 4]) for n in range(2)]
+
+    def elapsed(concurrency, skip_idle=True):
+        adapter = TelegramMultiAccountAdapter(collector_accounts=accounts,
+                                              client_factory=lambda _: ReplayClient(recording, latency=0.2))
+        adapter.fetch_concurrency, adapter.skip_idle = concurrency, skip_idle
+        started = time.perf_counter()
+        batch = asyncio.run(adapter.fetch_batch_concurrently(start_time=START, end_time=END, limit_per_chat=100))
+        assert len(batch) == 24
+        return time.perf_counter() - started
+
+    # 对话列表一轮 + 扫描一轮；全局 4 个名额时扫描需要两轮
+    unlimited, per_account, serial = elapsed(0), elapsed(4), elapsed(1)
+    assert unlimited < 0.55 and per_account < 0.55, (unlimited, per_account)
+    assert serial >= 0.95, serial
+    # 未开启预检时没有顺序可言，不限流（每个群组解析实体 + 一页）
+    assert elapsed(1, skip_idle=False) < 0.55
+    print(f"✅ 不限 {unlimited:.2f}s，每账号 4 个 {per_account:.2f}s，每账号 1 个 {serial:.2f}s")
+
+
+def test_schedule_orders_by_expected_volume():
+    """频道消息 ID 连续：最新 ID 减水位即为新增条数，预计多的先扫描"""
+    print("🧪 测试扫描顺序...")
+    recent = START + timedelta(hours=1)
+    activity = {
+        "@a": ChatActivity("@a", "collector1", 510, recent),
+        "@b": ChatActivity("@b", "collector1", 900, recent),
+        "@c": ChatActivity("@c", "collector1", 42, START - timedelta(days=1)),
+        "@d": ChatActivity("@d", "collector1", None, None),
+    }
+    limits = {"@a": 300, "@b": 300, "@c": 300, "@d": 50, "@e": 100}
+    chats = ["@a", "@b", "@c", "@d", "@e"]
+    scheduled = schedule_chats(chats, activity, START, limits, {"@a": 500, "@b": 700})
+    # @c 最新消息早于窗口，跳过；@a 只新增 10 条，排在没有水位的群组之后
+    assert scheduled == [(1, 200), (4, 100), (3, 50), (0, 10)]
+    assert [index for index, _ in schedule_chats(chats, {}, START, limits)] == [0, 1, 2, 4, 3]
+    print("✅ 按预计消息数排序")
+
+
+def test_watermarks_roundtrip():
+    """水位按账号、群组保存，采集时传回适配器"""
+    print("🧪 测试水位保存...")
+    chats = _chats(4)
+    recording = _recording(4, {1: 3, 2: 30})
+    with tempfile.TemporaryDirectory() as tmp:
+        budget = FetchBudget(os.path.join(tmp, "chat_rates.db"), data_dir=None)
+        adapter, _, _ = _collect(recording, chats)
+        assert budget.save_watermarks(adapter.last_activity) == 4
+        watermarks = budget.watermarks()
+        assert watermarks == {"collector1": {chats[0]: 100, chats[1]: 103, chats[2]: 130, chats[3]: 100}}
+
+        # 频道 1 又来 3 条：下次预计 3 条，频道 2 没有新消息但最新一条仍在窗口内，照常扫描
+        session = TelegramClientSession(adapter.collector_accounts[0],
+                                        client_factory=lambda _: ReplayClient(recording))
+        chat = RecordedEntity(2000001, "Channel", title="频道1")
+        for i in range(3):
+            recording.add_message(chat, RecordedMessage(104 + i, chat.marked_id, START_UTC + timedelta(hours=5 + i),
+                                                        "新消息", sender_id=7))
+        recording.add_dialog(chat, START_UTC + timedelta(hours=7), recording.messages_for(chat)[0])
+        scheduled, _ = asyncio.run(session.scheduled_chats(chats, START, dict.fromkeys(chats, 100),
+                                                           watermarks["collector1"]))
+        assert scheduled == [(1, 3), (2, 0)]
+    print("✅ 水位保存与读取正确")
+
+
+def main():
+    """主测试函数"""
+    test_idle_chats_collapse_to_dialogs_call()
+    test_unknown_chats_still_scanned()
+    test_fetch_concurrency_follows_schedule()
+    test_fetch_concurrency_per_account()
+    test_schedule_orders_by_expected_volume()
+    test_watermarks_roundtrip()
+    print("\n🎉 空闲群组跳过测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,64 @@
+"""
+启动耗时测试
+验证导入常用入口时不会加载 telethon / openai / google-genai 等重型 SDK，且配置在首次访问时才读取
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.importtime import heavy_modules_loaded, parse_importtime
+
+
+SAMPLE_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     _io
+import time:       300 |        420 |   io
+import time:      1000 |       1420 | src.config
+"""
+
+
+def test_parse_importtime():
+    """解析 -X importtime 输出中的模块名、耗时和层级"""
+    print("🧪 测试 importtime 解析...")
+    records = parse_importtime(SAMPLE_OUTPUT)
+    assert [(r.module, r.self_us, r.cumulative_us, r.depth) for r in records] == [
+        ("_io", 120, 120, 2), ("io", 300, 420, 1), ("src.config", 1000, 1420, 0),
+    ]
+    print("✅ 解析正确")
+
+
+def test_entry_points_skip_heavy_sdks():
+    """导入入口模块时不加载重型 SDK"""
+    print("🧪 测试入口模块的延迟导入...")
+    for entry in ("src.config", "src.processors.summarizer", "src.adapters.telegram_adapter_v2",
+                  "auto/telegram_alerter.py"):
+        loaded = heavy_modules_loaded(entry)
+        assert not loaded, f"{entry} 导入时加载了 {sorted(loaded)}"
+        print(f"   {entry}: 未加载重型 SDK")
+    print("✅ 延迟导入生效")
+
+
+def test_lazy_config():
+    """配置在第一次访问属性时才加载，之后复用同一实例"""
+    print("🧪 测试延迟加载配置...")
+    from src.config import config, AppConfig
+
+    first = config.ai_config
+    assert isinstance(object.__getattribute__(config, "_config"), AppConfig)
+    assert config.ai_config is first
+    print("✅ 配置按需加载")
+
+
+def main():
+    """主测试函数"""
+    test_parse_importtime()
+    test_entry_points_skip_heavy_sdks()
+    test_lazy_config()
+    print("\n🎉 启动耗时测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,117 @@
+"""
+紧凑消息批次测试
+验证 MessageRecord 与 UnifiedMessage 的属性兼容、字符串共享、去重/压缩/入库可直接使用批次，以及内存占用更小
+"""
+
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import make_message
+from src.adapters.telegram_adapter_v2 import TelegramMultiAccountAdapter
+from src.batch import MessageBatch, MessageRecord
+from src.models import UnifiedMessage
+from src.processors.compactor import PromptCompactor
+from src.storage import Storage
+
+
+def _linked_message(idx: int, chat_id: str = "-1001", account: str = "collector1") -> UnifiedMessage:
+    """带链接、多个作者和采集元数据的消息（覆盖 MessageRecord 的全部字段）"""
+    return make_message(
+        idx, f"消息 {idx} https://example.com/{idx}", chat_id, account=account,
+        author_id=f"user{idx % 3}", author_name=f"用户{idx % 3}", urls=[f"https://example.com/{idx}"],
+        raw_metadata={"collector_account": account, "views": idx, "forwards": 0, "reply_to": None},
+    )
+
+
+def test_round_trip():
+    """转换为 UnifiedMessage 后字段与原消息一致"""
+    print("🧪 测试 UnifiedMessage 往返转换...")
+    messages = [_linked_message(i) for i in range(5)]
+    batch = MessageBatch.from_unified(messages)
+    assert len(batch) == 5 and isinstance(batch[0], MessageRecord)
+    assert batch.to_unified() == messages
+    assert batch[0].raw_metadata == messages[0].raw_metadata
+    assert batch[0].urls == ("https://example.com/0",) and batch[0].tags == () and batch[0].summary is None
+    assert isinstance(batch[1:3], MessageBatch) and [r.id for r in batch[1:3]] == [m.id for m in messages[1:3]]
+    print("✅ 往返转换一致")
+
+
+def test_strings_are_shared():
+    """群组/作者/账号字符串在批次内只保留一份，合并批次后依然共享"""
+    print("🧪 测试字符串共享...")
+    batch = MessageBatch()
+    for i in range(6):
+        message = _linked_message(i)
+        # 模拟采集时每条消息都得到新的字符串对象
+        batch.add(message.id, message.external_id, message.content, "".join(message.author_id),
+                  "".join(message.author_name), message.timestamp, "".join(message.chat_id),
+                  "".join(message.chat_name), message.urls, "".join(["collector", "1"]))
+    assert batch[0].chat_name is batch[5].chat_name
+    assert batch[0].author_name is batch[3].author_name
+    assert batch[0].collector_account is batch[5].collector_account
+
+    other = MessageBatch.from_unified([_linked_message(10)])
+    batch.extend(other)
+    assert len(batch) == 7 and batch[6].chat_id is batch[0].chat_id
+    assert batch.derive(list(batch)[:2])._strings is batch._strings
+    print("✅ 重复字符串共享")
+
+
+def test_pipeline_accepts_batch():
+    """去重、提示词压缩和入库直接使用批次"""
+    print("🧪 测试流水线使用批次...")
+    adapter = TelegramMultiAccountAdapter(collector_accounts=[])
+    # 账号 2 也采集到了前 3 条，去重时保留账号 1 的
+    duplicated = [_linked_message(i, account="collector2") for i in range(3)]
+    batch = MessageBatch.from_unified(duplicated + [_linked_message(i) for i in range(5)])
+    deduplicated = adapter._deduplicate_messages(batch)
+    assert len(deduplicated) == 5 and all(isinstance(record, MessageRecord) for record in deduplicated)
+    assert {record.collector_account for record in deduplicated} == {"collector1"}
+
+    prompt_messages, stats = PromptCompactor().compact_messages(batch)
+    assert len(prompt_messages) <= len(batch) and stats
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = Storage(os.path.join(tmp, "messages.db"))
+        assert storage.save_messages(batch.derive(deduplicated)) == 5
+        assert storage.get_message_counts()[0]["total"] == 5
+    print("✅ 去重、压缩、入库正常")
+
+
+def test_batch_uses_less_memory():
+    """同样的消息，MessageBatch 比 UnifiedMessage 列表占用更少内存"""
+    print("🧪 测试内存占用...")
+    source = [_linked_message(i, chat_id=f"-10{i % 10}") for i in range(2000)]
+
+    def held(build):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del result
+        return used
+
+    unified = held(lambda: [message.model_copy(deep=True) for message in source])
+    batch = held(lambda: MessageBatch.from_unified(source))
+    assert batch < unified * 0.6, (batch, unified)
+    print(f"✅ MessageBatch {batch // 1024} KB < UnifiedMessage {unified // 1024} KB")
+
+
+def main():
+    """主测试函数"""
+    test_round_trip()
+    test_strings_are_shared()
+    test_pipeline_accepts_batch()
+    test_batch_uses_less_memory()
+    print("\n🎉 紧凑消息批次测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,152 @@
+"""
+看板查询测试
+验证按游标分页、SQL 筛选（群组/时间/标签/处理状态）、预计算计数以及缓存失效用的数据版本号
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import make_message
+from src.storage import Storage
+
+BASE_TIME = datetime(2026, 1, 1, 0, 0)
+
+
+
+def _populated_storage(tmp, count=300):
+    storage = Storage(os.path.join(tmp, "messages.db"))
+    # 每两条消息共用一个时间戳，验证同一时间戳的消息不会在翻页时丢失或重复
+    storage.save_messages([make_message(i, chat_id="-1001" if i % 3 else "-1002",
+                                        timestamp=BASE_TIME + timedelta(minutes=i // 2)) for i in range(count)])
+    return storage
+
+
+def test_cursor_pagination():
+    """逐页翻完所有消息，不重复不遗漏，且按时间倒序"""
+    print("🧪 测试游标分页...")
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = _populated_storage(tmp)
+        seen, cursor, pages = [], None, 0
+        while True:
+            rows, cursor = storage.query_messages(cursor=cursor, limit=40)
+            seen.extend(rows)
+            pages += 1
+            if cursor is None:
+                break
+        assert pages == 8
+        assert len({row["internal_id"] for row in seen}) == len(seen) == 300
+        keys = [(row["timestamp"], row["internal_id"]) for row in seen]
+        assert keys == sorted(keys, reverse=True)
+    print("✅ 300 条消息分 8 页翻完")
+
+
+def test_filters_in_sql():
+    """群组、时间、标签和处理状态组合筛选"""
+    print("🧪 测试筛选条件...")
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = _populated_storage(tmp)
+        storage.update_message_summary("collector1:-1002:0", "摘要", ["DeFi", "空投"])
+        storage.update_message_summary("collector1:-1002:3", "摘要", ["空投"])
+        storage.update_message_summary("collector1:-1001:4", "摘要", ["NFT"])
+
+        rows, _ = storage.query_messages(chat_ids=["-1002"], limit=500)
+        assert len(rows) == 100 and {row["chat_id"] for row in rows} == {"-1002"}
+
+        rows, _ = storage.query_messages(start_time=BASE_TIME + timedelta(minutes=140), limit=500)
+        assert len(rows) == 20
+
+        rows, _ = storage.query_messages(tags=["空投"], limit=500)
+        assert [row["internal_id"] for row in rows] == ["collector1:-1002:3", "collector1:-1002:0"]
+
+        rows, _ = storage.query_messages(processed=True, chat_ids=["-1001"], limit=500)
+        assert [row["internal_id"] for row in rows] == ["collector1:-1001:4"]
+        rows, _ = storage.query_messages(processed=False, limit=500)
+        assert len(rows) == 297
+
+        assert storage.get_tag_counts() == [{"tag": "空投", "messages": 2},
+                                            {"tag": "DeFi", "messages": 1},
+                                            {"tag": "NFT", "messages": 1}]
+    print("✅ 筛选在 SQL 中完成")
+
+
+def test_counts_and_version():
+    """计数随写入更新，重复写入和重复分析不重复计数；版本号在每次写入后变化"""
+    print("🧪 测试预计算计数与数据版本...")
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = _populated_storage(tmp)
+        counts = {row["chat_id"]: (row["total"], row["processed"]) for row in storage.get_message_counts()}
+        assert counts == {"-1001": (200, 0), "-1002": (100, 0)}
+
+        version = storage.data_version()
+        storage.save_messages([make_message(0, chat_id="-1002", timestamp=BASE_TIME)])
+        assert storage.data_version() == version
+
+        storage.update_message_summary("collector1:-1002:0", "摘要", ["DeFi"])
+        storage.update_message_summary("collector1:-1002:0", "新摘要", ["DeFi"])
+        storage.mark_as_processed("collector1:-1001:1")
+        assert storage.data_version() == version + 3
+        counts = {row["chat_id"]: (row["total"], row["processed"]) for row in storage.get_message_counts()}
+        assert counts == {"-1001": (200, 1), "-1002": (100, 1)}
+    print("✅ 计数和版本号正确")
+
+
+def test_counts_bootstrap_existing_database():
+    """已有数据库第一次打开时从 messages 表生成计数"""
+    print("🧪 测试已有数据库导入计数...")
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = _populated_storage(tmp, count=30)
+        storage.mark_as_processed("collector1:-1002:0")
+        with sqlite3.connect(storage.db_path) as conn:
+            conn.execute("DROP TABLE message_counts")
+
+        reopened = Storage(storage.db_path)
+        counts = {row["chat_id"]: (row["total"], row["processed"]) for row in reopened.get_message_counts()}
+        assert counts == {"-1001": (20, 0), "-1002": (10, 1)}
+    print("✅ 计数已从历史数据生成")
+
+
+def test_deep_page_uses_index():
+    """深翻页走索引：第 N 页与第 1 页耗时相当"""
+    print("🧪 测试深翻页性能...")
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = Storage(os.path.join(tmp, "messages.db"))
+        with sqlite3.connect(storage.db_path) as conn:
+            conn.executemany(
+                "INSERT INTO messages (internal_id, chat_id, chat_name, content, timestamp, processed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ((f"m{i:06d}", f"-100{i % 50}", "群", "内容", BASE_TIME + timedelta(seconds=i), i % 2)
+                 for i in range(100_000)))
+            plan = " ".join(row[-1] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM messages WHERE (timestamp, internal_id) < (?, ?) "
+                "ORDER BY timestamp DESC, internal_id DESC LIMIT 51", ("2026-01-02", "m")))
+        assert "idx_messages_time" in plan, plan
+
+        started = time.perf_counter()
+        for _ in range(20):
+            rows, _ = storage.query_messages(cursor=(str(BASE_TIME + timedelta(seconds=500)), "m"), limit=50)
+        elapsed = (time.perf_counter() - started) / 20
+        assert len(rows) == 50 and rows[0]["internal_id"] == "m000499"
+        assert elapsed < 0.05, f"翻页耗时 {elapsed * 1000:.1f}ms"
+    print(f"✅ 10 万条消息末尾翻页耗时 {elapsed * 1000:.1f}ms")
+
+
+def main():
+    """主测试函数"""
+    test_cursor_pagination()
+    test_filters_in_sql()
+    test_counts_and_version()
+    test_counts_bootstrap_existing_database()
+    test_deep_page_uses_index()
+    print("\n🎉 看板查询测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
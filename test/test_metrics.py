@@ -0,0 +1,103 @@
+"""
+运行指标测试
+验证计数器、直方图分位数、计时装饰器，以及 JSON / Prometheus 导出
+"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.metrics import MetricsRegistry
+
+
+def test_counters_and_histograms():
+    """同名不同标签的指标互相独立，直方图给出正确的分位数"""
+    print("🧪 测试计数器与直方图...")
+    registry = MetricsRegistry()
+    registry.counter("telegram_messages_fetched_total", account="collector1").inc(120)
+    registry.counter("telegram_messages_fetched_total", account="collector1").inc(5)
+    registry.counter("telegram_messages_fetched_total", account="collector2").inc()
+
+    histogram = registry.histogram("llm_request_seconds", provider="deepseek")
+    for value in range(1, 101):
+        histogram.observe(value / 100)
+
+    data = registry.to_dict()
+    counters = {c["labels"]["account"]: c["value"] for c in data["counters"]["telegram_messages_fetched_total"]}
+    assert counters == {"collector1": 125, "collector2": 1}
+    summary = data["histograms"]["llm_request_seconds"][0]
+    assert summary["count"] == 100 and summary["min"] == 0.01 and summary["max"] == 1.0
+    assert abs(summary["p50"] - 0.505) < 1e-9
+    assert abs(summary["p99"] - 0.9901) < 1e-9
+    print("✅ 计数器与直方图正确")
+
+
+def test_timed_decorator():
+    """计时装饰器同时支持同步函数和协程函数"""
+    print("🧪 测试计时装饰器...")
+    registry = MetricsRegistry()
+
+    @registry.timed("storage_seconds", op="save")
+    def save(x):
+        return x * 2
+
+    @registry.timed("llm_request_seconds", mode="json")
+    async def call(x):
+        await asyncio.sleep(0.01)
+        return x + 1
+
+    assert save(2) == 4 and save(3) == 6
+    assert asyncio.run(call(1)) == 2
+    assert registry.histogram("storage_seconds", op="save").count == 2
+    assert registry.histogram("llm_request_seconds", mode="json").min >= 0.01
+    print("✅ 同步与异步计时均已记录")
+
+
+def test_json_and_prometheus_export():
+    """运行结束写出 JSON，Prometheus 端点返回文本格式"""
+    print("🧪 测试指标导出...")
+    registry = MetricsRegistry()
+    registry.counter("delivery_messages_sent_total", target="telegram").inc(3)
+    with registry.timer("pipeline_stage_seconds", stage="collect"):
+        pass
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = registry.write_json("process_24h_report", output_dir=tmp)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    assert os.path.basename(path).startswith("process_24h_report_")
+    assert data["counters"]["delivery_messages_sent_total"][0]["value"] == 3
+
+    text = registry.render_prometheus()
+    assert '# TYPE delivery_messages_sent_total counter' in text
+    assert 'delivery_messages_sent_total{target="telegram"} 3' in text
+    assert 'pipeline_stage_seconds_count{stage="collect"} 1' in text
+    assert 'pipeline_stage_seconds{stage="collect",quantile="0.5"}' in text
+
+    port = registry.start_http_server(port=0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+    finally:
+        registry.stop_http_server()
+    assert 'delivery_messages_sent_total{target="telegram"} 3' in body
+    print(f"✅ JSON 与 Prometheus 端点（端口 {port}）导出正常")
+
+
+def main():
+    """主测试函数"""
+    test_counters_and_histograms()
+    test_timed_decorator()
+    test_json_and_prometheus_export()
+    print("\n🎉 运行指标测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
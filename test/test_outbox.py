@@ -0,0 +1,187 @@
+"""
+发件箱测试
+验证幂等入队、分段续发、FloodWait 处理、同聊天限速和多目标并发投递
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.delivery.outbox import MAX_PART_LENGTH, Outbox, OutboxWorker, split_parts
+
+
+class FakeFloodWait(Exception):
+    """与 telethon FloodWaitError 一样通过 seconds 给出等待时间"""
+
+    def __init__(self, seconds):
+        super().__init__(f"A wait of {seconds} seconds is required")
+        self.seconds = seconds
+
+
+class RecordingSender:
+    """记录每次发送；failures 中的 (目标, 第几次调用) 抛出指定异常"""
+
+    def __init__(self, failures=None):
+        self.sent = []
+        self.calls = 0
+        self.failures = failures or {}
+
+    async def __call__(self, target, text, parse_mode):
+        self.calls += 1
+        error = self.failures.pop((target, self.calls), None)
+        if error is not None:
+            raise error
+        self.sent.append((target, text))
+
+
+def _long_text(parts=3):
+    return "".join(chr(ord("a") + i) * MAX_PART_LENGTH for i in range(parts))
+
+
+def _worker(outbox, sender, **kwargs):
+    kwargs.setdefault("chat_interval", 0)
+    kwargs.setdefault("retry_base", 0)
+    kwargs.setdefault("max_attempts", 3)
+    kwargs.setdefault("max_flood_wait", 1)
+    return OutboxWorker(outbox, sender, **kwargs)
+
+
+def test_enqueue_idempotent():
+    """同一幂等键和目标只入队一次，已送达后重复提交不会再发"""
+    print("🧪 测试幂等入队...")
+    with tempfile.TemporaryDirectory() as tmp:
+        outbox = Outbox(os.path.join(tmp, "outbox.db"))
+        assert outbox.enqueue("daily:1", "hello", ["@a", "@b"]) == 2
+        assert outbox.enqueue("daily:1", "hello again", ["@a", "@b"]) == 0
+
+        sender = RecordingSender()
+        assert asyncio.run(_worker(outbox, sender).drain()) == 2
+        assert outbox.enqueue("daily:1", "hello", ["@a"]) == 0
+        assert asyncio.run(_worker(outbox, sender).drain()) == 0
+        assert sorted(sender.sent) == [("@a", "hello"), ("@b", "hello")]
+        assert outbox.status_of("daily:1") == {"@a": "sent", "@b": "sent"}
+    assert split_parts("<b>", "HTML") == ["&lt;b&gt;"]
+    # 已经是 HTML 的告警原样保留标签
+    assert split_parts("<b>告警</b>\n问题: a &lt; b", "HTML", is_html=True) == ["<b>告警</b>\n问题: a &lt; b"]
+    print("✅ 重复提交被忽略")
+
+
+def test_resume_partial_post():
+    """多段消息中途失败后从未发送的分段续发，已发送的分段不重复"""
+    print("🧪 测试分段续发...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "outbox.db")
+        outbox = Outbox(db_path)
+        outbox.enqueue("daily:1", _long_text(3), ["@channel"], parse_mode=None)
+
+        # 第二段失败：退避到未来，本次投递结束
+        sender = RecordingSender({("@channel", 2): ConnectionError("network down")})
+        asyncio.run(_worker(outbox, sender, retry_base=3600).drain())
+        assert [text[0] for _, text in sender.sent] == ["a"]
+        assert outbox.stats() == {"pending": 1}
+
+        # 新进程重新打开发件箱，到期后续发剩余两段
+        outbox = Outbox(db_path)
+        sender = RecordingSender()
+        worker = _worker(outbox, sender, clock=lambda: time.time() + 7200)
+        assert asyncio.run(worker.drain()) == 1
+        assert [text[0] for _, text in sender.sent] == ["b", "c"]
+        assert outbox.status_of("daily:1") == {"@channel": "sent"}
+    print("✅ 只续发了未送达的分段")
+
+
+def test_flood_wait_handling():
+    """短 FloodWait 原地等待；长 FloodWait 推迟该聊天的全部消息，其他目标不受影响"""
+    print("🧪 测试 FloodWait 处理...")
+    with tempfile.TemporaryDirectory() as tmp:
+        outbox = Outbox(os.path.join(tmp, "outbox.db"))
+        outbox.enqueue("r1", "first", ["@slow", "@short", "@fast"])
+        outbox.enqueue("r2", "second", ["@slow"])
+
+        sender = RecordingSender({
+            ("@slow", 1): FakeFloodWait(3600),
+            ("@short", 2): FakeFloodWait(0),
+        })
+        delivered = asyncio.run(_worker(outbox, sender).drain())
+
+        assert delivered == 2
+        assert sorted(target for target, _ in sender.sent) == ["@fast", "@short"]
+        assert outbox.status_of("r1") == {"@slow": "pending", "@short": "sent", "@fast": "sent"}
+        assert outbox.status_of("r2") == {"@slow": "pending"}
+        assert outbox.claim_due() == []
+    print("✅ FloodWait 按时长分别处理")
+
+
+def test_rate_limit_and_fan_out():
+    """同一聊天按最小间隔发送，不同目标并发"""
+    print("🧪 测试限速与并发投递...")
+    with tempfile.TemporaryDirectory() as tmp:
+        outbox = Outbox(os.path.join(tmp, "outbox.db"))
+        outbox.enqueue("r1", _long_text(3), ["@a", "@b", "@c"], parse_mode=None)
+
+        sender = RecordingSender()
+        started = time.perf_counter()
+        delivered = asyncio.run(_worker(outbox, sender, chat_interval=0.1).drain())
+        elapsed = time.perf_counter() - started
+
+    assert delivered == 3 and len(sender.sent) == 9
+    # 每个聊天 3 段需要至少 2 个间隔；三个聊天并发，总耗时不应叠加
+    assert 0.2 <= elapsed < 0.5, f"耗时 {elapsed:.2f}s"
+    print(f"✅ 3 个目标各 3 段，耗时 {elapsed:.2f}s")
+
+
+def test_max_attempts_and_retry_failed():
+    """超过最大次数标记为 failed，retry_failed 后重新投递"""
+    print("🧪 测试失败上限与手动重试...")
+    with tempfile.TemporaryDirectory() as tmp:
+        outbox = Outbox(os.path.join(tmp, "outbox.db"))
+        outbox.enqueue("alert:1", "告警", ["@a"], kind="alert")
+
+        failures = {("@a", n): RuntimeError("Forbidden") for n in range(1, 4)}
+        asyncio.run(_worker(outbox, RecordingSender(failures)).drain())
+        assert outbox.stats() == {"failed": 1}
+
+        assert outbox.retry_failed() == 1
+        assert asyncio.run(_worker(outbox, RecordingSender()).drain()) == 1
+        assert outbox.stats() == {"sent": 1}
+    print("✅ 失败消息可手动重新投递")
+
+
+def test_adapter_delivers_digest_via_outbox():
+    """适配器的简报推送经过发件箱，返回是否全部送达"""
+    print("🧪 测试简报经发件箱推送...")
+    from src.adapters.telegram_adapter_v2 import TelegramMultiAccountAdapter
+
+    with tempfile.TemporaryDirectory() as tmp:
+        outbox = Outbox(os.path.join(tmp, "outbox.db"))
+        adapter = TelegramMultiAccountAdapter(collector_accounts=[])
+        sender = RecordingSender({("@channel", 1): FakeFloodWait(3600)})
+        adapter._outbox_worker = _worker(outbox, sender)
+
+        assert asyncio.run(adapter.deliver_via_outbox("简报", ["@channel"], "daily:x")) is False
+        adapter._outbox_worker = _worker(outbox, sender, clock=lambda: time.time() + 7200)
+        assert asyncio.run(adapter.deliver_via_outbox("简报（重新生成）", ["@channel"], "daily:x")) is True
+        # 重试发送的是第一次入队的内容
+        assert sender.sent == [("@channel", "简报")]
+    print("✅ 简报推送失败后可续发")
+
+
+def main():
+    """主测试函数"""
+    test_enqueue_idempotent()
+    test_resume_partial_post()
+    test_flood_wait_handling()
+    test_rate_limit_and_fan_out()
+    test_max_attempts_and_retry_failed()
+    test_adapter_delivers_digest_via_outbox()
+    print("\n🎉 发件箱测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,60 @@
+"""
+流水线基准测试
+验证合成语料可复现、基准在小规模下能离线跑通并输出各阶段耗时
+"""
+
+import os
+import sys
+import copy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.run_pipeline import run_benchmark, compare_reports
+
+
+def test_corpus_is_deterministic():
+    """相同参数生成相同语料，且包含重复、链接和基础问题"""
+    first = generate_corpus(500, seed=7)
+    second = generate_corpus(500, seed=7)
+    assert len(first) == 500
+    assert [m.content for m in first] == [m.content for m in second]
+    contents = [m.content for m in first]
+    assert len(set(contents)) < len(contents)
+    assert any(m.urls for m in first)
+    assert any("下载" in c or "怎么" in c for c in contents)
+
+
+def test_run_benchmark_offline():
+    """小规模基准能跑通，输出全部阶段，并能与基线比较"""
+    print("🧪 测试离线基准...")
+    report = run_benchmark([300])
+    result = report["results"][0]
+    for stage in ["collect", "dedup", "basic_filter", "chunking", "storage_insert",
+                  "storage_query", "report_assembly", "delivery_formatting"]:
+        assert stage in result["stages"], stage
+    assert result["counts"]["deduplicated_messages"] <= 300
+    assert result["counts"]["llm_calls"] >= 1
+    assert result["counts"]["channel_posts"] >= 1
+
+    assert compare_reports(report, report) == []
+    slower = copy.deepcopy(report)
+    slower["results"][0]["stages"]["report_assembly"]["seconds"] = \
+        max(report["results"][0]["stages"]["report_assembly"]["seconds"], 0.01) * 10
+    report["results"][0]["stages"]["report_assembly"]["seconds"] = \
+        max(report["results"][0]["stages"]["report_assembly"]["seconds"], 0.01)
+    assert any("report_assembly" in line for line in compare_reports(slower, report))
+    print("✅ 离线基准运行正常")
+
+
+def main():
+    """主测试函数"""
+    test_corpus_is_deterministic()
+    test_run_benchmark_offline()
+    print("\n🎉 流水线基准测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
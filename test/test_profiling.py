@@ -0,0 +1,118 @@
+"""
+性能剖析测试
+验证 cProfile / 采样两种模式的阶段归属、内存峰值记录和产物输出
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.profiling import Profiler
+
+
+def _allocate(n):
+    return [str(i) * 10 for i in range(n)]
+
+
+def _spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_disabled_is_noop():
+    """未开启时 stage() 不做任何事，finish() 不写产物"""
+    print("🧪 测试未开启剖析...")
+    profiler = Profiler()
+    with profiler.stage("collect"):
+        _allocate(10)
+    assert not profiler.enabled
+    assert profiler.finish() is None
+    print("✅ 未开启时为空操作")
+
+
+def test_cprofile_nested_stages():
+    """嵌套阶段的 CPU 时间归属内层，内存峰值向外层传递"""
+    print("🧪 测试 cProfile 模式...")
+    with tempfile.TemporaryDirectory() as tmp:
+        profiler = Profiler()
+        profiler.configure("cprofile", "test_run", tmp)
+        with profiler.stage("summarize"):
+            _allocate(1000)
+            with profiler.stage("chunking"):
+                data = _allocate(50000)
+                del data
+        output_dir = profiler.finish()
+
+        with open(os.path.join(output_dir, "summary.json"), "r", encoding="utf-8") as f:
+            summary = json.load(f)
+        files = set(os.listdir(output_dir))
+
+    stages = summary["stages"]
+    assert summary["mode"] == "cprofile"
+    assert {"summarize.prof", "chunking.prof", "chunking_memory.txt"} <= files
+    assert stages["chunking"]["calls"] == 1
+    assert stages["chunking"]["peak_memory_bytes"] > 1_000_000
+    assert stages["summarize"]["peak_memory_bytes"] >= stages["chunking"]["peak_memory_bytes"]
+
+    def allocate_calls(stage):
+        return sum(h["calls"] for h in stages[stage]["hotspots"] if h["function"].startswith("_allocate"))
+
+    # _allocate 在两个阶段各调用一次，不会重复计入外层
+    assert allocate_calls("summarize") <= 1 and allocate_calls("chunking") == 1
+    print(f"✅ chunking 峰值内存 {stages['chunking']['peak_memory_bytes'] / 1024 / 1024:.1f} MB")
+
+
+def test_sampling_mode():
+    """采样模式输出折叠栈，热点指向实际耗时的函数"""
+    print("🧪 测试采样模式...")
+    with tempfile.TemporaryDirectory() as tmp:
+        profiler = Profiler()
+        profiler.configure("sample", "test_run", tmp, interval=0.002)
+        with profiler.stage("basic_filter"):
+            _spin(0.2)
+        output_dir = profiler.finish()
+        with open(os.path.join(output_dir, "basic_filter.folded"), "r", encoding="utf-8") as f:
+            folded = f.read().splitlines()
+        with open(os.path.join(output_dir, "summary.json"), "r", encoding="utf-8") as f:
+            summary = json.load(f)
+
+    entry = summary["stages"]["basic_filter"]
+    assert folded and all(line.rsplit(" ", 1)[1].isdigit() for line in folded)
+    assert entry["samples"] >= 10
+    assert entry["hotspots"][0]["function"].startswith("_spin")
+    print(f"✅ 采集 {entry['samples']} 个样本")
+
+
+def test_entry_points_accept_profile():
+    """各入口脚本都能正常启动并提供 --profile 参数"""
+    print("🧪 测试入口脚本的 --profile 参数...")
+    for script in ("collect_compatible.py", "process_24h_report.py", "process_past_hour.py",
+                   "generate_newsletter.py"):
+        result = subprocess.run([sys.executable, os.path.join(ROOT, script), "--help"],
+                                cwd=ROOT, capture_output=True, text=True, timeout=120)
+        assert result.returncode == 0, f"{script} 启动失败:\n{result.stderr}"
+        assert "--profile" in result.stdout
+        print(f"   {script}: 可以启动")
+    print("✅ 入口脚本支持 --profile")
+
+
+def main():
+    """主测试函数"""
+    test_disabled_is_noop()
+    test_cprofile_nested_stages()
+    test_sampling_mode()
+    test_entry_points_accept_profile()
+    print("\n🎉 性能剖析测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,81 @@
+"""
+提示词压缩测试
+验证链接缩短、表情折叠、引用去重、模板行删除和超长截断
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import make_message
+from src.config import CompactionConfig
+from src.processors.compactor import PromptCompactor
+
+
+
+def test_compact_text_rules():
+    """单条文本的归一化规则"""
+    print("🧪 测试单条消息压缩...")
+    compactor = PromptCompactor(CompactionConfig(max_message_chars=0))
+
+    text = compactor.compact_text("看这里 https://www.example.com/path?ref=abc123&utm_source=tg 🚀🚀🚀🚀🚀🚀 冲!!!!!!")
+    assert text == "看这里 [link:example.com] 🚀🚀🚀 冲!!!"
+
+    text = compactor.compact_text("BTC 突破 10 万\n\n\n   多空   比 1.2\n邀请码: ABC123 注册返佣")
+    assert text == "BTC 突破 10 万\n多空 比 1.2"
+
+    # 正常讨论中提到返佣/邀请码的句子保留，只删除带代码或链接的短推广行
+    news = "币安下调了 VIP 用户的返佣比例，做市商的手续费优势会缩小"
+    text = compactor.compact_text(f"{news}\n邀请码活动结束后交易量回落了 30%\n注册返佣 https://spam.example/ref?code=1")
+    assert text == f"{news}\n邀请码活动结束后交易量回落了 30%"
+    print("✅ 单条消息压缩规则正确")
+
+
+def test_compact_messages_keeps_ids_and_reports_savings():
+    """压缩不改变消息数量和顺序，并报告节省的 token"""
+    print("🧪 测试批量压缩...")
+    compactor = PromptCompactor(CompactionConfig(max_message_chars=50))
+    messages = [
+        make_message(0, "ETH 链上大额转账 5 万枚"),
+        make_message(1, "> ETH 链上大额转账 5 万枚\n这是要砸盘吗"),
+        make_message(2, "正常消息"),
+        make_message(3, "长" * 200),
+    ]
+
+    compacted, stats = compactor.compact_messages(messages)
+
+    assert len(compacted) == len(messages)
+    assert [m.id for m in compacted] == [m.id for m in messages]
+    assert compacted[1].content == "这是要砸盘吗"
+    # 未变化的消息直接复用原对象，原消息不被修改
+    assert compacted[2] is messages[2]
+    assert messages[1].content.startswith("> ETH")
+    assert compacted[3].content.startswith("长" * 50) and "截断150字" in compacted[3].content
+    assert stats.quoted_lines_dropped == 1
+    assert stats.messages_truncated == 1
+    assert stats.tokens_after < stats.tokens_before
+    print(f"✅ token {stats.tokens_before} -> {stats.tokens_after}，节省 {stats.saved_ratio:.1%}")
+
+
+def test_compaction_disabled():
+    """关闭压缩时原样返回"""
+    compactor = PromptCompactor(CompactionConfig(enabled=False))
+    messages = [make_message(0, "https://example.com/a 🚀🚀🚀🚀🚀")]
+    compacted, stats = compactor.compact_messages(messages)
+    assert compacted[0] is messages[0]
+    assert stats.tokens_saved == 0
+
+
+def main():
+    """主测试函数"""
+    test_compact_text_rules()
+    test_compact_messages_keeps_ids_and_reports_savings()
+    test_compaction_disabled()
+    print("\n🎉 提示词压缩测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,166 @@
+"""
+简报清单测试
+验证原子写入、首次导入已有简报、按清单查询上次统计窗口以及按清单归档
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.delivery.manifest import ReportManifest, atomic_write, parse_report_filename
+
+
+def _touch(directory, filename, content="# 简报"):
+    with open(os.path.join(directory, filename), "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def test_parse_report_filename():
+    """新旧两种文件名格式"""
+    print("🧪 测试文件名解析...")
+    assert parse_report_filename("简报_2601010800_-2601020800.md") == (
+        datetime(2026, 1, 1, 8, 0), datetime(2026, 1, 2, 8, 0))
+    assert parse_report_filename("简报_2601010800_-2601020800_2.md")[1] == datetime(2026, 1, 2, 8, 0)
+    assert parse_report_filename("简报_251231_to_20260101.md") == (None, datetime(2026, 1, 1))
+    assert parse_report_filename("笔记.md") is None
+    print("✅ 文件名解析正确")
+
+
+def test_atomic_write():
+    """写入完成后不留下临时文件，覆盖时内容完整替换"""
+    print("🧪 测试原子写入...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "vault", "简报.md")
+        atomic_write(path, "第一版")
+        atomic_write(path, "第二版")
+        with open(path, encoding="utf-8") as f:
+            assert f.read() == "第二版"
+        assert os.listdir(os.path.dirname(path)) == ["简报.md"]
+
+        # 写入失败时原文件保持不变，临时文件被清理
+        with mock.patch("os.replace", side_effect=OSError("disk full")):
+            try:
+                atomic_write(path, "第三版")
+            except OSError:
+                pass
+        with open(path, encoding="utf-8") as f:
+            assert f.read() == "第二版"
+        assert os.listdir(os.path.dirname(path)) == ["简报.md"]
+    print("✅ 原子写入正确")
+
+
+def test_bootstrap_then_lookup_without_scanning():
+    """首次使用时导入已有简报，之后查询不再遍历目录"""
+    print("🧪 测试清单导入与查询...")
+    with tempfile.TemporaryDirectory() as tmp:
+        vault = os.path.join(tmp, "vault")
+        os.makedirs(vault)
+        _touch(vault, "简报_2601010800_-2601020800.md")
+        _touch(vault, "简报_2601020800_-2601030900_2.md")
+        _touch(vault, "简报_251231_to_20251231.md")
+        _touch(vault, "随手笔记.md")
+        manifest = ReportManifest(os.path.join(tmp, "manifest.db"))
+
+        assert manifest.last_window_end(vault) == datetime(2026, 1, 3, 9, 0)
+
+        with mock.patch("os.listdir", side_effect=AssertionError("不应再遍历目录")):
+            path = manifest.save(vault, "简报_2601030900_-2601040800.md", "# 新简报", stats={"total_messages": 42})
+            assert manifest.last_window_end(vault) == datetime(2026, 1, 4, 8, 0)
+
+        with open(path, encoding="utf-8") as f:
+            assert f.read() == "# 新简报"
+        with sqlite3.connect(manifest.db_path) as conn:
+            sha256, size, stats = conn.execute(
+                "SELECT sha256, size, stats FROM reports WHERE filename = ?",
+                ("简报_2601030900_-2601040800.md",)).fetchone()
+        assert len(sha256) == 64 and size == len("# 新简报".encode("utf-8"))
+        assert json.loads(stats) == {"total_messages": 42}
+
+        # 其他目录互不影响
+        assert manifest.last_window_end(os.path.join(tmp, "other")) is None
+    print("✅ 清单查询不依赖目录遍历")
+
+
+def test_rebuild_after_manual_changes():
+    """手动删除文件后重建清单"""
+    print("🧪 测试重建清单...")
+    with tempfile.TemporaryDirectory() as tmp:
+        vault = os.path.join(tmp, "vault")
+        manifest = ReportManifest(os.path.join(tmp, "manifest.db"))
+        manifest.save(vault, "简报_2601010800_-2601020800.md", "a")
+        manifest.save(vault, "简报_2601020800_-2601030800.md", "b")
+        os.remove(os.path.join(vault, "简报_2601020800_-2601030800.md"))
+
+        assert manifest.last_window_end(vault) == datetime(2026, 1, 3, 8, 0)
+        assert manifest.rebuild(vault) == 1
+        assert manifest.last_window_end(vault) == datetime(2026, 1, 2, 8, 0)
+    print("✅ 重建后清单与目录一致")
+
+
+def test_archive_by_manifest():
+    """按清单归档超过一周的简报（只归档每日简报），归档后仍参与上次窗口的计算"""
+    print("🧪 测试按清单归档...")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+    from manage_obsidian_reports import move_old_reports
+    from process_24h_report import generate_filename
+
+    now = datetime.now().replace(second=0, microsecond=0)
+    old_name = generate_filename(now - timedelta(days=10), now - timedelta(days=9))
+    new_name = generate_filename(now - timedelta(days=1), now)
+    hourly_name = "PastHourReport_old.md"
+    with tempfile.TemporaryDirectory() as tmp:
+        vault = os.path.join(tmp, "vault")
+        os.makedirs(vault)
+        _touch(vault, old_name)
+        manifest = ReportManifest(os.path.join(tmp, "manifest.db"))
+        manifest.save(vault, new_name, "# 最新")
+        # 过去一小时简报登记为 hourly，即使已超过一周也不归档
+        manifest.save(vault, hourly_name, "# 小时简报", kind="hourly",
+                      window=(now - timedelta(days=10, hours=1), now - timedelta(days=10)))
+
+        assert move_old_reports(vault, days_threshold=7, manifest=manifest) == 1
+        assert sorted(os.listdir(vault)) == sorted(["Oldsletters", new_name, hourly_name])
+        assert os.listdir(os.path.join(vault, "Oldsletters")) == [old_name]
+        # 再次运行没有需要归档的文件
+        assert move_old_reports(vault, days_threshold=7, manifest=manifest) == 0
+        assert manifest.last_window_end(vault) == now
+    print("✅ 旧简报已归档")
+
+
+def test_hourly_report_records_collected_window():
+    """小时简报的文件名、正文和清单窗口都使用实际采集的窗口，而不是保存时刻往前一小时"""
+    print("🧪 测试小时简报窗口...")
+    from process_past_hour import save_to_obsidian
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vault = os.path.join(tmp, "vault")
+        manifest = ReportManifest(os.path.join(tmp, "manifest.db"))
+        path = save_to_obsidian("内容", datetime(2026, 1, 1, 12), datetime(2026, 1, 1, 13), vault, manifest)
+        assert os.path.basename(path) == "PastHourReport_20260101_1200.md"
+        with open(path, encoding="utf-8") as f:
+            assert "报告周期: 2026-01-01 12:00 - 13:00" in f.read()
+        assert manifest.last_window_end(vault, kind="hourly") == datetime(2026, 1, 1, 13)
+    print("✅ 清单记录了采集窗口")
+
+
+def main():
+    """主测试函数"""
+    test_parse_report_filename()
+    test_atomic_write()
+    test_bootstrap_then_lookup_without_scanning()
+    test_rebuild_after_manual_changes()
+    test_archive_by_manifest()
+    test_hourly_report_records_collected_window()
+    print("\n🎉 简报清单测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,104 @@
+"""
+简报统计日志测试
+验证追加记录、按结束时间查询上次统计、导入旧 JSON 文件以及按周汇总密度趋势
+"""
+
+import os
+import sys
+import json
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.delivery.report_stats import ReportStatsLog, build_record
+
+
+def test_append_and_previous():
+    """追加后取最新一条，before 可以排除当前窗口"""
+    print("🧪 测试追加与上次统计查询...")
+    with tempfile.TemporaryDirectory() as tmp:
+        log = ReportStatsLog(os.path.join(tmp, "stats.db"), legacy_path=None)
+        assert log.previous() is None
+
+        start = datetime(2026, 1, 1, 8, 0)
+        first = log.append(build_record(start, start + timedelta(hours=24), 12, "a.md"))
+        second = log.append(build_record(start + timedelta(hours=24), start + timedelta(hours=36), 3, "b.md"))
+
+        assert first["basic_operation_density"] == 0.5
+        assert second["hours"] == 12 and second["basic_operation_density"] == 0.25
+        assert log.previous() == second
+        assert log.previous(before=datetime(2026, 1, 2, 20, 0))["filename"] == "a.md"
+        assert log.count() == 2
+    print("✅ 上次统计查询正确")
+
+
+def test_history_not_truncated():
+    """历史记录不再截断到 100 条"""
+    print("🧪 测试保留全部历史...")
+    with tempfile.TemporaryDirectory() as tmp:
+        log = ReportStatsLog(os.path.join(tmp, "stats.db"), legacy_path=None)
+        start = datetime(2025, 1, 1, 8, 0)
+        for day in range(150):
+            window_start = start + timedelta(days=day)
+            log.append(build_record(window_start, window_start + timedelta(hours=24), day, f"{day}.md"))
+        assert log.count() == 150
+        assert log.previous()["filename"] == "149.md"
+    print("✅ 150 条记录全部保留")
+
+
+def test_import_legacy_json():
+    """旧 report_stats.json 只导入一次"""
+    print("🧪 测试导入旧统计文件...")
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, "report_stats.json")
+        start = datetime(2026, 1, 1, 8, 0)
+        records = [build_record(start + timedelta(days=i), start + timedelta(days=i + 1), i * 24, f"{i}.md")
+                   for i in range(3)]
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+
+        db_path = os.path.join(tmp, "stats.db")
+        log = ReportStatsLog(db_path, legacy_path=legacy)
+        assert log.count() == 3
+        assert log.previous()["basic_operation_density"] == 2
+        assert not os.path.exists(legacy) and os.path.exists(legacy + ".imported")
+
+        assert ReportStatsLog(db_path, legacy_path=legacy).count() == 3
+    print("✅ 旧统计文件已导入")
+
+
+def test_weekly_density_trend():
+    """按周汇总，密度按小时加权"""
+    print("🧪 测试按周密度趋势...")
+    with tempfile.TemporaryDirectory() as tmp:
+        log = ReportStatsLog(os.path.join(tmp, "stats.db"), legacy_path=None)
+        # 2026-01-05 是周一；第 2 周两份简报，第 3 周一份
+        monday = datetime(2026, 1, 5, 8, 0)
+        log.append(build_record(monday, monday + timedelta(hours=24), 24, "w2-1.md"))
+        log.append(build_record(monday + timedelta(days=5), monday + timedelta(days=6, hours=12), 12, "w2-2.md"))
+        log.append(build_record(monday + timedelta(days=7), monday + timedelta(days=8), 96, "w3.md"))
+
+        trend = log.weekly_density(weeks=12, until=datetime(2026, 1, 31))
+        assert [week["week"] for week in trend] == ["2026-W02", "2026-W03"]
+        assert trend[0]["reports"] == 2 and trend[0]["hours"] == 60
+        assert trend[0]["density"] == round(36 / 60, 4)
+        assert trend[1]["density"] == 4
+
+        assert [week["week"] for week in log.weekly_density(weeks=1, until=datetime(2026, 1, 31))] == ["2026-W03"]
+    print("✅ 周趋势汇总正确")
+
+
+def main():
+    """主测试函数"""
+    test_append_and_previous()
+    test_history_not_truncated()
+    test_import_legacy_json()
+    test_weekly_density_trend()
+    print("\n🎉 简报统计日志测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,169 @@
+"""
+常驻调度器测试
+验证 cron 表达式计算、错过补跑、防重叠和优雅退出
+"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import SchedulerConfig
+from src.scheduler import CronSchedule, Job, Scheduler
+
+
+def test_cron_next_after():
+    """常见表达式的下一次触发时间"""
+    print("🧪 测试 cron 表达式...")
+    now = datetime(2026, 1, 1, 10, 7, 30)  # 周四
+    assert CronSchedule("5 * * * *").next_after(now) == datetime(2026, 1, 1, 11, 5)
+    assert CronSchedule("*/15 * * * *").next_after(now) == datetime(2026, 1, 1, 10, 15)
+    assert CronSchedule("0 8 * * *").next_after(now) == datetime(2026, 1, 2, 8, 0)
+    assert CronSchedule("30 8,20 * * *").next_after(now) == datetime(2026, 1, 1, 20, 30)
+    assert CronSchedule("0 9 * * 1-5").next_after(datetime(2026, 1, 2, 12, 0)) == datetime(2026, 1, 5, 9, 0)
+    assert CronSchedule("0 0 * * 7").next_after(now) == datetime(2026, 1, 4, 0, 0)
+    assert CronSchedule("0 0 1 */3 *").next_after(now) == datetime(2026, 4, 1, 0, 0)
+    assert CronSchedule("0 0 29 2 *").next_after(now) == datetime(2028, 2, 29, 0, 0)
+    # 触发时间本身不算“之后”
+    assert CronSchedule("0 8 * * *").next_after(datetime(2026, 1, 1, 8, 0)) == datetime(2026, 1, 2, 8, 0)
+
+    for bad in ("* * * *", "60 * * * *", "*/0 * * * *", "5-1 * * * *"):
+        try:
+            CronSchedule(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"应当拒绝非法表达式: {bad}")
+    print("✅ cron 表达式计算正确")
+
+
+async def _noop(scheduled_at):
+    return None
+
+
+def test_catch_up_plan():
+    """停机期间错过的任务立即补跑一次，未错过的按计划运行"""
+    print("🧪 测试错过补跑...")
+    now = datetime(2026, 1, 2, 9, 30)
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = os.path.join(tmp, "state.json")
+        with open(state_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "daily": {"last_run_at": "2026-01-01T08:00:00"},
+                "hourly": {"last_run_at": "2026-01-02T09:05:00"},
+            }, f)
+        jobs = [
+            Job("daily", CronSchedule("0 8 * * *"), _noop),
+            Job("hourly", CronSchedule("5 * * * *"), _noop),
+            Job("newsletter", CronSchedule("30 8 * * *"), _noop),
+            Job("no_catch_up", CronSchedule("0 8 * * *"), _noop, catch_up=False),
+        ]
+        scheduler = Scheduler(jobs, state_path, clock=lambda: now)
+        scheduler.plan()
+
+    assert scheduler.next_runs["daily"] == now
+    assert scheduler.next_runs["hourly"] == datetime(2026, 1, 2, 10, 5)
+    # 首次运行（没有状态）不补跑
+    assert scheduler.next_runs["newsletter"] == datetime(2026, 1, 3, 8, 30)
+    assert scheduler.next_runs["no_catch_up"] == datetime(2026, 1, 3, 8, 0)
+    print("✅ 补跑计划正确")
+
+
+def test_overlap_and_graceful_shutdown():
+    """上一次未结束时跳过触发；退出时等待运行中的任务并记录状态"""
+    print("🧪 测试防重叠与优雅退出...")
+    runs = []
+
+    async def slow_job(scheduled_at):
+        runs.append(scheduled_at)
+        await asyncio.sleep(0.2)
+
+    async def scenario(state_path):
+        now = datetime(2026, 1, 2, 9, 30)
+        scheduler = Scheduler([Job("daily", CronSchedule("0 8 * * *"), slow_job)], state_path,
+                              tick_seconds=0.01, clock=lambda: now)
+        first = scheduler.launch("daily", now)
+        second = scheduler.launch("daily", now)
+        assert first is not None and second is None
+
+        # 主循环中请求退出：不再触发新任务，但要等运行中的任务完成
+        scheduler.next_runs = {}
+        loop_task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.05)
+        scheduler.stop()
+        await loop_task
+        assert first.done() and not first.cancelled()
+        return scheduler
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = os.path.join(tmp, "state.json")
+        asyncio.run(scenario(state_path))
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+
+    assert len(runs) == 1
+    assert state["daily"]["last_run_at"] == "2026-01-02T09:30:00"
+    assert state["daily"]["last_status"] == "ok"
+    print("✅ 重叠触发被跳过，退出前任务正常完成")
+
+
+def test_failed_job_and_timeout():
+    """任务失败或超时不会影响调度器，状态记录为 failed"""
+    print("🧪 测试任务失败与超时...")
+
+    async def broken(scheduled_at):
+        raise RuntimeError("boom")
+
+    async def hanging(scheduled_at):
+        await asyncio.sleep(10)
+
+    async def scenario(state_path):
+        now = datetime(2026, 1, 2, 9, 30)
+        scheduler = Scheduler([
+            Job("broken", CronSchedule("* * * * *"), broken),
+            Job("hanging", CronSchedule("* * * * *"), hanging, timeout=0.05),
+        ], state_path, clock=lambda: now)
+        await asyncio.gather(scheduler.launch("broken"), scheduler.launch("hanging"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = os.path.join(tmp, "state.json")
+        asyncio.run(scenario(state_path))
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+
+    assert state["broken"]["last_status"] == "failed"
+    assert state["hanging"]["last_status"] == "failed"
+    print("✅ 失败与超时均已记录")
+
+
+def test_build_jobs_from_config():
+    """cron 表达式为空的任务不启用"""
+    print("🧪 测试按配置生成任务...")
+    from run_scheduler import build_jobs
+
+    functions = {"hourly": _noop, "daily": _noop, "newsletter": _noop, "outbox": _noop}
+    jobs = build_jobs(functions, SchedulerConfig(hourly_cron="5 * * * *", daily_cron="0 8 * * *",
+                                                 newsletter_cron=""))
+    # 发件箱续发默认每 5 分钟运行
+    assert [job.name for job in jobs] == ["hourly", "daily", "outbox"]
+    assert jobs[0].schedule.expr == "5 * * * *"
+    print("✅ 任务列表正确")
+
+
+def main():
+    """主测试函数"""
+    test_cron_next_after()
+    test_catch_up_plan()
+    test_overlap_and_graceful_shutdown()
+    test_failed_job_and_timeout()
+    test_build_jobs_from_config()
+    print("\n🎉 调度器测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,124 @@
+"""
+消息切分测试
+验证按结构边界切分、条数最少、不切开 HTML 实体/标签以及跨段补齐代码块和标签
+"""
+
+import os
+import re
+import sys
+import html
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.delivery.splitter import split_message, split_point, utf16_len
+
+
+def _report(sections=6, lines=12):
+    blocks = []
+    for s in range(sections):
+        items = "\n".join(f"- 第 {s}-{i} 条：项目 A&B 的 <讨论> 持续升温，社区关注度明显提高。" for i in range(lines))
+        blocks.append(f"## 话题 {s}\n\n{items}")
+    return "# 深度简报\n\n" + "\n\n".join(blocks)
+
+
+def test_short_message_single_part():
+    """不超长时只发一条，HTML 模式下转义"""
+    print("🧪 测试短消息...")
+    assert split_message("A & <B>") == ["A &amp; &lt;B&gt;"]
+    assert split_message("A & <B>", escape=False) == ["A & <B>"]
+    assert split_message("") == [""]
+    print("✅ 短消息不切分")
+
+
+def test_structure_boundaries_and_limits():
+    """每段不超过上限、不切开实体，且在标题之前切分"""
+    print("🧪 测试结构化切分...")
+    text = _report()
+    limit = 1500
+    parts = split_message(text, limit)
+
+    assert all(utf16_len(part) <= limit for part in parts)
+    assert all(not re.search(r"&[#\w]*$", part) for part in parts), "HTML 实体被切开"
+    # 每一段都从标题开始（话题之间优先切分）
+    assert all(html.unescape(part).startswith("#") for part in parts)
+    # 内容完整：去掉分段处的换行后与原文一致
+    rejoined = "\n\n".join(html.unescape(part) for part in parts)
+    assert rejoined == text
+
+    # 条数不多于按行贪心装箱的结果
+    greedy, size = 1, 0
+    for line in text.split("\n"):
+        cost = utf16_len(html.escape(line)) + 1
+        if size + cost > limit:
+            greedy, size = greedy + 1, 0
+        size += cost
+    assert len(parts) <= greedy
+    print(f"✅ {utf16_len(html.escape(text))} 字符切成 {len(parts)} 段，均在话题边界")
+
+
+def test_long_line_falls_back_to_sentences():
+    """单行超长时在句末切分，仍不超过上限"""
+    print("🧪 测试超长段落...")
+    text = "这是一个很长的句子，包含&符号。" * 200
+    parts = split_message(text, 500)
+    assert all(utf16_len(part) <= 500 for part in parts)
+    assert all(html.unescape(part).endswith("。") for part in parts)
+    assert "".join(html.unescape(part) for part in parts) == text
+
+    emoji = "🚀" * 300
+    parts = split_message(emoji, 100, escape=False)
+    assert [len(part) for part in parts] == [50] * 6
+    print("✅ 超长段落按句子切分，emoji 按 2 个码元计数")
+
+
+def test_code_fence_reopened():
+    """跨段的代码块在前一段闭合、后一段重新打开"""
+    print("🧪 测试代码块补齐...")
+    text = "说明\n```python\n" + "print('hello')\n" * 60 + "```\n结束"
+    parts = split_message(text, 300, escape=False)
+    assert len(parts) > 1
+    assert all(utf16_len(part) <= 300 for part in parts)
+    for part in parts:
+        assert part.count("```") % 2 == 0, part
+    assert all(part.startswith("```python") for part in parts[1:])
+    print("✅ 每段代码块都成对出现")
+
+
+def test_html_tags_closed_and_reopened():
+    """HTML 输入不在标签内切分，未闭合的标签跨段补齐"""
+    print("🧪 测试 HTML 标签补齐...")
+    text = "<b>🔴 告警</b>\n<i>" + "\n".join(f"第 {i} 行 &amp; 说明" for i in range(80)) + "</i>"
+    parts = split_message(text, 200, escape=False, is_html=True)
+    assert len(parts) > 1
+    for part in parts:
+        assert utf16_len(part) <= 200
+        assert part.count("<i>") == part.count("</i>"), part
+        assert not re.search(r"<[^>]*$", part) and not re.search(r"&[#\w]*$", part)
+    print("✅ 标签在每段内成对")
+
+
+def test_split_point_prefers_paragraph():
+    """流式推送的切分点优先落在段落边界"""
+    print("🧪 测试流式切分点...")
+    text = "第一段内容" * 5 + "\n\n" + "第二段" * 3 + "\n" + "续" * 40
+    cut = split_point(text, 40)
+    assert text[:cut] == "第一段内容" * 5 + "\n\n"
+    assert split_point("短文本", 40) == len("短文本")
+    print("✅ 切分点在段落之间")
+
+
+def main():
+    """主测试函数"""
+    test_short_message_single_part()
+    test_structure_boundaries_and_limits()
+    test_long_line_falls_back_to_sentences()
+    test_code_fence_reopened()
+    test_html_tags_closed_and_reopened()
+    test_split_point_prefers_paragraph()
+    print("\n🎉 消息切分测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
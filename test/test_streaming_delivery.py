@@ -0,0 +1,185 @@
+"""
+流式交付测试
+使用本地假客户端验证频道消息的编辑/续发以及 Obsidian 草稿的定稿逻辑
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import make_message
+from benchmarks.fakes import FakeSummarizer
+from src.adapters.telegram_adapter_v2 import ChannelStreamWriter
+from src.config import TelegramAccountConfig
+from src.delivery.obsidian import StreamingMarkdownWriter
+from src.delivery.streaming import ReportStreamSink
+
+
+class _FakeMessage:
+    def __init__(self, message_id):
+        self.id = message_id
+
+
+class _FakeClient:
+    """记录 send/edit/delete 调用的假 Telegram 客户端"""
+
+    def __init__(self):
+        self.posts = {}
+        self.edits = 0
+        self.deleted = []
+
+    async def send_message(self, channel, text, parse_mode=None):
+        msg = _FakeMessage(len(self.posts) + 1)
+        self.posts[msg.id] = text
+        return msg
+
+    async def edit_message(self, channel, message, text, parse_mode=None):
+        self.edits += 1
+        self.posts[message.id] = text
+
+    async def delete_messages(self, channel, ids):
+        self.deleted.extend(ids)
+        for message_id in ids:
+            self.posts.pop(message_id, None)
+
+
+class _FakeSession:
+    def __init__(self):
+        self.client = _FakeClient()
+        self.account_config = TelegramAccountConfig(
+            account_id="main", api_id=0, api_hash="", phone="", session_name="test"
+        )
+
+
+def test_channel_stream_rolls_over_long_text():
+    """超过单条上限时应续发新消息，且每条都不超过上限"""
+    print("🧪 测试频道流式推送分片...")
+    session = _FakeSession()
+    writer = ChannelStreamWriter(session, channel="@test", parse_mode="HTML", min_edit_interval=0)
+
+    async def run():
+        for _ in range(300):
+            await writer.append("行情 <BTC> & ETH 讨论\n")
+        return await writer.finish("\n统计")
+
+    assert asyncio.run(run())
+    posts = session.client.posts
+    assert len(posts) >= 2
+    assert all(len(text) <= ChannelStreamWriter.MAX_LENGTH for text in posts.values())
+    # 先切原文再转义，HTML 实体不会被切断
+    for text in posts.values():
+        assert "&" not in text.replace("&amp;", "").replace("&lt;", "").replace("&gt;", "")
+    assert posts[max(posts)].endswith("统计")
+    print(f"✅ 共发送 {len(posts)} 条消息，编辑 {session.client.edits} 次")
+
+
+def test_channel_stream_respects_edit_interval():
+    """编辑间隔未到时不应频繁编辑"""
+    print("🧪 测试编辑频率限制...")
+    session = _FakeSession()
+    writer = ChannelStreamWriter(session, channel="@test", parse_mode="HTML", min_edit_interval=60)
+
+    async def run():
+        for i in range(50):
+            await writer.append(f"片段{i} ")
+        await writer.finish()
+
+    asyncio.run(run())
+    # 首次发送 + 收尾强制编辑
+    assert session.client.edits == 1
+    assert len(session.client.posts) == 1
+    print("✅ 编辑频率限制生效")
+
+
+def test_sink_abort_removes_partial_output():
+    """回退到一次性模式时应撤回频道分片并删除草稿"""
+    print("🧪 测试流式交付回退...")
+    session = _FakeSession()
+    channel_writer = ChannelStreamWriter(session, channel="@test", min_edit_interval=0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "简报_test.md")
+        draft = os.path.join(tmp, "简报_test.draft.md")
+        sink = ReportStreamSink(StreamingMarkdownWriter(path, flush_interval=0), channel_writer)
+
+        async def run():
+            await sink.append("📊 0101 00:00 - 0101 12:00\n\n部分内容")
+            # 流式内容只写入草稿，正式文件名下不会出现不完整的简报
+            assert os.path.exists(draft) and not os.path.exists(path)
+            await sink.abort()
+
+        asyncio.run(run())
+        assert os.listdir(tmp) == []
+    assert session.client.posts == {}
+    assert session.client.deleted == [1]
+    print("✅ 回退时已撤回流式输出")
+
+
+def test_sink_finish_writes_full_content():
+    """定稿时 Obsidian 文件应与一次性模式内容一致"""
+    print("🧪 测试流式交付定稿...")
+    session = _FakeSession()
+    channel_writer = ChannelStreamWriter(session, channel="@test", min_edit_interval=0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "简报_test.md")
+        sink = ReportStreamSink(StreamingMarkdownWriter(path), channel_writer)
+
+        async def run():
+            await sink.append("📊 正文")
+            return await sink.finish("📊 正文\n\n统计", channel_tail="\n\n统计")
+
+        delivered = asyncio.run(run())
+        assert delivered == {"obsidian": True, "channel": True}
+        assert os.listdir(tmp) == ["简报_test.md"]
+        with open(path, encoding="utf-8") as f:
+            assert f.read() == "📊 正文\n\n统计"
+    assert session.client.posts[1] == "📊 正文\n\n统计"
+    print("✅ 定稿内容正确")
+
+
+def test_stream_opened_only_for_aggregation():
+    """只有多分块聚合时才打开流式通道；单分块时不打开，也不会留下未定稿的通道"""
+    print("🧪 测试按需打开流式通道...")
+    from process_24h_report import generate_global_summary
+
+    start, end = datetime(2026, 1, 1), datetime(2026, 1, 2)
+    opened = []
+
+    async def open_stream():
+        sink = ReportStreamSink(StreamingMarkdownWriter(os.path.join(tmp, "简报_test.md"), flush_interval=0))
+        opened.append(sink)
+        return sink
+
+    async def summarize(messages):
+        return await generate_global_summary(FakeSummarizer(), "", messages, start, end, open_stream=open_stream)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        single = asyncio.run(summarize([make_message(i) for i in range(5)]))
+        assert not single["streamed"] and opened == []
+
+        # 每条约 6 万 token，超过单个分块上限，需要流式聚合
+        multi = asyncio.run(summarize([make_message(i, "长" * 30000) for i in range(3)]))
+        assert multi["streamed"] and multi["stream_sink"] is opened[0] and len(opened) == 1
+        assert os.listdir(tmp) == ["简报_test.draft.md"]
+    print("✅ 只在多分块聚合时打开")
+
+
+def main():
+    """主测试函数"""
+    test_channel_stream_rolls_over_long_text()
+    test_channel_stream_respects_edit_interval()
+    test_sink_abort_removes_partial_output()
+    test_sink_finish_writes_full_content()
+    test_stream_opened_only_for_aggregation()
+    print("\n🎉 流式交付测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
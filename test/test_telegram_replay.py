@@ -0,0 +1,201 @@
+"""
+Telegram 录制/回放测试
+验证录制内容可以回放给 TelegramClientSession、FloodWait 注入和单账号限速，以及按页转换和名称缓存
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telethon.errors import FloodWaitError
+
+from src.adapters.telegram_adapter_v2 import TelegramClientSession
+from src.adapters.telegram_replay import (
+    RecordedEntity,
+    RecordedMessage,
+    RecordingClient,
+    ReplayClient,
+    TelegramRecording,
+)
+from src.config import TelegramAccountConfig
+
+
+class Channel:
+    def __init__(self, id, title, username=None):
+        self.id = id
+        self.title = title
+        self.username = username
+
+
+class User:
+    def __init__(self, id, first_name, last_name=None):
+        self.id = id
+        self.first_name = first_name
+        self.last_name = last_name
+
+
+class _FakeTelethonMessage:
+    def __init__(self, id, chat, sender, text, date):
+        self.id = id
+        self.chat = chat
+        self.chat_id = int(f"-100{chat.id}")
+        self.sender = sender
+        self.sender_id = sender.id
+        self.message = text
+        self.date = date
+        self.entities = None
+        self.views = 10
+        self.forwards = 0
+        self.reply_to = None
+        self.reply_to_msg_id = None
+
+
+class _FakeLiveClient:
+    """模拟真实 Telethon 客户端的返回值"""
+
+    def __init__(self):
+        self.chat = Channel(1234567, "测试频道", username="test_channel")
+        sender = User(42, "Alice", "Lee")
+        self.history = [
+            _FakeTelethonMessage(i, self.chat, sender, f"消息 {i} $BTC",
+                                 datetime(2026, 1, 1, 10, i, tzinfo=timezone.utc))
+            for i in range(1, 6)
+        ]
+        self.disconnected = False
+
+    async def get_entity(self, identifier):
+        return self.chat
+
+    async def iter_messages(self, entity, limit=None, offset_date=None, reverse=False):
+        for message in sorted(self.history, key=lambda m: m.id, reverse=True)[:limit]:
+            yield message
+
+    async def disconnect(self):
+        self.disconnected = True
+
+
+def _account() -> TelegramAccountConfig:
+    return TelegramAccountConfig(account_id="collector1", api_id=0, api_hash="", phone="", session_name="test")
+
+
+def test_record_then_replay():
+    """录制的流量回放后，适配器得到与录制时相同的消息"""
+    print("🧪 测试录制与回放...")
+
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "collector1.json")
+            live = _FakeLiveClient()
+            recorder = RecordingClient(live, path)
+            entity = await recorder.get_entity("@test_channel")
+            recorded = [m async for m in recorder.iter_messages(entity, limit=10)]
+            await recorder.disconnect()
+            assert live.disconnected and len(recorded) == 5
+
+            replay = ReplayClient(TelegramRecording.load(path))
+            session = TelegramClientSession(_account(), client_factory=lambda cfg: replay)
+            # 适配器按本地时间比较，窗口起点用本地时间表示
+            start = datetime(2026, 1, 1, 10, 2, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+            messages = await session.fetch_messages("@test_channel", start, datetime(2026, 1, 2), limit=100)
+            # 按数字ID解析同样可以找到实体
+            by_id = await replay.get_entity(-1001234567)
+            return messages, by_id, replay
+
+    messages, by_id, replay = asyncio.run(run())
+    assert by_id.title == "测试频道"
+    assert [m.external_id for m in messages] == ["5", "4", "3", "2"]
+    assert messages[0].content == "消息 5 $BTC"
+    assert messages[0].chat_name == "测试频道"
+    assert messages[0].author_name == "Alice Lee"
+    assert messages[0].chat_id == "-1001234567"
+    assert replay.requests >= 2
+    print(f"✅ 回放 {len(messages)} 条消息，请求 {replay.requests} 次")
+
+
+def test_flood_wait_injection_and_rate_limit():
+    """按概率注入 FloodWait，并按单账号速率限制请求"""
+    print("🧪 测试 FloodWait 注入与限速...")
+    recording = TelegramRecording()
+
+    async def flood():
+        client = ReplayClient(recording, flood_wait_rate=1.0, flood_wait_seconds=7)
+        try:
+            await client.get_dialogs()
+        except FloodWaitError as e:
+            return e.seconds, client.flood_waits
+        return None, client.flood_waits
+
+    seconds, flood_waits = asyncio.run(flood())
+    assert seconds == 7 and flood_waits == 1
+
+    async def limited():
+        client = ReplayClient(recording, rate_limit=100)
+        started = time.monotonic()
+        await asyncio.gather(*(client.get_dialogs() for _ in range(11)))
+        return time.monotonic() - started, client.requests
+
+    elapsed, requests = asyncio.run(limited())
+    assert requests == 11
+    assert elapsed >= 0.09, elapsed
+    print(f"✅ 11 次请求在 100 次/秒限速下耗时 {elapsed:.3f}s")
+
+
+def test_page_conversion_and_name_cache():
+    """按页批量转换：跨页消息完整保留，群组/作者名称按 ID 缓存，中途出错时已拉到的消息照常返回"""
+    print("🧪 测试按页转换与名称缓存...")
+    recording = TelegramRecording()
+    chat = RecordedEntity(1234567, "Channel", title="测试频道")
+    alice = RecordedEntity(42, "User", first_name="Alice", last_name="Lee")
+    for i in range(1, 251):
+        recording.add_message(chat, RecordedMessage(
+            i, chat.marked_id, datetime(2026, 1, 1, 10, tzinfo=timezone.utc) + timedelta(seconds=i),
+            f"消息 {i}", sender_id=42, sender=None if i % 2 else alice))
+    replay = ReplayClient(recording)
+    session = TelegramClientSession(_account(), client_factory=lambda cfg: replay)
+
+    def fetch():
+        return asyncio.run(session.fetch_records(str(chat.marked_id), datetime(2025, 12, 31), datetime(2026, 1, 2),
+                                                 limit=500))
+
+    batch = fetch()
+    assert len(batch) == 250 and batch[0].external_id == "250" and batch[-1].external_id == "1"
+    # 没有 sender 实体的消息也能用缓存中的作者名称
+    assert {record.author_name for record in batch} == {"Alice Lee"}
+    assert session.chat_names == {chat.marked_id: "测试频道"} and len(session.senders) == 1
+    assert batch[0].chat_name is batch[-1].chat_name
+
+    unified = session._convert_to_unified_message(recording.messages_for(chat)[0], "")
+    assert unified == batch[0].to_unified()
+
+    iter_messages = replay.iter_messages
+
+    async def broken_iter_messages(entity, **kwargs):
+        count = 0
+        async for message in iter_messages(entity, **kwargs):
+            if count == 150:
+                raise ConnectionError("连接中断")
+            count += 1
+            yield message
+
+    replay.iter_messages = broken_iter_messages
+    assert [record.external_id for record in fetch()] == [str(i) for i in range(250, 100, -1)]
+    print("✅ 250 条消息跨页转换，名称缓存命中")
+
+
+def main():
+    """主测试函数"""
+    test_record_then_replay()
+    test_flood_wait_injection_and_rate_limit()
+    test_page_conversion_and_name_cache()
+    print("\n🎉 录制/回放测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
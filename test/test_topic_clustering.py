@@ -0,0 +1,106 @@
+"""
+话题聚类测试
+验证同一话题/代币的消息被聚到一起，以及按话题分块后相对ID能正确映射回原始ID
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import make_message
+from src.config import ClusteringConfig
+from src.processors.clustering import TopicClusterer
+from process_24h_report import chunk_messages_by_clusters, format_chunk_messages
+
+
+
+CORPUS = [
+    "$SOL 今天突破 200 了，链上活跃度很高",
+    "以太坊 gas 费又涨了，layer2 交互成本上升",
+    "SOL 生态 meme 币爆发，$SOL 还能追吗",
+    "美联储 议息 会议 今晚公布，注意 风险",
+    "以太坊 gas 太贵了，layer2 才是未来",
+    "$SOL 链上 DEX 交易量创新高",
+    "美联储 议息 结果 可能 降息 25 个基点",
+    "gm",
+]
+
+
+def test_clusters_group_same_topic():
+    """同一代币/话题的消息应落在同一个簇中"""
+    print("🧪 测试话题聚类...")
+    clusterer = TopicClusterer(ClusteringConfig(similarity_threshold=0.2, batch_size=3))
+    messages = [make_message(i, text, f"-100{i % 3}") for i, text in enumerate(CORPUS)]
+
+    clusters = clusterer.cluster(messages)
+    assert clusters, "聚类结果不应为空"
+
+    cluster_of = {}
+    for cluster in clusters:
+        for idx in cluster.indices:
+            cluster_of[idx] = cluster.cluster_id
+    assert sorted(cluster_of) == list(range(len(CORPUS))), "每条消息都应恰好属于一个簇"
+
+    assert cluster_of[0] == cluster_of[2] == cluster_of[5] != -1
+    assert cluster_of[1] == cluster_of[4] != -1
+    assert cluster_of[3] == cluster_of[6] != -1
+    assert cluster_of[7] == -1, "没有话题特征的消息应归入零散消息"
+    assert clusters[0].label.startswith("$SOL")
+    assert clusters[-1].cluster_id == -1
+    print(f"✅ 聚成 {len(clusters) - 1} 个话题: {[c.label for c in clusters]}")
+
+
+def test_chunk_by_clusters_maps_relative_ids():
+    """按话题分块后，块内相对ID应能映射回原始下标"""
+    print("🧪 测试按话题分块...")
+    clusterer = TopicClusterer(ClusteringConfig(similarity_threshold=0.2))
+    messages = [make_message(i, text, f"-100{i % 3}") for i, text in enumerate(CORPUS)]
+    clusters = clusterer.cluster(messages)
+
+    # 分块上限很小，迫使话题分散到多个块中
+    chunks = chunk_messages_by_clusters(messages, clusters, max_tokens_per_chunk=60)
+    assert len(chunks) > 1
+
+    seen = []
+    for chunk in chunks:
+        text = format_chunk_messages(chunk)
+        assert text.startswith("【话题：")
+        for relative_id, (original_id, msg) in enumerate(chunk['messages']):
+            assert f"[ID:{relative_id}] {msg.content}" in text
+            assert messages[original_id] is msg
+            seen.append(original_id)
+    assert sorted(seen) == list(range(len(CORPUS)))
+    print(f"✅ 分成 {len(chunks)} 个块")
+
+
+def test_plain_uppercase_words_are_not_tickers():
+    """OK、AI、USD 等大写词不算代币；显式 $TICKER 和已知项目名合并为同一实体"""
+    clusterer = TopicClusterer(ClusteringConfig(enabled=True))
+    tokens = clusterer._tokens("OK GM，AI 和 USD ETF 的 CEO 说 API 没问题")
+    assert not [token for token in tokens if token.startswith("$")]
+
+    tokens = clusterer._tokens("$btc 和比特币都在涨")
+    assert set(token for token in tokens if token.startswith("$")) == {"$BTC"}
+    assert clusterer._tokens("大饼")["$BTC"] > 0
+
+
+def test_clustering_disabled():
+    """关闭聚类时返回空列表，调用方回退到顺序分块"""
+    clusterer = TopicClusterer(ClusteringConfig(enabled=False))
+    assert clusterer.cluster([make_message(0, "$BTC")]) == []
+
+
+def main():
+    """主测试函数"""
+    test_clusters_group_same_topic()
+    test_chunk_by_clusters_maps_relative_ids()
+    test_plain_uppercase_words_are_not_tickers()
+    test_clustering_disabled()
+    print("\n🎉 话题聚类测试全部通过！")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,569 @@
+"""
+只读 HTTP API
+对外提供消息、AI 摘要、简报、实体提及统计和搜索，其他工具不需要直接打开 SQLite 文件：
+- 按月分库（data/raw_messages_YYYY_MM.db）用只读连接池访问，不与采集进程争写锁
+- 列表接口按 (时间戳, internal_id) 游标分页，跨分库合并排序
+- /export/messages.ndjson 逐行流式导出，不把结果整体读入内存
+- 响应带 ETag（由分库文件的修改时间和大小生成），数据未变化时返回 304
+- /feed 以 SSE 推送新入库的消息和 AI 分析结果（所有订阅者共用一次增量查询）
+
+启动：python -m web.api（或 uvicorn web.api:app）
+"""
+
+import asyncio
+import base64
+import glob
+import hashlib
+import heapq
+import json
+import os
+import queue
+import sqlite3
+import sys
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from loguru import logger
+
+from src.config import config
+from src.feed import EVENT_TYPES, FeedFilter, FeedHub, Subscription
+from src.storage import build_message_query, message_source
+
+SHARD_PATTERN = "raw_messages_*.db"
+# 导出时每次从分库读取的行数
+EXPORT_FETCH_SIZE = 500
+# SSE 心跳间隔（秒），防止代理断开空闲连接
+FEED_HEARTBEAT = 15.0
+# 增量读取失败（如 database is locked）后的最长退避间隔（秒）
+FEED_MAX_BACKOFF = 30.0
+
+
+def _row_key(row: Dict):
+    return str(row["timestamp"]), row["internal_id"]
+
+
+def _message(row: sqlite3.Row) -> Dict:
+    item = dict(row)
+    try:
+        item["tags"] = json.loads(item["tags"]) if item["tags"] else []
+    except ValueError:
+        item["tags"] = []
+    item["processed"] = bool(item["processed"])
+    return item
+
+
+def encode_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values), ensure_ascii=False).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="无效的游标")
+    if not isinstance(values, list) or len(values) != 2:
+        raise HTTPException(status_code=400, detail="无效的游标")
+    return tuple(values)
+
+
+class ShardPool:
+    """按月分库的只读连接池：每个分库保留若干空闲连接，查询在线程池中执行"""
+
+    def __init__(self, data_dir: str = "data", pool_size: int = 4, manifest_path: Optional[str] = None):
+        self.data_dir = data_dir
+        self.pool_size = pool_size
+        self.manifest_path = manifest_path
+        self._idle: Dict[str, queue.LifoQueue] = {}
+        self._with_authors: set = set()
+
+    def shards(self) -> List[str]:
+        """所有分库路径，最新的月份在前"""
+        return sorted(glob.glob(os.path.join(self.data_dir, SHARD_PATTERN)), reverse=True)
+
+    def version(self, include_manifest: bool = False) -> str:
+        """分库文件（含 WAL）的修改时间和大小，任一分库写入后都会变化"""
+        paths = self.shards()
+        if include_manifest and self.manifest_path:
+            paths.append(self.manifest_path)
+        parts = []
+        for path in paths:
+            for name in (path, path + "-wal"):
+                try:
+                    stat = os.stat(name)
+                except OSError:
+                    continue
+                parts.append(f"{os.path.basename(name)}:{stat.st_mtime_ns}:{stat.st_size}")
+        return "|".join(parts)
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True,
+                               check_same_thread=False, timeout=5)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @contextmanager
+    def connection(self, path: str) -> Iterator[sqlite3.Connection]:
+        idle = self._idle.setdefault(path, queue.LifoQueue())
+        try:
+            conn = idle.get_nowait()
+        except queue.Empty:
+            conn = self._open(path)
+        reusable = False
+        try:
+            yield conn
+            reusable = True
+        finally:
+            # 出错或导出中途断开的连接直接关闭，不放回池中
+            if reusable and idle.qsize() < self.pool_size:
+                idle.put(conn)
+            else:
+                conn.close()
+
+    def has_authors(self, path: str, conn: sqlite3.Connection) -> bool:
+        """分库是否已有 authors 表（旧分库的作者名称直接存在消息行里）；只缓存“有”，迁移后下次查询即生效"""
+        if path in self._with_authors:
+            return True
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'authors'").fetchone():
+            self._with_authors.add(path)
+            return True
+        return False
+
+    @staticmethod
+    def _fetch(conn: sqlite3.Connection, sql: str, params: list) -> List[sqlite3.Row]:
+        try:
+            return conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            if "no such table" not in str(e):
+                raise
+            return []
+
+    def query_all(self, sql: str, params: list) -> List[Dict]:
+        """在每个分库上执行同一条查询并合并结果（缺表的旧分库跳过）"""
+        rows = []
+        for path in self.shards():
+            with self.connection(path) as conn:
+                rows.extend(self._fetch(conn, sql, params))
+        return rows
+
+    def page(self, limit: int, **filters) -> Dict:
+        """跨分库的一页消息：每个分库取 limit+1 条，合并后按时间倒序截取"""
+        rows = []
+        for path in self.shards():
+            with self.connection(path) as conn:
+                sql, params = build_message_query(limit=limit + 1, with_authors=self.has_authors(path, conn),
+                                                  **filters)
+                rows.extend(_message(row) for row in self._fetch(conn, sql, params))
+        rows.sort(key=_row_key, reverse=True)
+        next_cursor = encode_cursor(_row_key(rows[limit - 1])) if len(rows) > limit else None
+        return {"items": rows[:limit], "next_cursor": next_cursor}
+
+    def stream(self, **filters) -> Iterator[Dict]:
+        """按时间倒序逐条读出所有分库中匹配的消息（分库之间归并排序）"""
+
+        def shard_rows(path):
+            with self.connection(path) as conn:
+                sql, params = build_message_query(with_authors=self.has_authors(path, conn), **filters)
+                cursor = conn.execute(sql, params)
+                while True:
+                    batch = cursor.fetchmany(EXPORT_FETCH_SIZE)
+                    if not batch:
+                        return
+                    for row in batch:
+                        yield _message(row)
+
+        return heapq.merge(*(shard_rows(path) for path in self.shards()), key=_row_key, reverse=True)
+
+    def close(self):
+        for idle in self._idle.values():
+            while not idle.empty():
+                idle.get_nowait().close()
+        self._idle.clear()
+
+
+class ShardTailer:
+    """
+    增量读取最新的分库，把新消息和新的分析结果发布到 FeedHub
+
+    新消息按 rowid、分析结果按 analyzed_seq 读取，都走索引；没有订阅者时不查询。
+    """
+
+    def __init__(self, pool: ShardPool, hub: FeedHub, interval: float = 1.0, recent_shards: int = 2,
+                 batch_size: int = 500):
+        self.pool = pool
+        self.hub = hub
+        self.interval = interval
+        self.recent_shards = recent_shards
+        self.batch_size = batch_size
+        # 分库 -> (最后读到的 rowid, 最后读到的 analyzed_seq)
+        self._positions: Dict[str, Tuple[int, int]] = {}
+        self._started = False
+
+    def _query(self, conn: sqlite3.Connection, sql: str, params: tuple) -> List[sqlite3.Row]:
+        try:
+            return conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            # 旧分库没有 analyzed_seq 列
+            if "no such" not in str(e):
+                raise
+            return []
+
+    def _scalar(self, conn: sqlite3.Connection, sql: str) -> int:
+        rows = self._query(conn, sql, ())
+        return (rows[0][0] or 0) if rows else 0
+
+    def poll_once(self) -> List[Dict]:
+        """读取上次之后的新事件；第一次调用只记录当前位置，不回放历史
+
+        位置在全部分库读完后才提交，中途出错时下次从原位置重读，不会漏掉事件。
+        """
+        events = []
+        positions = dict(self._positions)
+        for path in self.pool.shards()[:self.recent_shards]:
+            shard = os.path.basename(path)
+            with self.pool.connection(path) as conn:
+                if path not in positions:
+                    if self._started:
+                        # 启动后新出现的分库（跨月）从头读取
+                        positions[path] = (0, 0)
+                    else:
+                        positions[path] = (
+                            self._scalar(conn, "SELECT MAX(rowid) FROM messages"),
+                            self._scalar(conn, "SELECT MAX(analyzed_seq) FROM messages "
+                                               "WHERE analyzed_seq IS NOT NULL"),
+                        )
+                        continue
+                last_rowid, last_seq = positions[path]
+                columns, source = message_source(self.pool.has_authors(path, conn))
+                for row in self._query(conn, f"SELECT messages.rowid AS rowid, {columns} FROM {source} "
+                                             f"WHERE messages.rowid > ? ORDER BY messages.rowid LIMIT ?",
+                                       (last_rowid, self.batch_size)):
+                    last_rowid = row["rowid"]
+                    events.append(self._event("message", f"{shard}:m{last_rowid}", row))
+                for row in self._query(conn, f"SELECT analyzed_seq, {columns} FROM {source} "
+                                             f"WHERE analyzed_seq > ? ORDER BY analyzed_seq LIMIT ?",
+                                       (last_seq, self.batch_size)):
+                    last_seq = row["analyzed_seq"]
+                    events.append(self._event("analysis", f"{shard}:a{last_seq}", row))
+                positions[path] = (last_rowid, last_seq)
+        self._positions = positions
+        self._started = True
+        return events
+
+    @staticmethod
+    def _event(event_type: str, event_id: str, row: sqlite3.Row) -> Dict:
+        data = _message(row)
+        data.pop("rowid", None)
+        data.pop("analyzed_seq", None)
+        return {"type": event_type, "id": event_id, "data": data}
+
+    def reset(self):
+        self._positions.clear()
+        self._started = False
+
+    async def run(self):
+        delay = self.interval
+        while True:
+            try:
+                if self.hub.subscriber_count:
+                    self.hub.publish_many(await asyncio.to_thread(self.poll_once))
+                elif self._started:
+                    # 没有订阅者时不追踪位置，下次有人订阅时从当时的最新位置开始
+                    self.reset()
+                delay = self.interval
+            except Exception as e:
+                # 采集进程长时间持有写锁等临时错误不能终止推送任务，退避后重试
+                delay = min(max(delay, self.interval) * 2, FEED_MAX_BACKOFF)
+                logger.warning(f"增量读取分库失败，{delay:g} 秒后重试: {e}")
+            await asyncio.sleep(delay)
+
+
+def _sse(event_type: str, data: Dict, event_id: Optional[str] = None) -> str:
+    lines = [f"event: {event_type}"]
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False, default=str))
+    return "\n".join(lines) + "\n\n"
+
+
+async def sse_events(subscription: Subscription, is_disconnected: Callable[[], Awaitable[bool]],
+                     heartbeat: float = FEED_HEARTBEAT) -> AsyncIterator[str]:
+    """把订阅者的事件编码为 SSE；缓冲区溢出时先发送 dropped 事件告知丢弃数量"""
+    yield "retry: 3000\n\n"
+    while not await is_disconnected():
+        event = await subscription.get(timeout=heartbeat)
+        dropped = subscription.take_dropped()
+        if dropped:
+            yield _sse("dropped", {"count": dropped})
+        if event is None:
+            yield ": ping\n\n"
+            continue
+        yield _sse(event["type"], event["data"], event["id"])
+
+
+def _etag(request: Request, version: str) -> str:
+    digest = hashlib.sha1(f"{version}|{request.url.path}?{request.url.query}".encode("utf-8")).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    return etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+
+
+async def _conditional_json(request: Request, version: str, produce: Callable[[], object]) -> Response:
+    """数据版本未变化时直接返回 304，否则在线程池中执行查询"""
+    etag = _etag(request, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(await asyncio.to_thread(produce), headers=headers)
+
+
+def _hour_bucket(value: datetime) -> str:
+    return value.strftime("%Y-%m-%d %H:00")
+
+
+def create_app(pool: Optional[ShardPool] = None) -> FastAPI:
+    """创建 API 应用；pool 为空时按配置在第一次请求时创建"""
+    state = {"pool": pool, "hub": None, "tailer": None}
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        if state["tailer"] is not None:
+            state["tailer"].cancel()
+        if state["pool"] is not None:
+            state["pool"].close()
+
+    app = FastAPI(title="Telegram AI 只读 API", lifespan=lifespan)
+
+    def get_pool() -> ShardPool:
+        if state["pool"] is None:
+            api_config = config.api_config
+            state["pool"] = ShardPool(api_config.data_dir, api_config.pool_size, config.report_manifest_path)
+        return state["pool"]
+
+    def get_hub() -> FeedHub:
+        """第一次订阅时创建推送中心并启动增量读取任务"""
+        if state["hub"] is None:
+            api_config = config.api_config
+            state["hub"] = FeedHub(api_config.feed_buffer_size)
+            tailer = ShardTailer(get_pool(), state["hub"], api_config.feed_poll_interval)
+            state["tailer"] = asyncio.create_task(tailer.run())
+        return state["hub"]
+
+    def page_limit(limit: int) -> int:
+        return min(limit, config.api_config.max_page_size)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "shards": [os.path.basename(path) for path in get_pool().shards()]}
+
+    @app.get("/messages")
+    async def messages(request: Request, chat_id: Optional[List[str]] = Query(None),
+                       since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       tag: Optional[List[str]] = Query(None), processed: Optional[bool] = None,
+                       cursor: Optional[str] = None, limit: int = Query(50, ge=1)):
+        shards = get_pool()
+        filters = dict(chat_ids=chat_id, start_time=since, end_time=until, tags=tag, processed=processed,
+                       cursor=decode_cursor(cursor))
+        return await _conditional_json(request, shards.version(),
+                                       lambda: shards.page(page_limit(limit), **filters))
+
+    @app.get("/summaries")
+    async def summaries(request: Request, chat_id: Optional[List[str]] = Query(None),
+                        since: Optional[datetime] = None, until: Optional[datetime] = None,
+                        tag: Optional[List[str]] = Query(None), cursor: Optional[str] = None,
+                        limit: int = Query(50, ge=1)):
+        shards = get_pool()
+        filters = dict(chat_ids=chat_id, start_time=since, end_time=until, tags=tag, processed=True,
+                       cursor=decode_cursor(cursor))
+
+        def produce():
+            page = shards.page(page_limit(limit), **filters)
+            page["items"] = [{key: item[key] for key in ("internal_id", "chat_id", "chat_name", "timestamp",
+                                                         "summary", "tags")} for item in page["items"]]
+            return page
+
+        return await _conditional_json(request, shards.version(), produce)
+
+    @app.get("/search")
+    async def search(request: Request, q: str = Query(..., min_length=1), chat_id: Optional[List[str]] = Query(None),
+                     since: Optional[datetime] = None, until: Optional[datetime] = None,
+                     cursor: Optional[str] = None, limit: int = Query(50, ge=1)):
+        shards = get_pool()
+        filters = dict(search=q, chat_ids=chat_id, start_time=since, end_time=until, cursor=decode_cursor(cursor))
+        return await _conditional_json(request, shards.version(),
+                                       lambda: shards.page(page_limit(limit), **filters))
+
+    @app.get("/mentions/top")
+    async def top_mentions(request: Request, hours: int = Query(24, ge=1), limit: int = Query(20, ge=1),
+                           entity_type: Optional[str] = None):
+        shards = get_pool()
+        end = datetime.now()
+        params = [_hour_bucket(end - timedelta(hours=hours)), _hour_bucket(end)]
+        sql = """
+            SELECT entity, entity_type, chat_id, SUM(count) AS mentions
+            FROM mention_hourly WHERE hour >= ? AND hour <= ?
+        """
+        if entity_type:
+            sql += " AND entity_type = ?"
+            params.append(entity_type)
+        sql += " GROUP BY entity, entity_type, chat_id"
+
+        def produce():
+            totals: Dict[tuple, Dict] = {}
+            for row in shards.query_all(sql, params):
+                item = totals.setdefault((row["entity"], row["entity_type"]), {
+                    "entity": row["entity"], "entity_type": row["entity_type"], "mentions": 0, "chats": set()})
+                item["mentions"] += row["mentions"]
+                item["chats"].add(row["chat_id"])
+            ranked = sorted(totals.values(), key=lambda item: (-item["mentions"], item["entity"]))[:page_limit(limit)]
+            return {"items": [dict(item, chats=len(item["chats"])) for item in ranked]}
+
+        return await _conditional_json(request, shards.version(), produce)
+
+    @app.get("/mentions/{entity}")
+    async def entity_mentions(request: Request, entity: str, hours: int = Query(24, ge=1)):
+        shards = get_pool()
+        end = datetime.now()
+        params = [entity, _hour_bucket(end - timedelta(hours=hours)), _hour_bucket(end)]
+
+        def produce():
+            by_hour: Dict[str, int] = {}
+            by_chat: Dict[str, Dict] = {}
+            for row in shards.query_all("""
+                SELECT hour, chat_id, chat_name, SUM(count) AS mentions
+                FROM mention_hourly WHERE entity = ? AND hour >= ? AND hour <= ?
+                GROUP BY hour, chat_id
+            """, params):
+                by_hour[row["hour"]] = by_hour.get(row["hour"], 0) + row["mentions"]
+                chat = by_chat.setdefault(row["chat_id"], {"chat_id": row["chat_id"], "chat_name": row["chat_name"],
+                                                           "mentions": 0})
+                chat["mentions"] += row["mentions"]
+            return {
+                "entity": entity,
+                "by_hour": [{"hour": hour, "mentions": count} for hour, count in sorted(by_hour.items())],
+                "by_chat": sorted(by_chat.values(), key=lambda chat: -chat["mentions"]),
+            }
+
+        return await _conditional_json(request, shards.version(), produce)
+
+    @app.get("/feed")
+    async def feed(request: Request, chat_id: Optional[List[str]] = Query(None),
+                   tag: Optional[List[str]] = Query(None), q: Optional[List[str]] = Query(None),
+                   type: Optional[List[str]] = Query(None)):
+        if type and not set(type) <= set(EVENT_TYPES):
+            raise HTTPException(status_code=400, detail=f"type 只能是 {', '.join(EVENT_TYPES)}")
+        hub = get_hub()
+        subscription = hub.subscribe(FeedFilter(chat_ids=set(chat_id or ()), tags=set(tag or ()),
+                                                keywords=[keyword for keyword in q or () if keyword],
+                                                types=set(type or EVENT_TYPES)))
+
+        async def events():
+            try:
+                async for chunk in sse_events(subscription, request.is_disconnected):
+                    yield chunk
+            finally:
+                hub.unsubscribe(subscription)
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    def manifest_rows(sql: str, params: list) -> List[Dict]:
+        path = get_pool().manifest_path
+        if not path or not os.path.exists(path):
+            return []
+        with get_pool().connection(path) as conn:
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+    @app.get("/reports")
+    async def reports(request: Request, kind: Optional[str] = None, cursor: Optional[str] = None,
+                      limit: int = Query(50, ge=1)):
+        limit = page_limit(limit)
+        where, params = ["window_end IS NOT NULL"], []
+        if kind:
+            where.append("kind = ?")
+            params.append(kind)
+        position = decode_cursor(cursor)
+        if position:
+            where.append("(window_end, filename) < (?, ?)")
+            params.extend(position)
+        sql = f"""
+            SELECT filename, kind, window_start, window_end, sha256, size, stats, saved_at,
+                   archived_path IS NOT NULL AS archived
+            FROM reports WHERE {" AND ".join(where)}
+            ORDER BY window_end DESC, filename DESC LIMIT ?
+        """
+
+        def produce():
+            rows = manifest_rows(sql, params + [limit + 1])
+            for row in rows:
+                row["stats"] = json.loads(row["stats"]) if row["stats"] else None
+                row["archived"] = bool(row["archived"])
+            next_cursor = (encode_cursor((rows[limit - 1]["window_end"], rows[limit - 1]["filename"]))
+                           if len(rows) > limit else None)
+            return {"items": rows[:limit], "next_cursor": next_cursor}
+
+        return await _conditional_json(request, get_pool().version(include_manifest=True), produce)
+
+    @app.get("/reports/{filename}")
+    async def report_content(request: Request, filename: str):
+        rows = await asyncio.to_thread(manifest_rows, """
+            SELECT directory, filename, sha256, archived_path FROM reports
+            WHERE filename = ? ORDER BY saved_at DESC LIMIT 1
+        """, [filename])
+        if not rows:
+            raise HTTPException(status_code=404, detail="简报不存在")
+        row = rows[0]
+        path = row["archived_path"] or os.path.join(row["directory"], row["filename"])
+        etag = f'"{row["sha256"]}"' if row["sha256"] else None
+        if etag and _not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        try:
+            content = await asyncio.to_thread(_read_text, path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="简报文件已被删除")
+        headers = {"ETag": etag} if etag else {}
+        return PlainTextResponse(content, media_type="text/markdown; charset=utf-8", headers=headers)
+
+    @app.get("/export/messages.ndjson")
+    async def export_messages(chat_id: Optional[List[str]] = Query(None), since: Optional[datetime] = None,
+                              until: Optional[datetime] = None, processed: Optional[bool] = None):
+        rows = get_pool().stream(chat_ids=chat_id, start_time=since, end_time=until, processed=processed)
+        lines = (json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows)
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+    return app
+
+
+def _read_text(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+app = create_app()
+
+
+def main():
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="只读 HTTP API")
+    parser.add_argument("--host", default=None, help="监听地址（默认 API_HOST）")
+    parser.add_argument("--port", type=int, default=None, help="端口（默认 API_PORT）")
+    args = parser.parse_args()
+    uvicorn.run("web.api:app", host=args.host or config.api_config.host, port=args.port or config.api_config.port)
+
+
+if __name__ == "__main__":
+    main()
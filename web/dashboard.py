@@ -1,77 +1,122 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from src.config import config
+from src.storage import Storage
 
 # Page config
 st.set_page_config(page_title="Telegram AI Dashboard", page_icon="🤖", layout="wide")
 
-# Database connection
-def get_connection():
-    return sqlite3.connect(config.database_path)
-
-# Load data
-def load_data():
-    conn = get_connection()
-    query = """
-    SELECT internal_id, chat_name, author_name, content, summary, tags, timestamp, processed
-    FROM messages
-    ORDER BY timestamp DESC
-    """
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+# 看板每次交互都会重新运行脚本：Storage 只初始化一次，查询结果按 (筛选条件, 数据版本号) 缓存，
+# 有新消息写入或摘要更新时版本号变化，缓存自动失效
+PAGE_SIZES = [20, 50, 100]
+TIME_RANGES = {"全部": None, "最近 1 小时": 1, "最近 24 小时": 24, "最近 7 天": 168, "最近 30 天": 720}
+PROCESSED_FILTERS = {"全部": None, "已分析": True, "未分析": False}
+
+
+@st.cache_resource
+def get_storage():
+    return Storage(config.database_path)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_page(version, chat_ids, start_time, tags, processed, cursor, limit):
+    return get_storage().query_messages(chat_ids=list(chat_ids) or None, start_time=start_time,
+                                        tags=list(tags) or None, processed=processed,
+                                        cursor=cursor, limit=limit)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def load_counts(version):
+    return get_storage().get_message_counts()
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def load_tags(version):
+    return [row["tag"] for row in get_storage().get_tag_counts()]
+
+
+def paginate(name, version, filters, limit):
+    """按游标翻页；筛选条件变化时回到第一页"""
+    state_key = f"{name}_cursors"
+    if st.session_state.get(f"{name}_filters") != filters:
+        st.session_state[f"{name}_filters"] = filters
+        st.session_state[state_key] = [None]
+    cursors = st.session_state[state_key]
+
+    rows, next_cursor = load_page(version, *filters, cursors[-1], limit)
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    if col_prev.button("⬅️ 上一页", key=f"{name}_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    col_page.markdown(f"第 {len(cursors)} 页")
+    if col_next.button("下一页 ➡️", key=f"{name}_next", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
+    return rows
+
 
 st.title("🤖 Telegram AI 信息自动化中心")
+storage = get_storage()
+version = storage.data_version()
 
 # Sidebar
 st.sidebar.header("⚙️ 控制面板")
 if st.sidebar.button("🔄 刷新数据"):
     st.rerun()
 
-# Stats
-df = load_data()
-total = len(df)
-analyzed = len(df[df['processed'] == 1])
-st.sidebar.metric("总消息数", total)
-st.sidebar.metric("已 AI 分析", analyzed)
+# Stats（预计算的群组计数）
+chat_counts = load_counts(version)
+st.sidebar.metric("总消息数", sum(row["total"] for row in chat_counts))
+st.sidebar.metric("已 AI 分析", sum(row["processed"] for row in chat_counts))
+
+st.sidebar.header("🔍 筛选")
+chat_names = {row["chat_id"]: f"{row['chat_name'] or row['chat_id']} ({row['total']})" for row in chat_counts}
+selected_chats = st.sidebar.multiselect("群组", list(chat_names), format_func=chat_names.get)
+time_range = st.sidebar.selectbox("时间范围", list(TIME_RANGES))
+selected_tags = st.sidebar.multiselect("标签", load_tags(version))
+processed_filter = st.sidebar.radio("处理状态", list(PROCESSED_FILTERS), horizontal=True)
+page_size = st.sidebar.selectbox("每页条数", PAGE_SIZES)
+
+start_time = None
+if TIME_RANGES[time_range]:
+    # 取整到分钟，避免每次重新运行都产生新的缓存键
+    start_time = (datetime.now() - timedelta(hours=TIME_RANGES[time_range])).replace(second=0, microsecond=0)
+base_filters = (tuple(selected_chats), start_time, tuple(selected_tags))
 
 # Tabs
-tab1, tab2 = st.tabs(["📊 已分析信息", "📥 原始数据"])
+tab1, tab2, tab3 = st.tabs(["📊 已分析信息", "📥 原始数据", "🔥 热门提及"])
 
 with tab1:
     st.header("已分析消息详情")
-    analyzed_df = df[df['processed'] == 1].copy()
-    
-    if not analyzed_df.empty:
-        for idx, row in analyzed_df.iterrows():
-            with st.expander(f"🔹 {row['chat_name']} - {row['timestamp'][:16]}", expanded=True):
+    rows = paginate("analyzed", version, base_filters + (True,), page_size)
+
+    if rows:
+        for row in rows:
+            with st.expander(f"🔹 {row['chat_name']} - {str(row['timestamp'])[:16]}", expanded=False):
                 col1, col2 = st.columns([3, 1])
-                
+
                 with col1:
                     st.markdown(f"**AI 摘要:**")
                     st.info(row['summary'])
-                    
-                    st.markdown("**标签:**")
+
                     tags = row['tags']
                     if isinstance(tags, str):
                         try:
                             tags = json.loads(tags)
                         except:
                             tags = []
-                    
+
                     if tags:
-                        tag_cols = st.columns(len(tags))
-                        for i, tag in enumerate(tags):
-                            st.button(tag, key=f"tag_{idx}_{i}")
-                
+                        st.markdown("**标签:** " + " ".join(f"`{tag}`" for tag in tags))
+
                 with col2:
                     st.markdown("**元数据:**")
                     st.write(f"作者: {row['author_name']}")
                     st.write(f"平台: Telegram")
-                    
+
                 with st.container():
                     st.markdown("**原始内容:**")
                     st.code(row['content'], language=None)
@@ -80,7 +125,35 @@ with tab1:
 
 with tab2:
     st.header("数据库原始消息")
-    st.dataframe(df, use_container_width=True)
+    rows = paginate("raw", version, base_filters + (PROCESSED_FILTERS[processed_filter],), page_size)
+    st.dataframe(pd.DataFrame(rows), use_container_width=True)
+
+with tab3:
+    st.header("热门代币/项目提及")
+    hours = st.selectbox("时间范围", [1, 6, 24, 72, 168], index=2, format_func=lambda h: f"最近 {h} 小时")
+    end_time = datetime.now()
+    start_time = end_time - timedelta(hours=hours)
+    top_mentions = storage.get_top_mentions(start_time, end_time, limit=30)
+
+    if top_mentions:
+        mentions_df = pd.DataFrame(top_mentions).rename(columns={
+            "entity": "实体", "entity_type": "类型", "mentions": "提及次数", "chats": "群组数"
+        })
+        st.dataframe(mentions_df, use_container_width=True)
+
+        selected = st.selectbox("查看实体详情", [m["entity"] for m in top_mentions])
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("**按小时**")
+            by_hour = storage.get_mention_counts_by_hour(selected, start_time, end_time)
+            if by_hour:
+                st.bar_chart(pd.DataFrame(by_hour).set_index("hour")["mentions"])
+        with col2:
+            st.markdown("**按群组**")
+            st.dataframe(pd.DataFrame(storage.get_mention_counts_by_chat(selected, start_time, end_time)),
+                         use_container_width=True)
+    else:
+        st.write("该时间范围内暂无提及数据。")
 
 # Footer
 st.markdown("---")